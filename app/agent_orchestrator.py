@@ -1,24 +1,51 @@
 """Generic multi-agent pipeline orchestrator.
 
 Each *agent* is defined by a system prompt and a Pydantic output model.
-The orchestrator runs them sequentially, feeding each agent's structured
-output into the next agent's context.
+Steps declare the upstream agents whose structured output they need
+(``depends_on``); the orchestrator runs the pipeline as a DAG, starting every
+step as soon as its dependencies have finished, so independent agents run
+concurrently and wall-clock time follows the critical path. Each step's
+prompt contains only the outputs it declared.
+
+With a :class:`app.workflow_cache.WorkflowStepCache`, a step whose prompt,
+model, input and upstream outputs were seen before reuses the stored output
+instead of calling the LLM (reported as ``cached``).
+
+Steps can also adapt to what upstream agents found: ``skip_if`` leaves a step
+out (e.g. no review for a simple ticket the researcher is sure about) and
+``route`` picks a different, usually cheaper, model. Every result records its
+``status`` (completed/failed/skipped) and the ``model`` that ran it.
 """
 
+import asyncio
 import json
 import time
-from typing import Type
+from typing import Callable, Optional, Sequence, Type
 
 from pydantic import BaseModel
 
-from app.helpers import client as openai_client
+from app.llm_gateway import llm_gateway
 from app.logger import setup_logger
+from app.workflow_cache import WorkflowStepCache, step_key
 
 logger = setup_logger(__name__)
 
+# Upstream outputs by agent name, as seen by skip_if / route
+UpstreamOutputs = dict[str, dict]
+
 
 class AgentStep:
-    """Describes a single agent in a pipeline."""
+    """Describes a single agent in a pipeline.
+
+    *depends_on* names the steps whose output this one receives. ``None``
+    (the default) means every step listed before it, which keeps a plain
+    list of steps sequential; ``[]`` means it only needs the input.
+
+    *skip_if* and *route* receive the outputs of those dependencies. When
+    *skip_if* returns true the step is not run; *route* may return a model
+    name to use instead of *model* (``None`` keeps it). Neither is consulted
+    when a dependency failed, and a predicate that raises is ignored.
+    """
 
     def __init__(
         self,
@@ -26,60 +53,150 @@ class AgentStep:
         system_prompt: str,
         output_model: Type[BaseModel],
         model: str = "gpt-4o-mini",
+        depends_on: Optional[Sequence[str]] = None,
+        skip_if: Optional[Callable[[UpstreamOutputs], bool]] = None,
+        route: Optional[Callable[[UpstreamOutputs], Optional[str]]] = None,
     ):
         self.name = name
         self.system_prompt = system_prompt
         self.output_model = output_model
         self.model = model
+        self.depends_on = list(depends_on) if depends_on is not None else None
+        self.skip_if = skip_if
+        self.route = route
 
 
-def run_pipeline(
-    steps: list[AgentStep],
-    initial_input: str,
-    extra_context: str = "",
-) -> list[dict]:
-    """Execute a sequence of agents, passing each output to the next.
+def resolve_dependencies(steps: list[AgentStep]) -> dict[str, list[str]]:
+    """Map each step name to the names it depends on.
 
-    Returns a list of dicts: [{agent_name, output, duration_ms}, ...]
+    Steps may only depend on steps listed before them, so the list order is
+    always a valid execution order and cycles cannot occur.
     """
-    results: list[dict] = []
-    accumulated_context = initial_input
-    if extra_context:
-        accumulated_context += f"\n\n{extra_context}"
-
+    deps: dict[str, list[str]] = {}
     for step in steps:
-        t0 = time.time()
-
-        previous_outputs = ""
-        for r in results:
-            previous_outputs += f"\n\n--- {r['agent_name']} output ---\n{json.dumps(r['output'], indent=2)}"
-
-        user_content = f"Input:\n{accumulated_context}"
-        if previous_outputs:
-            user_content += f"\n\nPrevious agent outputs:{previous_outputs}"
-
+        if step.name in deps:
+            raise ValueError(f"Duplicate agent step name '{step.name}'")
+        if step.depends_on is None:
+            deps[step.name] = list(deps)
+            continue
+        for name in step.depends_on:
+            if name not in deps:
+                raise ValueError(f"Agent step '{step.name}' depends on '{name}', which is not listed before it")
+        deps[step.name] = list(step.depends_on)
+    return deps
+
+
+def _user_content(context: str, upstream: list[dict]) -> str:
+    content = f"Input:\n{context}"
+    if upstream:
+        previous_outputs = "".join(
+            f"\n\n--- {r['agent_name']} output ---\n{json.dumps(r['output'], indent=2)}" for r in upstream
+        )
+        content += f"\n\nPrevious agent outputs:{previous_outputs}"
+    return content
+
+
+def _evaluate(step: AgentStep, hook: str, upstream: list[dict]):
+    fn = getattr(step, hook)
+    if fn is None or any(r["status"] == "failed" for r in upstream):
+        return None
+    try:
+        return fn({r["agent_name"]: r["output"] for r in upstream})
+    except Exception as e:
+        logger.warning(f"Agent '{step.name}' {hook} failed, ignoring it: {e}")
+        return None
+
+
+async def _run_step(
+    step: AgentStep, context: str, upstream: list[dict], cache: Optional[WorkflowStepCache] = None
+) -> dict:
+    if _evaluate(step, "skip_if", upstream):
+        logger.info(f"Agent '{step.name}' skipped")
+        return {
+            "agent_name": step.name,
+            "output": {},
+            "duration_ms": 0,
+            "status": "skipped",
+            "model": None,
+            "routed": False,
+            "cached": False,
+            "cache_key": None,
+        }
+
+    t0 = time.time()
+    model = _evaluate(step, "route", upstream) or step.model
+    key = step_key(step.name, step.system_prompt, model, context, upstream)
+    output = await asyncio.to_thread(cache.get, key) if cache is not None else None
+    cached = output is not None
+    status = "completed"
+    if not cached:
         try:
-            completion = openai_client.chat.completions.create(
-                model=step.model,
-                messages=[
+            raw = await llm_gateway.complete(
+                [
                     {"role": "system", "content": step.system_prompt},
-                    {"role": "user", "content": user_content},
+                    {"role": "user", "content": _user_content(context, upstream)},
                 ],
+                model=model,
                 response_format={"type": "json_object"},
             )
-            raw = completion.choices[0].message.content
             parsed = step.output_model.model_validate_json(raw)
             output = parsed.model_dump()
+            if cache is not None:
+                await cache.aput(key, step.name, model, output)
         except Exception as e:
             logger.error(f"Agent '{step.name}' failed: {e}", exc_info=True)
             output = {"error": str(e)}
+            status = "failed"
+
+    duration_ms = int((time.time() - t0) * 1000)
+    logger.info(
+        f"Agent '{step.name}' {'reused from cache' if cached else status} on {model} in {duration_ms}ms"
+    )
+    return {
+        "agent_name": step.name,
+        "output": output,
+        "duration_ms": duration_ms,
+        "status": status,
+        "model": model,
+        "routed": model != step.model,
+        "cached": cached,
+        "cache_key": key,
+    }
+
+
+async def arun_pipeline(
+    steps: list[AgentStep],
+    initial_input: str,
+    extra_context: str = "",
+    cache: Optional[WorkflowStepCache] = None,
+) -> list[dict]:
+    """Execute the pipeline DAG; independent steps run concurrently.
 
-        duration_ms = int((time.time() - t0) * 1000)
-        results.append({
-            "agent_name": step.name,
-            "output": output,
-            "duration_ms": duration_ms,
-        })
-        logger.info(f"Agent '{step.name}' completed in {duration_ms}ms")
+    Returns a list of dicts in step order:
+    [{agent_name, output, duration_ms, status, model, routed, cached, cache_key}, ...]
+    Skipped steps have an empty output and are left out of downstream prompts.
+    """
+    deps = resolve_dependencies(steps)
+    context = initial_input
+    if extra_context:
+        context += f"\n\n{extra_context}"
 
+    t0 = time.time()
+    tasks: dict[str, asyncio.Task] = {}
+
+    async def run(step: AgentStep) -> dict:
+        upstream = [await tasks[name] for name in deps[step.name]]
+        upstream = [r for r in upstream if r["status"] != "skipped"]
+        return await _run_step(step, context, upstream, cache)
+
+    for step in steps:
+        tasks[step.name] = asyncio.ensure_future(run(step))
+    results = list(await asyncio.gather(*tasks.values()))
+
+    hits = sum(r["cached"] for r in results)
+    skipped = sum(r["status"] == "skipped" for r in results)
+    logger.info(
+        f"Pipeline of {len(steps)} agents completed in {int((time.time() - t0) * 1000)}ms "
+        f"({hits} from cache, {skipped} skipped)"
+    )
     return results
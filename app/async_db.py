@@ -0,0 +1,93 @@
+"""Async PostgREST client backed by a single shared HTTP/2 connection pool."""
+
+from typing import Dict, Union
+
+import httpx
+from postgrest import AsyncPostgrestClient
+from postgrest.constants import DEFAULT_POSTGREST_CLIENT_HEADERS
+
+from app.config import settings
+from app.db_instrumentation import instrument_client
+from app.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class PooledAsyncPostgrestClient(AsyncPostgrestClient):
+    """AsyncPostgrestClient whose session multiplexes requests over HTTP/2."""
+
+    def create_session(
+        self,
+        base_url: str,
+        headers: Dict[str, str],
+        timeout: Union[int, float, httpx.Timeout],
+    ) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            http2=settings.db_http2,
+            limits=httpx.Limits(
+                max_connections=settings.db_pool_max_connections,
+                max_keepalive_connections=settings.db_pool_max_keepalive,
+            ),
+        )
+
+
+# Instrumented proxy around the pool (see app.db_instrumentation)
+_client = None
+
+
+def get_async_db():
+    """Return the shared async PostgREST client, creating it on first use.
+
+    Returns None when Supabase credentials are placeholders, mirroring
+    ``get_supabase_client``.
+    """
+    global _client
+    if _client is not None:
+        return _client
+
+    if settings.db_backend == "sqlite":
+        from app.sqlite_backend import AsyncSQLiteClient, get_sqlite_database
+
+        _client = instrument_client(AsyncSQLiteClient(get_sqlite_database()))
+        return _client
+
+    url = settings.supabase_url
+    key = settings.supabase_key
+    if url in ["your_supabase_project_url", "https://your-project-id.supabase.co"] or key in [
+        "your_supabase_anon_key",
+        "your_anon_key",
+    ]:
+        logger.error("Supabase credentials contain placeholder values; async client disabled")
+        return None
+
+    try:
+        pool = PooledAsyncPostgrestClient(
+            f"{url}/rest/v1",
+            headers={
+                **DEFAULT_POSTGREST_CLIENT_HEADERS,
+                "apiKey": key,
+                "Authorization": f"Bearer {key}",
+            },
+            timeout=settings.db_timeout_seconds,
+        )
+        _client = instrument_client(pool)
+        logger.info(
+            f"Async PostgREST client initialized (http2={settings.db_http2}, "
+            f"max_connections={settings.db_pool_max_connections})"
+        )
+    except Exception as e:
+        logger.error(f"Failed to initialize async PostgREST client: {e}")
+        return None
+    return _client
+
+
+async def close_async_db() -> None:
+    """Close the shared connection pool (called on application shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        logger.info("Async PostgREST client closed")
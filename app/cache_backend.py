@@ -0,0 +1,305 @@
+"""Pluggable cache/counter backend shared by caches and rate limiters.
+
+The Procfile runs several uvicorn workers, so anything kept in a module-level
+dict is per-worker. :class:`CacheBackend` is the small surface the app needs
+to share that state: byte values with a TTL, atomic counters, sliding-window
+counters and pub/sub for invalidation messages.
+
+``CACHE_BACKEND=memory`` (the default) keeps everything in the current
+process, which is right for a single worker and for tests.
+``CACHE_BACKEND=redis`` talks to ``REDIS_URL`` using any server that speaks
+the Redis protocol; the ``redis`` package is only imported in that case.
+"""
+
+import json
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, Union
+
+from app.config import settings
+from app.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+Value = Union[str, bytes]
+MessageHandler = Callable[[str], None]
+
+
+def _to_bytes(value: Value) -> bytes:
+    return value.encode() if isinstance(value, str) else value
+
+
+class Subscription:
+    """Handle returned by :meth:`CacheBackend.subscribe`; call :meth:`close` to stop."""
+
+    def __init__(self, close: Callable[[], None]):
+        self._close = close
+        self.closed = False
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self._close()
+
+
+class CacheBackend(ABC):
+    """Key/value store with TTLs, counters and pub/sub.
+
+    Values are stored as bytes (``str`` is UTF-8 encoded). Keys are namespaced
+    by the backend's prefix so several deployments can share one server.
+    """
+
+    def __init__(self, prefix: str = ""):
+        self.prefix = prefix
+
+    def key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    # -- values --------------------------------------------------------
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: Value, ttl_seconds: Optional[float] = None, only_if_absent: bool = False) -> bool:
+        """Store *value*; with ``only_if_absent`` the write is skipped (and ``False``
+        returned) when the key already exists."""
+
+    @abstractmethod
+    def delete(self, *keys: str) -> int:
+        ...
+
+    def get_json(self, key: str) -> Any:
+        raw = self.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def set_json(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> bool:
+        return self.set(key, json.dumps(value, separators=(",", ":")), ttl_seconds)
+
+    # -- counters ------------------------------------------------------
+    @abstractmethod
+    def incr(self, key: str, amount: int = 1, ttl_seconds: Optional[float] = None) -> int:
+        """Atomically add *amount* and return the new value.
+
+        ``ttl_seconds`` is applied when the increment creates the key, giving
+        fixed-window counters that reset on their own.
+        """
+
+    @abstractmethod
+    def hit_window(self, key: str, window_seconds: float) -> int:
+        """Record one event now and return how many fall in the last *window_seconds*."""
+
+    @abstractmethod
+    def window_count(self, key: str, window_seconds: float) -> int:
+        """Events recorded in the last *window_seconds*, without adding one."""
+
+    # -- pub/sub -------------------------------------------------------
+    @abstractmethod
+    def publish(self, channel: str, message: str) -> None:
+        ...
+
+    @abstractmethod
+    def subscribe(self, channel: str, handler: MessageHandler) -> Subscription:
+        """Call *handler* with each message published on *channel* from now on."""
+
+    def close(self) -> None:
+        pass
+
+
+# ---------------------------------------------------
+# In-memory backend
+# ---------------------------------------------------
+class MemoryCacheBackend(CacheBackend):
+    """Single-process backend; handlers run synchronously inside :meth:`publish`."""
+
+    def __init__(self, prefix: str = "", clock: Callable[[], float] = time.monotonic):
+        super().__init__(prefix)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._values: Dict[str, Tuple[Any, Optional[float]]] = {}
+        self._windows: Dict[str, Deque[float]] = {}
+        self._handlers: Dict[str, List[MessageHandler]] = {}
+
+    def _live(self, key: str):
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and self._clock() >= expires_at:
+            del self._values[key]
+            return None
+        return entry
+
+    def _expiry(self, ttl_seconds: Optional[float]) -> Optional[float]:
+        return self._clock() + ttl_seconds if ttl_seconds else None
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._live(self.key(key))
+        if entry is None:
+            return None
+        value = entry[0]
+        return str(value).encode() if isinstance(value, int) else value
+
+    def set(self, key: str, value: Value, ttl_seconds: Optional[float] = None, only_if_absent: bool = False) -> bool:
+        with self._lock:
+            full = self.key(key)
+            if only_if_absent and self._live(full) is not None:
+                return False
+            self._values[full] = (_to_bytes(value), self._expiry(ttl_seconds))
+            return True
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            removed = 0
+            for key in keys:
+                full = self.key(key)
+                removed += int(self._live(full) is not None or full in self._windows)
+                self._values.pop(full, None)
+                self._windows.pop(full, None)
+            return removed
+
+    def incr(self, key: str, amount: int = 1, ttl_seconds: Optional[float] = None) -> int:
+        with self._lock:
+            full = self.key(key)
+            entry = self._live(full)
+            if entry is None:
+                value, expires_at = amount, self._expiry(ttl_seconds)
+            else:
+                value, expires_at = int(entry[0]) + amount, entry[1]
+            self._values[full] = (value, expires_at)
+            return value
+
+    def _trim(self, full: str, window_seconds: float) -> Deque[float]:
+        hits = self._windows.setdefault(full, deque())
+        cutoff = self._clock() - window_seconds
+        while hits and hits[0] <= cutoff:
+            hits.popleft()
+        return hits
+
+    def hit_window(self, key: str, window_seconds: float) -> int:
+        with self._lock:
+            hits = self._trim(self.key(key), window_seconds)
+            hits.append(self._clock())
+            return len(hits)
+
+    def window_count(self, key: str, window_seconds: float) -> int:
+        with self._lock:
+            return len(self._trim(self.key(key), window_seconds))
+
+    def publish(self, channel: str, message: str) -> None:
+        with self._lock:
+            handlers = list(self._handlers.get(self.key(channel), []))
+        for handler in handlers:
+            try:
+                handler(message)
+            except Exception as e:
+                logger.warning(f"Cache message handler failed on {channel}: {e}")
+
+    def subscribe(self, channel: str, handler: MessageHandler) -> Subscription:
+        full = self.key(channel)
+        with self._lock:
+            self._handlers.setdefault(full, []).append(handler)
+
+        def close():
+            with self._lock:
+                self._handlers.get(full, []).remove(handler)
+
+        return Subscription(close)
+
+
+# ---------------------------------------------------
+# Redis-protocol backend
+# ---------------------------------------------------
+class RedisCacheBackend(CacheBackend):
+    """Backend for Redis or any server speaking its protocol.
+
+    Pass an existing *client* (e.g. a ``fakeredis.FakeRedis`` in tests) or a
+    *url*. Subscriptions each run a daemon listener thread.
+    """
+
+    def __init__(self, url: Optional[str] = None, client=None, prefix: str = ""):
+        super().__init__(prefix)
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package") from e
+            client = redis.Redis.from_url(url, socket_timeout=settings.redis_timeout_seconds)
+        self._redis = client
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._redis.get(self.key(key))
+
+    def set(self, key: str, value: Value, ttl_seconds: Optional[float] = None, only_if_absent: bool = False) -> bool:
+        px = int(ttl_seconds * 1000) if ttl_seconds else None
+        return bool(self._redis.set(self.key(key), _to_bytes(value), px=px, nx=only_if_absent))
+
+    def delete(self, *keys: str) -> int:
+        return self._redis.delete(*(self.key(k) for k in keys)) if keys else 0
+
+    def incr(self, key: str, amount: int = 1, ttl_seconds: Optional[float] = None) -> int:
+        full = self.key(key)
+        pipe = self._redis.pipeline(transaction=True)
+        if ttl_seconds:
+            # Create the key with its expiry first; an existing key keeps its TTL
+            pipe.set(full, 0, px=int(ttl_seconds * 1000), nx=True)
+        pipe.incrby(full, amount)
+        return int(pipe.execute()[-1])
+
+    def hit_window(self, key: str, window_seconds: float) -> int:
+        full = self.key(key)
+        now = time.time()
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.zremrangebyscore(full, "-inf", now - window_seconds)
+        pipe.zadd(full, {f"{now}:{uuid.uuid4().hex[:8]}": now})
+        pipe.zcard(full)
+        pipe.pexpire(full, int(window_seconds * 1000) + 1000)
+        return int(pipe.execute()[2])
+
+    def window_count(self, key: str, window_seconds: float) -> int:
+        full = self.key(key)
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.zremrangebyscore(full, "-inf", time.time() - window_seconds)
+        pipe.zcard(full)
+        return int(pipe.execute()[1])
+
+    def publish(self, channel: str, message: str) -> None:
+        self._redis.publish(self.key(channel), message)
+
+    def subscribe(self, channel: str, handler: MessageHandler) -> Subscription:
+        def on_message(msg):
+            data = msg["data"]
+            try:
+                handler(data.decode() if isinstance(data, bytes) else data)
+            except Exception as e:
+                logger.warning(f"Cache message handler failed on {channel}: {e}")
+
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self.key(channel): on_message})
+        thread = pubsub.run_in_thread(sleep_time=0.5, daemon=True)
+
+        def close():
+            # The worker thread closes the pubsub connection itself once it exits
+            thread.stop()
+            thread.join(timeout=1.0)
+
+        return Subscription(close)
+
+    def close(self) -> None:
+        self._redis.close()
+
+
+def create_cache_backend() -> CacheBackend:
+    """Build the backend selected by ``CACHE_BACKEND``."""
+    if settings.cache_backend == "redis":
+        logger.info("Using Redis cache backend")
+        return RedisCacheBackend(url=settings.redis_url, prefix=settings.cache_key_prefix)
+    return MemoryCacheBackend(prefix=settings.cache_key_prefix)
+
+
+# Global instance
+cache_backend = create_cache_backend()
@@ -0,0 +1,123 @@
+"""Cache of per-requirement compliance verdicts.
+
+A requirement's verdict depends only on the requirement itself, the document
+content (``knowledge_documents.content_hash``), the model and the evaluation
+prompt. Results are keyed by a hash of exactly those, so re-evaluating a
+template against a document only calls the LLM for requirements that were
+edited or documents whose content changed. Error results are never stored.
+
+Verdicts are kept in a per-process LRU and in the ``compliance_result_cache``
+table (:class:`app.table_cache.TableBackedCache`); lookups for a whole
+template are one query.
+"""
+
+import hashlib
+import json
+from typing import Any, Callable, Dict, List, Optional
+
+from app.config import settings
+from app.logger import setup_logger
+from app.table_cache import TableBackedCache
+
+logger = setup_logger(__name__)
+
+TABLE = "compliance_result_cache"
+
+# Keys per table lookup; keeps the PostgREST query string well under URL limits
+LOOKUP_CHUNK = 100
+
+
+def requirement_hash(req: Dict[str, Any]) -> str:
+    fields = {k: req.get(k) for k in ("id", "title", "description", "category")}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+
+def result_key(req: Dict[str, Any], content_hash: str, model: str, prompt_version: str) -> str:
+    """Hex sha256 of (requirement, document content, model, prompt version)."""
+    payload = "\n".join([requirement_hash(req), content_hash, model, prompt_version])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ComplianceResultCache(TableBackedCache):
+    """LRU of requirement verdicts backed by a persistent table."""
+
+    TABLE = TABLE
+    VALUE_COLUMN = "result"
+
+    def __init__(
+        self,
+        *,
+        enabled: bool = True,
+        persist: bool = True,
+        max_entries: int = 5000,
+        writer=None,
+        async_client_factory: Optional[Callable[[], Any]] = None,
+    ):
+        super().__init__(enabled=enabled, persist=persist, max_entries=max_entries, writer=writer)
+        self._async_client_factory = async_client_factory
+
+    async def aget_many(self, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Cached results for whichever of *keys* are known."""
+        if not self.enabled or not keys:
+            return {}
+        found: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                result = self._get_memory(key)
+                if result is not None:
+                    found[key] = result
+            self._stats["memory_hits"] += len(found)
+        missing = [k for k in dict.fromkeys(keys) if k not in found]
+        if missing and self.persist:
+            rows = await self._atable_lookup(missing)
+            with self._lock:
+                for row in rows:
+                    result = self._decode(row["result"])
+                    found[row["cache_key"]] = result
+                    self._put(row["cache_key"], result)
+                self._stats["table_hits"] += len(rows)
+        with self._lock:
+            self._stats["misses"] += len(set(keys)) - len(found)
+        return found
+
+    def put(self, key: str, requirement_id: str, content_hash: str, model: str, prompt_version: str,
+            result: Dict[str, Any]) -> None:
+        self._store(key, result, {
+            "requirement_id": requirement_id,
+            "content_hash": content_hash,
+            "model": model,
+            "prompt_version": prompt_version,
+        })
+
+    async def _atable_lookup(self, keys: List[str]) -> List[Dict[str, Any]]:
+        client = self._async_client()
+        if client is None:
+            return []
+        rows: List[Dict[str, Any]] = []
+        try:
+            for start in range(0, len(keys), LOOKUP_CHUNK):
+                result = await (
+                    client.table(TABLE)
+                    .select("cache_key, result")
+                    .in_("cache_key", keys[start:start + LOOKUP_CHUNK])
+                    .execute()
+                )
+                rows.extend(result.data or [])
+        except Exception as e:
+            logger.warning(f"Compliance result cache lookup failed, evaluating without it: {e}")
+        return rows
+
+    def _async_client(self):
+        if self._async_client_factory is None:
+            from app.async_db import get_async_db
+
+            self._async_client_factory = get_async_db
+        return self._async_client_factory()
+
+
+# Global instance
+compliance_cache = ComplianceResultCache(
+    enabled=settings.compliance_cache_enabled,
+    persist=settings.compliance_cache_persist,
+    max_entries=settings.compliance_cache_max_entries,
+)
@@ -0,0 +1,264 @@
+"""Concurrent evaluation of a document against compliance requirements.
+
+A template can hold dozens of requirements, and each needs a retrieval and
+an LLM verdict. Evaluating them one after another made a 40-requirement
+template take minutes. :class:`ComplianceEngine` embeds every requirement
+query in one batched call, then runs retrieval and evaluation for all
+requirements concurrently, at most ``COMPLIANCE_EVAL_CONCURRENCY`` at a time,
+and yields each result as soon as it is ready. :func:`summarize` computes
+the aggregate score once all results are in.
+
+Given the document's ``content_hash``, verdicts are looked up in
+:data:`app.compliance_cache.compliance_cache` first; only the requirements
+without one are embedded and sent to the LLM.
+
+Batch jobs (:mod:`app.compliance_jobs`) evaluate one template against many
+documents; they embed the requirement queries once with
+:meth:`ComplianceEngine.query_vectors` and pass the vectors and a shared
+semaphore into every :meth:`ComplianceEngine.evaluate`.
+"""
+
+import asyncio
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.compliance_cache import ComplianceResultCache, compliance_cache, result_key
+from app.config import settings
+from app.llm_gateway import CHAT_MODEL, llm_gateway
+from app.logger import setup_logger
+from app.schemas import RequirementResult
+
+logger = setup_logger(__name__)
+
+EVAL_SYSTEM_PROMPT = (
+    "You are a compliance auditor. You will receive a requirement description and "
+    "relevant excerpts from a document. Evaluate whether the document satisfies the "
+    "requirement. Return JSON with fields: status (pass|fail|partial|not_applicable), "
+    "reasoning (one sentence), confidence (float 0-1), evidence (quote from document "
+    "or empty string)."
+)
+
+# Bump when EVAL_SYSTEM_PROMPT or the user prompt in _judge changes, so cached
+# verdicts produced by the old prompt are not reused
+EVAL_PROMPT_VERSION = "1"
+
+NO_CONTEXT = "(No relevant sections found.)"
+
+
+def requirement_query(req: Dict[str, Any]) -> str:
+    return f"{req['title']} {req['description']}"
+
+
+def summarize(results: List[RequirementResult]) -> Tuple[float, str]:
+    """Overall score (share of pass/partial) and a one-line summary."""
+    pass_count = sum(r.status in ("pass", "partial") for r in results)
+    overall_score = round(pass_count / (len(results) or 1), 2)
+
+    summary_lines = [f"Overall compliance: {overall_score * 100:.0f}%"]
+    fails = [r for r in results if r.status == "fail"]
+    if fails:
+        summary_lines.append(f"{len(fails)} requirement(s) failed.")
+    return overall_score, " ".join(summary_lines)
+
+
+def evaluation_row(
+    template_id: str, document_id: str, results: List[RequirementResult], evaluated_by: Optional[str]
+) -> Dict[str, Any]:
+    """A ``compliance_evaluations`` row for *results*."""
+    overall_score, summary = summarize(results)
+    return {
+        "template_id": template_id,
+        "document_id": document_id,
+        "results": [r.model_dump() for r in results],
+        "overall_score": overall_score,
+        "summary": summary,
+        "evaluated_by": evaluated_by,
+    }
+
+
+def _error_result(req: Dict[str, Any], error: Exception) -> RequirementResult:
+    return RequirementResult(
+        requirement_id=req["id"],
+        status="fail",
+        reasoning=f"Evaluation error: {error}",
+        confidence=0.0,
+    )
+
+
+class ComplianceEngine:
+    """Evaluates requirements concurrently under a bounded limit, reusing cached verdicts."""
+
+    def __init__(
+        self,
+        concurrency: int = 8,
+        *,
+        match_count: int = 3,
+        match_threshold: float = 0.5,
+        model: str = CHAT_MODEL,
+        cache: Optional[ComplianceResultCache] = None,
+        embed: Optional[Callable[[List[str]], Awaitable[List[List[float]]]]] = None,
+        search: Optional[Callable[..., Awaitable[List[Dict[str, Any]]]]] = None,
+        gateway=None,
+        async_client_factory: Optional[Callable[[], Any]] = None,
+    ):
+        self.concurrency = concurrency
+        self.match_count = match_count
+        self.match_threshold = match_threshold
+        self.model = model
+        self.cache = cache
+        self._embed = embed
+        self._search = search
+        self.gateway = gateway if gateway is not None else llm_gateway
+        self._async_client_factory = async_client_factory
+
+    @property
+    def prompt_version(self) -> str:
+        # Retrieval settings change the excerpts the LLM sees, so they are part of it
+        return f"{EVAL_PROMPT_VERSION}:{self.match_count}:{self.match_threshold}"
+
+    async def query_vectors(self, requirements: List[Dict[str, Any]]) -> Dict[str, List[float]]:
+        """Embeddings of the distinct requirement queries, in one batched call."""
+        queries = list(dict.fromkeys(requirement_query(r) for r in requirements))
+        if not queries:
+            return {}
+        return dict(zip(queries, await self._embed_queries(queries)))
+
+    async def evaluate(
+        self,
+        document_id: str,
+        requirements: List[Dict[str, Any]],
+        content_hash: Optional[str] = None,
+        *,
+        vectors: Optional[Dict[str, List[float]]] = None,
+        limit: Optional[asyncio.Semaphore] = None,
+    ) -> AsyncIterator[Tuple[int, RequirementResult, bool]]:
+        """Yield ``(index in requirements, result, reused)`` in completion order.
+
+        Cached verdicts (``reused``) come first; they need a *content_hash*.
+        *vectors* maps requirement queries to embeddings that are already
+        known; *limit* replaces the per-call ``concurrency`` semaphore.
+        """
+        if not requirements:
+            return
+        keys: List[Optional[str]] = [None] * len(requirements)
+        cached: Dict[str, Dict[str, Any]] = {}
+        if self.cache is not None and content_hash:
+            keys = [result_key(r, content_hash, self.model, self.prompt_version) for r in requirements]
+            cached = await self.cache.aget_many(keys)
+        pending = []
+        for index, key in enumerate(keys):
+            if key in cached:
+                yield index, RequirementResult(**cached[key]), True
+            else:
+                pending.append(index)
+        if not pending:
+            return
+
+        known = dict(vectors or {})
+        missing = [r for r in (requirements[i] for i in pending) if requirement_query(r) not in known]
+        if missing:
+            known.update(await self.query_vectors(missing))
+        db = self._async_client()
+        if limit is None:
+            limit = asyncio.Semaphore(self.concurrency)
+
+        async def run(index: int, vector: List[float]) -> Tuple[int, RequirementResult, bool]:
+            async with limit:
+                req = requirements[index]
+                try:
+                    chunks = await self._retrieve(db, document_id, vector)
+                    result = await self._judge(req, chunks)
+                except Exception as e:
+                    logger.error(f"Evaluation failed for requirement {req['id']}: {e}")
+                    return index, _error_result(req, e), False
+                if keys[index] is not None:
+                    await self.cache.aput(
+                        keys[index], req["id"], content_hash, self.model, self.prompt_version, result.model_dump(),
+                    )
+                return index, result, False
+
+        tasks = [asyncio.ensure_future(run(i, known[requirement_query(requirements[i])])) for i in pending]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # The consumer stopped early (client disconnected): drop the rest
+            for task in tasks:
+                task.cancel()
+
+    async def evaluate_all(
+        self,
+        document_id: str,
+        requirements: List[Dict[str, Any]],
+        content_hash: Optional[str] = None,
+        **kwargs: Any,
+    ) -> Tuple[List[RequirementResult], List[str]]:
+        """All results in requirement order, and the ids of the reused ones.
+
+        Keyword arguments are passed on to :meth:`evaluate`.
+        """
+        results: List[Optional[RequirementResult]] = [None] * len(requirements)
+        reused: List[str] = []
+        async for index, result, was_cached in self.evaluate(document_id, requirements, content_hash, **kwargs):
+            results[index] = result
+            if was_cached:
+                reused.append(result.requirement_id)
+        return results, reused
+
+    async def _embed_queries(self, texts: List[str]) -> List[List[float]]:
+        if self._embed is None:
+            from app.embedding_service import aembed_batch
+
+            self._embed = aembed_batch
+        return await self._embed(texts)
+
+    async def _retrieve(self, db, document_id: str, vector: List[float]) -> List[Dict[str, Any]]:
+        # Scoped to the document inside the search, so all match_count chunks are its own
+        if self._search is None:
+            from app.embedding_service import asearch_chunks
+
+            self._search = asearch_chunks
+        return await self._search(
+            vector,
+            client=db,
+            match_count=self.match_count,
+            match_threshold=self.match_threshold,
+            document_ids=[document_id],
+        )
+
+    async def _judge(self, req: Dict[str, Any], chunks: List[Dict[str, Any]]) -> RequirementResult:
+        context = "\n\n".join(c["content"] for c in chunks) or NO_CONTEXT
+        raw = await self.gateway.complete(
+            [
+                {"role": "system", "content": EVAL_SYSTEM_PROMPT},
+                {
+                    "role": "user",
+                    "content": (
+                        f"Requirement: {req['title']}\n"
+                        f"Description: {req['description']}\n\n"
+                        f"Document excerpts:\n{context}"
+                    ),
+                },
+            ],
+            model=self.model,
+            response_format={"type": "json_object"},
+        )
+        parsed = json.loads(raw)
+        return RequirementResult(
+            requirement_id=req["id"],
+            status=parsed.get("status", "fail"),
+            reasoning=parsed.get("reasoning", ""),
+            confidence=float(parsed.get("confidence", 0.0)),
+            evidence=parsed.get("evidence", ""),
+        )
+
+    def _async_client(self):
+        if self._async_client_factory is None:
+            from app.async_db import get_async_db
+
+            self._async_client_factory = get_async_db
+        return self._async_client_factory()
+
+
+# Global instance
+compliance_engine = ComplianceEngine(concurrency=settings.compliance_eval_concurrency, cache=compliance_cache)
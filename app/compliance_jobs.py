@@ -0,0 +1,330 @@
+"""Background jobs evaluating many documents against many compliance templates.
+
+An audit of every policy document against several templates used to be one
+blocking ``POST /compliance/evaluate`` per (document, template) pair.
+``POST /compliance/batch`` instead submits the whole matrix as one job and
+answers ``202 Accepted``; progress is polled from
+``GET /compliance/batch/{job_id}``.
+
+A job embeds the distinct requirement queries of all its templates in one
+batched call and reuses those vectors for every document. Pairs run
+concurrently through :data:`app.compliance_engine.compliance_engine` (so
+cached verdicts are reused as usual), and every requirement retrieval and
+LLM verdict, across all running jobs of the process, goes through one
+semaphore of ``COMPLIANCE_BATCH_CONCURRENCY`` slots. Finished pairs are
+written to ``compliance_evaluations`` in multi-row inserts of
+``COMPLIANCE_BATCH_WRITE_SIZE``.
+
+Jobs live in process memory like non-durable reply jobs: a poll must reach
+the worker that accepted the job, and a job running at shutdown is lost
+(the evaluations it already wrote are kept).
+"""
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from app.compliance_engine import ComplianceEngine, compliance_engine, evaluation_row
+from app.config import settings
+from app.logger import setup_logger
+from app.schemas import RequirementResult
+
+logger = setup_logger(__name__)
+
+TABLE = "compliance_evaluations"
+
+# Finished jobs kept in memory for polling (on top of the TTL)
+MAX_FINISHED = 1000
+
+
+class BatchTooLarge(Exception):
+    """Raised when a batch has more than ``COMPLIANCE_BATCH_MAX_PAIRS`` pairs."""
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+@dataclass
+class ComplianceBatchJob:
+    id: str
+    user_id: Optional[str]
+    # One entry per (template, document) pair: ids, status, evaluation_id, score, summary, error
+    pairs: List[Dict[str, Any]]
+    requirements_total: int
+    status: str = "queued"  # queued | running | completed | failed
+    requirements_completed: int = 0
+    requirements_reused: int = 0
+    error: Optional[str] = None
+    created_at: str = field(default_factory=lambda: _now().isoformat())
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    done: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    def count(self, status: str) -> int:
+        return sum(p["status"] == status for p in self.pairs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        run = (self.finished or time.monotonic()) - self.started if self.started else None
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "run_ms": round(run * 1000, 1) if run is not None else None,
+            "progress": {
+                "pairs_total": len(self.pairs),
+                "pairs_completed": self.count("completed"),
+                "pairs_failed": self.count("failed"),
+                "requirements_total": self.requirements_total,
+                "requirements_completed": self.requirements_completed,
+                "requirements_reused": self.requirements_reused,
+            },
+            "evaluations": [dict(p) for p in self.pairs],
+            "error": self.error,
+        }
+
+
+class ComplianceBatchJobs:
+    """Runs batch evaluation jobs under one process-wide requirement concurrency cap."""
+
+    def __init__(
+        self,
+        *,
+        concurrency: int = 16,
+        max_pairs: int = 1000,
+        write_size: int = 50,
+        result_ttl_seconds: float = 3600.0,
+        engine: Optional[ComplianceEngine] = None,
+        async_client_factory: Optional[Callable[[], Any]] = None,
+    ):
+        self.concurrency = concurrency
+        self.max_pairs = max_pairs
+        self.write_size = write_size
+        self.result_ttl_seconds = result_ttl_seconds
+        self.engine = engine if engine is not None else compliance_engine
+        self._async_client_factory = async_client_factory
+        self._jobs: "OrderedDict[str, ComplianceBatchJob]" = OrderedDict()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._limit: Optional[asyncio.Semaphore] = None
+        self._running = 0
+        self.reset_stats()
+
+    def _db(self):
+        if self._async_client_factory is None:
+            from app.async_db import get_async_db
+
+            self._async_client_factory = get_async_db
+        return self._async_client_factory()
+
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        # First use, or a new event loop (tests): the semaphore is bound to its loop
+        self._loop = loop
+        self._limit = asyncio.Semaphore(self.concurrency)
+
+    async def stop(self) -> None:
+        """Cancel running jobs; evaluations they already wrote are kept."""
+        tasks = [job.task for job in self._jobs.values() if job.task is not None and not job.task.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+            logger.warning(f"{len(tasks)} compliance batch job(s) cancelled at shutdown")
+        self._loop = None
+
+    # ---------------------------------------------------
+    # Producer side
+    # ---------------------------------------------------
+    def submit(
+        self, templates: List[Dict[str, Any]], documents: List[Dict[str, Any]], user_id: Optional[str]
+    ) -> ComplianceBatchJob:
+        """Start evaluating every document against every template.
+
+        *templates* are ``{id, requirements}`` rows and *documents* ``{id,
+        content_hash}`` rows. Raises :class:`BatchTooLarge` past ``max_pairs``.
+        """
+        self._ensure_started()
+        self._prune()
+        if len(templates) * len(documents) > self.max_pairs:
+            self._stats["rejected"] += 1
+            raise BatchTooLarge(
+                f"{len(templates) * len(documents)} evaluations requested, at most {self.max_pairs} per batch"
+            )
+        pairs = [
+            {
+                "template_id": t["id"],
+                "document_id": d["id"],
+                "status": "queued",  # queued | running | completed | failed
+                "evaluation_id": None,
+                "overall_score": None,
+                "summary": None,
+                "error": None,
+            }
+            for t in templates
+            for d in documents
+        ]
+        job = ComplianceBatchJob(
+            str(uuid.uuid4()),
+            user_id,
+            pairs,
+            requirements_total=sum(len(t["requirements"] or []) for t in templates) * len(documents),
+        )
+        self._jobs[job.id] = job
+        job.task = self._loop.create_task(self._run(job, templates, documents))
+        self._stats["submitted"] += 1
+        return job
+
+    # ---------------------------------------------------
+    # Lookup
+    # ---------------------------------------------------
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Public view of a job (``to_dict``) with ``user_id``, or None if unknown."""
+        job = self._jobs.get(job_id)
+        return {**job.to_dict(), "user_id": job.user_id} if job is not None else None
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Like :meth:`get`, but first waits up to *timeout* seconds for the job to finish."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            try:
+                await asyncio.wait_for(job.done.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.get(job_id)
+
+    def _prune(self) -> None:
+        cutoff = time.monotonic() - self.result_ttl_seconds
+        for job_id in list(self._jobs):
+            job = self._jobs[job_id]
+            if job.finished is None:
+                continue
+            if job.finished < cutoff or len(self._jobs) > MAX_FINISHED:
+                del self._jobs[job_id]
+
+    # ---------------------------------------------------
+    # Running a job
+    # ---------------------------------------------------
+    async def _run(
+        self, job: ComplianceBatchJob, templates: List[Dict[str, Any]], documents: List[Dict[str, Any]]
+    ) -> None:
+        job.status = "running"
+        job.started = time.monotonic()
+        self._running += 1
+        unwritten: List[tuple] = []
+        try:
+            vectors = await self.engine.query_vectors(
+                [r for t in templates for r in t["requirements"] or []]
+            )
+            # Bounds the pairs whose requirements are queued on the shared semaphore at once
+            pair_slots = asyncio.Semaphore(self.concurrency)
+            matrix = [(t, d) for t in templates for d in documents]
+
+            async def evaluate_pair(template: Dict[str, Any], document: Dict[str, Any], pair: Dict[str, Any]) -> None:
+                requirements = template["requirements"] or []
+                async with pair_slots:
+                    pair["status"] = "running"
+                    results: List[Optional[RequirementResult]] = [None] * len(requirements)
+                    try:
+                        async for index, result, reused in self.engine.evaluate(
+                            document["id"], requirements, document.get("content_hash"),
+                            vectors=vectors, limit=self._limit,
+                        ):
+                            results[index] = result
+                            job.requirements_completed += 1
+                            job.requirements_reused += reused
+                    except Exception as e:
+                        logger.error(
+                            f"Batch {job.id}: evaluating document {document['id']} against "
+                            f"template {template['id']} failed: {e}"
+                        )
+                        pair.update(status="failed", error="Evaluation failed")
+                        return
+                row = evaluation_row(template["id"], document["id"], results, job.user_id)
+                row["id"] = str(uuid.uuid4())
+                unwritten.append((pair, row))
+                if len(unwritten) >= self.write_size:
+                    await self._write(unwritten)
+
+            await asyncio.gather(*(evaluate_pair(t, d, pair) for (t, d), pair in zip(matrix, job.pairs)))
+            await self._write(unwritten)
+            job.status = "failed" if job.pairs and job.count("failed") == len(job.pairs) else "completed"
+        except Exception as e:
+            logger.error(f"Compliance batch job {job.id} failed: {e}", exc_info=True)
+            job.status = "failed"
+            job.error = "Batch evaluation failed"
+            for pair in job.pairs:
+                if pair["status"] in ("queued", "running"):
+                    pair.update(status="failed", error="Batch evaluation failed")
+        finally:
+            if job.status == "running":
+                # Cancelled (shutdown)
+                job.status = "failed"
+                job.error = "Batch evaluation was cancelled"
+            self._running -= 1
+            job.finished = time.monotonic()
+            self._stats[job.status] += 1
+            self._stats["pairs_completed"] += job.count("completed")
+            self._stats["pairs_failed"] += job.count("failed")
+            job.done.set()
+
+    async def _write(self, unwritten: List[tuple]) -> None:
+        """Insert the finished evaluations in *unwritten* (emptied) as one multi-row insert."""
+        batch, unwritten[:] = list(unwritten), []
+        if not batch:
+            return
+        try:
+            db = self._db()
+            if db is None:
+                raise RuntimeError("Supabase is not configured")
+            await db.table(TABLE).insert([row for _, row in batch]).execute()
+        except Exception as e:
+            logger.error(f"Could not store {len(batch)} compliance evaluation(s): {e}")
+            for pair, _ in batch:
+                pair.update(status="failed", error="Failed to store evaluation")
+            return
+        self._stats["inserts"] += 1
+        for pair, row in batch:
+            pair.update(
+                status="completed",
+                evaluation_id=row["id"],
+                overall_score=row["overall_score"],
+                summary=row["summary"],
+            )
+
+    # ---------------------------------------------------
+    # Metrics
+    # ---------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "max_pairs": self.max_pairs,
+            "running": self._running,
+            **self._stats,
+        }
+
+    def reset_stats(self) -> None:
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "pairs_completed": 0,
+            "pairs_failed": 0,
+            "inserts": 0,
+        }
+
+
+# Global instance
+compliance_jobs = ComplianceBatchJobs(
+    concurrency=settings.compliance_batch_concurrency,
+    max_pairs=settings.compliance_batch_max_pairs,
+    write_size=settings.compliance_batch_write_size,
+    result_ttl_seconds=settings.compliance_batch_result_ttl_seconds,
+)
@@ -27,6 +27,96 @@ class Settings(BaseSettings):
     openai_initial_delay: float = Field(default=0.5, description="Initial retry delay in seconds")
     openai_backoff_multiplier: float = Field(default=2.0, description="Backoff multiplier for retries")
     
+    # LLM gateway (shared limits for every OpenAI call)
+    llm_max_concurrency: int = Field(default=16, description="Max OpenAI requests in flight per process")
+    llm_requests_per_minute: int = Field(default=500, description="OpenAI requests per minute (0 disables the limit)")
+    llm_tokens_per_minute: int = Field(default=200000, description="OpenAI tokens per minute, estimated up front (0 disables the limit)")
+    llm_timeout_seconds: float = Field(default=60.0, description="Timeout for a single OpenAI request attempt in seconds")
+    llm_max_backoff_seconds: float = Field(default=20.0, description="Upper bound for the delay between retries in seconds")
+    llm_default_completion_tokens: int = Field(default=512, description="Completion tokens reserved per chat call when max_tokens is not set")
+    embedding_batching_enabled: bool = Field(default=True, description="Coalesce concurrent small embedding requests into shared API calls")
+    embedding_batch_window_ms: float = Field(default=5.0, description="How long the first queued text waits for others to join its batch (ms)")
+    embedding_batch_max_size: int = Field(default=64, description="Texts per coalesced embedding request; a full batch is sent immediately")
+
+    # Async database client (shared HTTP/2 pool for PostgREST)
+    db_http2: bool = Field(default=True, description="Multiplex async PostgREST requests over HTTP/2")
+    db_pool_max_connections: int = Field(default=100, description="Max connections in the async PostgREST pool")
+    db_pool_max_keepalive: int = Field(default=20, description="Max idle keep-alive connections in the async pool")
+    db_timeout_seconds: float = Field(default=10.0, description="Timeout for async PostgREST requests in seconds")
+
+    # Data backend ("supabase" in production, "sqlite" for offline load tests)
+    db_backend: str = Field(default="supabase", description="Data backend: supabase or sqlite")
+    sqlite_path: str = Field(default=":memory:", description="SQLite database file when DB_BACKEND=sqlite")
+
+    # Database round-trip instrumentation
+    db_instrumentation_enabled: bool = Field(default=True, description="Count and time database calls per request (Server-Timing header)")
+    db_round_trip_budget: int = Field(default=10, description="Log requests making more database round trips than this")
+    db_latency_budget_ms: float = Field(default=500.0, description="Log requests spending more time than this in the database (ms)")
+
+    # Reference table cache (SLAs, routing rules, tags, categories, email accounts)
+    reference_cache_enabled: bool = Field(default=True, description="Cache small reference tables in process memory")
+    reference_cache_ttl_seconds: float = Field(default=300.0, description="Seconds a cached reference table stays fresh")
+
+    # Embedding cache (in-process LRU plus the embedding_cache table)
+    embedding_cache_enabled: bool = Field(default=True, description="Reuse embeddings of texts seen before instead of calling the API")
+    embedding_cache_persist: bool = Field(default=True, description="Also keep embeddings in the embedding_cache table, shared by all workers")
+    embedding_cache_max_entries: int = Field(default=5000, description="Vectors kept in process memory (about 6 KB each)")
+
+    # Semantic cache of approved AI answers (opt-in)
+    semantic_cache_enabled: bool = Field(default=False, description="Answer repeated questions from approved AI replies without an LLM call")
+    semantic_cache_threshold: float = Field(default=0.92, description="Minimum cosine similarity between questions for a cached answer to be used")
+    semantic_cache_ttl_seconds: float = Field(default=604800.0, description="Seconds an approved answer stays in the cache")
+    semantic_cache_min_rating: int = Field(default=4, description="Customer rating (1-5) at which an AI reply is cached as approved")
+
+    # Background AI reply jobs (Prefer: respond-async)
+    ai_reply_job_workers: int = Field(default=4, description="Concurrent AI reply jobs per worker process")
+    ai_reply_job_max_queued: int = Field(default=1000, description="Queued AI reply jobs before new ones are refused with 503")
+    ai_reply_jobs_durable: bool = Field(default=False, description="Record reply jobs in ai_reply_jobs so they survive restarts and can be polled from any worker")
+    ai_reply_job_result_ttl_seconds: float = Field(default=600.0, description="How long finished reply jobs stay in memory for polling")
+    ai_reply_job_timeout_seconds: float = Field(default=300.0, description="Running durable jobs older than this are re-queued on startup; also the longest a job stream waits")
+
+    # Conversation history in AI prompts
+    prompt_history_budget_tokens: int = Field(default=1500, description="Token budget for the summary plus recent messages in an AI reply prompt")
+    prompt_recent_messages: int = Field(default=8, description="Most recent messages sent verbatim (within the token budget)")
+    conversation_summary_enabled: bool = Field(default=True, description="Fold older messages into a rolling per-ticket summary")
+    conversation_summary_max_tokens: int = Field(default=300, description="Maximum tokens of a rolling conversation summary")
+
+    # Knowledge base context in prompts
+    rag_context_budget_tokens: int = Field(default=1200, description="Token budget for knowledge base excerpts in a prompt")
+    rag_duplicate_threshold: float = Field(default=0.8, description="Share of a paragraph already in the context at which it is dropped as a duplicate")
+
+    # Workflow agent step cache (in-process LRU plus the workflow_step_cache table)
+    workflow_step_cache_enabled: bool = Field(default=True, description="Reuse agent step outputs whose prompt, model, input and upstream outputs are unchanged")
+    workflow_step_cache_persist: bool = Field(default=True, description="Also keep step outputs in the workflow_step_cache table, shared by all workers")
+    workflow_step_cache_max_entries: int = Field(default=1000, description="Step outputs kept in process memory")
+
+    # Ticket analysis pipeline short-circuits
+    workflow_cheap_model: str = Field(default="gpt-4.1-nano", description="Model for workflow steps routed to the cheaper tier (review of simple tickets)")
+    workflow_review_skip_confidence: float = Field(default=0.85, description="Researcher confidence above which the review of a simple ticket is skipped")
+
+    # Compliance evaluation
+    compliance_eval_concurrency: int = Field(default=8, description="Requirements retrieved and evaluated at once per compliance evaluation")
+    compliance_cache_enabled: bool = Field(default=True, description="Reuse requirement verdicts when neither the requirement nor the document content changed")
+    compliance_cache_persist: bool = Field(default=True, description="Also keep verdicts in the compliance_result_cache table, shared by all workers")
+    compliance_cache_max_entries: int = Field(default=5000, description="Requirement verdicts kept in process memory")
+    compliance_batch_concurrency: int = Field(default=16, description="Requirements evaluated at once across all compliance batch jobs of a worker process")
+    compliance_batch_max_pairs: int = Field(default=1000, description="Most (document, template) evaluations in one batch job")
+    compliance_batch_write_size: int = Field(default=50, description="Evaluations written to compliance_evaluations per insert")
+    compliance_batch_result_ttl_seconds: float = Field(default=3600.0, description="How long finished batch jobs stay in memory for polling")
+
+    # Shared cache/counter backend ("memory" per process, "redis" across workers)
+    cache_backend: str = Field(default="memory", description="Cache backend: memory or redis")
+    redis_url: str = Field(default="redis://localhost:6379/0", description="Redis URL when CACHE_BACKEND=redis")
+    redis_timeout_seconds: float = Field(default=2.0, description="Socket timeout for Redis commands in seconds")
+    cache_key_prefix: str = Field(default="nexus:", description="Prefix for every cache key and pub/sub channel")
+
+    # Write-behind buffer for audit/log inserts (KB usage, routing logs, activities)
+    write_buffer_enabled: bool = Field(default=True, description="Batch non-critical log inserts off the request path")
+    write_buffer_max_batch: int = Field(default=500, description="Flush once this many rows are queued")
+    write_buffer_flush_interval_seconds: float = Field(default=1.0, description="Flush queued rows at least this often")
+    write_buffer_max_pending: int = Field(default=10000, description="Queued rows before new rows are dropped")
+    write_buffer_enqueue_timeout_seconds: float = Field(default=0.05, description="How long a full buffer may block the caller before dropping rows")
+
     # JWT configuration
     jwt_secret_key: str = Field(default="your-secret-key-change-in-production", description="JWT secret key for token signing")
     jwt_token_expire_hours: int = Field(default=24, description="JWT token expiration time in hours")
@@ -54,7 +144,34 @@ class Settings(BaseSettings):
         extra="ignore",
     )
 
-    @field_validator("ai_reply_window_seconds", "ai_reply_max_per_window", "openai_max_retries", "email_polling_interval")
+    @field_validator(
+        "ai_reply_window_seconds",
+        "ai_reply_max_per_window",
+        "openai_max_retries",
+        "email_polling_interval",
+        "db_pool_max_connections",
+        "db_pool_max_keepalive",
+        "db_round_trip_budget",
+        "write_buffer_max_batch",
+        "write_buffer_max_pending",
+        "llm_max_concurrency",
+        "llm_default_completion_tokens",
+        "embedding_cache_max_entries",
+        "embedding_batch_max_size",
+        "semantic_cache_min_rating",
+        "ai_reply_job_workers",
+        "ai_reply_job_max_queued",
+        "prompt_history_budget_tokens",
+        "prompt_recent_messages",
+        "conversation_summary_max_tokens",
+        "rag_context_budget_tokens",
+        "workflow_step_cache_max_entries",
+        "compliance_eval_concurrency",
+        "compliance_cache_max_entries",
+        "compliance_batch_concurrency",
+        "compliance_batch_max_pairs",
+        "compliance_batch_write_size",
+    )
     @classmethod
     def validate_positive_integers(cls, v: int) -> int:
         """Ensure positive integers for numeric settings."""
@@ -62,7 +179,26 @@ class Settings(BaseSettings):
             raise ValueError(f"Value must be positive, got {v}")
         return v
 
-    @field_validator("openai_initial_delay", "openai_backoff_multiplier")
+    @field_validator(
+        "openai_initial_delay",
+        "openai_backoff_multiplier",
+        "db_timeout_seconds",
+        "db_latency_budget_ms",
+        "reference_cache_ttl_seconds",
+        "redis_timeout_seconds",
+        "write_buffer_flush_interval_seconds",
+        "write_buffer_enqueue_timeout_seconds",
+        "llm_timeout_seconds",
+        "llm_max_backoff_seconds",
+        "embedding_batch_window_ms",
+        "semantic_cache_threshold",
+        "semantic_cache_ttl_seconds",
+        "rag_duplicate_threshold",
+        "workflow_review_skip_confidence",
+        "ai_reply_job_result_ttl_seconds",
+        "ai_reply_job_timeout_seconds",
+        "compliance_batch_result_ttl_seconds",
+    )
     @classmethod
     def validate_positive_floats(cls, v: float) -> float:
         """Ensure positive floats for delay settings."""
@@ -70,6 +206,32 @@ class Settings(BaseSettings):
             raise ValueError(f"Value must be positive, got {v}")
         return v
 
+    @field_validator("llm_requests_per_minute", "llm_tokens_per_minute")
+    @classmethod
+    def validate_non_negative_integers(cls, v: int) -> int:
+        """Ensure rate limits are zero (disabled) or positive."""
+        if v < 0:
+            raise ValueError(f"Value must not be negative, got {v}")
+        return v
+
+    @field_validator("db_backend")
+    @classmethod
+    def validate_db_backend(cls, v: str) -> str:
+        """Validate data backend name."""
+        v_lower = v.lower()
+        if v_lower not in {"supabase", "sqlite"}:
+            raise ValueError(f"DB backend must be 'supabase' or 'sqlite', got {v}")
+        return v_lower
+
+    @field_validator("cache_backend")
+    @classmethod
+    def validate_cache_backend(cls, v: str) -> str:
+        """Validate cache backend name."""
+        v_lower = v.lower()
+        if v_lower not in {"memory", "redis"}:
+            raise ValueError(f"Cache backend must be 'memory' or 'redis', got {v}")
+        return v_lower
+
     @field_validator("log_level")
     @classmethod
     def validate_log_level(cls, v: str) -> str:
@@ -0,0 +1,213 @@
+"""Token-budgeted packing of retrieved knowledge base chunks into prompt context.
+
+``chunk_text`` cuts documents into 500-token windows that overlap by 50
+tokens, so the top-k chunks for a query often repeat each other: neighbours
+from the same document share their edges, and the same paragraph shows up in
+several documents (FAQ copies, templates). :meth:`ContextPacker.pack` turns
+``match_chunks`` rows into prompt context by
+
+1. merging chunks with consecutive ``chunk_index`` from the same document into
+   one passage, removing the overlapping text,
+2. dropping paragraphs that mostly repeat text already selected (word
+   shingle containment at or above ``RAG_DUPLICATE_THRESHOLD``), and
+3. adding passages in similarity order until ``RAG_CONTEXT_BUDGET_TOKENS`` is
+   reached (measured with :func:`app.embedding_service.count_tokens`); the
+   passage that crosses the budget is cut to fit.
+"""
+
+import re
+import threading
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from app.config import settings
+from app.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+SHINGLE_WORDS = 4
+# Shortest text accepted as the overlap between two adjacent chunks
+MIN_OVERLAP_CHARS = 20
+# Longest overlap searched for (50 tokens is a few hundred characters)
+MAX_OVERLAP_CHARS = 2000
+# Do not bother cutting the last passage down to less than this
+MIN_TRUNCATED_TOKENS = 40
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_WORD = re.compile(r"\w+")
+
+
+class Passage(NamedTuple):
+    """One or more adjacent chunks of a document, as placed in the prompt."""
+
+    document_id: Optional[str]
+    chunk_ids: List[Any]
+    content: str
+    similarity: float
+    tokens: int
+
+
+class PackedContext(NamedTuple):
+    passages: List[Passage]
+    tokens: int
+
+    @property
+    def chunk_ids(self) -> Set[Any]:
+        return {chunk_id for p in self.passages for chunk_id in p.chunk_ids}
+
+    def render(self, separator: str = "\n---\n", label: Optional[Callable[[Passage], str]] = None) -> str:
+        """Join the passages, each prefixed with ``label(passage)`` when given."""
+        return separator.join((label(p) if label else "") + p.content for p in self.passages)
+
+
+def merge_overlap(first: str, second: str) -> str:
+    """Concatenate two consecutive chunks, keeping their shared text once."""
+    probe = second[:MIN_OVERLAP_CHARS]
+    if len(probe) == MIN_OVERLAP_CHARS:
+        pos = first.find(probe, max(len(first) - MAX_OVERLAP_CHARS, 0))
+        while pos != -1:
+            # The leftmost match that runs to the end of *first* is the longest overlap
+            if second.startswith(first[pos:]):
+                return first + second[len(first) - pos:]
+            pos = first.find(probe, pos + 1)
+    return first.rstrip() + "\n" + second.lstrip()
+
+
+def _shingles(text: str) -> Set[Tuple[str, ...]]:
+    words = _WORD.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+class ContextPacker:
+    """Merges, deduplicates and budgets retrieved chunks for a prompt."""
+
+    def __init__(
+        self,
+        *,
+        budget_tokens: int = 1200,
+        duplicate_threshold: float = 0.8,
+        count_tokens: Optional[Callable[[str], int]] = None,
+    ):
+        self.budget_tokens = budget_tokens
+        self.duplicate_threshold = duplicate_threshold
+        self._count_tokens = count_tokens
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def count(self, text: str) -> int:
+        if self._count_tokens is None:
+            from app.embedding_service import count_tokens
+
+            self._count_tokens = count_tokens
+        return self._count_tokens(text)
+
+    def pack(self, rows: Iterable[Dict[str, Any]], budget_tokens: Optional[int] = None) -> PackedContext:
+        """Pack ``match_chunks`` rows (``id``, ``document_id``, ``chunk_index``,
+        ``content``, ``similarity``) into at most *budget_tokens* tokens."""
+        budget = self.budget_tokens if budget_tokens is None else budget_tokens
+        rows = [r for r in rows if r.get("content")]
+        merged = self._merge_adjacent(rows)
+
+        seen: Set[Tuple[str, ...]] = set()
+        passages: List[Passage] = []
+        used = dropped_spans = 0
+        truncated = False
+        for document_id, chunk_ids, content, similarity in merged:
+            kept = []
+            for span in _PARAGRAPH_BREAK.split(content):
+                shingles = _shingles(span)
+                if not shingles:
+                    continue
+                if len(shingles & seen) >= self.duplicate_threshold * len(shingles):
+                    dropped_spans += 1
+                    continue
+                seen |= shingles
+                kept.append(span.strip())
+            if not kept:
+                continue
+            text = "\n\n".join(kept)
+            tokens = self.count(text)
+            if used + tokens > budget:
+                remaining = budget - used
+                if remaining < MIN_TRUNCATED_TOKENS:
+                    truncated = True
+                    break
+                text = text[: int(len(text) * remaining / tokens)].rstrip() + "…"
+                tokens = self.count(text)
+                truncated = True
+            passages.append(Passage(document_id, chunk_ids, text, similarity, tokens))
+            used += tokens
+            if truncated:
+                break
+
+        with self._lock:
+            s = self._stats
+            s["packs"] += 1
+            s["chunks_in"] += len(rows)
+            s["passages_out"] += len(passages)
+            s["chunks_merged"] += len(rows) - len(merged)
+            s["duplicate_spans_dropped"] += dropped_spans
+            s["tokens_out"] += used
+            s["truncated"] += int(truncated)
+        return PackedContext(passages, used)
+
+    @staticmethod
+    def _merge_adjacent(rows: List[Dict[str, Any]]) -> List[Tuple[Optional[str], List[Any], str, float]]:
+        # Runs of consecutive chunk_index per document, ranked by their best chunk
+        by_document: Dict[Any, List[Dict[str, Any]]] = {}
+        for row in rows:
+            by_document.setdefault(row.get("document_id"), []).append(row)
+        merged = []
+        for document_id, chunks in by_document.items():
+            chunks.sort(key=lambda r: (r.get("chunk_index") is None, r.get("chunk_index") or 0))
+            run: List[Dict[str, Any]] = []
+            for row in chunks + [None]:
+                if (
+                    row is not None
+                    and run
+                    and row.get("chunk_index") is not None
+                    and run[-1].get("chunk_index") is not None
+                    and row["chunk_index"] == run[-1]["chunk_index"] + 1
+                ):
+                    run.append(row)
+                    continue
+                if run:
+                    content = run[0]["content"]
+                    for nxt in run[1:]:
+                        content = merge_overlap(content, nxt["content"])
+                    merged.append((
+                        document_id,
+                        [r.get("id") for r in run],
+                        content,
+                        max(float(r.get("similarity") or 0.0) for r in run),
+                    ))
+                run = [row] if row is not None else []
+        merged.sort(key=lambda m: m[3], reverse=True)
+        return merged
+
+    # ---------------------------------------------------
+    # Metrics
+    # ---------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            s = dict(self._stats)
+        return {
+            "budget_tokens": self.budget_tokens,
+            **s,
+            "avg_context_tokens": round(s["tokens_out"] / s["packs"], 1) if s["packs"] else None,
+        }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._stats = {
+                "packs": 0, "chunks_in": 0, "passages_out": 0, "chunks_merged": 0,
+                "duplicate_spans_dropped": 0, "tokens_out": 0, "truncated": 0,
+            }
+
+
+# Global instance
+context_packer = ContextPacker(
+    budget_tokens=settings.rag_context_budget_tokens,
+    duplicate_threshold=settings.rag_duplicate_threshold,
+)
@@ -0,0 +1,228 @@
+"""Token-budgeted conversation history with a rolling per-ticket summary.
+
+AI prompts used to contain every message of the ticket, so long email
+threads produced huge, slow and expensive completions. :meth:`ConversationMemory.build`
+now renders the history as
+
+* the ticket's ``conversation_summary``, which covers its first
+  ``summary_message_count`` messages, and
+* the most recent messages after that, newest first, up to
+  ``PROMPT_RECENT_MESSAGES`` and ``PROMPT_HISTORY_BUDGET_TOKENS`` (measured
+  with :func:`app.embedding_service.count_tokens`, summary included).
+
+Messages that fall between the two are folded into the summary by
+:meth:`ConversationMemory.schedule_refresh` in the background, one LLM call
+per budget-sized slice, so the summary grows incrementally and the request
+never waits for it. Until that finishes, the prompt notes how many earlier
+messages it leaves out.
+"""
+
+import asyncio
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set
+
+from app.config import settings
+from app.llm_gateway import llm_gateway
+from app.logger import setup_logger
+from app.ticket_repository import ticket_repository
+
+logger = setup_logger(__name__)
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a customer support conversation for the agent "
+    "who continues it. Update the summary with the new messages. Keep every fact the "
+    "agent may need: the customer's problem, account/order details, what was tried or "
+    "promised, and open questions. Write plain prose, no preamble."
+)
+
+
+def format_message(message: Dict[str, Any]) -> str:
+    return f"{message['sender'].capitalize()}: {message['message']}"
+
+
+class ConversationWindow(NamedTuple):
+    """History rendered for one prompt, and what the summary still has to absorb."""
+
+    text: str
+    tokens: int
+    summarized: int  # messages covered by the stored summary
+    overflow: List[Dict[str, Any]]  # older messages neither summarized nor included
+
+
+class ConversationMemory:
+    """Builds bounded prompt history and keeps ticket summaries up to date."""
+
+    def __init__(
+        self,
+        *,
+        budget_tokens: int = 1500,
+        recent_messages: int = 8,
+        summary_max_tokens: int = 300,
+        summaries_enabled: bool = True,
+        count_tokens: Optional[Callable[[str], int]] = None,
+        repository=None,
+        gateway=None,
+    ):
+        self.budget_tokens = budget_tokens
+        self.recent_messages = recent_messages
+        self.summary_max_tokens = summary_max_tokens
+        self.summaries_enabled = summaries_enabled
+        self._count_tokens = count_tokens
+        self.repository = repository if repository is not None else ticket_repository
+        self.gateway = gateway if gateway is not None else llm_gateway
+        self._refreshing: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.reset_stats()
+
+    def count(self, text: str) -> int:
+        if self._count_tokens is None:
+            from app.embedding_service import count_tokens
+
+            self._count_tokens = count_tokens
+        return self._count_tokens(text)
+
+    # ---------------------------------------------------
+    # Prompt history
+    # ---------------------------------------------------
+    def build(self, ticket: Dict[str, Any], history: List[Dict[str, Any]]) -> ConversationWindow:
+        """Render *history* (oldest first) within the token budget."""
+        summary = (ticket.get("conversation_summary") or "").strip() if self.summaries_enabled else ""
+        summarized = min(ticket.get("summary_message_count") or 0, len(history)) if summary else 0
+        header = f"Summary of the earlier conversation:\n{summary}" if summary else ""
+        remaining = self.budget_tokens - (self.count(header) if header else 0)
+
+        recent: List[str] = []
+        used = 0
+        for message in reversed(history[summarized:]):
+            if len(recent) >= self.recent_messages:
+                break
+            line = format_message(message)
+            tokens = self.count(line)
+            if used + tokens > remaining:
+                if recent:
+                    break
+                # The newest message always goes in, cut to what the budget allows
+                line = _truncate(line, tokens, max(remaining, 0))
+                tokens = self.count(line)
+            recent.append(line)
+            used += tokens
+        recent.reverse()
+
+        overflow = history[summarized:len(history) - len(recent)]
+        parts = [header] if header else []
+        if overflow:
+            parts.append(f"({len(overflow)} earlier message(s) not shown)")
+        parts.extend(recent)
+        text = "\n".join(parts)
+        tokens = used + (self.budget_tokens - remaining)
+
+        self._stats["prompts"] += 1
+        self._stats["history_tokens"] += tokens
+        self._stats["max_history_tokens"] = max(self._stats["max_history_tokens"], tokens)
+        if overflow or summarized:
+            self._stats["bounded_prompts"] += 1
+        return ConversationWindow(text, tokens, summarized, overflow)
+
+    # ---------------------------------------------------
+    # Rolling summary
+    # ---------------------------------------------------
+    def schedule_refresh(self, ticket_id: str, ticket: Dict[str, Any], window: ConversationWindow) -> None:
+        """Fold *window*'s overflow into the ticket summary in the background."""
+        if not self.summaries_enabled or not window.overflow or ticket_id in self._refreshing:
+            return
+        self._refreshing.add(ticket_id)
+        task = asyncio.get_running_loop().create_task(self.refresh(ticket_id, ticket, window))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def refresh(self, ticket_id: str, ticket: Dict[str, Any], window: ConversationWindow) -> Optional[str]:
+        """Extend the summary with the overflow messages and store it."""
+        summary = (ticket.get("conversation_summary") or "").strip() if window.summarized else ""
+        try:
+            for batch in self._slices(window.overflow):
+                summary = await self._summarize(summary, batch)
+            stored = await self.repository.update_conversation_summary(
+                ticket_id,
+                summary,
+                window.summarized + len(window.overflow),
+                expected_count=ticket.get("summary_message_count") or 0,
+            )
+        except Exception as e:
+            self._stats["summary_failures"] += 1
+            logger.warning(f"Updating conversation summary for ticket {ticket_id} failed: {e}")
+            return None
+        finally:
+            self._refreshing.discard(ticket_id)
+        if not stored:
+            # Another worker summarized this ticket first; its summary is as good
+            self._stats["summary_conflicts"] += 1
+            return None
+        self._stats["summaries_written"] += 1
+        self._stats["messages_summarized"] += len(window.overflow)
+        logger.info(f"Conversation summary for ticket {ticket_id} now covers {window.summarized + len(window.overflow)} messages")
+        return summary
+
+    def _slices(self, messages: List[Dict[str, Any]]) -> List[List[str]]:
+        # Keep each summarization call within the same budget as a reply prompt
+        slices: List[List[str]] = [[]]
+        used = 0
+        for message in messages:
+            line = format_message(message)
+            tokens = self.count(line)
+            if tokens > self.budget_tokens:
+                line, tokens = _truncate(line, tokens, self.budget_tokens), self.budget_tokens
+            if slices[-1] and used + tokens > self.budget_tokens:
+                slices.append([])
+                used = 0
+            slices[-1].append(line)
+            used += tokens
+        return slices
+
+    async def _summarize(self, summary: str, lines: List[str]) -> str:
+        previous = summary or "(none yet)"
+        prompt = f"Current summary:\n{previous}\n\nNew messages:\n" + "\n".join(lines) + "\n\nUpdated summary:"
+        return (
+            await self.gateway.complete(
+                [{"role": "system", "content": SUMMARY_INSTRUCTIONS}, {"role": "user", "content": prompt}],
+                max_tokens=self.summary_max_tokens,
+            )
+        ).strip()
+
+    async def drain(self) -> None:
+        """Wait for pending summary updates (shutdown and tests)."""
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    # ---------------------------------------------------
+    # Metrics
+    # ---------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        s = dict(self._stats)
+        return {
+            "budget_tokens": self.budget_tokens,
+            "recent_messages": self.recent_messages,
+            **s,
+            "avg_history_tokens": round(s["history_tokens"] / s["prompts"], 1) if s["prompts"] else None,
+            "summaries_in_progress": len(self._refreshing),
+        }
+
+    def reset_stats(self) -> None:
+        self._stats = {
+            "prompts": 0, "bounded_prompts": 0, "history_tokens": 0, "max_history_tokens": 0,
+            "summaries_written": 0, "messages_summarized": 0, "summary_failures": 0, "summary_conflicts": 0,
+        }
+
+
+def _truncate(text: str, tokens: int, budget: int) -> str:
+    """Cut *text* (measured at *tokens*) to roughly *budget* tokens, keeping the start."""
+    if tokens <= budget:
+        return text
+    return text[: max(int(len(text) * budget / tokens) - 1, 0)] + "…"
+
+
+# Global instance
+conversation_memory = ConversationMemory(
+    budget_tokens=settings.prompt_history_budget_tokens,
+    recent_messages=settings.prompt_recent_messages,
+    summary_max_tokens=settings.conversation_summary_max_tokens,
+    summaries_enabled=settings.conversation_summary_enabled,
+)
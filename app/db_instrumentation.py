@@ -0,0 +1,287 @@
+"""Per-request database round-trip instrumentation.
+
+``instrument_client`` wraps a Supabase/PostgREST client so every ``.execute()``
+(including ``.rpc(...).execute()``) is counted and timed, tagged by table (or
+RPC function) and operation. Calls made while a request is in flight are
+attributed to that request through a context variable; ``DbTimingMiddleware``
+turns them into a ``Server-Timing`` header, a per-route summary and a warning
+for requests over the configured budgets.
+"""
+
+import inspect
+import re
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Builder methods that decide what kind of statement is sent
+_OPERATIONS = {"select", "insert", "update", "upsert", "delete"}
+
+
+@dataclass
+class DbCall:
+    target: str
+    operation: str
+    duration_ms: float
+
+
+@dataclass
+class RequestDbStats:
+    """Database calls recorded during a single request."""
+
+    calls: List[DbCall] = field(default_factory=list)
+
+    @property
+    def round_trips(self) -> int:
+        return len(self.calls)
+
+    @property
+    def total_ms(self) -> float:
+        return sum(c.duration_ms for c in self.calls)
+
+    def by_tag(self) -> Dict[str, Dict[str, float]]:
+        tags: Dict[str, Dict[str, float]] = {}
+        for call in self.calls:
+            tag = tags.setdefault(f"{call.target}.{call.operation}", {"count": 0, "ms": 0.0})
+            tag["count"] += 1
+            tag["ms"] += call.duration_ms
+        return tags
+
+
+_current_stats: ContextVar[Optional[RequestDbStats]] = ContextVar("db_request_stats", default=None)
+
+
+def current_db_stats() -> Optional[RequestDbStats]:
+    return _current_stats.get()
+
+
+def _record(target: str, operation: str, started: float) -> None:
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.calls.append(DbCall(target, operation, (time.perf_counter() - started) * 1000))
+
+
+# ---------------------------------------------------
+# Client / builder proxies
+# ---------------------------------------------------
+class _InstrumentedBuilder:
+    """Proxy around a query builder that times ``execute()``."""
+
+    __slots__ = ("_builder", "_target", "_operation")
+
+    def __init__(self, builder, target: str, operation: str):
+        object.__setattr__(self, "_builder", builder)
+        object.__setattr__(self, "_target", target)
+        object.__setattr__(self, "_operation", operation)
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._builder, name)
+        if name == "execute":
+            return self._timed_execute(attr)
+        if not callable(attr):
+            return attr
+        operation = name if name in _OPERATIONS else self._operation
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if hasattr(result, "execute"):
+                return _InstrumentedBuilder(result, self._target, operation)
+            return result
+
+        return call
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        # Helpers such as app.pagination assign `query.params` directly
+        setattr(self._builder, name, value)
+
+    def _timed_execute(self, execute):
+        target, operation = self._target, self._operation
+        if inspect.iscoroutinefunction(execute):
+            async def timed_async():
+                started = time.perf_counter()
+                try:
+                    return await execute()
+                finally:
+                    _record(target, operation, started)
+
+            return timed_async
+
+        def timed():
+            started = time.perf_counter()
+            try:
+                return execute()
+            finally:
+                _record(target, operation, started)
+
+        return timed
+
+
+class InstrumentedClient:
+    """Proxy around a Supabase or PostgREST client; everything else passes through."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def table(self, name: str):
+        return _InstrumentedBuilder(self._client.table(name), name, "select")
+
+    def from_(self, name: str):
+        return self.table(name)
+
+    def rpc(self, fn: str, params: Optional[Dict[str, Any]] = None, *args, **kwargs):
+        return _InstrumentedBuilder(self._client.rpc(fn, params or {}, *args, **kwargs), fn, "rpc")
+
+    def __getattr__(self, name: str):
+        return getattr(self._client, name)
+
+
+def instrument_client(client):
+    """Wrap *client* for round-trip accounting (None and disabled settings pass through)."""
+    if client is None or not settings.db_instrumentation_enabled:
+        return client
+    return InstrumentedClient(client)
+
+
+# ---------------------------------------------------
+# Per-route summary
+# ---------------------------------------------------
+class RouteDbSummary:
+    """Aggregated round trips and DB time per route template."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, route: str, stats: RequestDbStats, request_ms: float, over_budget: bool) -> None:
+        with self._lock:
+            entry = self._routes.setdefault(
+                route,
+                {
+                    "requests": 0,
+                    "round_trips": 0,
+                    "max_round_trips": 0,
+                    "db_ms": 0.0,
+                    "request_ms": 0.0,
+                    "over_budget": 0,
+                    "calls": {},
+                },
+            )
+            entry["requests"] += 1
+            entry["round_trips"] += stats.round_trips
+            entry["max_round_trips"] = max(entry["max_round_trips"], stats.round_trips)
+            entry["db_ms"] += stats.total_ms
+            entry["request_ms"] += request_ms
+            entry["over_budget"] += int(over_budget)
+            for tag, values in stats.by_tag().items():
+                call = entry["calls"].setdefault(tag, {"count": 0, "ms": 0.0})
+                call["count"] += values["count"]
+                call["ms"] += values["ms"]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            summary = {}
+            for route, entry in self._routes.items():
+                n = entry["requests"]
+                summary[route] = {
+                    "requests": n,
+                    "avg_round_trips": round(entry["round_trips"] / n, 2),
+                    "max_round_trips": entry["max_round_trips"],
+                    "avg_db_ms": round(entry["db_ms"] / n, 2),
+                    "avg_request_ms": round(entry["request_ms"] / n, 2),
+                    "over_budget": entry["over_budget"],
+                    "calls": {
+                        tag: {"count": c["count"], "avg_ms": round(c["ms"] / c["count"], 2)}
+                        for tag, c in sorted(entry["calls"].items())
+                    },
+                }
+            return summary
+
+    def reset(self) -> None:
+        with self._lock:
+            self._routes.clear()
+
+
+# Global instance
+route_db_summary = RouteDbSummary()
+
+
+# ---------------------------------------------------
+# Middleware
+# ---------------------------------------------------
+_METRIC_NAME_RE = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def server_timing_header(stats: RequestDbStats, request_ms: float) -> str:
+    parts = [
+        f'db;dur={stats.total_ms:.1f};desc="{stats.round_trips} round trips"',
+        f"app;dur={request_ms:.1f}",
+    ]
+    for tag, values in stats.by_tag().items():
+        name = _METRIC_NAME_RE.sub("_", f"db.{tag}")
+        parts.append(f'{name};dur={values["ms"]:.1f};desc="x{values["count"]}"')
+    return ", ".join(parts)
+
+
+class DbTimingMiddleware:
+    """Attach per-request DB stats, emit ``Server-Timing`` and flag slow requests.
+
+    Pure ASGI rather than ``BaseHTTPMiddleware`` so the stats stay attached
+    while a ``StreamingResponse`` body runs: calls made inside SSE generators
+    count towards their route, and the request is summarised once the last
+    body chunk is sent. Streamed responses (no ``Content-Length``) send their
+    headers before that, so they get no ``Server-Timing`` header and are only
+    reported in the per-route summary.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestDbStats()
+        started = time.perf_counter()
+        finished = False
+
+        async def send_with_timing(message):
+            nonlocal finished
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                if any(name.lower() == b"content-length" for name, _ in headers):
+                    request_ms = (time.perf_counter() - started) * 1000
+                    headers.append((b"server-timing", server_timing_header(stats, request_ms).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False) and not finished:
+                finished = True
+                self._summarize(scope, stats, (time.perf_counter() - started) * 1000)
+
+        token = _current_stats.set(stats)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_stats.reset(token)
+
+    @staticmethod
+    def _summarize(scope, stats: RequestDbStats, request_ms: float) -> None:
+        route = scope.get("route")
+        route_key = f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+        over_budget = (
+            stats.round_trips > settings.db_round_trip_budget
+            or stats.total_ms > settings.db_latency_budget_ms
+        )
+        if over_budget:
+            logger.warning(
+                f"DB budget exceeded on {route_key}: {stats.round_trips} round trips, "
+                f"{stats.total_ms:.1f}ms in DB ({request_ms:.1f}ms total) "
+                f"{stats.by_tag()}"
+            )
+        route_db_summary.add(route_key, stats, request_ms, over_budget)
@@ -6,7 +6,9 @@ from app.supabase_config import supabase
 from app.email_service import email_service
 from app.routing_service import routing_service
 from app.spam_classifier import spam_classifier
+from app.ticket_repository import ticket_intake_params
 from app.config import settings
+from app.write_buffer import buffered_writer
 import re
 
 logger = setup_logger(__name__)
@@ -30,10 +32,11 @@ class EmailPollingService:
                 logger.error("Database not configured")
                 return None
             
+            from_email = parsed_email.get("from_email", "")
+            
             # Spam filtering - check if email should be filtered
             if settings.email_spam_filter_enabled:
                 # Check if sender is a registered user (less likely to be spam)
-                from_email = parsed_email.get("from_email", "")
                 is_registered_user = False
                 if from_email:
                     user_res = (
@@ -55,20 +58,17 @@ class EmailPollingService:
                         )
                         # Optionally log filtered emails for review
                         if settings.email_log_filtered:
-                            try:
-                                self.supabase.table("email_messages").insert({
-                                    "email_account_id": account_id,
-                                    "message_id": parsed_email.get("message_id", ""),
-                                    "subject": parsed_email.get("subject", ""),
-                                    "body_text": parsed_email.get("body_text", "")[:500],  # Truncate
-                                    "from_email": from_email,
-                                    "to_email": parsed_email.get("to_emails", []),
-                                    "status": "filtered",
-                                    "direction": "inbound",
-                                    "created_at": datetime.now(timezone.utc).isoformat(),
-                                }).execute()
-                            except Exception as e:
-                                logger.warning(f"Failed to log filtered email: {e}")
+                            buffered_writer.enqueue("email_messages", {
+                                "email_account_id": account_id,
+                                "message_id": parsed_email.get("message_id", ""),
+                                "subject": parsed_email.get("subject", ""),
+                                "body_text": parsed_email.get("body_text", "")[:500],  # Truncate
+                                "from_email": from_email,
+                                "to_email": parsed_email.get("to_emails", []),
+                                "status": "filtered",
+                                "direction": "inbound",
+                                "created_at": datetime.now(timezone.utc).isoformat(),
+                            })
                         return None
             
             subject = parsed_email.get("subject", "")
@@ -87,10 +87,8 @@ class EmailPollingService:
                     logger.debug(f"Email {message_id} already processed, skipping")
                     return existing_email.data[0]["ticket_id"]
             
-            # Find or create ticket
-            ticket_id = None
-            
             # Check if this is a reply to an existing ticket
+            reply_ticket_id = None
             in_reply_to = parsed_email.get("in_reply_to", "")
             if in_reply_to:
                 # Find ticket by email message ID
@@ -102,25 +100,11 @@ class EmailPollingService:
                     .execute()
                 )
                 if existing_email.data:
-                    ticket_id = existing_email.data[0]["ticket_id"]
+                    reply_ticket_id = existing_email.data[0]["ticket_id"]
             
-            # If no ticket found, create new one
-            if not ticket_id:
-                # Extract ticket subject (remove Re:, Fwd:, etc.)
-                clean_subject = re.sub(r'^(Re:|Fwd?:|RE:|FW?:)\s*', '', subject, flags=re.IGNORECASE).strip()
-                
-                # Create new ticket
-                ticket_data = {
-                    "context": "email",
-                    "subject": clean_subject or "Email from " + from_email,
-                    "status": "open",
-                    "priority": "medium",
-                    "user_id": None,  # Will be linked if user exists
-                    "source": "email",
-                    "created_at": datetime.now(timezone.utc).isoformat(),
-                }
-                
-                # Try to find user by email
+            # Try to find user by email
+            user_id = None
+            if not reply_ticket_id and from_email:
                 user_res = (
                     self.supabase.table("users")
                     .select("id")
@@ -129,16 +113,34 @@ class EmailPollingService:
                     .execute()
                 )
                 if user_res.data:
-                    ticket_data["user_id"] = user_res.data[0]["id"]
-                
-                ticket_result = self.supabase.table("tickets").insert(ticket_data).execute()
-                if ticket_result.data:
-                    ticket_id = ticket_result.data[0]["id"]
-                    logger.info(f"Created new ticket {ticket_id} from email {from_email}")
+                    user_id = user_res.data[0]["id"]
             
-            if not ticket_id:
+            # Extract ticket subject (remove Re:, Fwd:, etc.)
+            clean_subject = re.sub(r'^(Re:|Fwd?:|RE:|FW?:)\s*', '', subject, flags=re.IGNORECASE).strip()
+            message_text = parsed_email.get("body_text", "")[:1000]  # Limit length
+            
+            # Continue the replied-to ticket or create a new one (with SLA), and add the
+            # customer message, in one round trip
+            intake_result = self.supabase.rpc(
+                "create_or_continue_ticket",
+                ticket_intake_params(
+                    context="email",
+                    subject=clean_subject or "Email from " + from_email,
+                    message=f"Email received from {from_email}:\n\n{message_text}",
+                    user_id=user_id,
+                    source="email",
+                    ticket_id=reply_ticket_id,
+                    continue_open=False,
+                ),
+            ).execute()
+            if not intake_result.data:
                 logger.error("Failed to create or find ticket for email")
                 return None
+            intake = intake_result.data[0]
+            ticket = intake["ticket"]
+            ticket_id = ticket["id"]
+            if intake["created"]:
+                logger.info(f"Created new ticket {ticket_id} from email {from_email}")
             
             # Save email message
             email_message_data = {
@@ -179,19 +181,12 @@ class EmailPollingService:
                     "created_at": datetime.now(timezone.utc).isoformat(),
                 }).execute()
             
-            # Create message in ticket
-            message_text = parsed_email.get("body_text", "")[:1000]  # Limit length
-            self.supabase.table("messages").insert({
-                "ticket_id": ticket_id,
-                "sender": "customer",
-                "message": f"Email received from {from_email}:\n\n{message_text}",
-                "created_at": datetime.now(timezone.utc).isoformat(),
-            }).execute()
-            
             # Apply routing rules if this is a new ticket
-            if not in_reply_to:
+            if intake["created"]:
                 try:
-                    routing_service.apply_routing_rules(ticket_id)
+                    routing_service.apply_routing_rules(
+                        ticket_id, ticket=ticket, ticket_text=message_text, ticket_tag_ids=set()
+                    )
                 except Exception as e:
                     logger.warning(f"Failed to apply routing rules for ticket {ticket_id}: {e}")
             
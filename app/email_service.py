@@ -15,6 +15,7 @@ import httpx
 from app.logger import setup_logger
 from app.supabase_config import supabase
 from app.config import settings
+from app.reference_cache import find_by_id, reference_cache
 
 logger = setup_logger(__name__)
 
@@ -28,10 +29,7 @@ class EmailService:
     def get_email_account(self, account_id: str) -> Optional[Dict]:
         """Get email account configuration."""
         try:
-            result = self.supabase.table("email_accounts").select("*").eq("id", account_id).limit(1).execute()
-            if result.data:
-                return result.data[0]
-            return None
+            return find_by_id(reference_cache.rows("email_accounts", self.supabase), account_id)
         except Exception as e:
             logger.error(f"Error getting email account: {e}", exc_info=True)
             return None
@@ -39,31 +37,17 @@ class EmailService:
     def get_default_email_account(self) -> Optional[Dict]:
         """Get default email account. Falls back to any active account if no default is set."""
         try:
+            active = [a for a in reference_cache.rows("email_accounts", self.supabase) if a.get("is_active")]
             # First, try to get the default active account
-            result = (
-                self.supabase.table("email_accounts")
-                .select("*")
-                .eq("is_default", True)
-                .eq("is_active", True)
-                .limit(1)
-                .execute()
-            )
-            if result.data:
-                logger.info(f"Found default email account: {result.data[0].get('email')}")
-                return result.data[0]
+            default = next((a for a in active if a.get("is_default")), None)
+            if default:
+                logger.debug(f"Found default email account: {default.get('email')}")
+                return default
             
             # Fallback: Get any active account if no default is set
-            logger.warning("No default email account found. Trying to find any active account...")
-            fallback_result = (
-                self.supabase.table("email_accounts")
-                .select("*")
-                .eq("is_active", True)
-                .limit(1)
-                .execute()
-            )
-            if fallback_result.data:
-                logger.info(f"Using fallback active email account: {fallback_result.data[0].get('email')}")
-                return fallback_result.data[0]
+            if active:
+                logger.warning(f"No default email account set. Using active account: {active[0].get('email')}")
+                return active[0]
             
             # No active accounts found
             logger.error("No active email accounts found in database")
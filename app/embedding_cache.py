@@ -0,0 +1,265 @@
+"""Two-tier cache of embedding vectors keyed by model and content hash.
+
+The same texts are embedded over and over: a ticket subject on every reply,
+popular KB searches, compliance requirements on every evaluation. Vectors are
+kept in a per-process LRU and in the ``embedding_cache`` table, keyed by
+``(model, sha256(text))`` so the text itself is never stored. A lookup checks
+memory first, then the table for whatever is left, and only the remaining
+misses are sent to the embeddings API. New vectors are written to the table
+through :data:`app.write_buffer.buffered_writer`, off the request path.
+
+Embeddings are deterministic for a given model, so entries never go stale;
+changing ``EMBEDDING_MODEL`` simply starts a new keyspace.
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.logger import setup_logger
+from app.supabase_config import supabase
+from app.write_buffer import buffered_writer
+
+logger = setup_logger(__name__)
+
+TABLE = "embedding_cache"
+
+# Hashes per table lookup; keeps the PostgREST query string well under URL limits
+LOOKUP_CHUNK = 100
+
+Vector = List[float]
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _parse_vector(value: Any) -> Optional[np.ndarray]:
+    # PostgREST returns pgvector columns as their text form, "[0.1,0.2,...]"
+    if isinstance(value, str):
+        value = json.loads(value)
+    if not value:
+        return None
+    return np.asarray(value, dtype=np.float32)
+
+
+class EmbeddingCache:
+    """LRU of embedding vectors backed by a persistent table.
+
+    Vectors are held as float32 arrays (about 6 KB each at 1536 dimensions)
+    rather than lists of Python floats, which take eight times as much.
+    """
+
+    def __init__(
+        self,
+        client=None,
+        *,
+        enabled: bool = True,
+        persist: bool = True,
+        max_entries: int = 5000,
+        writer=None,
+        async_client_factory: Optional[Callable[[], Any]] = None,
+    ):
+        self.client = client if client is not None else supabase
+        self.enabled = enabled
+        self.persist = persist
+        self.max_entries = max_entries
+        self.writer = writer if writer is not None else buffered_writer
+        self._async_client_factory = async_client_factory
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self.reset_stats()
+
+    # ---------------------------------------------------
+    # Embedding through the cache
+    # ---------------------------------------------------
+    def embed(self, texts: List[str], model: str, fetch: Callable[[List[str]], List[Vector]]) -> List[Vector]:
+        """Vectors for *texts*, calling *fetch* only with the texts not cached."""
+        if not self.enabled or not texts:
+            return fetch(texts) if texts else []
+        hashes = [text_hash(t) for t in texts]
+        found = self._memory_lookup(model, hashes)
+        missing = [h for h in dict.fromkeys(hashes) if h not in found]
+        if missing and self.persist:
+            found.update(self._table_lookup(model, missing))
+        pending = self._pending_texts(texts, hashes, found)
+        new = dict(zip(pending, fetch(list(pending.values())) if pending else []))
+        self._store(model, new)
+        return self._finish(hashes, found, new)
+
+    async def aembed(
+        self, texts: List[str], model: str, fetch: Callable[[List[str]], Awaitable[List[Vector]]]
+    ) -> List[Vector]:
+        """Async variant of :meth:`embed`; *fetch* is a coroutine function."""
+        if not self.enabled or not texts:
+            return await fetch(texts) if texts else []
+        hashes = [text_hash(t) for t in texts]
+        found = self._memory_lookup(model, hashes)
+        missing = [h for h in dict.fromkeys(hashes) if h not in found]
+        if missing and self.persist:
+            found.update(await self._atable_lookup(model, missing))
+        pending = self._pending_texts(texts, hashes, found)
+        new = dict(zip(pending, await fetch(list(pending.values())) if pending else []))
+        if new:
+            # The write buffer can wait for room (or write directly when disabled)
+            await asyncio.to_thread(self._store, model, new)
+        return self._finish(hashes, found, new)
+
+    @staticmethod
+    def _pending_texts(texts: List[str], hashes: List[str], found: Dict[str, Any]) -> Dict[str, str]:
+        # One API input per distinct missing text
+        pending: Dict[str, str] = {}
+        for text, key in zip(texts, hashes):
+            if key not in found and key not in pending:
+                pending[key] = text
+        return pending
+
+    def _finish(self, hashes, found, new) -> List[Vector]:
+        distinct = len(set(hashes))
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["texts"] += distinct
+            self._stats["misses"] += len(new)
+            self._stats["api_texts_saved"] += distinct - len(new)
+            if new:
+                self._stats["api_calls"] += 1
+            else:
+                self._stats["api_calls_saved"] += 1
+        out: List[Vector] = []
+        for key in hashes:
+            vector = new.get(key)
+            out.append(list(vector) if vector is not None else found[key].tolist())
+        return out
+
+    # ---------------------------------------------------
+    # Tiers
+    # ---------------------------------------------------
+    def _memory_lookup(self, model: str, hashes: List[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for key in dict.fromkeys(hashes):
+                vector = self._entries.get((model, key))
+                if vector is not None:
+                    self._entries.move_to_end((model, key))
+                    found[key] = vector
+            self._stats["memory_hits"] += len(found)
+        return found
+
+    def _table_lookup(self, model: str, hashes: List[str]) -> Dict[str, np.ndarray]:
+        if self.client is None:
+            return {}
+        rows: List[Dict[str, Any]] = []
+        try:
+            for start in range(0, len(hashes), LOOKUP_CHUNK):
+                result = (
+                    self.client.table(TABLE)
+                    .select("text_hash, embedding")
+                    .eq("model", model)
+                    .in_("text_hash", hashes[start:start + LOOKUP_CHUNK])
+                    .execute()
+                )
+                rows.extend(result.data or [])
+        except Exception as e:
+            logger.warning(f"Embedding cache lookup failed, embedding without it: {e}")
+        return self._remember_rows(model, rows)
+
+    async def _atable_lookup(self, model: str, hashes: List[str]) -> Dict[str, np.ndarray]:
+        client = self._async_client()
+        if client is None:
+            return {}
+        rows: List[Dict[str, Any]] = []
+        try:
+            for start in range(0, len(hashes), LOOKUP_CHUNK):
+                result = await (
+                    client.table(TABLE)
+                    .select("text_hash, embedding")
+                    .eq("model", model)
+                    .in_("text_hash", hashes[start:start + LOOKUP_CHUNK])
+                    .execute()
+                )
+                rows.extend(result.data or [])
+        except Exception as e:
+            logger.warning(f"Embedding cache lookup failed, embedding without it: {e}")
+        return self._remember_rows(model, rows)
+
+    def _async_client(self):
+        if self._async_client_factory is None:
+            from app.async_db import get_async_db
+
+            self._async_client_factory = get_async_db
+        return self._async_client_factory()
+
+    def _remember_rows(self, model: str, rows: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        for row in rows:
+            vector = _parse_vector(row.get("embedding"))
+            if vector is not None:
+                found[row["text_hash"]] = vector
+        with self._lock:
+            for key, vector in found.items():
+                self._put(model, key, vector)
+            self._stats["table_hits"] += len(found)
+        return found
+
+    def _store(self, model: str, vectors: Dict[str, Vector]) -> None:
+        if not vectors:
+            return
+        with self._lock:
+            for key, vector in vectors.items():
+                self._put(model, key, np.asarray(vector, dtype=np.float32))
+        if self.persist:
+            self.writer.enqueue(
+                TABLE,
+                [{"model": model, "text_hash": key, "embedding": list(v)} for key, v in vectors.items()],
+                on_conflict="model,text_hash",
+            )
+
+    def _put(self, model: str, key: str, vector: np.ndarray) -> None:
+        # Caller holds self._lock
+        self._entries[(model, key)] = vector
+        self._entries.move_to_end((model, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop the in-memory tier (the table is kept)."""
+        with self._lock:
+            self._entries.clear()
+
+    # ---------------------------------------------------
+    # Metrics
+    # ---------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            s = dict(self._stats)
+            entries = len(self._entries)
+        hits = s["memory_hits"] + s["table_hits"]
+        return {
+            "enabled": self.enabled,
+            "persist": self.persist,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            **s,
+            "hit_ratio": round(hits / s["texts"], 3) if s["texts"] else None,
+        }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._stats = {
+                "requests": 0, "texts": 0, "memory_hits": 0, "table_hits": 0, "misses": 0,
+                "api_calls": 0, "api_calls_saved": 0, "api_texts_saved": 0,
+            }
+
+
+# Global instance
+embedding_cache = EmbeddingCache(
+    enabled=settings.embedding_cache_enabled,
+    persist=settings.embedding_cache_persist,
+    max_entries=settings.embedding_cache_max_entries,
+)
@@ -5,38 +5,117 @@ import io
 from typing import Optional
 
 import tiktoken
-from openai import OpenAI
 
-from app.config import settings
+from app.embedding_cache import embedding_cache
+from app.llm_gateway import EMBEDDING_MODEL, llm_gateway
 from app.logger import setup_logger
 
 logger = setup_logger(__name__)
 
-_client = OpenAI(api_key=settings.openai_api_key)
-_encoder = tiktoken.encoding_for_model("gpt-4o-mini")
+# Loaded on first use; tiktoken may have to download the encoding
+_encoder = None
 
-EMBEDDING_MODEL = "text-embedding-3-small"
 EMBEDDING_DIM = 1536
 
 
 def embed_text(text: str) -> list[float]:
     """Return a 1536-dim embedding vector for *text*."""
-    resp = _client.embeddings.create(model=EMBEDDING_MODEL, input=text)
-    return resp.data[0].embedding
+    return embed_batch([text])[0]
 
 
 def embed_batch(texts: list[str], batch_size: int = 512) -> list[list[float]]:
-    """Embed a list of texts, splitting into sub-batches if needed."""
-    all_embeddings: list[list[float]] = []
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i : i + batch_size]
-        resp = _client.embeddings.create(model=EMBEDDING_MODEL, input=batch)
-        all_embeddings.extend([d.embedding for d in resp.data])
-    return all_embeddings
+    """Embed a list of texts, splitting into sub-batches if needed.
+
+    Cached vectors are reused; only texts missing from the embedding cache
+    are sent to the API, where small requests share calls with concurrent
+    callers (see `EmbeddingBatcher`).
+    """
+
+    def fetch(missing: list[str]) -> list[list[float]]:
+        all_embeddings: list[list[float]] = []
+        for i in range(0, len(missing), batch_size):
+            batch = missing[i : i + batch_size]
+            all_embeddings.extend(llm_gateway.embed_sync(batch, model=EMBEDDING_MODEL, coalesce=True))
+        return all_embeddings
+
+    return embedding_cache.embed(texts, EMBEDDING_MODEL, fetch)
+
+
+async def aembed_text(text: str) -> list[float]:
+    """Async variant of `embed_text`."""
+    return (await aembed_batch([text]))[0]
+
+
+async def aembed_batch(texts: list[str], batch_size: int = 512) -> list[list[float]]:
+    """Async variant of `embed_batch`."""
+
+    async def fetch(missing: list[str]) -> list[list[float]]:
+        all_embeddings: list[list[float]] = []
+        for i in range(0, len(missing), batch_size):
+            batch = missing[i : i + batch_size]
+            all_embeddings.extend(await llm_gateway.embed(batch, model=EMBEDDING_MODEL, coalesce=True))
+        return all_embeddings
+
+    return await embedding_cache.aembed(texts, EMBEDDING_MODEL, fetch)
+
+
+def chunk_search_params(
+    query_embedding: list[float],
+    *,
+    match_count: int = 5,
+    match_threshold: float = 0.7,
+    document_ids: Optional[list[str]] = None,
+    source: Optional[str] = None,
+    tenant_id: Optional[str] = None,
+    metadata: Optional[dict] = None,
+) -> tuple[str, dict]:
+    """RPC name and parameters for a knowledge base vector search.
+
+    Without filters this is the plain ``match_chunks`` (ANN index); with any
+    of them it is ``match_chunks_filtered`` (migration 027), which resolves
+    the filters to the matching documents first and ranks their chunks
+    exactly, so up to *match_count* results above *match_threshold* are
+    returned however selective the filters are (filters matching more than
+    500 documents use the ANN index, oversampled). ``metadata`` matches
+    documents whose metadata contains it (JSONB ``@>``).
+    """
+    params = {"query_embedding": query_embedding, "match_count": match_count, "match_threshold": match_threshold}
+    filters = {"p_document_ids": document_ids, "p_source": source, "p_tenant_id": tenant_id, "p_metadata": metadata}
+    if all(v is None for v in filters.values()):
+        return "match_chunks", params
+    params.update({k: v for k, v in filters.items() if v is not None})
+    return "match_chunks_filtered", params
+
+
+def search_chunks(query_embedding: list[float], *, client=None, **filters) -> list[dict]:
+    """Chunks most similar to *query_embedding*; see `chunk_search_params` for *filters*."""
+    if client is None:
+        from app.supabase_config import supabase
+
+        client = supabase
+    fn, params = chunk_search_params(query_embedding, **filters)
+    return client.rpc(fn, params).execute().data or []
+
+
+async def asearch_chunks(query_embedding: list[float], *, client=None, **filters) -> list[dict]:
+    """Async variant of `search_chunks` (async PostgREST client)."""
+    if client is None:
+        from app.async_db import get_async_db
+
+        client = get_async_db()
+    fn, params = chunk_search_params(query_embedding, **filters)
+    return (await client.rpc(fn, params).execute()).data or []
+
+
+def _get_encoder():
+    global _encoder
+    if _encoder is None:
+        _encoder = tiktoken.encoding_for_model("gpt-4o-mini")
+    return _encoder
 
 
 def count_tokens(text: str) -> int:
-    return len(_encoder.encode(text))
+    return len(_get_encoder().encode(text))
 
 
 def chunk_text(
@@ -45,7 +124,8 @@ def chunk_text(
     overlap_tokens: int = 50,
 ) -> list[str]:
     """Split *text* into overlapping token-window chunks."""
-    tokens = _encoder.encode(text)
+    encoder = _get_encoder()
+    tokens = encoder.encode(text)
     if len(tokens) <= max_tokens:
         return [text]
 
@@ -54,7 +134,7 @@ def chunk_text(
     while start < len(tokens):
         end = min(start + max_tokens, len(tokens))
         chunk_tokens = tokens[start:end]
-        chunks.append(_encoder.decode(chunk_tokens))
+        chunks.append(encoder.decode(chunk_tokens))
         if end >= len(tokens):
             break
         start += max_tokens - overlap_tokens
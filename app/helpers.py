@@ -1,22 +1,32 @@
 """Shared helper utilities: rate limiting, output sanitization, and AI reply generation."""
 
 import re
-import time
+from typing import AsyncIterator, NamedTuple, Optional
 from datetime import datetime, timedelta
 from app.supabase_config import supabase
+from app.async_db import get_async_db
+from app.ticket_repository import ticket_repository
 from app.config import settings
+from app.context_packer import context_packer
+from app.llm_gateway import llm_gateway
 from app.logger import setup_logger
-from openai import OpenAI
 
 logger = setup_logger(__name__)
 
-# Initialize OpenAI client
-client = OpenAI(api_key=settings.openai_api_key)
-
 
 # ---------------------------------------------------
 # Rate Limiting
 # ---------------------------------------------------
+def ai_reply_limit_reached(ticket_id: str, ai_replies_in_window: int) -> bool:
+    """Apply the AI reply limit to a count taken over the configured window."""
+    limited = ai_replies_in_window >= settings.ai_reply_max_per_window
+    if limited:
+        logger.warning(
+            f"Rate limit exceeded for ticket {ticket_id}: {ai_replies_in_window} replies in window"
+        )
+    return limited
+
+
 def is_rate_limited(ticket_id: str) -> tuple[bool, dict]:
     """Check if ticket has exceeded AI reply rate limit."""
     try:
@@ -32,12 +42,20 @@ def is_rate_limited(ticket_id: str) -> tuple[bool, dict]:
             .execute()
             .count
         )
-        limited = count >= settings.ai_reply_max_per_window
-        if limited:
-            logger.warning(
-                f"Rate limit exceeded for ticket {ticket_id}: {count} replies in window"
-            )
-        return limited, {"ai_replies_in_window": count}
+        return ai_reply_limit_reached(ticket_id, count), {"ai_replies_in_window": count}
+    except Exception as e:
+        logger.error(f"Error checking rate limit for ticket {ticket_id}: {e}")
+        return False, {}
+
+
+async def is_rate_limited_async(ticket_id: str) -> tuple[bool, dict]:
+    """Async variant of `is_rate_limited` for endpoints using the ticket repository."""
+    try:
+        window_start = (
+            datetime.utcnow() - timedelta(seconds=settings.ai_reply_window_seconds)
+        ).isoformat()
+        count = await ticket_repository.count_ai_replies_since(ticket_id, window_start)
+        return ai_reply_limit_reached(ticket_id, count), {"ai_replies_in_window": count}
     except Exception as e:
         logger.error(f"Error checking rate limit for ticket {ticket_id}: {e}")
         return False, {}
@@ -70,9 +88,67 @@ def sanitize_output(text: str) -> tuple[str, dict]:
     return redacted, flags
 
 
+class StreamSanitizer:
+    """Applies `sanitize_output` to text that arrives in pieces.
+
+    Emails, phone and card numbers can straddle token boundaries, so text is
+    held back until a whitespace that no pattern can span (one not preceded
+    by a digit, ``)`` or ``-``). Each released piece is then redacted on its
+    own with the same result as redacting the whole message.
+    """
+
+    _UNSAFE_BEFORE_SPACE = set("0123456789)-+")
+
+    def __init__(self):
+        self._pending = ""
+        self.flags = {"profanity": False, "email": False, "phone": False, "cc": False}
+
+    def feed(self, text: str) -> str:
+        """Add *text*; returns the redacted text that is now safe to send (may be empty)."""
+        self._pending += text
+        cut = self._safe_cut()
+        if cut == 0:
+            return ""
+        ready, self._pending = self._pending[:cut], self._pending[cut:]
+        return self._sanitize(ready)
+
+    def flush(self) -> str:
+        """Redact and return whatever is still held back."""
+        ready, self._pending = self._pending, ""
+        return self._sanitize(ready)
+
+    def _safe_cut(self) -> int:
+        text = self._pending
+        for i in range(len(text) - 1, 0, -1):
+            if not text[i].isspace():
+                continue
+            before = text[:i].rstrip()
+            if before and before[-1] not in self._UNSAFE_BEFORE_SPACE:
+                return i + 1
+        return 0
+
+    def _sanitize(self, text: str) -> str:
+        if not text:
+            return ""
+        redacted, flags = sanitize_output(text)
+        for name, hit in flags.items():
+            self.flags[name] = self.flags[name] or hit
+        return redacted
+
+
 # ---------------------------------------------------
-# AI Reply Generation (OpenAI with retry/backoff)
+# AI Reply Generation (through the LLM gateway)
 # ---------------------------------------------------
+def _format_rag_context(rows) -> str:
+    packed = context_packer.pack(rows or [])
+    if not packed.passages:
+        return ""
+    return (
+        "\n\nRelevant knowledge base context (use this to inform your answer):\n"
+        + packed.render()
+    )
+
+
 def _get_rag_context(prompt: str) -> str:
     """Search the knowledge base for context relevant to the user prompt."""
     try:
@@ -82,50 +158,68 @@ def _get_rag_context(prompt: str) -> str:
             "match_chunks",
             {"query_embedding": query_vec, "match_count": 3, "match_threshold": 0.65},
         ).execute()
-        if rpc.data:
-            snippets = [r["content"] for r in rpc.data]
-            return (
-                "\n\nRelevant knowledge base context (use this to inform your answer):\n"
-                + "\n---\n".join(snippets)
-            )
+        return _format_rag_context(rpc.data)
     except Exception as e:
         logger.debug(f"RAG context lookup skipped: {e}")
     return ""
 
 
+async def _aget_rag_context(prompt: str) -> str:
+    """Async variant of `_get_rag_context` (async embedding and PostgREST clients)."""
+    try:
+        from app.embedding_service import aembed_text
+        db = get_async_db()
+        if db is None:
+            return ""
+        query_vec = await aembed_text(prompt[:500])
+        rpc = await db.rpc(
+            "match_chunks",
+            {"query_embedding": query_vec, "match_count": 3, "match_threshold": 0.65},
+        ).execute()
+        return _format_rag_context(rpc.data)
+    except Exception as e:
+        logger.debug(f"RAG context lookup skipped: {e}")
+    return ""
+
+
+class ReplyPrompt(NamedTuple):
+    """Prompt for an AI reply, plus the scope (context and customer) and question the
+    semantic cache looks up and the ticket priority that orders queued reply jobs."""
+
+    text: str
+    context: Optional[str] = None
+    question: Optional[str] = None
+    priority: str = "medium"
+    user_id: Optional[str] = None
+
+
+def _user_message(content: str) -> list[dict]:
+    return [{"role": "user", "content": content}]
+
+
 def generate_ai_reply(prompt: str, use_rag: bool = True) -> str:
-    """Generate AI reply with exponential backoff retry logic.
+    """Generate AI reply; retries, backoff and rate limits are applied by the LLM gateway.
 
     When *use_rag* is True (default), the knowledge base is searched first and
     relevant excerpts are injected into the prompt for grounded answers.
     """
-    delay = settings.openai_initial_delay
-    max_retries = settings.openai_max_retries
-
-    augmented_prompt = prompt
-    if use_rag:
-        rag_context = _get_rag_context(prompt)
-        if rag_context:
-            augmented_prompt = prompt + rag_context
-
-    for attempt in range(max_retries + 1):
-        try:
-            logger.debug(f"Calling OpenAI API (attempt {attempt + 1}/{max_retries + 1})")
-            completion = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": augmented_prompt}],
-            )
-            response = completion.choices[0].message.content
-            logger.debug("OpenAI API call successful")
-            return response
-        except Exception as e:
-            if attempt < max_retries:
-                logger.warning(
-                    f"OpenAI API call failed (attempt {attempt + 1}/{max_retries + 1}): {e}. "
-                    f"Retrying in {delay:.2f}s..."
-                )
-                time.sleep(delay)
-                delay *= settings.openai_backoff_multiplier
-            else:
-                logger.error(f"OpenAI API call failed after {max_retries + 1} attempts: {e}")
-                raise e
+    augmented_prompt = prompt + (_get_rag_context(prompt) if use_rag else "")
+    return llm_gateway.complete_sync(_user_message(augmented_prompt))
+
+
+async def agenerate_ai_reply(prompt: str, use_rag: bool = True) -> str:
+    """Async variant of `generate_ai_reply`; no thread is held while waiting."""
+    augmented_prompt = prompt + (await _aget_rag_context(prompt) if use_rag else "")
+    return await llm_gateway.complete(_user_message(augmented_prompt))
+
+
+async def stream_ai_reply(prompt: str, use_rag: bool = True) -> AsyncIterator[str]:
+    """Streaming variant of `agenerate_ai_reply`; yields content deltas as they arrive.
+
+    Opening the stream is retried by the gateway. A failure after text has
+    been yielded is raised to the caller instead, since a retry would repeat
+    what the customer has already seen.
+    """
+    augmented_prompt = prompt + (await _aget_rag_context(prompt) if use_rag else "")
+    async for delta in llm_gateway.stream(_user_message(augmented_prompt)):
+        yield delta
@@ -0,0 +1,676 @@
+"""Single async gateway for every OpenAI call (chat, streaming chat, embeddings).
+
+All calls run on one background event loop owned by the gateway, so the
+limits below hold for the whole process no matter whether the caller is an
+async endpoint, a sync endpoint in the threadpool or the email poller:
+
+* ``LLM_MAX_CONCURRENCY`` requests in flight at once (a semaphore);
+* token buckets for ``LLM_REQUESTS_PER_MINUTE`` and ``LLM_TOKENS_PER_MINUTE``
+  (tokens are estimated up front and corrected from the reported usage); with
+  ``CACHE_BACKEND=redis`` these become :class:`SharedRateLimit` counters so
+  the limits hold across all workers (:meth:`LLMGateway.share_rate_limits`);
+* ``LLM_TIMEOUT_SECONDS`` per attempt;
+* retries on rate limits, timeouts, connection and 5xx errors with jittered
+  exponential backoff (``asyncio.sleep``, honouring ``Retry-After``).
+
+A burst of requests therefore waits in the gateway instead of stampeding the
+provider, and waiting never holds a thread.
+
+Small embedding requests (``embed(..., coalesce=True)``) are micro-batched
+across callers by :class:`EmbeddingBatcher`: texts arriving within
+``EMBEDDING_BATCH_WINDOW_MS`` of each other share one ``embeddings.create``
+request of up to ``EMBEDDING_BATCH_MAX_SIZE`` inputs. Async callers ``await``
+:meth:`LLMGateway.complete`, :meth:`LLMGateway.stream` and
+:meth:`LLMGateway.embed`; sync code uses the ``*_sync`` variants, which block
+only the calling thread.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import openai
+from openai import AsyncOpenAI
+
+from app.config import settings
+from app.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+CHAT_MODEL = "gpt-4o-mini"
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,  # includes APITimeoutError
+    openai.InternalServerError,
+    asyncio.TimeoutError,
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used for rate limiting."""
+    return len(text) // 4 + 1
+
+
+class TokenBucket:
+    """Refills ``per_minute`` units evenly over a minute, holding at most a minute's worth.
+
+    :meth:`reserve` always succeeds and returns how long the caller must wait
+    before using the reservation, so waiters are served in arrival order. A
+    non-positive ``per_minute`` disables the limit.
+    """
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self._clock = clock
+        self._level = self.capacity
+        self._updated = clock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        if not self.enabled:
+            return 0.0
+        self._refill()
+        self._level -= min(amount, self.capacity)
+        return 0.0 if self._level >= 0 else -self._level / self.rate
+
+    def adjust(self, delta: float) -> None:
+        """Take *delta* more units (or give them back when negative)."""
+        if self.enabled:
+            self._refill()
+            self._level = min(self.capacity, self._level - delta)
+
+
+class SharedRateLimit:
+    """``per_minute`` units per wall-clock minute, counted on a shared :class:`CacheBackend`.
+
+    Same interface as :class:`TokenBucket`, but every worker process draws
+    from one counter per minute window (atomic ``incr``). A reservation that
+    does not fit the current minute is booked in the first later window with
+    room and the caller waits for that window to open. If the backend is
+    unreachable the reservation falls back to a per-process bucket.
+    """
+
+    # Windows ahead a reservation may be booked in before the caller simply waits that long
+    MAX_WINDOWS_AHEAD = 10
+    WINDOW_SECONDS = 60
+
+    def __init__(self, backend, name: str, per_minute: float, clock: Callable[[], float] = time.time):
+        self.capacity = float(per_minute)
+        self._backend = backend
+        self._name = name
+        self._clock = clock
+        self._fallback = TokenBucket(per_minute)
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def _key(self, window: int) -> str:
+        return f"llm_rate:{self._name}:{window}"
+
+    def reserve(self, amount: float) -> float:
+        if not self.enabled:
+            return 0.0
+        units = max(1, int(min(amount, self.capacity)))
+        now = self._clock()
+        current = int(now // self.WINDOW_SECONDS)
+        try:
+            for ahead in range(self.MAX_WINDOWS_AHEAD):
+                key = self._key(current + ahead)
+                used = self._backend.incr(key, units, ttl_seconds=(ahead + 2) * self.WINDOW_SECONDS)
+                if used <= self.capacity:
+                    return 0.0 if ahead == 0 else (current + ahead) * self.WINDOW_SECONDS - now
+                self._backend.incr(key, -units)
+        except Exception as e:
+            logger.warning(f"Shared LLM rate limit unavailable, limiting per worker: {e}")
+            return self._fallback.reserve(amount)
+        return (current + self.MAX_WINDOWS_AHEAD) * self.WINDOW_SECONDS - now
+
+    def adjust(self, delta: float) -> None:
+        """Take *delta* more units in the current window (or give them back when negative)."""
+        if not self.enabled or int(delta) == 0:
+            return
+        try:
+            window = int(self._clock() // self.WINDOW_SECONDS)
+            self._backend.incr(self._key(window), int(delta), ttl_seconds=2 * self.WINDOW_SECONDS)
+        except Exception as e:
+            logger.warning(f"Shared LLM rate limit unavailable, limiting per worker: {e}")
+            self._fallback.adjust(delta)
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent embedding requests into shared API calls.
+
+    Lives on the gateway loop and is only touched from it. The first text
+    queued for a model starts a ``window``-second timer; the batch is sent
+    when the timer fires or as soon as ``max_batch`` texts are waiting,
+    whichever comes first. Identical texts in a batch are sent once. Each
+    caller gets its own vectors back, or the batch's exception.
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[List[str], str], Awaitable[List[List[float]]]],
+        *,
+        window: float = 0.005,
+        max_batch: int = 64,
+    ):
+        self._embed = embed
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: Dict[str, List[Tuple[str, asyncio.Future]]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.reset_stats()
+
+    async def submit(self, texts: List[str], model: str) -> List[List[float]]:
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            futures.append(future)
+            pending = self._pending.setdefault(model, [])
+            pending.append((text, future))
+            if len(pending) >= self.max_batch:
+                self._flush(model, "full")
+            elif model not in self._timers:
+                self._timers[model] = loop.call_later(self.window, self._flush, model, "window")
+        return list(await asyncio.gather(*futures))
+
+    def _flush(self, model: str, reason: str) -> None:
+        timer = self._timers.pop(model, None)
+        if timer is not None:
+            timer.cancel()
+        items = self._pending.pop(model, [])
+        if not items:
+            return
+        size = len(items)
+        self._stats["batches"] += 1
+        self._stats["texts"] += size
+        self._stats[f"{reason}_flushes"] += 1
+        self._stats["largest_batch"] = max(self._stats["largest_batch"], size)
+        bucket = _size_bucket(size)
+        self._histogram[bucket] = self._histogram.get(bucket, 0) + 1
+        task = asyncio.get_running_loop().create_task(self._dispatch(model, items))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, model: str, items: List[Tuple[str, asyncio.Future]]) -> None:
+        unique = list(dict.fromkeys(text for text, _ in items))
+        self._stats["sent"] += len(unique)
+        try:
+            vectors = dict(zip(unique, await self._embed(unique, model)))
+        except Exception as e:
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for text, future in items:
+            if not future.done():  # the caller may have been cancelled
+                future.set_result(vectors[text])
+
+    def discard(self) -> None:
+        """Forget queued texts (used when the gateway loop shuts down)."""
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        self._pending.clear()
+        self._tasks.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        s = dict(self._stats)
+        avg = s["texts"] / s["batches"] if s["batches"] else 0.0
+        return {
+            "window_ms": round(self.window * 1000, 1),
+            "max_batch": self.max_batch,
+            **s,
+            "avg_batch_size": round(avg, 2),
+            "fill_ratio": round(avg / self.max_batch, 3),
+            "batch_sizes": dict(sorted(self._histogram.items(), key=lambda kv: int(kv[0].split("-")[0]))),
+        }
+
+    def reset_stats(self) -> None:
+        self._stats = {
+            "batches": 0, "texts": 0, "sent": 0, "full_flushes": 0, "window_flushes": 0, "largest_batch": 0,
+        }
+        self._histogram: Dict[str, int] = {}
+
+
+def _size_bucket(size: int) -> str:
+    # 1, 2-3, 4-7, 8-15, ...
+    low = 1 << (size.bit_length() - 1)
+    return str(low) if low == 1 else f"{low}-{2 * low - 1}"
+
+
+class LLMGateway:
+    """Rate-limited, retrying front door to the OpenAI API."""
+
+    def __init__(
+        self,
+        client: Optional[AsyncOpenAI] = None,
+        *,
+        max_concurrency: int = 16,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        timeout: float = 60.0,
+        max_retries: int = 3,
+        initial_delay: float = 0.5,
+        backoff_multiplier: float = 2.0,
+        max_delay: float = 20.0,
+        default_completion_tokens: int = 512,
+        embed_batching: bool = True,
+        embed_batch_window: float = 0.005,
+        embed_batch_max: int = 64,
+    ):
+        self._client = client
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.initial_delay = initial_delay
+        self.backoff_multiplier = backoff_multiplier
+        self.max_delay = max_delay
+        self.default_completion_tokens = default_completion_tokens
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self.shared_rate_limits = False
+        self._start_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.embed_batching = embed_batching
+        self.embedding_batcher = EmbeddingBatcher(
+            self._embed, window=embed_batch_window, max_batch=embed_batch_max
+        )
+        self._stats: Dict[str, float] = {}
+        self.reset_stats()
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        if self._client is None:
+            # Retries are handled here, with the shared limits, not inside the SDK
+            self._client = AsyncOpenAI(api_key=settings.openai_api_key, max_retries=0)
+        return self._client
+
+    @client.setter
+    def client(self, value) -> None:
+        self._client = value
+
+    # ---------------------------------------------------
+    # Public API
+    # ---------------------------------------------------
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        *,
+        model: str = CHAT_MODEL,
+        response_format: Optional[Dict[str, Any]] = None,
+        max_tokens: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> str:
+        """Return the content of one chat completion."""
+        return await self._submit(self._complete(messages, model, response_format, max_tokens, timeout))
+
+    def complete_sync(
+        self,
+        messages: List[Dict[str, str]],
+        *,
+        model: str = CHAT_MODEL,
+        response_format: Optional[Dict[str, Any]] = None,
+        max_tokens: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> str:
+        """Blocking :meth:`complete` for sync code (blocks only the calling thread)."""
+        return self._submit_sync(self._complete(messages, model, response_format, max_tokens, timeout))
+
+    async def stream(
+        self,
+        messages: List[Dict[str, str]],
+        *,
+        model: str = CHAT_MODEL,
+        max_tokens: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[str]:
+        """Yield content deltas of a streamed chat completion.
+
+        Opening the stream is retried; a failure after text has been yielded
+        is raised instead, since a retry would repeat text already sent.
+        ``timeout`` bounds the wait for each chunk. Closing the iterator
+        early cancels the upstream request.
+        """
+        caller_loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def emit(kind: str, value: Any = None) -> None:
+            caller_loop.call_soon_threadsafe(queue.put_nowait, (kind, value))
+
+        future = self._run(self._stream(messages, model, max_tokens, timeout, emit))
+        try:
+            while True:
+                kind, value = await queue.get()
+                if kind == "delta":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    return
+        finally:
+            future.cancel()
+
+    async def embed(
+        self, texts: List[str], *, model: str = EMBEDDING_MODEL, coalesce: bool = False
+    ) -> List[List[float]]:
+        """Embed *texts*; vectors come back in input order.
+
+        With ``coalesce`` a request smaller than the batch limit may share an
+        API call with other callers' texts, at the cost of up to one batching
+        window of extra latency.
+        """
+        return await self._submit(self._embed_entry(texts, model, coalesce))
+
+    def embed_sync(
+        self, texts: List[str], *, model: str = EMBEDDING_MODEL, coalesce: bool = False
+    ) -> List[List[float]]:
+        return self._submit_sync(self._embed_entry(texts, model, coalesce))
+
+    # ---------------------------------------------------
+    # Calls (run on the gateway loop)
+    # ---------------------------------------------------
+    async def _complete(self, messages, model, response_format, max_tokens, timeout) -> str:
+        kwargs: Dict[str, Any] = {"model": model, "messages": messages}
+        if response_format is not None:
+            kwargs["response_format"] = response_format
+        if max_tokens is not None:
+            kwargs["max_tokens"] = max_tokens
+        estimate = self._estimate_chat(messages, max_tokens)
+        completion = await self._call(lambda: self.client.chat.completions.create(**kwargs), estimate, timeout)
+        self._reconcile(estimate, getattr(completion, "usage", None))
+        return completion.choices[0].message.content
+
+    async def _embed_entry(self, texts: List[str], model: str, coalesce: bool) -> List[List[float]]:
+        if coalesce and self.embed_batching and 0 < len(texts) < self.embedding_batcher.max_batch:
+            return await self.embedding_batcher.submit(texts, model)
+        return await self._embed(texts, model)
+
+    async def _embed(self, texts: List[str], model: str) -> List[List[float]]:
+        if not texts:
+            return []
+        estimate = sum(estimate_tokens(t) for t in texts)
+        resp = await self._call(lambda: self.client.embeddings.create(model=model, input=texts), estimate, None)
+        self._reconcile(estimate, getattr(resp, "usage", None))
+        return [d.embedding for d in resp.data]
+
+    async def _stream(self, messages, model, max_tokens, timeout, emit) -> None:
+        timeout = timeout or self.timeout
+        kwargs: Dict[str, Any] = {
+            "model": model,
+            "messages": messages,
+            "stream": True,
+            "stream_options": {"include_usage": True},
+        }
+        if max_tokens is not None:
+            kwargs["max_tokens"] = max_tokens
+        estimate = self._estimate_chat(messages, max_tokens)
+        try:
+            # The semaphore is held until the stream is drained
+            stream = await self._call(
+                lambda: self.client.chat.completions.create(**kwargs), estimate, timeout, release=False
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            emit("error", e)
+            return
+        try:
+            try:
+                usage = None
+                chunks = stream.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout)
+                    except StopAsyncIteration:
+                        break
+                    usage = getattr(chunk, "usage", None) or usage
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        emit("delta", chunk.choices[0].delta.content)
+                self._reconcile(estimate, usage)
+            finally:
+                self._semaphore.release()
+                self._stats["in_flight"] -= 1
+                close = getattr(stream, "close", None)
+                if close is not None:
+                    try:
+                        await close()
+                    except Exception:
+                        pass
+            emit("end")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._stats["failures"] += 1
+            emit("error", e)
+
+    async def _call(
+        self,
+        request: Callable[[], Awaitable[Any]],
+        estimated_tokens: int,
+        timeout: Optional[float],
+        release: bool = True,
+    ):
+        """Run *request* under the rate limits, semaphore, timeout and retry policy.
+
+        With ``release=False`` the semaphore stays acquired on success and the
+        caller must release it (and decrement ``in_flight``).
+        """
+        timeout = timeout or self.timeout
+        for attempt in range(self.max_retries + 1):
+            await self._admit(estimated_tokens)
+            queued_at = time.perf_counter()
+            self._stats["queued"] += 1
+            try:
+                await self._semaphore.acquire()
+            finally:
+                self._stats["queued"] -= 1
+            self._stats["wait_ms"] += (time.perf_counter() - queued_at) * 1000
+            self._stats["in_flight"] += 1
+            self._stats["requests"] += 1
+            succeeded = False
+            try:
+                result = await asyncio.wait_for(request(), timeout)
+                succeeded = True
+                return result
+            except RETRYABLE_ERRORS as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self._stats["timeouts"] += 1
+                if attempt >= self.max_retries:
+                    self._stats["failures"] += 1
+                    logger.error(f"OpenAI call failed after {attempt + 1} attempts: {e!r}")
+                    raise
+                delay = self._backoff(attempt, e)
+                self._stats["retries"] += 1
+                logger.warning(
+                    f"OpenAI call failed (attempt {attempt + 1}/{self.max_retries + 1}): {e!r}. "
+                    f"Retrying in {delay:.2f}s..."
+                )
+            except Exception:
+                self._stats["failures"] += 1
+                raise
+            finally:
+                if release or not succeeded:
+                    self._semaphore.release()
+                    self._stats["in_flight"] -= 1
+            # Back off without holding a concurrency slot
+            await asyncio.sleep(delay)
+
+    def share_rate_limits(self, backend) -> None:
+        """Count the request and token limits on *backend*, shared by every worker."""
+        self._requests = SharedRateLimit(backend, "requests", self._requests.capacity)
+        self._tokens = SharedRateLimit(backend, "tokens", self._tokens.capacity)
+        self.shared_rate_limits = True
+
+    def _reserve(self, estimated_tokens: int) -> float:
+        return max(self._requests.reserve(1), self._tokens.reserve(estimated_tokens))
+
+    async def _admit(self, estimated_tokens: int) -> None:
+        if self.shared_rate_limits:
+            # Backend round trips stay off the gateway loop
+            wait = await asyncio.to_thread(self._reserve, estimated_tokens)
+        else:
+            wait = self._reserve(estimated_tokens)
+        if wait > 0:
+            self._stats["throttled"] += 1
+            self._stats["throttle_ms"] += wait * 1000
+            await asyncio.sleep(wait)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        ceiling = min(self.max_delay, self.initial_delay * (self.backoff_multiplier ** attempt))
+        delay = random.uniform(ceiling / 2, ceiling)
+        retry_after = _retry_after_seconds(error)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def _estimate_chat(self, messages: List[Dict[str, str]], max_tokens: Optional[int]) -> int:
+        prompt = sum(estimate_tokens(m.get("content") or "") for m in messages)
+        return prompt + (max_tokens or self.default_completion_tokens)
+
+    def _reconcile(self, estimate: int, usage) -> None:
+        total = getattr(usage, "total_tokens", None) if usage is not None else None
+        if total is None:
+            self._stats["tokens"] += estimate
+            return
+        if self.shared_rate_limits:
+            asyncio.get_running_loop().run_in_executor(None, self._tokens.adjust, total - estimate)
+        else:
+            self._tokens.adjust(total - estimate)
+        self._stats["tokens"] += total
+
+    # ---------------------------------------------------
+    # Event loop plumbing
+    # ---------------------------------------------------
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is not None:
+            return self._loop
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run() -> None:
+                    asyncio.set_event_loop(loop)
+                    self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                    ready.set()
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=run, name="llm-gateway", daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+        return self._loop
+
+    def _run(self, coro) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    async def _submit(self, coro):
+        if self._loop is not None and asyncio.get_running_loop() is self._loop:
+            return await coro
+        return await asyncio.wrap_future(self._run(coro))
+
+    def _submit_sync(self, coro):
+        if self._thread is not None and threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("Sync LLM gateway call made from the gateway loop; await the async method")
+        return self._run(coro).result()
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Close the HTTP client and stop the gateway loop (it restarts on next use)."""
+        loop, thread = self._loop, self._thread
+        if loop is None:
+            return
+        if self._client is not None and hasattr(self._client, "close"):
+            try:
+                asyncio.run_coroutine_threadsafe(self._client.close(), loop).result(timeout)
+            except Exception as e:
+                logger.debug(f"Closing OpenAI client failed: {e}")
+            self._client = None
+        loop.call_soon_threadsafe(self.embedding_batcher.discard)
+        loop.call_soon_threadsafe(loop.stop)
+        if thread is not None:
+            thread.join(timeout)
+        loop.close()
+        self._loop = self._thread = self._semaphore = None
+
+    # ---------------------------------------------------
+    # Metrics
+    # ---------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        s = dict(self._stats)
+        attempts = s["requests"] or 1
+        return {
+            "max_concurrency": self.max_concurrency,
+            "requests_per_minute": self._requests.capacity or None,
+            "tokens_per_minute": self._tokens.capacity or None,
+            "shared_rate_limits": self.shared_rate_limits,
+            "in_flight": int(s["in_flight"]),
+            "queued": int(s["queued"]),
+            "requests": int(s["requests"]),
+            "retries": int(s["retries"]),
+            "timeouts": int(s["timeouts"]),
+            "failures": int(s["failures"]),
+            "throttled": int(s["throttled"]),
+            "tokens": int(s["tokens"]),
+            "avg_queue_wait_ms": round(s["wait_ms"] / attempts, 1),
+            "avg_throttle_ms": round(s["throttle_ms"] / s["throttled"], 1) if s["throttled"] else 0.0,
+            "embedding_batches": self.embedding_batcher.stats() if self.embed_batching else None,
+        }
+
+    def reset_stats(self) -> None:
+        in_flight = self._stats.get("in_flight", 0)
+        queued = self._stats.get("queued", 0)
+        self._stats = {
+            "requests": 0, "retries": 0, "timeouts": 0, "failures": 0, "throttled": 0,
+            "tokens": 0, "wait_ms": 0.0, "throttle_ms": 0.0,
+            "in_flight": in_flight, "queued": queued,
+        }
+        self.embedding_batcher.reset_stats()
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+# Global instance
+llm_gateway = LLMGateway(
+    max_concurrency=settings.llm_max_concurrency,
+    requests_per_minute=settings.llm_requests_per_minute,
+    tokens_per_minute=settings.llm_tokens_per_minute,
+    timeout=settings.llm_timeout_seconds,
+    max_retries=settings.openai_max_retries,
+    initial_delay=settings.openai_initial_delay,
+    backoff_multiplier=settings.openai_backoff_multiplier,
+    max_delay=settings.llm_max_backoff_seconds,
+    default_completion_tokens=settings.llm_default_completion_tokens,
+    embed_batching=settings.embedding_batching_enabled,
+    embed_batch_window=settings.embedding_batch_window_ms / 1000,
+    embed_batch_max=settings.embedding_batch_max_size,
+)
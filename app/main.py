@@ -19,6 +19,15 @@ from app.middleware import error_handler, http_exception_handler, validation_exc
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from fastapi.exceptions import RequestValidationError
 from app.email_polling_service import email_polling_service
+from app.async_db import close_async_db
+from app.db_instrumentation import DbTimingMiddleware
+from app.cache_backend import cache_backend
+from app.reference_cache import reference_cache
+from app.write_buffer import buffered_writer
+from app.llm_gateway import llm_gateway
+from app.reply_jobs import reply_jobs
+from app.compliance_jobs import compliance_jobs
+from app.conversation_memory import conversation_memory
 
 # Routers
 from app.routers import auth, tickets, admin, sla, attachments, email, routing, tags
@@ -58,6 +67,15 @@ async def email_polling_task():
 async def lifespan(app: FastAPI):
     """Lifespan context manager for startup and shutdown events."""
     logger.info("Starting AI Support API...")
+    try:
+        reference_cache.connect(cache_backend)
+    except Exception as e:
+        logger.warning(f"Reference cache invalidations will not be shared across workers: {e}")
+    if settings.cache_backend == "redis":
+        # LLM request/token limits counted once for all workers instead of per worker
+        llm_gateway.share_rate_limits(cache_backend)
+    # Reply job workers; in durable mode also re-queues jobs a previous process left unfinished
+    await reply_jobs.start()
     polling_task = None
     if settings.email_polling_enabled:
         polling_task = asyncio.create_task(email_polling_task())
@@ -68,6 +86,16 @@ async def lifespan(app: FastAPI):
     if polling_task:
         polling_task.cancel()
         logger.info("Email polling stopped")
+    # Let in-flight ticket summaries finish while the database clients are still open
+    await conversation_memory.drain()
+    await reply_jobs.stop()
+    await compliance_jobs.stop()
+    # Write out queued audit/log rows before the database clients go away
+    await asyncio.get_event_loop().run_in_executor(None, buffered_writer.stop)
+    await close_async_db()
+    await asyncio.get_event_loop().run_in_executor(None, llm_gateway.close)
+    reference_cache.disconnect()
+    cache_backend.close()
     logger.info("AI Support API shutting down")
 
 
@@ -81,6 +109,10 @@ app.add_exception_handler(Exception, error_handler)
 app.add_exception_handler(StarletteHTTPException, http_exception_handler)
 app.add_exception_handler(RequestValidationError, validation_exception_handler)
 
+# Database round-trip timing (Server-Timing header, per-route summary)
+if settings.db_instrumentation_enabled:
+    app.add_middleware(DbTimingMiddleware)
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -0,0 +1,166 @@
+"""Keyset (cursor) pagination helpers shared by the list endpoints.
+
+List queries are ordered by ``(<sort_column> DESC NULLS FIRST, id DESC)`` and each page
+continues strictly after the last row of the previous one, so the database
+only reads ``limit + 1`` rows per request regardless of table size. Cursors
+are opaque url-safe base64 tokens; clients should pass back ``next_cursor``
+unchanged.
+"""
+
+import base64
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+DEFAULT_SORT_COLUMN = "updated_at"
+
+
+# ---------------------------------------------------
+# Cursor encoding
+# ---------------------------------------------------
+def encode_cursor(payload: Dict[str, Any]) -> str:
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Decode a cursor token, raising 400 if it was not issued by us."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(payload, dict):
+            raise ValueError("cursor payload must be an object")
+        return payload
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+
+
+def keyset_cursor(row: Dict[str, Any], sort_column: str = DEFAULT_SORT_COLUMN) -> str:
+    """Cursor pointing just after *row* in ``(sort_column, id)`` order."""
+    return encode_cursor({"v": row.get(sort_column), "id": row["id"]})
+
+
+def offset_cursor(offset: int) -> str:
+    """Cursor for result sets that cannot be keyset-paged (e.g. ranked search)."""
+    return encode_cursor({"offset": offset})
+
+
+def cursor_offset(cursor: str) -> int:
+    offset = decode_cursor(cursor).get("offset")
+    if not isinstance(offset, int) or offset < 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+    return offset
+
+
+# ---------------------------------------------------
+# Query helpers
+# ---------------------------------------------------
+def _quote(value: Any) -> str:
+    # PostgREST logic trees reserve `,.:()`; double-quote values such as timestamps
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _add_or_filter(query, expression: str):
+    or_ = getattr(query, "or_", None)
+    if or_ is not None:
+        return or_(expression)
+    # postgrest-py 0.13 has no `or_`; add the raw `or=(...)` parameter ourselves
+    query.params = query.params.add("or", f"({expression})")
+    return query
+
+
+def apply_keyset(
+    query,
+    *,
+    limit: int,
+    cursor: Optional[str] = None,
+    sort_column: str = DEFAULT_SORT_COLUMN,
+):
+    """Order *query* by ``(sort_column, id)`` desc and restrict it to one page.
+
+    Fetches ``limit + 1`` rows so :func:`split_page` can tell whether another
+    page exists without a separate count query.
+    """
+    if cursor:
+        payload = decode_cursor(cursor)
+        if "id" not in payload or "v" not in payload:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor",
+            )
+        row_id = _quote(payload["id"])
+        if payload["v"] is None:
+            # Rows with a null sort key come first; after them, every non-null row
+            expression = f"and({sort_column}.is.null,id.lt.{row_id}),{sort_column}.not.is.null"
+        else:
+            value = _quote(payload["v"])
+            expression = f"{sort_column}.lt.{value},and({sort_column}.eq.{value},id.lt.{row_id})"
+        query = _add_or_filter(query, expression)
+    return order_keyset(query, sort_column).limit(limit + 1)
+
+
+def order_keyset(query, sort_column: str = DEFAULT_SORT_COLUMN):
+    """Order *query* by ``(sort_column DESC NULLS FIRST, id DESC)``."""
+    query = query.order(sort_column, desc=True, nullsfirst=True).order("id", desc=True)
+    return _merge_order_params(query)
+
+
+def _merge_order_params(query):
+    # postgrest-py 0.13 sends each .order() as its own `order` parameter and PostgREST
+    # only honours one of them; join them into a single comma-separated list
+    params = getattr(query, "params", None)
+    if params is None:
+        return query
+    orders = params.get_list("order")
+    if len(orders) > 1:
+        query.params = params.set("order", ",".join(orders))
+    return query
+
+
+def split_page(
+    rows: List[Dict[str, Any]],
+    limit: int,
+    sort_column: str = DEFAULT_SORT_COLUMN,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Trim the look-ahead row and return ``(page_rows, next_cursor)``."""
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, keyset_cursor(page[-1], sort_column)
+
+
+def build_pagination(
+    *,
+    page_size: int,
+    next_cursor: Optional[str],
+    page: Optional[int] = None,
+    total_count: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Pagination block for list responses.
+
+    Cursor requests only report ``next_cursor``/``has_next``; legacy page
+    requests also get the page counters they always had.
+    """
+    pagination: Dict[str, Any] = {
+        "page_size": page_size,
+        "has_next": next_cursor is not None,
+        "next_cursor": next_cursor,
+    }
+    if total_count is not None and page is not None:
+        total_pages = (total_count + page_size - 1) // page_size if total_count > 0 else 0
+        pagination.update(
+            {
+                "page": page,
+                "total_count": total_count,
+                "total_pages": total_pages,
+                "has_prev": page > 1,
+            }
+        )
+    return pagination
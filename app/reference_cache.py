@@ -0,0 +1,202 @@
+"""Process-local read-through cache for small reference tables.
+
+SLA definitions, routing rules, tags, categories and email accounts change a
+few times a day but are read on every ticket creation, routing pass and
+outbound email. Each table is loaded whole on first use and served from
+memory until its TTL expires or a write endpoint calls
+:meth:`ReferenceCache.invalidate`. Once :meth:`ReferenceCache.connect` has
+attached a shared cache backend, invalidations are broadcast to the other
+workers; without one they only see a change when their own copy expires.
+"""
+
+import json
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from app.config import settings
+from app.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+INVALIDATION_CHANNEL = "reference-cache:invalidate"
+
+# How each reference table is loaded; callers filter the cached rows in Python
+REFERENCE_TABLES: Dict[str, Callable[[Any], Any]] = {
+    "sla_definitions": lambda t: t.select("*").eq("is_active", True).order("created_at", desc=True),
+    "routing_rules": lambda t: t.select("*").eq("is_active", True).order("priority", desc=True),
+    "tags": lambda t: t.select("*").order("name", desc=False),
+    "categories": lambda t: t.select("*").order("name", desc=False),
+    "email_accounts": lambda t: t.select("*").order("created_at", desc=False),
+}
+
+
+class _Entry:
+    __slots__ = ("rows", "loaded_at")
+
+    def __init__(self, rows: List[Dict[str, Any]], loaded_at: float):
+        self.rows = rows
+        self.loaded_at = loaded_at
+
+
+class ReferenceCache:
+    """TTL cache of whole reference tables with explicit invalidation.
+
+    Concurrent misses on the same table may each run the query; the cost is
+    one extra small read, and no lock is held across a database call. A load
+    that started before an :meth:`invalidate` is returned to its caller but
+    not stored, so a write is never masked by an older in-flight read.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 300.0,
+        enabled: bool = True,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _Entry] = {}
+        self._generations: Dict[str, int] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._origin = uuid.uuid4().hex
+        self._backend = None
+        self._subscription = None
+
+    # ---------------------------------------------------
+    # Reads
+    # ---------------------------------------------------
+    def rows(self, table: str, client) -> List[Dict[str, Any]]:
+        """Cached rows of *table*, loading them with the sync *client* on a miss."""
+        cached, generation = self._lookup(table)
+        if cached is not None:
+            return cached
+        result = REFERENCE_TABLES[table](client.table(table)).execute()
+        return self._store(table, generation, result.data or [])
+
+    async def arows(self, table: str, client) -> List[Dict[str, Any]]:
+        """Async variant of :meth:`rows` for the async PostgREST client."""
+        cached, generation = self._lookup(table)
+        if cached is not None:
+            return cached
+        result = await REFERENCE_TABLES[table](client.table(table)).execute()
+        return self._store(table, generation, result.data or [])
+
+    def _lookup(self, table: str):
+        if table not in REFERENCE_TABLES:
+            raise KeyError(f"Not a reference table: {table}")
+        with self._lock:
+            counters = self._counter(table)
+            entry = self._entries.get(table)
+            if self.enabled and entry is not None and self._clock() - entry.loaded_at < self.ttl_seconds:
+                counters["hits"] += 1
+                return entry.rows, None
+            counters["misses"] += 1
+            return None, self._generations.get(table, 0)
+
+    def _store(self, table: str, generation: int, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        with self._lock:
+            if self.enabled and self._generations.get(table, 0) == generation:
+                self._entries[table] = _Entry(rows, self._clock())
+        return rows
+
+    # ---------------------------------------------------
+    # Invalidation & stats
+    # ---------------------------------------------------
+    def invalidate(self, *tables: str) -> None:
+        """Drop cached rows for *tables* (all tables when none are given).
+
+        The invalidation is also published to other workers when connected.
+        """
+        tables = tables or tuple(REFERENCE_TABLES)
+        self._drop(tables)
+        logger.debug(f"Invalidated reference cache: {', '.join(tables)}")
+        if self._backend is not None:
+            try:
+                self._backend.publish(
+                    INVALIDATION_CHANNEL, json.dumps({"origin": self._origin, "tables": list(tables)})
+                )
+            except Exception as e:
+                logger.warning(f"Could not broadcast reference cache invalidation: {e}")
+
+    def _drop(self, tables) -> None:
+        with self._lock:
+            for table in tables:
+                if table not in REFERENCE_TABLES:
+                    continue
+                self._entries.pop(table, None)
+                self._generations[table] = self._generations.get(table, 0) + 1
+                self._counter(table)["invalidations"] += 1
+
+    def _on_remote_invalidate(self, message: str) -> None:
+        payload = json.loads(message)
+        if payload.get("origin") != self._origin:
+            self._drop(payload.get("tables") or REFERENCE_TABLES)
+
+    def connect(self, backend) -> None:
+        """Exchange invalidations with other workers over *backend* pub/sub."""
+        self.disconnect()
+        self._subscription = backend.subscribe(INVALIDATION_CHANNEL, self._on_remote_invalidate)
+        self._backend = backend
+
+    def disconnect(self) -> None:
+        if self._subscription is not None:
+            self._subscription.close()
+        self._backend = self._subscription = None
+
+    def _counter(self, table: str) -> Dict[str, int]:
+        return self._counters.setdefault(table, {"hits": 0, "misses": 0, "invalidations": 0})
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters per table plus the age of each cached copy."""
+        with self._lock:
+            now = self._clock()
+            tables = {}
+            for table in REFERENCE_TABLES:
+                counters = dict(self._counter(table))
+                lookups = counters["hits"] + counters["misses"]
+                entry = self._entries.get(table)
+                tables[table] = {
+                    **counters,
+                    "hit_ratio": round(counters["hits"] / lookups, 3) if lookups else None,
+                    "cached_rows": len(entry.rows) if entry else 0,
+                    "age_seconds": round(now - entry.loaded_at, 1) if entry else None,
+                }
+        hits = sum(t["hits"] for t in tables.values())
+        misses = sum(t["misses"] for t in tables.values())
+        return {
+            "enabled": self.enabled,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else None,
+            "tables": tables,
+        }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._counters.clear()
+
+
+# ---------------------------------------------------
+# Lookups over cached rows
+# ---------------------------------------------------
+def active_sla_for_priority(slas: List[Dict[str, Any]], priority: str) -> Optional[Dict[str, Any]]:
+    """Newest active SLA for *priority* (rows are cached newest first)."""
+    return next((s for s in slas if s.get("priority") == priority), None)
+
+
+def find_by_id(rows: List[Dict[str, Any]], row_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not row_id:
+        return None
+    return next((r for r in rows if r.get("id") == row_id), None)
+
+
+# Global instance
+reference_cache = ReferenceCache(
+    ttl_seconds=settings.reference_cache_ttl_seconds,
+    enabled=settings.reference_cache_enabled,
+)
@@ -0,0 +1,425 @@
+"""Background queue for AI reply generation.
+
+``POST /ticket`` and ``POST /ticket/{id}/reply`` normally hold the request
+open while the reply is generated (semantic cache, RAG lookup, LLM call with
+retries, sanitization). A client that sends ``Prefer: respond-async`` gets
+``202 Accepted`` with a job id as soon as the customer message is stored; the
+reply is generated by one of ``AI_REPLY_JOB_WORKERS`` workers and fetched from
+``GET /ticket/jobs/{job_id}`` (optionally long-polling) or streamed from
+``GET /ticket/jobs/{job_id}/stream``.
+
+Jobs are ordered by ticket priority, so ``urgent`` tickets are answered
+before anything already waiting at a lower priority, and first come first
+served within a priority. At most ``AI_REPLY_JOB_MAX_QUEUED`` jobs wait; past
+that :meth:`ReplyJobQueue.submit` raises :class:`ReplyQueueFull`.
+
+With ``AI_REPLY_JOBS_DURABLE`` every job is also recorded in
+``ai_reply_jobs`` (migration 025). Workers claim a job there before running
+it, any worker process can answer a poll for it, and jobs still queued when a
+process stops, or stuck running for longer than
+``AI_REPLY_JOB_TIMEOUT_SECONDS``, are picked up again on startup.
+"""
+
+import asyncio
+import itertools
+import time
+import uuid
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.config import settings
+from app.helpers import ReplyPrompt
+from app.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+TABLE = "ai_reply_jobs"
+
+PRIORITY_RANK = {"urgent": 0, "high": 1, "medium": 2, "low": 3}
+
+# Finished jobs kept in memory for polling (on top of the TTL)
+MAX_FINISHED = 10000
+
+Handler = Callable[[str, ReplyPrompt], Awaitable[Dict[str, Any]]]
+
+
+class ReplyQueueFull(Exception):
+    """Raised when ``AI_REPLY_JOB_MAX_QUEUED`` jobs are already waiting."""
+
+
+class ReplyJobLookupFailed(Exception):
+    """Raised when a job is not in memory and ``ai_reply_jobs`` cannot be read."""
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+@dataclass
+class ReplyJob:
+    id: str
+    ticket_id: str
+    user_id: Optional[str]
+    prompt: ReplyPrompt
+    status: str = "queued"  # queued | running | completed | failed
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: str = field(default_factory=lambda: _now().isoformat())
+    enqueued: float = field(default_factory=time.monotonic)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    done: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    @property
+    def priority(self) -> str:
+        return self.prompt.priority if self.prompt.priority in PRIORITY_RANK else "medium"
+
+    def to_dict(self) -> Dict[str, Any]:
+        wait = (self.started or time.monotonic()) - self.enqueued
+        run = (self.finished or time.monotonic()) - self.started if self.started else None
+        return {
+            "job_id": self.id,
+            "ticket_id": self.ticket_id,
+            "status": self.status,
+            "priority": self.priority,
+            "created_at": self.created_at,
+            "wait_ms": round(wait * 1000, 1),
+            "run_ms": round(run * 1000, 1) if run is not None else None,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+def _row_to_dict(row: Dict[str, Any]) -> Dict[str, Any]:
+    # Poll answer for a durable job owned by another worker process
+    return {
+        "job_id": row["id"],
+        "ticket_id": row["ticket_id"],
+        "status": row["status"],
+        "priority": row.get("priority"),
+        "created_at": row.get("created_at"),
+        "wait_ms": None,
+        "run_ms": None,
+        "result": row.get("result"),
+        "error": row.get("error"),
+    }
+
+
+class ReplyJobQueue:
+    """Priority queue of AI reply jobs served by a bounded pool of asyncio workers."""
+
+    def __init__(
+        self,
+        *,
+        workers: int = 4,
+        max_queued: int = 1000,
+        durable: bool = False,
+        result_ttl_seconds: float = 600.0,
+        timeout_seconds: float = 300.0,
+        handler: Optional[Handler] = None,
+        async_client_factory: Optional[Callable[[], Any]] = None,
+        window: int = 1000,
+    ):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.durable = durable
+        self.result_ttl_seconds = result_ttl_seconds
+        self.timeout_seconds = timeout_seconds
+        self.window = window
+        self._handler = handler
+        self._async_client_factory = async_client_factory
+        self._jobs: "OrderedDict[str, ReplyJob]" = OrderedDict()
+        self._seq = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._queued_by_priority: Counter = Counter()
+        self._running = 0
+        self.reset_stats()
+
+    def set_handler(self, handler: Handler) -> None:
+        """Coroutine function that generates and stores the reply, returning the response body."""
+        self._handler = handler
+
+    def _db(self):
+        if self._async_client_factory is None:
+            from app.async_db import get_async_db
+
+            self._async_client_factory = get_async_db
+        return self._async_client_factory()
+
+    # ---------------------------------------------------
+    # Lifecycle
+    # ---------------------------------------------------
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        # First use, or a new event loop (tests): jobs queued on the old loop are gone
+        self._loop = loop
+        self._queue = asyncio.PriorityQueue()
+        self._queued_by_priority.clear()
+        self._running = 0
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def start(self) -> int:
+        """Start the workers and, in durable mode, re-queue unfinished jobs. Returns how many."""
+        self._ensure_started()
+        if not self.durable:
+            return 0
+        db = self._db()
+        if db is None:
+            return 0
+        try:
+            stale = (_now() - timedelta(seconds=self.timeout_seconds)).isoformat()
+            await db.table(TABLE).update({"status": "queued"}).eq("status", "running").lt("started_at", stale).execute()
+            rows = (
+                await db.table(TABLE)
+                .select("id, ticket_id, user_id, priority, prompt, context, question, created_at")
+                .eq("status", "queued")
+                .order("created_at")
+                .execute()
+            ).data or []
+        except Exception as e:
+            logger.warning(f"Could not recover queued AI reply jobs: {e}")
+            return 0
+        for row in rows:
+            if row["id"] in self._jobs:
+                continue
+            prompt = ReplyPrompt(
+                row["prompt"], row.get("context"), row.get("question"), row.get("priority") or "medium", row.get("user_id")
+            )
+            job = ReplyJob(row["id"], row["ticket_id"], row.get("user_id"), prompt, created_at=row.get("created_at") or _now().isoformat())
+            self._put(job)
+        self._stats["recovered"] += len(rows)
+        if rows:
+            logger.info(f"Recovered {len(rows)} queued AI reply job(s)")
+        return len(rows)
+
+    async def stop(self) -> None:
+        """Cancel the workers. Queued jobs stay in ``ai_reply_jobs`` in durable mode."""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        pending = self._queue.qsize() if self._queue is not None else 0
+        if pending and not self.durable:
+            logger.warning(f"{pending} queued AI reply job(s) dropped at shutdown")
+        self._loop = None
+
+    # ---------------------------------------------------
+    # Producer side
+    # ---------------------------------------------------
+    async def submit(self, ticket_id: str, user_id: Optional[str], prompt: ReplyPrompt) -> ReplyJob:
+        """Queue a reply for *ticket_id*; raises :class:`ReplyQueueFull` when at capacity."""
+        self._ensure_started()
+        self._prune()
+        if self._queue.qsize() >= self.max_queued:
+            self._stats["rejected"] += 1
+            raise ReplyQueueFull(f"{self._queue.qsize()} AI reply jobs are already queued")
+        job = ReplyJob(str(uuid.uuid4()), ticket_id, user_id, prompt)
+        if self.durable:
+            await self._record(job)
+        self._put(job)
+        self._stats["submitted"] += 1
+        return job
+
+    def _put(self, job: ReplyJob) -> None:
+        self._jobs[job.id] = job
+        self._queued_by_priority[job.priority] += 1
+        self._queue.put_nowait((PRIORITY_RANK[job.priority], next(self._seq), job))
+
+    async def _record(self, job: ReplyJob) -> None:
+        db = self._db()
+        if db is None:
+            return
+        try:
+            await db.table(TABLE).insert({
+                "id": job.id,
+                "ticket_id": job.ticket_id,
+                "user_id": job.user_id,
+                "priority": job.priority,
+                "status": "queued",
+                "prompt": job.prompt.text,
+                "context": job.prompt.context,
+                "question": job.prompt.question,
+                "created_at": job.created_at,
+            }).execute()
+        except Exception as e:
+            # Still answered by this process; only restart recovery is lost
+            logger.warning(f"Could not record AI reply job {job.id}: {e}")
+
+    # ---------------------------------------------------
+    # Lookup
+    # ---------------------------------------------------
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Public view of a job (``to_dict``) with ``user_id``, or None if unknown.
+
+        Raises :class:`ReplyJobLookupFailed` when the job has to be read from
+        ``ai_reply_jobs`` and that fails.
+        """
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return {**job.to_dict(), "user_id": job.user_id}
+        if not self.durable:
+            return None
+        db = self._db()
+        if db is None:
+            return None
+        try:
+            rows = (await db.table(TABLE).select("*").eq("id", job_id).limit(1).execute()).data
+        except Exception as e:
+            # Not "unknown": the job may well exist, so do not answer 404
+            logger.warning(f"Could not look up AI reply job {job_id}: {e}")
+            raise ReplyJobLookupFailed(str(e)) from e
+        return {**_row_to_dict(rows[0]), "user_id": rows[0].get("user_id")} if rows else None
+
+    async def wait(self, job_id: str, timeout: float, poll_interval: float = 0.5) -> Optional[Dict[str, Any]]:
+        """Like :meth:`get`, but first waits up to *timeout* seconds for the job to finish."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            try:
+                await asyncio.wait_for(job.done.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            return await self.get(job_id)
+        deadline = time.monotonic() + timeout
+        while True:
+            view = await self.get(job_id)
+            if view is None or view["status"] in ("completed", "failed") or time.monotonic() >= deadline:
+                return view
+            await asyncio.sleep(min(poll_interval, max(deadline - time.monotonic(), 0)))
+
+    def _prune(self) -> None:
+        cutoff = time.monotonic() - self.result_ttl_seconds
+        for job_id in list(self._jobs):
+            job = self._jobs[job_id]
+            if job.finished is None:
+                continue
+            if job.finished < cutoff or len(self._jobs) > MAX_FINISHED:
+                del self._jobs[job_id]
+
+    # ---------------------------------------------------
+    # Workers
+    # ---------------------------------------------------
+    async def _worker(self) -> None:
+        while True:
+            _rank, _seq, job = await self._queue.get()
+            self._queued_by_priority[job.priority] -= 1
+            try:
+                await self._run(job)
+            except Exception as e:
+                logger.error(f"AI reply worker failed on job {job.id}: {e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: ReplyJob) -> None:
+        if self.durable and not await self._claim(job):
+            # Another worker process took it (restart recovery races)
+            self._jobs.pop(job.id, None)
+            return
+        job.status = "running"
+        job.started = time.monotonic()
+        self._running += 1
+        try:
+            job.result = await self._handler(job.ticket_id, job.prompt)
+            job.status = "completed"
+            self._stats["completed"] += 1
+        except Exception as e:
+            logger.error(f"AI reply job {job.id} for ticket {job.ticket_id} failed: {e}", exc_info=True)
+            job.status = "failed"
+            job.error = "Failed to generate AI reply"
+            self._stats["failed"] += 1
+        finally:
+            self._running -= 1
+            job.finished = time.monotonic()
+            self._record_timing(job)
+        if self.durable:
+            await self._finish(job)
+        job.done.set()
+
+    async def _claim(self, job: ReplyJob) -> bool:
+        db = self._db()
+        if db is None:
+            return True
+        try:
+            res = await (
+                db.table(TABLE)
+                .update({"status": "running", "started_at": _now().isoformat()})
+                .eq("id", job.id)
+                .eq("status", "queued")
+                .execute()
+            )
+        except Exception as e:
+            logger.warning(f"Could not claim AI reply job {job.id}, running it anyway: {e}")
+            return True
+        # A job whose insert failed has no row; run it here
+        return bool(res.data) or not await self._exists(db, job.id)
+
+    @staticmethod
+    async def _exists(db, job_id: str) -> bool:
+        try:
+            return bool((await db.table(TABLE).select("id").eq("id", job_id).limit(1).execute()).data)
+        except Exception:
+            return False
+
+    async def _finish(self, job: ReplyJob) -> None:
+        db = self._db()
+        if db is None:
+            return
+        try:
+            await db.table(TABLE).update({
+                "status": job.status,
+                "result": job.result,
+                "error": job.error,
+                "finished_at": _now().isoformat(),
+            }).eq("id", job.id).execute()
+        except Exception as e:
+            logger.warning(f"Could not store the outcome of AI reply job {job.id}: {e}")
+
+    # ---------------------------------------------------
+    # Metrics
+    # ---------------------------------------------------
+    def _record_timing(self, job: ReplyJob) -> None:
+        self._wait_ms = (self._wait_ms + [(job.started - job.enqueued) * 1000])[-self.window:]
+        self._run_ms = (self._run_ms + [(job.finished - job.started) * 1000])[-self.window:]
+
+    @staticmethod
+    def _percentiles(samples: List[float]) -> Dict[str, Optional[float]]:
+        if not samples:
+            return {"p50": None, "p95": None, "p99": None}
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+        return {"p50": round(float(p50), 1), "p95": round(float(p95), 1), "p99": round(float(p99), 1)}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "durable": self.durable,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "queued_by_priority": {p: self._queued_by_priority[p] for p in PRIORITY_RANK},
+            "running": self._running,
+            "max_queued": self.max_queued,
+            **self._stats,
+            "wait_ms": self._percentiles(self._wait_ms),
+            "run_ms": self._percentiles(self._run_ms),
+        }
+
+    def reset_stats(self) -> None:
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "recovered": 0}
+        self._wait_ms: List[float] = []
+        self._run_ms: List[float] = []
+
+
+# Global instance
+reply_jobs = ReplyJobQueue(
+    workers=settings.ai_reply_job_workers,
+    max_queued=settings.ai_reply_job_max_queued,
+    durable=settings.ai_reply_jobs_durable,
+    result_ttl_seconds=settings.ai_reply_job_result_ttl_seconds,
+    timeout_seconds=settings.ai_reply_job_timeout_seconds,
+)
@@ -0,0 +1,259 @@
+"""Semantic cache of approved AI answers for repeated customer questions.
+
+Customers ask the same thing again ("how do I reset my password", "where is
+my refund"), often across tickets and email threads. When a customer rates an AI reply at least
+``SEMANTIC_CACHE_MIN_RATING``, the reply is stored in ``response_cache``
+together with the embedding of the customer message it answered. Before the
+next AI reply is generated, the latest customer message is embedded and
+``match_cached_response`` looks for an approved answer above
+``SEMANTIC_CACHE_THRESHOLD`` similarity; on a hit that answer is used and the
+LLM is not called.
+
+Entries are scoped by ticket ``context`` (the brand/product the ticket is
+for), by customer and by knowledge base version. A reply is written with
+the customer's conversation in the prompt and can carry their name, order
+numbers or other details sanitisation does not remove, so it is only ever
+served again to the customer whose ticket it answered. The document
+endpoints call :meth:`SemanticResponseCache.invalidate` after every KB
+change, which starts a new version and drops answers grounded in the old
+content. Entries also
+expire after ``SEMANTIC_CACHE_TTL_SECONDS``, and a low rating removes the
+answer again.
+
+A reply sent from the cache records the entry in ``messages.cached_response_id``.
+Rating it well stores nothing new (the answer is already cached), and
+rating it poorly removes that entry. The cache is opt-in
+(``SEMANTIC_CACHE_ENABLED``).
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.config import settings
+from app.logger import setup_logger
+from app.supabase_config import supabase
+
+logger = setup_logger(__name__)
+
+TABLE = "response_cache"
+
+# Only the start of a long message is embedded, as for RAG lookups
+QUESTION_CHARS = 1000
+
+
+def _parse_timestamp(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class SemanticResponseCache:
+    """Approved answers looked up by question similarity."""
+
+    def __init__(
+        self,
+        client=None,
+        *,
+        enabled: bool = False,
+        threshold: float = 0.92,
+        ttl_seconds: float = 7 * 24 * 3600,
+        min_rating: int = 4,
+        async_client_factory: Optional[Callable[[], Any]] = None,
+        embed: Optional[Callable[[str], List[float]]] = None,
+        aembed: Optional[Callable[[str], Awaitable[List[float]]]] = None,
+    ):
+        self.client = client if client is not None else supabase
+        self.enabled = enabled
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.min_rating = min_rating
+        self._async_client_factory = async_client_factory
+        self._embed = embed
+        self._aembed = aembed
+        self.reset_stats()
+
+    # ---------------------------------------------------
+    # Lookup (before generating a reply)
+    # ---------------------------------------------------
+    async def alookup(
+        self, context: Optional[str], question: Optional[str], user_id: Optional[str]
+    ) -> Optional[Dict[str, Any]]:
+        """Best answer approved by customer *user_id* for *question* in *context*, or None.
+
+        Returns the ``match_cached_response`` row (``id``, ``question``,
+        ``answer``, ``similarity``). Failures are logged and treated as a miss.
+        """
+        if not self.enabled or not context or not user_id or not question or not question.strip():
+            return None
+        db = self._async_client()
+        if db is None:
+            return None
+        try:
+            if self._aembed is None:
+                from app.embedding_service import aembed_text
+
+                self._aembed = aembed_text
+            vector = await self._aembed(question[:QUESTION_CHARS])
+            result = await db.rpc(
+                "match_cached_response",
+                {
+                    "query_embedding": vector,
+                    "p_context": context,
+                    "p_user_id": user_id,
+                    "match_threshold": self.threshold,
+                },
+            ).execute()
+        except Exception as e:
+            self._stats["errors"] += 1
+            logger.warning(f"Semantic cache lookup failed, generating instead: {e}")
+            return None
+        self._stats["lookups"] += 1
+        rows = result.data or []
+        if not rows:
+            self._stats["misses"] += 1
+            return None
+        hit = rows[0]
+        self._stats["hits"] += 1
+        self._stats["similarity_sum"] += float(hit.get("similarity") or 0.0)
+        logger.info(f"Semantic cache hit ({hit.get('similarity', 0):.3f}) for context '{context}'")
+        return hit
+
+    def _async_client(self):
+        if self._async_client_factory is None:
+            from app.async_db import get_async_db
+
+            self._async_client_factory = get_async_db
+        return self._async_client_factory()
+
+    # ---------------------------------------------------
+    # Approval (from customer ratings)
+    # ---------------------------------------------------
+    def record_rating(self, ticket: Dict[str, Any], message: Dict[str, Any], rating: int) -> None:
+        """Cache *message* on a good rating, drop it on a bad one."""
+        if not self.enabled or self.client is None:
+            return
+        if rating >= self.min_rating:
+            self.approve(ticket, message)
+        else:
+            self.revoke(message["id"], message.get("cached_response_id"))
+
+    def approve(self, ticket: Dict[str, Any], message: Dict[str, Any]) -> bool:
+        """Store AI *message* as the answer to the customer message before it."""
+        if message.get("cached_response_id"):
+            # Sent from the cache: the answer is stored already
+            self._stats["skipped_reused"] += 1
+            return False
+        try:
+            question_res = (
+                self.client.table("messages")
+                .select("message")
+                .eq("ticket_id", ticket["id"])
+                .eq("sender", "customer")
+                .lt("created_at", message["created_at"])
+                .order("created_at", desc=True)
+                .limit(1)
+                .execute()
+            )
+            if not question_res.data or not ticket.get("context") or not ticket.get("user_id"):
+                return False
+            question = question_res.data[0]["message"]
+
+            version, changed_at = self._kb_state()
+            if changed_at is not None and _parse_timestamp(message["created_at"]) < changed_at:
+                # The answer was written against a knowledge base that has since changed
+                self._stats["skipped_stale"] += 1
+                return False
+
+            if self._embed is None:
+                from app.embedding_service import embed_text
+
+                self._embed = embed_text
+            expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl_seconds)
+            self.client.table(TABLE).upsert(
+                {
+                    "context": ticket["context"],
+                    "user_id": ticket["user_id"],
+                    "kb_version": version,
+                    "question": question,
+                    "embedding": self._embed(question[:QUESTION_CHARS]),
+                    "answer": message["message"],
+                    "source_message_id": message["id"],
+                    "expires_at": expires_at.isoformat(),
+                },
+                on_conflict="source_message_id",
+                ignore_duplicates=True,
+            ).execute()
+        except Exception as e:
+            logger.warning(f"Could not cache approved answer {message.get('id')}: {e}")
+            return False
+        self._stats["stored"] += 1
+        return True
+
+    def revoke(self, message_id: str, entry_id: Optional[str] = None) -> None:
+        """Drop the answer cached from *message_id*, or entry *entry_id* it was sent from."""
+        try:
+            query = self.client.table(TABLE).delete()
+            if entry_id:
+                query.eq("id", entry_id).execute()
+            else:
+                query.eq("source_message_id", message_id).execute()
+            self._stats["revoked"] += 1
+        except Exception as e:
+            logger.warning(f"Could not remove cached answer {message_id}: {e}")
+
+    def _kb_state(self):
+        result = self.client.table("knowledge_base_state").select("version, updated_at").limit(1).execute()
+        if not result.data:
+            return 0, None
+        row = result.data[0]
+        updated_at = row.get("updated_at")
+        return row.get("version") or 0, _parse_timestamp(updated_at) if updated_at else None
+
+    # ---------------------------------------------------
+    # Invalidation (knowledge base changed)
+    # ---------------------------------------------------
+    def invalidate(self) -> Optional[int]:
+        """Start a new KB version, dropping every answer cached under older ones.
+
+        Runs even while the cache is disabled, so answers stored before it
+        was switched off cannot come back stale when it is switched on.
+        """
+        if self.client is None:
+            return None
+        try:
+            result = self.client.rpc("bump_kb_version", {}).execute()
+        except Exception as e:
+            if self.enabled:
+                logger.warning(f"Could not invalidate the semantic response cache: {e}")
+            return None
+        self._stats["invalidations"] += 1
+        return result.data[0]["version"] if result.data else None
+
+    # ---------------------------------------------------
+    # Metrics
+    # ---------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        s = dict(self._stats)
+        similarity_sum = s.pop("similarity_sum")
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            **s,
+            "hit_rate": round(s["hits"] / s["lookups"], 3) if s["lookups"] else None,
+            "avg_hit_similarity": round(similarity_sum / s["hits"], 3) if s["hits"] else None,
+            "llm_calls_saved": s["hits"],
+        }
+
+    def reset_stats(self) -> None:
+        self._stats = {
+            "lookups": 0, "hits": 0, "misses": 0, "errors": 0, "stored": 0, "skipped_stale": 0, "skipped_reused": 0,
+            "revoked": 0, "invalidations": 0, "similarity_sum": 0.0,
+        }
+
+
+# Global instance
+response_cache = SemanticResponseCache(
+    enabled=settings.semantic_cache_enabled,
+    threshold=settings.semantic_cache_threshold,
+    ttl_seconds=settings.semantic_cache_ttl_seconds,
+    min_rating=settings.semantic_cache_min_rating,
+)
@@ -1,9 +1,24 @@
-"""Admin endpoints: ticket management, assignment, close, delete, trash, restore."""
+"""Admin endpoints: ticket management, assignment, close, delete, trash, restore, DB, cache and LLM stats."""
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from datetime import datetime, timezone
 from app.supabase_config import supabase
+from app.config import settings
+from app.db_instrumentation import route_db_summary
+from app.compliance_cache import compliance_cache
+from app.compliance_jobs import compliance_jobs
+from app.context_packer import context_packer
+from app.conversation_memory import conversation_memory
+from app.embedding_cache import embedding_cache
+from app.llm_gateway import llm_gateway
 from app.logger import setup_logger
+from app.reference_cache import reference_cache
+from app.reply_jobs import reply_jobs
+from app.response_cache import response_cache
+from app.streaming import stream_stats
+from app.write_buffer import buffered_writer
+from app.workflow_cache import workflow_step_cache
+from app.ticket_repository import ticket_repository
 from app.dependencies import get_current_user, get_current_admin, require_admin
 from app.schemas import AdminReplyRequest, AssignAdminRequest, DeleteTicketsRequest, RestoreTicketsRequest
 
@@ -11,7 +26,7 @@ logger = setup_logger(__name__)
 router = APIRouter()
 
 @router.get("/admin/tickets")
-def admin_get_all_tickets(
+async def admin_get_all_tickets(
     search: str = Query(default=None, description="Search in subject and message content"),
     filter_status: str = Query(default=None, description="Filter by status (open, human_assigned, closed)"),
     context: str = Query(default=None, description="Filter by context/brand"),
@@ -20,6 +35,7 @@ def admin_get_all_tickets(
     date_to: str = Query(default=None, description="Filter to date (ISO format: YYYY-MM-DD)"),
     page: int = Query(default=1, ge=1, description="Page number (1-indexed)"),
     page_size: int = Query(default=10, ge=1, le=100, description="Number of items per page"),
+    cursor: str = Query(default=None, description="Opaque cursor from a previous response's next_cursor"),
     current_admin: dict = Depends(get_current_admin)
 ):
     """
@@ -28,77 +44,25 @@ def admin_get_all_tickets(
     Supports:
     - Full-text search in subject and message content
     - Filter by status, context, assigned agent, date range
-    - Pagination with page and page_size parameters
+    - Cursor pagination via next_cursor (page/page_size still supported)
     """
     try:
-        if supabase is None:
+        if not ticket_repository.is_configured:
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail="Database not configured",
             )
         
-        query = supabase.table("tickets").select("*", count="exact")
-        
-        # Exclude deleted tickets by default
-        query = query.eq("is_deleted", False)
-        
-        # Apply filters
-        if filter_status:
-            query = query.eq("status", filter_status)
-        if context:
-            query = query.eq("context", context)
-        if assigned_to:
-            query = query.eq("assigned_to", assigned_to)
-        if date_from:
-            query = query.gte("created_at", f"{date_from}T00:00:00Z")
-        if date_to:
-            query = query.lte("created_at", f"{date_to}T23:59:59Z")
-        
-        # Get total count before pagination (for search we'll need to handle differently)
-        base_res = query.order("updated_at", desc=True).execute()
-        all_tickets = base_res.data
-        
-        # If search is provided, filter by subject and message content
-        if search:
-            filtered_tickets = []
-            search_lower = search.lower()
-            for ticket in all_tickets:
-                # Check if search matches subject
-                if search_lower in ticket.get("subject", "").lower():
-                    filtered_tickets.append(ticket)
-                    continue
-                
-                # Check if search matches any message in the ticket
-                messages_res = (
-                    supabase.table("messages")
-                    .select("message")
-                    .eq("ticket_id", ticket["id"])
-                    .execute()
-                )
-                for msg in messages_res.data:
-                    if search_lower in msg.get("message", "").lower():
-                        filtered_tickets.append(ticket)
-                        break
-            
-            all_tickets = filtered_tickets
-        
-        # Calculate pagination
-        total_count = len(all_tickets)
-        total_pages = (total_count + page_size - 1) // page_size if total_count > 0 else 0
-        skip = (page - 1) * page_size
-        tickets = all_tickets[skip:skip + page_size]
-        
-        return {
-            "tickets": tickets,
-            "pagination": {
-                "page": page,
-                "page_size": page_size,
-                "total_count": total_count,
-                "total_pages": total_pages,
-                "has_next": page < total_pages,
-                "has_prev": page > 1
-            }
-        }
+        filters = {"status": filter_status, "context": context, "assigned_to": assigned_to}
+        return await ticket_repository.page_tickets(
+            filters,
+            search=search,
+            date_from=date_from,
+            date_to=date_to,
+            page=page,
+            page_size=page_size,
+            cursor=cursor,
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -107,7 +71,7 @@ def admin_get_all_tickets(
 
 
 @router.get("/admin/tickets/assigned")
-def get_assigned_tickets(
+async def get_assigned_tickets(
     search: str = Query(default=None, description="Search in subject and message content"),
     filter_status: str = Query(default=None, description="Filter by status (open, human_assigned, closed)"),
     context: str = Query(default=None, description="Filter by context/brand"),
@@ -115,6 +79,7 @@ def get_assigned_tickets(
     date_to: str = Query(default=None, description="Filter to date (ISO format: YYYY-MM-DD)"),
     page: int = Query(default=1, ge=1, description="Page number (1-indexed)"),
     page_size: int = Query(default=10, ge=1, le=100, description="Number of items per page"),
+    cursor: str = Query(default=None, description="Opaque cursor from a previous response's next_cursor"),
     current_admin: dict = Depends(get_current_admin)
 ):
     """
@@ -123,75 +88,29 @@ def get_assigned_tickets(
     Supports:
     - Full-text search in subject and message content
     - Filter by status, context, date range
-    - Pagination with page and page_size parameters
+    - Cursor pagination via next_cursor (page/page_size still supported)
     """
     try:
-        if supabase is None:
+        if not ticket_repository.is_configured:
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail="Database not configured",
             )
         
-        admin_email = current_admin["email"]
-        query = supabase.table("tickets").select("*", count="exact").eq("assigned_to", admin_email)
-        
-        # Exclude deleted tickets by default
-        query = query.eq("is_deleted", False)
-        
-        # Apply filters
-        if filter_status:
-            query = query.eq("status", filter_status)
-        if context:
-            query = query.eq("context", context)
-        if date_from:
-            query = query.gte("created_at", f"{date_from}T00:00:00Z")
-        if date_to:
-            query = query.lte("created_at", f"{date_to}T23:59:59Z")
-        
-        res = query.order("updated_at", desc=True).execute()
-        all_tickets = res.data
-        
-        # If search is provided, filter by subject and message content
-        if search:
-            filtered_tickets = []
-            search_lower = search.lower()
-            for ticket in all_tickets:
-                # Check if search matches subject
-                if search_lower in ticket.get("subject", "").lower():
-                    filtered_tickets.append(ticket)
-                    continue
-                
-                # Check if search matches any message in the ticket
-                messages_res = (
-                    supabase.table("messages")
-                    .select("message")
-                    .eq("ticket_id", ticket["id"])
-                    .execute()
-                )
-                for msg in messages_res.data:
-                    if search_lower in msg.get("message", "").lower():
-                        filtered_tickets.append(ticket)
-                        break
-            
-            all_tickets = filtered_tickets
-        
-        # Calculate pagination
-        total_count = len(all_tickets)
-        total_pages = (total_count + page_size - 1) // page_size if total_count > 0 else 0
-        skip = (page - 1) * page_size
-        tickets = all_tickets[skip:skip + page_size]
-        
-        return {
-            "tickets": tickets,
-            "pagination": {
-                "page": page,
-                "page_size": page_size,
-                "total_count": total_count,
-                "total_pages": total_pages,
-                "has_next": page < total_pages,
-                "has_prev": page > 1
-            }
+        filters = {
+            "assigned_to": current_admin["email"],
+            "status": filter_status,
+            "context": context,
         }
+        return await ticket_repository.page_tickets(
+            filters,
+            search=search,
+            date_from=date_from,
+            date_to=date_to,
+            page=page,
+            page_size=page_size,
+            cursor=cursor,
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -712,3 +631,96 @@ def permanently_delete_tickets(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to permanently delete tickets",
         )
+
+
+@router.get("/admin/db-stats")
+def get_db_stats(current_admin: dict = Depends(get_current_admin)):
+    """Per-route database round trips and latency since startup (or last reset), plus write buffer counters."""
+    return {
+        "budgets": {
+            "round_trips": settings.db_round_trip_budget,
+            "latency_ms": settings.db_latency_budget_ms,
+        },
+        "routes": route_db_summary.snapshot(),
+        "write_buffer": buffered_writer.stats(),
+    }
+
+
+@router.delete("/admin/db-stats")
+def reset_db_stats(current_admin: dict = Depends(get_current_admin)):
+    """Clear the per-route database summary."""
+    route_db_summary.reset()
+    return {"success": True}
+
+
+@router.get("/admin/cache-stats")
+def get_cache_stats(current_admin: dict = Depends(get_current_admin)):
+    """Reference table, embedding, semantic response, workflow step and compliance result cache counters."""
+    return {
+        "reference_cache": reference_cache.stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "workflow_step_cache": workflow_step_cache.stats(),
+        "compliance_cache": compliance_cache.stats(),
+    }
+
+
+@router.delete("/admin/cache-stats")
+def reset_cache_stats(current_admin: dict = Depends(get_current_admin)):
+    """Drop every cached reference table and in-memory embedding, step output and verdict; reset the counters."""
+    reference_cache.invalidate()
+    reference_cache.reset_stats()
+    embedding_cache.clear()
+    embedding_cache.reset_stats()
+    response_cache.reset_stats()
+    workflow_step_cache.clear()
+    workflow_step_cache.reset_stats()
+    compliance_cache.clear()
+    compliance_cache.reset_stats()
+    return {"success": True}
+
+
+@router.get("/admin/stream-stats")
+def get_stream_stats(current_admin: dict = Depends(get_current_admin)):
+    """Time to first token and duration percentiles of streamed AI replies."""
+    return {"streams": stream_stats.snapshot()}
+
+
+@router.delete("/admin/stream-stats")
+def reset_stream_stats(current_admin: dict = Depends(get_current_admin)):
+    """Clear the streamed reply samples and counters."""
+    stream_stats.reset()
+    return {"success": True}
+
+
+@router.get("/admin/llm-stats")
+def get_llm_stats(current_admin: dict = Depends(get_current_admin)):
+    """OpenAI gateway counters and prompt sizes (conversation history, knowledge base context)."""
+    return {
+        "llm_gateway": llm_gateway.stats(),
+        "conversation_memory": conversation_memory.stats(),
+        "rag_context": context_packer.stats(),
+    }
+
+
+@router.delete("/admin/llm-stats")
+def reset_llm_stats(current_admin: dict = Depends(get_current_admin)):
+    """Reset the gateway and prompt size counters (in-flight and queued gauges are kept)."""
+    llm_gateway.reset_stats()
+    conversation_memory.reset_stats()
+    context_packer.reset_stats()
+    return {"success": True}
+
+
+@router.get("/admin/job-stats")
+def get_job_stats(current_admin: dict = Depends(get_current_admin)):
+    """Background AI reply jobs (queue depth per priority, running jobs, wait and run times) and compliance batch jobs."""
+    return {"reply_jobs": reply_jobs.stats(), "compliance_batches": compliance_jobs.stats()}
+
+
+@router.delete("/admin/job-stats")
+def reset_job_stats(current_admin: dict = Depends(get_current_admin)):
+    """Reset the job counters and timing samples (queue depth is kept)."""
+    reply_jobs.reset_stats()
+    compliance_jobs.reset_stats()
+    return {"success": True}
@@ -1,31 +1,29 @@
 """Compliance router — create requirement templates and evaluate documents."""
 
-import json
-from fastapi import APIRouter, Depends, HTTPException
+from typing import AsyncIterator, Optional
 
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import JSONResponse
+
+from app.async_db import get_async_db
+from app.compliance_engine import compliance_engine, evaluation_row
+from app.compliance_jobs import BatchTooLarge, compliance_jobs
 from app.dependencies import get_current_admin
 from app.supabase_config import supabase
 from app.logger import setup_logger
+from app.pagination import apply_keyset, split_page
 from app.schemas import (
+    BatchEvaluateRequest,
     ComplianceTemplateRequest,
     EvaluateRequest,
     RequirementResult,
     EvaluationResponse,
 )
-from app.embedding_service import embed_text
-from app.helpers import client as openai_client
+from app.streaming import sse_event, sse_response
 
 logger = setup_logger(__name__)
 router = APIRouter(prefix="/compliance", tags=["Compliance"])
 
-EVAL_SYSTEM_PROMPT = (
-    "You are a compliance auditor. You will receive a requirement description and "
-    "relevant excerpts from a document. Evaluate whether the document satisfies the "
-    "requirement. Return JSON with fields: status (pass|fail|partial|not_applicable), "
-    "reasoning (one sentence), confidence (float 0-1), evidence (quote from document "
-    "or empty string)."
-)
-
 
 # ------------------------------------------------------------------
 # Templates CRUD
@@ -74,112 +72,45 @@ def get_template(template_id: str, current_user: dict = Depends(get_current_admi
 
 # ------------------------------------------------------------------
 # Evaluate a document against a template
+# Requirements are evaluated concurrently by compliance_engine.
 # ------------------------------------------------------------------
-@router.post("/evaluate", response_model=EvaluationResponse)
-def evaluate_document(
-    body: EvaluateRequest,
-    current_user: dict = Depends(get_current_admin),
-):
-    tmpl = (
-        supabase.table("compliance_templates")
-        .select("*")
+def _async_db():
+    db = get_async_db()
+    if db is None:
+        raise HTTPException(503, "Supabase is not configured")
+    return db
+
+
+async def _load_evaluation_inputs(db, body: EvaluateRequest) -> tuple[list[dict], Optional[str]]:
+    """Template requirements and the document's content hash."""
+    tmpl = await (
+        db.table("compliance_templates")
+        .select("requirements")
         .eq("id", body.template_id)
         .limit(1)
         .execute()
     )
     if not tmpl.data:
         raise HTTPException(404, "Template not found")
-    template = tmpl.data[0]
-    requirements = template["requirements"]
 
-    doc = (
-        supabase.table("knowledge_documents")
-        .select("id, title")
+    doc = await (
+        db.table("knowledge_documents")
+        .select("id, content_hash")
         .eq("id", body.document_id)
         .limit(1)
         .execute()
     )
     if not doc.data:
         raise HTTPException(404, "Document not found in knowledge base")
+    return tmpl.data[0]["requirements"], doc.data[0].get("content_hash")
 
-    results: list[RequirementResult] = []
-    pass_count = 0
-
-    for req in requirements:
-        query_text = f"{req['title']} {req['description']}"
-        query_vec = embed_text(query_text)
-
-        rpc = supabase.rpc(
-            "match_chunks",
-            {
-                "query_embedding": query_vec,
-                "match_count": 3,
-                "match_threshold": 0.5,
-            },
-        ).execute()
-
-        relevant_chunks = [
-            r for r in (rpc.data or []) if r["document_id"] == body.document_id
-        ]
-
-        context = "\n\n".join(c["content"] for c in relevant_chunks) or "(No relevant sections found.)"
-
-        try:
-            completion = openai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": EVAL_SYSTEM_PROMPT},
-                    {
-                        "role": "user",
-                        "content": (
-                            f"Requirement: {req['title']}\n"
-                            f"Description: {req['description']}\n\n"
-                            f"Document excerpts:\n{context}"
-                        ),
-                    },
-                ],
-                response_format={"type": "json_object"},
-            )
-            raw = completion.choices[0].message.content
-            parsed = json.loads(raw)
-            result = RequirementResult(
-                requirement_id=req["id"],
-                status=parsed.get("status", "fail"),
-                reasoning=parsed.get("reasoning", ""),
-                confidence=float(parsed.get("confidence", 0.0)),
-                evidence=parsed.get("evidence", ""),
-            )
-        except Exception as e:
-            logger.error(f"Evaluation failed for requirement {req['id']}: {e}")
-            result = RequirementResult(
-                requirement_id=req["id"],
-                status="fail",
-                reasoning=f"Evaluation error: {e}",
-                confidence=0.0,
-            )
 
-        if result.status in ("pass", "partial"):
-            pass_count += 1
-        results.append(result)
-
-    total = len(requirements) or 1
-    overall_score = round(pass_count / total, 2)
-
-    summary_lines = [f"Overall compliance: {overall_score * 100:.0f}%"]
-    fails = [r for r in results if r.status == "fail"]
-    if fails:
-        summary_lines.append(f"{len(fails)} requirement(s) failed.")
-    summary = " ".join(summary_lines)
-
-    eval_row = {
-        "template_id": body.template_id,
-        "document_id": body.document_id,
-        "results": [r.model_dump() for r in results],
-        "overall_score": overall_score,
-        "summary": summary,
-        "evaluated_by": current_user["id"],
-    }
-    insert = supabase.table("compliance_evaluations").insert(eval_row).execute()
+async def _store_evaluation(
+    db, body: EvaluateRequest, results: list[RequirementResult], reused: list[str], user_id: str
+) -> EvaluationResponse:
+    reused_ids = set(reused)
+    eval_row = evaluation_row(body.template_id, body.document_id, results, user_id)
+    insert = await db.table("compliance_evaluations").insert(eval_row).execute()
     eval_id = insert.data[0]["id"] if insert.data else "unknown"
 
     return EvaluationResponse(
@@ -187,23 +118,156 @@ def evaluate_document(
         document_id=body.document_id,
         template_id=body.template_id,
         results=results,
-        overall_score=overall_score,
-        summary=summary,
+        overall_score=eval_row["overall_score"],
+        summary=eval_row["summary"],
+        reused=reused,
+        recomputed=[r.requirement_id for r in results if r.requirement_id not in reused_ids],
     )
 
 
+@router.post("/evaluate", response_model=EvaluationResponse)
+async def evaluate_document(
+    body: EvaluateRequest,
+    current_user: dict = Depends(get_current_admin),
+):
+    db = _async_db()
+    requirements, content_hash = await _load_evaluation_inputs(db, body)
+    results, reused = await compliance_engine.evaluate_all(body.document_id, requirements, content_hash)
+    return await _store_evaluation(db, body, results, reused, current_user["id"])
+
+
+async def _evaluation_events(
+    db, body: EvaluateRequest, requirements: list[dict], content_hash: Optional[str], user_id: str
+) -> AsyncIterator[str]:
+    total = len(requirements)
+    yield sse_event("evaluation", {"template_id": body.template_id, "document_id": body.document_id, "total": total})
+    results: list[Optional[RequirementResult]] = [None] * total
+    reused: list[str] = []
+    completed = 0
+    try:
+        async for index, result, was_cached in compliance_engine.evaluate(body.document_id, requirements, content_hash):
+            results[index] = result
+            if was_cached:
+                reused.append(result.requirement_id)
+            completed += 1
+            yield sse_event(
+                "requirement",
+                {
+                    "index": index,
+                    "completed": completed,
+                    "total": total,
+                    "reused": was_cached,
+                    "result": result.model_dump(),
+                },
+            )
+        evaluation = await _store_evaluation(db, body, results, reused, user_id)
+    except Exception as e:
+        logger.error(f"Streamed compliance evaluation failed: {e}", exc_info=True)
+        yield sse_event("error", {"detail": "Compliance evaluation failed"})
+        return
+    yield sse_event("done", evaluation.model_dump())
+
+
+@router.post("/evaluate/stream")
+async def evaluate_document_stream(
+    body: EvaluateRequest,
+    current_user: dict = Depends(get_current_admin),
+):
+    """Streaming variant of ``POST /compliance/evaluate``.
+
+    Sends ``evaluation`` (``{template_id, document_id, total}``), then one
+    ``requirement`` event per requirement as it finishes (``{index,
+    completed, total, reused, result}``; reused verdicts first), and finally
+    ``done`` with the stored evaluation (or ``error``).
+    """
+    db = _async_db()
+    requirements, content_hash = await _load_evaluation_inputs(db, body)
+    return sse_response(_evaluation_events(db, body, requirements, content_hash, current_user["id"]))
+
+
+# ------------------------------------------------------------------
+# Batch evaluation: every document against every template, as a background job
+# ------------------------------------------------------------------
+# Ids per lookup query; keeps the PostgREST query string well under URL limits
+LOOKUP_CHUNK = 100
+
+
+async def _fetch_by_ids(db, table: str, columns: str, ids: list[str]) -> list[dict]:
+    rows: dict[str, dict] = {}
+    for start in range(0, len(ids), LOOKUP_CHUNK):
+        result = await db.table(table).select(columns).in_("id", ids[start:start + LOOKUP_CHUNK]).execute()
+        rows.update((row["id"], row) for row in result.data or [])
+    missing = [i for i in ids if i not in rows]
+    if missing:
+        raise HTTPException(404, f"Not found in {table}: {', '.join(missing)}")
+    return [rows[i] for i in ids]
+
+
+@router.post("/batch", status_code=status.HTTP_202_ACCEPTED)
+async def evaluate_batch(
+    body: BatchEvaluateRequest,
+    current_user: dict = Depends(get_current_admin),
+):
+    """Evaluate every document against every template in the background.
+
+    Answers ``202`` with the job id; progress and the stored evaluation ids
+    are polled from ``GET /compliance/batch/{job_id}``.
+    """
+    document_ids = list(dict.fromkeys(body.document_ids))
+    template_ids = list(dict.fromkeys(body.template_ids))
+    if len(document_ids) * len(template_ids) > compliance_jobs.max_pairs:
+        raise HTTPException(
+            422, f"At most {compliance_jobs.max_pairs} document/template pairs per batch"
+        )
+    db = _async_db()
+    templates = await _fetch_by_ids(db, "compliance_templates", "id, requirements", template_ids)
+    documents = await _fetch_by_ids(db, "knowledge_documents", "id, content_hash", document_ids)
+    try:
+        job = compliance_jobs.submit(templates, documents, current_user["id"])
+    except BatchTooLarge as e:
+        raise HTTPException(422, str(e))
+    poll_url = f"/compliance/batch/{job.id}"
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={
+            "job_id": job.id,
+            "status": job.status,
+            "total": len(job.pairs),
+            "poll_url": poll_url,
+        },
+        headers={"Location": poll_url},
+    )
+
+
+@router.get("/batch/{job_id}")
+async def get_batch(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=30, description="Seconds to wait for the job to finish before answering"),
+    current_user: dict = Depends(get_current_admin),
+):
+    """Progress of a batch job and, per pair, its status and stored evaluation id."""
+    job = await compliance_jobs.wait(job_id, wait) if wait else compliance_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Batch job not found")
+    job.pop("user_id")
+    return job
+
+
 # ------------------------------------------------------------------
 # List / get evaluations
 # ------------------------------------------------------------------
 @router.get("/evaluations")
-def list_evaluations(current_user: dict = Depends(get_current_admin)):
-    result = (
-        supabase.table("compliance_evaluations")
-        .select("id, template_id, document_id, overall_score, summary, evaluated_at")
-        .order("evaluated_at", desc=True)
-        .execute()
+def list_evaluations(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None),
+    current_user: dict = Depends(get_current_admin),
+):
+    query = supabase.table("compliance_evaluations").select(
+        "id, template_id, document_id, overall_score, summary, evaluated_at"
     )
-    return {"evaluations": result.data or []}
+    result = apply_keyset(query, limit=limit, cursor=cursor, sort_column="evaluated_at").execute()
+    evaluations, next_cursor = split_page(result.data or [], limit, "evaluated_at")
+    return {"evaluations": evaluations, "next_cursor": next_cursor}
 
 
 @router.get("/evaluations/{evaluation_id}")
@@ -5,6 +5,8 @@ from datetime import datetime, timezone
 from app.supabase_config import supabase
 from app.config import settings
 from app.logger import setup_logger
+from app.reference_cache import reference_cache
+from app.pagination import apply_keyset, split_page
 from app.dependencies import get_current_user, get_current_admin
 from app.email_service import email_service
 from app.email_polling_service import email_polling_service
@@ -95,6 +97,7 @@ def create_email_account(
             )
             logger.info(f"Created email account: {req.email} by {current_admin['email']}")
         
+        reference_cache.invalidate("email_accounts")
         return {"success": True, "account": result.data[0] if result.data else None}
         
     except HTTPException:
@@ -248,6 +251,7 @@ def enable_email_polling(
             .execute()
         )
         
+        reference_cache.invalidate("email_accounts")
         logger.info(f"Enabled IMAP polling for account {account.get('email')} by {current_admin['email']}")
         
         return {
@@ -307,6 +311,7 @@ def disable_email_polling(
             .execute()
         )
         
+        reference_cache.invalidate("email_accounts")
         logger.info(f"Disabled IMAP polling for account {account.get('email')} by {current_admin['email']}")
         
         return {
@@ -928,9 +933,11 @@ def create_email_template(
 def list_email_templates(
     template_type: str | None = Query(None),
     is_active: bool | None = Query(None),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = Query(None),
     current_admin: dict = Depends(get_current_admin),
 ):
-    """List email templates."""
+    """List email templates, newest first, one cursor page at a time."""
     try:
         if supabase is None:
             raise HTTPException(
@@ -945,9 +952,10 @@ def list_email_templates(
         if is_active is not None:
             query = query.eq("is_active", is_active)
         
-        result = query.order("created_at", desc=True).execute()
+        result = apply_keyset(query, limit=limit, cursor=cursor, sort_column="created_at").execute()
+        templates, next_cursor = split_page(result.data or [], limit, "created_at")
         
-        return {"templates": result.data if result.data else []}
+        return {"templates": templates, "next_cursor": next_cursor}
         
     except HTTPException:
         raise
@@ -8,6 +8,8 @@ from typing import Optional
 from app.dependencies import get_current_admin
 from app.supabase_config import supabase
 from app.logger import setup_logger
+from app.pagination import apply_keyset, split_page
+from app.write_buffer import buffered_writer
 from app.schemas import SearchRequest, ChatRequest, ChatResponse, SearchResultItem
 from app.embedding_service import (
     embed_text,
@@ -16,8 +18,11 @@ from app.embedding_service import (
     count_tokens,
     content_hash,
     extract_text_from_upload,
+    search_chunks,
 )
-from app.helpers import client as openai_client
+from app.context_packer import context_packer
+from app.llm_gateway import llm_gateway
+from app.response_cache import response_cache
 
 logger = setup_logger(__name__)
 router = APIRouter(prefix="/knowledge", tags=["Knowledge Base"])
@@ -33,6 +38,7 @@ async def upload_document(
     file: UploadFile = File(...),
     title: Optional[str] = Form(None),
     source: Optional[str] = Form("manual"),
+    tenant_id: Optional[str] = Form(None),
     current_user: dict = Depends(get_current_admin),
 ):
     file_bytes = await file.read()
@@ -61,6 +67,8 @@ async def upload_document(
         "total_chunks": len(chunks),
         "created_by": current_user["id"],
     }
+    if tenant_id:
+        doc_row["tenant_id"] = tenant_id
     doc_result = supabase.table("knowledge_documents").insert(doc_row).execute()
     if not doc_result.data:
         raise HTTPException(500, "Failed to create document record")
@@ -85,6 +93,7 @@ async def upload_document(
         })
 
     supabase.table("document_chunks").insert(chunk_rows).execute()
+    response_cache.invalidate()
 
     logger.info(f"Document '{doc_title}' uploaded: {len(chunks)} chunks embedded")
     return {
@@ -99,14 +108,17 @@ async def upload_document(
 # List all knowledge-base documents
 # ------------------------------------------------------------------
 @router.get("/documents")
-def list_documents(current_user: dict = Depends(get_current_admin)):
-    result = (
-        supabase.table("knowledge_documents")
-        .select("id, title, source, file_name, total_chunks, created_at")
-        .order("created_at", desc=True)
-        .execute()
+def list_documents(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None),
+    current_user: dict = Depends(get_current_admin),
+):
+    query = supabase.table("knowledge_documents").select(
+        "id, title, source, file_name, total_chunks, created_at"
     )
-    return {"documents": result.data or []}
+    result = apply_keyset(query, limit=limit, cursor=cursor, sort_column="created_at").execute()
+    documents, next_cursor = split_page(result.data or [], limit, "created_at")
+    return {"documents": documents, "next_cursor": next_cursor}
 
 
 # ------------------------------------------------------------------
@@ -125,6 +137,7 @@ def delete_document(document_id: str, current_user: dict = Depends(get_current_a
 
     supabase.table("document_chunks").delete().eq("document_id", document_id).execute()
     supabase.table("knowledge_documents").delete().eq("id", document_id).execute()
+    response_cache.invalidate()
     return {"deleted": document_id}
 
 
@@ -135,16 +148,15 @@ def delete_document(document_id: str, current_user: dict = Depends(get_current_a
 def search_knowledge(body: SearchRequest, current_user: dict = Depends(get_current_admin)):
     query_vec = embed_text(body.query)
 
-    rpc_result = supabase.rpc(
-        "match_chunks",
-        {
-            "query_embedding": query_vec,
-            "match_count": body.top_k,
-            "match_threshold": body.threshold,
-        },
-    ).execute()
-
-    rows = rpc_result.data or []
+    rows = search_chunks(
+        query_vec,
+        match_count=body.top_k,
+        match_threshold=body.threshold,
+        document_ids=body.document_ids,
+        source=body.source,
+        tenant_id=body.tenant_id,
+        metadata=body.metadata,
+    )
 
     doc_ids = list({r["document_id"] for r in rows})
     titles_map: dict[str, str] = {}
@@ -218,6 +230,9 @@ def chat_with_knowledge(body: ChatRequest, current_user: dict = Depends(get_curr
     ).execute()
 
     rows = rpc_result.data or []
+    # Overlapping neighbours merged, repeated paragraphs dropped, within the token budget
+    packed = context_packer.pack(rows)
+    rows = [r for r in rows if r["id"] in packed.chunk_ids]
 
     doc_ids = list({r["document_id"] for r in rows})
     titles_map: dict[str, str] = {}
@@ -230,9 +245,8 @@ def chat_with_knowledge(body: ChatRequest, current_user: dict = Depends(get_curr
         )
         titles_map = {d["id"]: d["title"] for d in (docs.data or [])}
 
-    context_block = "\n\n---\n\n".join(
-        f"[{titles_map.get(r['document_id'], 'Unknown')}]\n{r['content']}"
-        for r in rows
+    context_block = packed.render(
+        "\n\n---\n\n", label=lambda p: f"[{titles_map.get(p.document_id, 'Unknown')}]\n"
     )
 
     if not context_block.strip():
@@ -246,11 +260,7 @@ def chat_with_knowledge(body: ChatRequest, current_user: dict = Depends(get_curr
         },
     ]
 
-    completion = openai_client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=messages,
-    )
-    answer = completion.choices[0].message.content
+    answer = llm_gateway.complete_sync(messages)
 
     sources = [
         SearchResultItem(
@@ -315,6 +325,8 @@ def ticket_assist(ticket_id: str, current_user: dict = Depends(get_current_admin
         },
     ).execute()
     rows = rpc_result.data or []
+    packed = context_packer.pack(rows)
+    rows = [r for r in rows if r["id"] in packed.chunk_ids]
 
     doc_ids = list({r["document_id"] for r in rows})
     titles_map: dict[str, str] = {}
@@ -327,9 +339,8 @@ def ticket_assist(ticket_id: str, current_user: dict = Depends(get_current_admin
         )
         titles_map = {d["id"]: d["title"] for d in (docs.data or [])}
 
-    context_block = "\n\n---\n\n".join(
-        f"[{titles_map.get(r['document_id'], 'Unknown')}]\n{r['content']}"
-        for r in rows
+    context_block = packed.render(
+        "\n\n---\n\n", label=lambda p: f"[{titles_map.get(p.document_id, 'Unknown')}]\n"
     )
     if not context_block.strip():
         context_block = "(No relevant documents found in the knowledge base.)"
@@ -344,15 +355,13 @@ def ticket_assist(ticket_id: str, current_user: dict = Depends(get_current_admin
     )
 
     try:
-        completion = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
+        raw = llm_gateway.complete_sync(
+            [
                 {"role": "system", "content": TICKET_ASSIST_SYSTEM_PROMPT},
                 {"role": "user", "content": user_content},
             ],
             response_format={"type": "json_object"},
         )
-        raw = completion.choices[0].message.content
         parsed = json.loads(raw)
     except Exception as e:
         logger.error(f"Ticket assist LLM call failed: {e}", exc_info=True)
@@ -391,7 +400,7 @@ def _log_kb_usage(
     query_type: str,
     confidence: float | None = None,
 ):
-    """Fire-and-forget: log which KB chunks were matched."""
+    """Fire-and-forget: queue a log of which KB chunks were matched."""
     try:
         rows = []
         for src in sources:
@@ -403,8 +412,7 @@ def _log_kb_usage(
                 "similarity_score": src.get("similarity"),
                 "confidence_score": confidence,
             })
-        if rows:
-            supabase.table("kb_usage_logs").insert(rows).execute()
+        buffered_writer.enqueue("kb_usage_logs", rows)
     except Exception as e:
         logger.debug(f"KB usage logging failed (non-fatal): {e}")
 
@@ -464,15 +472,14 @@ def generate_article_from_ticket(
     )
 
     try:
-        completion = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
+        raw = llm_gateway.complete_sync(
+            [
                 {"role": "system", "content": ARTICLE_GEN_PROMPT},
                 {"role": "user", "content": user_content},
             ],
             response_format={"type": "json_object"},
         )
-        parsed = json.loads(completion.choices[0].message.content)
+        parsed = json.loads(raw)
     except Exception as e:
         logger.error(f"Article generation failed: {e}", exc_info=True)
         raise HTTPException(502, f"AI generation failed: {e}")
@@ -515,6 +522,7 @@ def generate_article_from_ticket(
                     for idx, (c, emb) in enumerate(zip(chunks, embeddings))
                 ]
                 supabase.table("document_chunks").insert(chunk_rows).execute()
+                response_cache.invalidate()
             except Exception as e:
                 logger.error(f"Embedding for auto-article failed: {e}")
             result["document_id"] = doc_id
@@ -4,6 +4,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from datetime import datetime, timezone
 from app.supabase_config import supabase
 from app.logger import setup_logger
+from app.reference_cache import reference_cache
 from app.dependencies import get_current_admin
 from app.schemas import RoutingRuleRequest
 import json
@@ -51,6 +52,7 @@ def create_routing_rule(
             .execute()
         )
         
+        reference_cache.invalidate("routing_rules")
         logger.info(f"Created routing rule: {req.name} by {current_admin['email']}")
         return {"success": True, "rule": result.data[0] if result.data else None}
         
@@ -130,6 +132,7 @@ def delete_routing_rule(
         
         supabase.table("routing_rules").delete().eq("id", rule_id).execute()
         
+        reference_cache.invalidate("routing_rules")
         logger.info(f"Deleted routing rule {rule_id} by {current_admin['email']}")
         return {"success": True, "message": "Routing rule deleted successfully"}
         
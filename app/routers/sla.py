@@ -4,6 +4,8 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query
 from datetime import datetime, timezone
 from app.supabase_config import supabase
 from app.logger import setup_logger
+from app.reference_cache import active_sla_for_priority, find_by_id, reference_cache
+from app.write_buffer import buffered_writer
 from app.dependencies import get_current_user, get_current_admin
 from app.schemas import SLADefinitionRequest, UpdatePriorityRequest, TimeEntryRequest
 
@@ -56,6 +58,7 @@ def create_sla_definition(
             .execute()
         )
         
+        reference_cache.invalidate("sla_definitions")
         logger.info(f"Created SLA definition: {result.data[0]['id']} by {current_admin['email']}")
         return {"sla": result.data[0]}
         
@@ -140,17 +143,9 @@ def update_ticket_priority(
         # Auto-assign SLA based on new priority
         sla_id = None
         try:
-            sla_res = (
-                supabase.table("sla_definitions")
-                .select("id")
-                .eq("priority", req.priority)
-                .eq("is_active", True)
-                .order("created_at", desc=True)
-                .limit(1)
-                .execute()
-            )
-            if sla_res.data:
-                sla_id = sla_res.data[0]["id"]
+            sla = active_sla_for_priority(reference_cache.rows("sla_definitions", supabase), req.priority)
+            if sla:
+                sla_id = sla["id"]
         except Exception as e:
             logger.warning(f"Could not auto-assign SLA for priority {req.priority}: {e}")
         
@@ -169,18 +164,15 @@ def update_ticket_priority(
             .execute()
         )
         
-        # Log activity
-        try:
-            supabase.table("ticket_activities").insert({
-                "ticket_id": ticket_id,
-                "user_id": current_admin["id"],
-                "action_type": "priority_changed",
-                "old_value": old_priority,
-                "new_value": req.priority,
-                "created_at": datetime.utcnow().isoformat()
-            }).execute()
-        except Exception as e:
-            logger.warning(f"Could not log activity: {e}")  # Activity log is optional
+        # Log activity (optional; written behind the request)
+        buffered_writer.enqueue("ticket_activities", {
+            "ticket_id": ticket_id,
+            "user_id": current_admin["id"],
+            "action_type": "priority_changed",
+            "old_value": old_priority,
+            "new_value": req.priority,
+            "created_at": datetime.utcnow().isoformat()
+        })
         
         logger.info(f"Updated ticket {ticket_id} priority from {old_priority} to {req.priority}")
         return {"ticket": result.data[0]}
@@ -234,32 +226,12 @@ def get_ticket_sla_status(
         sla_id = ticket.get("sla_id")
         priority = ticket.get("priority", "medium")
         
-        sla_definition = None
-        if sla_id:
-            sla_res = (
-                supabase.table("sla_definitions")
-                .select("*")
-                .eq("id", sla_id)
-                .eq("is_active", True)
-                .limit(1)
-                .execute()
-            )
-            if sla_res.data:
-                sla_definition = sla_res.data[0]
+        slas = reference_cache.rows("sla_definitions", supabase)
+        sla_definition = find_by_id(slas, sla_id)
         
         # If no SLA assigned, try to find by priority
         if not sla_definition:
-            sla_res = (
-                supabase.table("sla_definitions")
-                .select("*")
-                .eq("priority", priority)
-                .eq("is_active", True)
-                .order("created_at", desc=True)
-                .limit(1)
-                .execute()
-            )
-            if sla_res.data:
-                sla_definition = sla_res.data[0]
+            sla_definition = active_sla_for_priority(slas, priority)
         
         if not sla_definition:
             return {
@@ -4,6 +4,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from datetime import datetime, timezone
 from app.supabase_config import supabase
 from app.logger import setup_logger
+from app.reference_cache import reference_cache
 from app.dependencies import get_current_user, get_current_admin
 from app.schemas import TagRequest, CategoryRequest, TicketTagsRequest, TicketCategoryRequest
 
@@ -42,6 +43,7 @@ def create_tag(
             .execute()
         )
         
+        reference_cache.invalidate("tags")
         logger.info(f"Created tag: {req.name} by {current_admin['email']}")
         return {"success": True, "tag": result.data[0] if result.data else None}
         
@@ -67,14 +69,7 @@ def list_tags(
                 detail="Database not configured",
             )
         
-        result = (
-            supabase.table("tags")
-            .select("*")
-            .order("name", desc=False)
-            .execute()
-        )
-        
-        return {"tags": result.data if result.data else []}
+        return {"tags": reference_cache.rows("tags", supabase)}
         
     except HTTPException:
         raise
@@ -131,6 +126,7 @@ def update_tag(
             .execute()
         )
         
+        reference_cache.invalidate("tags")
         logger.info(f"Updated tag {tag_id} by {current_admin['email']}")
         return {"success": True, "tag": result.data[0] if result.data else None}
         
@@ -180,6 +176,7 @@ def delete_tag(
         # Delete tag (cascade will handle ticket_tags)
         supabase.table("tags").delete().eq("id", tag_id).execute()
         
+        reference_cache.invalidate("tags")
         logger.info(f"Deleted tag {tag_id} by {current_admin['email']}")
         return {"success": True, "message": "Tag deleted successfully"}
         
@@ -414,6 +411,7 @@ def create_category(
             .execute()
         )
         
+        reference_cache.invalidate("categories")
         logger.info(f"Created category: {req.name} by {current_admin['email']}")
         return {"success": True, "category": result.data[0] if result.data else None}
         
@@ -442,13 +440,10 @@ def list_categories(
 
         # Organization logic removed
         
-        query = supabase.table("categories").select("*")
         # List all categories (global)
-        query = query.is_("organization_id", "null")
-        
-        result = query.order("name", desc=False).execute()
+        categories = [c for c in reference_cache.rows("categories", supabase) if c.get("organization_id") is None]
         
-        return {"categories": result.data if result.data else []}
+        return {"categories": categories}
         
     except HTTPException:
         raise
@@ -504,6 +499,7 @@ def update_category(
             .execute()
         )
         
+        reference_cache.invalidate("categories")
         logger.info(f"Updated category {category_id} by {current_admin['email']}")
         return {"success": True, "category": result.data[0] if result.data else None}
         
@@ -551,6 +547,7 @@ def delete_category(
         # Delete category
         supabase.table("categories").delete().eq("id", category_id).execute()
         
+        reference_cache.invalidate("categories")
         logger.info(f"Deleted category {category_id} by {current_admin['email']}")
         return {"success": True, "message": "Category deleted successfully"}
         
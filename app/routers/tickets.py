@@ -1,13 +1,29 @@
 """Ticket endpoints: create, reply, rate, escalate, thread, stats, customer tickets."""
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+import asyncio
+import time
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from datetime import datetime, timezone
 from app.supabase_config import supabase
 from app.config import settings
+from app.conversation_memory import conversation_memory
 from app.logger import setup_logger
 from app.dependencies import get_current_user, get_current_admin
-from app.helpers import is_rate_limited, sanitize_output, generate_ai_reply
+from app.helpers import (
+    ReplyPrompt,
+    ai_reply_limit_reached,
+    agenerate_ai_reply,
+    is_rate_limited_async,
+    sanitize_output,
+)
+from app.reply_jobs import ReplyJobLookupFailed, ReplyQueueFull, reply_jobs
+from app.response_cache import response_cache
 from app.routing_service import routing_service
+from app.streaming import sse_event, sse_response, stream_ai_message
+from app.ticket_repository import ticket_repository
 from app.schemas import (
     TicketRequest, MessageRequest, RatingRequest, EscalateRequest,
 )
@@ -15,18 +31,251 @@ from app.schemas import (
 logger = setup_logger(__name__)
 router = APIRouter()
 
+
+# ---------------------------------------------------
+# Shared steps for the JSON and streaming endpoints
+# ---------------------------------------------------
+async def _intake_new_ticket_message(req: TicketRequest, user_id: str):
+    """Find/create the ticket, store the customer message and decide whether AI replies.
+
+    Returns ``(ticket_id, response, prompt)``: *response* is the final body
+    when no AI reply will be generated, otherwise *prompt* is a `ReplyPrompt`.
+    """
+    priority = req.priority if hasattr(req, 'priority') and req.priority in ['low', 'medium', 'high', 'urgent'] else 'medium'
+    
+    # 1️⃣ Find or create the ticket (with SLA) and add the customer message in one round trip
+    intake = await ticket_repository.create_or_continue_ticket(
+        context=req.context,
+        subject=req.subject,
+        message=req.message,
+        user_id=user_id,
+        priority=priority,
+        source="web",
+    )
+    ticket = intake["ticket"]
+    ticket_id = ticket["id"]
+    history = intake["history"]
+
+    if intake["created"]:
+        logger.info(f"Created new ticket: {ticket_id}")
+        
+        # 2️⃣ Apply routing rules to new tickets (rules are cached; the ticket has no tags yet)
+        try:
+            routing_result = await run_in_threadpool(
+                routing_service.apply_routing_rules,
+                ticket_id,
+                ticket=ticket,
+                ticket_text=req.message,
+                ticket_tag_ids=set(),
+            )
+            if routing_result.get("success") and routing_result.get("rules_matched", 0) > 0:
+                logger.info(f"Applied {routing_result['rules_matched']} routing rule(s) to ticket {ticket_id}")
+                ticket = {**ticket, **routing_result.get("updates", {})}
+        except Exception as e:
+            logger.warning(f"Failed to apply routing rules to ticket {ticket_id}: {e}")
+    else:
+        logger.info(f"Continuing existing ticket: {ticket_id}")
+
+    # 3️⃣ Check if human is assigned — skip AI if true
+    if ticket.get("assigned_to"):
+        logger.info(
+            f"Human agent assigned ({ticket['assigned_to']}), skipping AI reply for ticket {ticket_id}"
+        )
+        return ticket_id, {
+            "ticket_id": ticket_id,
+            "reply": f"Human agent {ticket['assigned_to']} will handle this ticket.",
+        }, None
+
+    # 4️⃣ History and the rate-limit window came back with the intake call
+    if ai_reply_limit_reached(ticket_id, intake["ai_replies_in_window"]):
+        return ticket_id, _rate_limited(ticket_id), None
+    # Summary plus recent messages within the token budget; older ones are summarized in the background
+    window = conversation_memory.build(ticket, history)
+    conversation_memory.schedule_refresh(ticket_id, ticket, window)
+
+    # 5️⃣ Build the AI prompt
+    prompt = f"""
+        You are an AI support assistant for {req.context}.
+        Continue the following ticket conversation helpfully and politely.
+        ----
+        {window.text}
+        ----
+        Reply as the assistant:
+        """
+    return ticket_id, None, ReplyPrompt(
+        prompt, req.context, req.message, ticket.get("priority") or priority, ticket.get("user_id")
+    )
+
+
+async def _intake_thread_message(ticket_id: str, req: MessageRequest, user_id: str):
+    """Store a customer reply on an existing ticket and decide whether AI replies.
+
+    Returns ``(response, prompt)`` like `_intake_new_ticket_message`. Raises
+    403 if the ticket belongs to someone else.
+    """
+    # 1️⃣ Verify ticket exists and belongs to user
+    ticket = await ticket_repository.get_ticket(ticket_id)
+    if not ticket:
+        return {"error": f"Ticket {ticket_id} not found."}, None
+    
+    # Verify ticket belongs to current user
+    if ticket.get("user_id") != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You don't have access to this ticket",
+        )
+
+    # 2️⃣ Store new customer message
+    await ticket_repository.add_message(
+        {
+            "ticket_id": ticket_id,
+            "sender": "customer",
+            "message": req.message,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+    )
+
+    # 3️⃣ If human assigned, skip AI
+    if ticket.get("assigned_to"):
+        logger.info(
+            f"Human assigned ({ticket['assigned_to']}), skipping AI for ticket {ticket_id}"
+        )
+        return {
+            "ticket_id": ticket_id,
+            "reply": f"Human agent {ticket['assigned_to']} will handle this.",
+        }, None
+
+    # 4️⃣ Fetch messages and rate-limit window concurrently
+    history, (limited, _meta) = await asyncio.gather(
+        ticket_repository.get_messages(ticket_id, "sender, message"),
+        is_rate_limited_async(ticket_id),
+    )
+    if limited:
+        return _rate_limited(ticket_id), None
+    window = conversation_memory.build(ticket, history)
+    conversation_memory.schedule_refresh(ticket_id, ticket, window)
+
+    # 5️⃣ Build the AI prompt
+    prompt = f"""
+        You are an AI assistant continuing this customer support thread.
+        ----
+        {window.text}
+        ----
+        Respond concisely and politely as the assistant.
+        """
+    return None, ReplyPrompt(
+        prompt, ticket.get("context"), req.message, ticket.get("priority") or "medium", ticket.get("user_id")
+    )
+
+
+def _rate_limited(ticket_id: str) -> dict:
+    return {
+        "ticket_id": ticket_id,
+        "rate_limited": True,
+        "wait_seconds": settings.ai_reply_window_seconds,
+    }
+
+
+async def _generate_and_store_reply(ticket_id: str, prompt: ReplyPrompt) -> dict:
+    # Reuse an approved answer to the same question when the semantic cache has one
+    confidence = 0.95
+    cached = await response_cache.alookup(prompt.context, prompt.question, prompt.user_id)
+    if cached:
+        raw_answer = cached["answer"]
+        confidence = round(float(cached["similarity"]), 3)
+    else:
+        # Generate AI reply (retries/backoff and rate limits in the LLM gateway)
+        logger.info(f"Generating AI reply for ticket {ticket_id}")
+        raw_answer = await agenerate_ai_reply(prompt.text)
+
+    # Sanitize output for profanity/PII
+    answer, flags = sanitize_output(raw_answer)
+
+    # Store AI reply
+    await ticket_repository.add_message(
+        {
+            "ticket_id": ticket_id,
+            "sender": "ai",
+            "message": answer,
+            "confidence": confidence,
+            "success": True,
+            "cached_response_id": cached["id"] if cached else None,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+    )
+
+    return {"ticket_id": ticket_id, "reply": answer}
+
+
+# Queued replies (Prefer: respond-async) run the same generation step
+reply_jobs.set_handler(_generate_and_store_reply)
+
+
+def _prefers_async(prefer: Optional[str]) -> bool:
+    return bool(prefer) and "respond-async" in prefer.lower()
+
+
+async def _queue_reply(ticket_id: str, user_id: str, prompt: ReplyPrompt) -> JSONResponse:
+    """Hand the reply to the background job queue and answer ``202 Accepted``."""
+    try:
+        job = await reply_jobs.submit(ticket_id, user_id, prompt)
+    except ReplyQueueFull as e:
+        logger.warning(f"Refusing queued AI reply for ticket {ticket_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many AI replies are queued, please retry shortly",
+            headers={"Retry-After": "5"},
+        )
+    poll_url = f"/ticket/jobs/{job.id}"
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={
+            "ticket_id": ticket_id,
+            "job_id": job.id,
+            "status": job.status,
+            "poll_url": poll_url,
+            "stream_url": f"{poll_url}/stream",
+        },
+        headers={"Location": poll_url, "Preference-Applied": "respond-async"},
+    )
+
+
+async def _stream_reply_events(ticket_id: str, response, prompt, started: float):
+    yield sse_event("ticket", {"ticket_id": ticket_id})
+    if response is not None:
+        yield sse_event("rate_limited" if response.get("rate_limited") else "reply", response)
+        return
+    async for event in stream_ai_message(ticket_id, prompt, started):
+        yield event
+
+
+_NOT_CONFIGURED = {"error": "Supabase is not configured. Please set SUPABASE_URL and SUPABASE_KEY in .env file"}
+
+
+# ---------------------------------------------------
+# POST /ticket → Create or continue a ticket
+# ---------------------------------------------------
 @router.post("/ticket")
-def create_or_continue_ticket(
-    req: TicketRequest, current_user: dict = Depends(get_current_user)
+async def create_or_continue_ticket(
+    req: TicketRequest,
+    current_user: dict = Depends(get_current_user),
+    prefer: Optional[str] = Header(None),
 ):
     """Create or continue a ticket and optionally generate an AI reply.
 
+    The ticket lookup/insert, SLA assignment, customer message and history
+    read are one ``create_or_continue_ticket`` RPC; routing runs in the
+    threadpool and the OpenAI call goes through the async LLM gateway.
+
     Parameters
     ----------
     req : TicketRequest
         `{ context, subject, message }`
     current_user : dict
         Current authenticated customer
+    prefer : str, optional
+        ``Prefer: respond-async`` queues the AI reply and answers ``202``
+        with `{ ticket_id, job_id, status, poll_url, stream_url }`
 
     Returns
     -------
@@ -34,272 +283,146 @@ def create_or_continue_ticket(
         `{ ticket_id, reply? }` or `{ ticket_id, rate_limited, wait_seconds }`
     """
     try:
-        if supabase is None:
-            return {"error": "Supabase is not configured. Please set SUPABASE_URL and SUPABASE_KEY in .env file"}
+        if not ticket_repository.is_configured:
+            return _NOT_CONFIGURED
         
-        user_id = current_user["id"]
-        
-        # 1️⃣ Find open ticket with same context & subject for this user
-        existing = (
-            supabase.table("tickets")
-            .select("*")
-            .eq("context", req.context)
-            .eq("subject", req.subject)
-            .eq("status", "open")
-            .eq("user_id", user_id)
-            .limit(1)
-            .execute()
-        )
-
-        if existing.data:
-            ticket = existing.data[0]
-            ticket_id = ticket["id"]
-            logger.info(f"Continuing existing ticket: {ticket_id}")
-        else:
-            # Create new ticket
-            priority = req.priority if hasattr(req, 'priority') and req.priority in ['low', 'medium', 'high', 'urgent'] else 'medium'
-            
-            # Auto-assign SLA based on priority
-            sla_id = None
-            try:
-                sla_res = (
-                    supabase.table("sla_definitions")
-                    .select("id")
-                    .eq("priority", priority)
-                    .eq("is_active", True)
-                    .order("created_at", desc=True)
-                    .limit(1)
-                    .execute()
-                )
-                if sla_res.data:
-                    sla_id = sla_res.data[0]["id"]
-            except Exception as e:
-                logger.warning(f"Could not auto-assign SLA for priority {priority}: {e}")
-            
-            new_ticket = (
-                supabase.table("tickets")
-                .insert(
-                    {
-                        "context": req.context,
-                        "subject": req.subject,
-                        "status": "open",
-                        "priority": priority,
-                        "sla_id": sla_id,
-                        "user_id": user_id,
-                        "source": "web",
-                        "created_at": datetime.now(timezone.utc).isoformat(),
-                    }
-                )
-                .execute()
-            )
-            ticket = new_ticket.data[0]
-            ticket_id = ticket["id"]
-            logger.info(f"Created new ticket: {ticket_id}")
-            
-            # Apply routing rules to new tickets
-            try:
-                routing_result = routing_service.apply_routing_rules(ticket_id)
-                if routing_result.get("success") and routing_result.get("rules_matched", 0) > 0:
-                    logger.info(f"Applied {routing_result['rules_matched']} routing rule(s) to ticket {ticket_id}")
-                    # Reload ticket to get updated assignment/priority
-                    ticket_res = (
-                        supabase.table("tickets")
-                        .select("*")
-                        .eq("id", ticket_id)
-                        .limit(1)
-                        .execute()
-                    )
-                    if ticket_res.data:
-                        ticket = ticket_res.data[0]
-            except Exception as e:
-                logger.warning(f"Failed to apply routing rules to ticket {ticket_id}: {e}")
-
-        # 2️⃣ Add customer message
-        supabase.table("messages").insert(
-            {
-                "ticket_id": ticket_id,
-                "sender": "customer",
-                "message": req.message,
-                "created_at": datetime.now(timezone.utc).isoformat(),
-            }
-        ).execute()
+        ticket_id, response, prompt = await _intake_new_ticket_message(req, current_user["id"])
+        if response is not None:
+            return response
+        if _prefers_async(prefer):
+            return await _queue_reply(ticket_id, current_user["id"], prompt)
+        return await _generate_and_store_reply(ticket_id, prompt)
 
-        # 3️⃣ Check if human is assigned — skip AI if true
-        if ticket.get("assigned_to"):
-            logger.info(
-                f"Human agent assigned ({ticket['assigned_to']}), skipping AI reply for ticket {ticket_id}"
-            )
-            return {
-                "ticket_id": ticket_id,
-                "reply": f"Human agent {ticket['assigned_to']} will handle this ticket.",
-            }
-
-        # 4️⃣ Fetch full message history for context
-        history = (
-            supabase.table("messages")
-            .select("sender, message")
-            .eq("ticket_id", ticket_id)
-            .order("created_at", desc=False)
-            .execute()
-        )
-        conversation_history = "\n".join(
-            [f"{m['sender'].capitalize()}: {m['message']}" for m in history.data]
-        )
-
-        # 5️⃣ Generate AI reply
-        prompt = f"""
-        You are an AI support assistant for {req.context}.
-        Continue the following ticket conversation helpfully and politely.
-        ----
-        {conversation_history}
-        ----
-        Reply as the assistant:
-        """
-
-        # 5.1️⃣ Rate limit check
-        limited, _meta = is_rate_limited(ticket_id)
-        if limited:
-            return {
-                "ticket_id": ticket_id,
-                "rate_limited": True,
-                "wait_seconds": settings.ai_reply_window_seconds,
-            }
-
-        # 5.2️⃣ Generate AI reply with retry/backoff
-        logger.info(f"Generating AI reply for ticket {ticket_id}")
-        raw_answer = generate_ai_reply(prompt)
-
-        # 5.3️⃣ Sanitize output for profanity/PII
-        answer, flags = sanitize_output(raw_answer)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in create_or_continue_ticket: {e}", exc_info=True)
+        raise
 
-        # 6️⃣ Store AI reply
-        supabase.table("messages").insert(
-            {
-                "ticket_id": ticket_id,
-                "sender": "ai",
-                "message": answer,
-                "confidence": 0.95,
-                "success": True,
-                "created_at": datetime.now(timezone.utc).isoformat(),
-            }
-        ).execute()
 
-        return {"ticket_id": ticket_id, "reply": answer}
+@router.post("/ticket/stream")
+async def create_or_continue_ticket_stream(
+    req: TicketRequest, current_user: dict = Depends(get_current_user)
+):
+    """Streaming variant of ``POST /ticket``: the AI reply is sent as Server-Sent Events.
 
+    The ticket is created/continued before the stream starts. Events are
+    described in :mod:`app.streaming`; the redacted reply is stored once
+    generation completes.
+    """
+    started = time.perf_counter()
+    if not ticket_repository.is_configured:
+        return _NOT_CONFIGURED
+    try:
+        ticket_id, response, prompt = await _intake_new_ticket_message(req, current_user["id"])
     except Exception as e:
-        logger.error(f"Error in create_or_continue_ticket: {e}", exc_info=True)
+        logger.error(f"Error in create_or_continue_ticket_stream: {e}", exc_info=True)
         raise
+    return sse_response(_stream_reply_events(ticket_id, response, prompt, started))
 
 
 # ---------------------------------------------------
 # POST /ticket/{ticket_id}/reply → Continue thread
 # ---------------------------------------------------
 @router.post("/ticket/{ticket_id}/reply")
-def reply_to_existing_ticket(
-    ticket_id: str, req: MessageRequest, current_user: dict = Depends(get_current_user)
+async def reply_to_existing_ticket(
+    ticket_id: str,
+    req: MessageRequest,
+    current_user: dict = Depends(get_current_user),
+    prefer: Optional[str] = Header(None),
 ):
     """Append a customer message and optionally generate an AI reply.
 
     If a human is assigned, AI reply is skipped.
     Rate limiting and output sanitization apply if AI is used.
+    With ``Prefer: respond-async`` the reply is queued as for ``POST /ticket``.
     """
     try:
-        if supabase is None:
-            return {"error": "Supabase is not configured. Please set SUPABASE_URL and SUPABASE_KEY in .env file"}
+        if not ticket_repository.is_configured:
+            return _NOT_CONFIGURED
         
-        user_id = current_user["id"]
-        
-        # 1️⃣ Verify ticket exists and belongs to user
-        ticket_res = (
-            supabase.table("tickets").select("*").eq("id", ticket_id).limit(1).execute()
-        )
-        if not ticket_res.data:
-            return {"error": f"Ticket {ticket_id} not found."}
+        response, prompt = await _intake_thread_message(ticket_id, req, current_user["id"])
+        if response is not None:
+            return response
+        if _prefers_async(prefer):
+            return await _queue_reply(ticket_id, current_user["id"], prompt)
+        return await _generate_and_store_reply(ticket_id, prompt)
 
-        ticket = ticket_res.data[0]
-        
-        # Verify ticket belongs to current user
-        if ticket.get("user_id") != user_id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You don't have access to this ticket",
-            )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in reply_to_existing_ticket: {e}", exc_info=True)
+        raise
 
-        # 2️⃣ Store new customer message
-        supabase.table("messages").insert(
-            {
-                "ticket_id": ticket_id,
-                "sender": "customer",
-                "message": req.message,
-                "created_at": datetime.now(timezone.utc).isoformat(),
-            }
-        ).execute()
 
-        # 3️⃣ If human assigned, skip AI
-        if ticket.get("assigned_to"):
-            logger.info(
-                f"Human assigned ({ticket['assigned_to']}), skipping AI for ticket {ticket_id}"
-            )
-            return {
-                "ticket_id": ticket_id,
-                "reply": f"Human agent {ticket['assigned_to']} will handle this.",
-            }
+@router.post("/ticket/{ticket_id}/reply/stream")
+async def reply_to_existing_ticket_stream(
+    ticket_id: str, req: MessageRequest, current_user: dict = Depends(get_current_user)
+):
+    """Streaming variant of ``POST /ticket/{ticket_id}/reply`` (Server-Sent Events)."""
+    started = time.perf_counter()
+    if not ticket_repository.is_configured:
+        return _NOT_CONFIGURED
+    try:
+        response, prompt = await _intake_thread_message(ticket_id, req, current_user["id"])
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in reply_to_existing_ticket_stream: {e}", exc_info=True)
+        raise
+    if response is not None and "error" in response:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=response["error"])
+    return sse_response(_stream_reply_events(ticket_id, response, prompt, started))
 
-        # 4️⃣ Fetch all messages
-        history = (
-            supabase.table("messages")
-            .select("sender, message")
-            .eq("ticket_id", ticket_id)
-            .order("created_at", desc=False)
-            .execute()
-        )
-        conversation_history = "\n".join(
-            [f"{m['sender'].capitalize()}: {m['message']}" for m in history.data]
-        )
 
-        # 5️⃣ Generate AI reply
-        prompt = f"""
-        You are an AI assistant continuing this customer support thread.
-        ----
-        {conversation_history}
-        ----
-        Respond concisely and politely as the assistant.
-        """
+# ---------------------------------------------------
+# GET /ticket/jobs/{job_id} → Queued AI reply
+# ---------------------------------------------------
+async def _owned_job(job_id: str, user_id: str, wait: float = 0) -> dict:
+    try:
+        job = await (reply_jobs.wait(job_id, wait) if wait else reply_jobs.get(job_id))
+    except ReplyJobLookupFailed:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Could not look up the AI reply job, please retry shortly",
+            headers={"Retry-After": "5"},
+        )
+    if job is None or job.pop("user_id") != user_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
 
-        # 5.1️⃣ Rate limit check
-        limited, _meta = is_rate_limited(ticket_id)
-        if limited:
-            return {
-                "ticket_id": ticket_id,
-                "rate_limited": True,
-                "wait_seconds": settings.ai_reply_window_seconds,
-            }
 
-        # 5.2️⃣ Generate AI reply with retry/backoff
-        raw_answer = generate_ai_reply(prompt)
+@router.get("/ticket/jobs/{job_id}")
+async def get_reply_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=30, description="Seconds to wait for the reply before answering"),
+    current_user: dict = Depends(get_current_user),
+):
+    """Status of a queued AI reply; ``result`` holds the ``POST /ticket`` body once completed."""
+    return await _owned_job(job_id, current_user["id"], wait)
 
-        # 5.3️⃣ Sanitize output for profanity/PII
-        answer, flags = sanitize_output(raw_answer)
 
-        # 6️⃣ Store AI reply
-        supabase.table("messages").insert(
-            {
-                "ticket_id": ticket_id,
-                "sender": "ai",
-                "message": answer,
-                "confidence": 0.95,
-                "success": True,
-                "created_at": datetime.now(timezone.utc).isoformat(),
-            }
-        ).execute()
+async def _job_events(job: dict):
+    yield sse_event("job", {"job_id": job["job_id"], "ticket_id": job["ticket_id"], "status": job["status"]})
+    if job["status"] not in ("completed", "failed"):
+        try:
+            job = await reply_jobs.wait(job["job_id"], settings.ai_reply_job_timeout_seconds) or job
+        except ReplyJobLookupFailed:
+            yield sse_event("error", {"detail": "Could not look up the AI reply job"})
+            return
+    if job["status"] == "completed":
+        yield sse_event("reply", job["result"])
+    elif job["status"] == "failed":
+        yield sse_event("error", {"detail": job["error"]})
+    else:
+        yield sse_event("error", {"detail": "Timed out waiting for the AI reply"})
 
-        return {"ticket_id": ticket_id, "reply": answer}
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error in reply_to_existing_ticket: {e}", exc_info=True)
-        raise
+@router.get("/ticket/jobs/{job_id}/stream")
+async def stream_reply_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Server-Sent Events for a queued AI reply: ``job``, then ``reply`` or ``error``."""
+    job = await _owned_job(job_id, current_user["id"])
+    return sse_response(_job_events(job))
 
 
 # ---------------------------------------------------
@@ -397,6 +520,9 @@ def rate_ai_response(
                 }
             ).execute()
             logger.info(f"Created rating for message {req.message_id} by user {user_id}")
+
+        # Well-rated answers become reusable for the same question; poorly rated ones are dropped
+        response_cache.record_rating(ticket, message, req.rating)
         
         return {"success": True, "message": "Rating saved"}
     
@@ -516,27 +642,27 @@ def escalate_to_human(
 # GET /ticket/{ticket_id} → Fetch full thread
 # ---------------------------------------------------
 @router.get("/ticket/{ticket_id}")
-def get_ticket_thread(
+async def get_ticket_thread(
     ticket_id: str, current_user: dict = Depends(get_current_user)
 ):
-    """Fetch a ticket and its full message thread ordered by time."""
+    """Fetch a ticket and its full message thread ordered by time.
+
+    The ticket, its messages and the caller's ratings are fetched concurrently.
+    """
     try:
-        if supabase is None:
+        if not ticket_repository.is_configured:
             return {"error": "Supabase is not configured. Please set SUPABASE_URL and SUPABASE_KEY in .env file"}
         
-        ticket = (
-            supabase.table("tickets").select("*").eq("id", ticket_id).limit(1).execute()
-        )
-        if not ticket.data:
+        user_id = current_user["id"]
+        user_role = current_user["role"]
+        
+        ticket_data, messages, ratings_map = await ticket_repository.get_thread(ticket_id, user_id)
+        if not ticket_data:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Ticket not found",
             )
         
-        ticket_data = ticket.data[0]
-        user_id = current_user["id"]
-        user_role = current_user["role"]
-        
         # Verify access: customers can only see their tickets, admins can see all
         if user_role == "customer" and ticket_data.get("user_id") != user_id:
             raise HTTPException(
@@ -544,32 +670,13 @@ def get_ticket_thread(
                 detail="You don't have access to this ticket",
             )
         
-        messages = (
-            supabase.table("messages")
-            .select("*")
-            .eq("ticket_id", ticket_id)
-            .order("created_at", desc=False)
-            .execute()
-        )
-        
-        # Get ratings for AI messages
-        ratings = (
-            supabase.table("ratings")
-            .select("*")
-            .eq("ticket_id", ticket_id)
-            .eq("user_id", user_id)
-            .execute()
-        )
-        ratings_map = {r["message_id"]: r["rating"] for r in ratings.data}
-        
         # Attach ratings to messages
-        messages_with_ratings = messages.data.copy()
-        for msg in messages_with_ratings:
+        for msg in messages:
             msg["user_rating"] = ratings_map.get(msg["id"])
         
         return {
             "ticket": ticket_data,
-            "messages": messages_with_ratings,
+            "messages": messages,
         }
     except HTTPException:
         raise
@@ -617,7 +724,7 @@ def get_stats():
 
 
 @router.get("/customer/tickets")
-def get_customer_tickets(
+async def get_customer_tickets(
     search: str = Query(default=None, description="Search in subject and message content"),
     filter_status: str = Query(default=None, description="Filter by status (open, human_assigned, closed)"),
     context: str = Query(default=None, description="Filter by context/brand"),
@@ -625,6 +732,7 @@ def get_customer_tickets(
     date_to: str = Query(default=None, description="Filter to date (ISO format: YYYY-MM-DD)"),
     page: int = Query(default=1, ge=1, description="Page number (1-indexed)"),
     page_size: int = Query(default=10, ge=1, le=100, description="Number of items per page"),
+    cursor: str = Query(default=None, description="Opaque cursor from a previous response's next_cursor"),
     current_user: dict = Depends(get_current_user)
 ):
     """
@@ -633,75 +741,29 @@ def get_customer_tickets(
     Supports:
     - Full-text search in subject and message content
     - Filter by status, context, date range
-    - Pagination with page and page_size parameters
+    - Cursor pagination via next_cursor (page/page_size still supported)
     """
     try:
-        if supabase is None:
+        if not ticket_repository.is_configured:
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail="Database not configured",
             )
         
-        user_id = current_user["id"]
-        query = supabase.table("tickets").select("*", count="exact").eq("user_id", user_id)
-        
-        # Exclude deleted tickets by default
-        query = query.eq("is_deleted", False)
-        
-        # Apply filters
-        if filter_status:
-            query = query.eq("status", filter_status)
-        if context:
-            query = query.eq("context", context)
-        if date_from:
-            query = query.gte("created_at", f"{date_from}T00:00:00Z")
-        if date_to:
-            query = query.lte("created_at", f"{date_to}T23:59:59Z")
-        
-        res = query.order("updated_at", desc=True).execute()
-        all_tickets = res.data
-        
-        # If search is provided, filter by subject and message content
-        if search:
-            filtered_tickets = []
-            search_lower = search.lower()
-            for ticket in all_tickets:
-                # Check if search matches subject
-                if search_lower in ticket.get("subject", "").lower():
-                    filtered_tickets.append(ticket)
-                    continue
-                
-                # Check if search matches any message in the ticket
-                messages_res = (
-                    supabase.table("messages")
-                    .select("message")
-                    .eq("ticket_id", ticket["id"])
-                    .execute()
-                )
-                for msg in messages_res.data:
-                    if search_lower in msg.get("message", "").lower():
-                        filtered_tickets.append(ticket)
-                        break
-            
-            all_tickets = filtered_tickets
-        
-        # Calculate pagination
-        total_count = len(all_tickets)
-        total_pages = (total_count + page_size - 1) // page_size if total_count > 0 else 0
-        skip = (page - 1) * page_size
-        tickets = all_tickets[skip:skip + page_size]
-        
-        return {
-            "tickets": tickets,
-            "pagination": {
-                "page": page,
-                "page_size": page_size,
-                "total_count": total_count,
-                "total_pages": total_pages,
-                "has_next": page < total_pages,
-                "has_prev": page > 1
-            }
+        filters = {
+            "user_id": current_user["id"],
+            "status": filter_status,
+            "context": context,
         }
+        return await ticket_repository.page_tickets(
+            filters,
+            search=search,
+            date_from=date_from,
+            date_to=date_to,
+            page=page,
+            page_size=page_size,
+            cursor=cursor,
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -1,9 +1,12 @@
 """Multi-agent workflow router — run analysis pipelines on tickets."""
 
 from datetime import datetime
+from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException
 
+from app.config import settings
+from app.async_db import get_async_db
 from app.dependencies import get_current_admin
 from app.supabase_config import supabase
 from app.logger import setup_logger
@@ -15,8 +18,10 @@ from app.schemas import (
     WorkflowAnalysisResponse,
     WorkflowStepResult,
 )
-from app.agent_orchestrator import AgentStep, run_pipeline
-from app.embedding_service import embed_text
+from app.agent_orchestrator import AgentStep, arun_pipeline
+from app.context_packer import context_packer
+from app.embedding_service import aembed_text
+from app.workflow_cache import workflow_step_cache
 
 logger = setup_logger(__name__)
 router = APIRouter(prefix="/workflows", tags=["Workflows"])
@@ -24,7 +29,39 @@ router = APIRouter(prefix="/workflows", tags=["Workflows"])
 
 # ------------------------------------------------------------------
 # Pipeline definition — 4 specialised agents
+# Classifier and Researcher run concurrently; Drafter waits for both.
+# Simple tickets get a cheaper review, or none when research is confident.
 # ------------------------------------------------------------------
+def _is_simple(outputs: dict) -> bool:
+    return outputs["Classifier"].get("complexity") == "simple"
+
+
+def _skip_review(outputs: dict) -> bool:
+    confidence = outputs["Researcher"].get("confidence") or 0.0
+    return _is_simple(outputs) and confidence > settings.workflow_review_skip_confidence
+
+
+def _review_model(outputs: dict) -> Optional[str]:
+    return settings.workflow_cheap_model if _is_simple(outputs) else None
+
+
+def _final_output(step_results: list[dict]) -> Optional[dict]:
+    """The Reviewer's output; with the review skipped, the draft in the same shape."""
+    ran = {s["agent_name"]: s for s in step_results if s["status"] != "skipped"}
+    if "Reviewer" in ran:
+        return ran["Reviewer"]["output"]
+    draft = ran.get("Drafter", {}).get("output")
+    if draft is None or "error" in draft:
+        return draft
+    return {
+        "approved": None,
+        "feedback": "",
+        "revised_response": draft.get("draft_response", ""),
+        "quality_score": None,
+        "review_skipped": True,
+    }
+
+
 TICKET_PIPELINE = [
     AgentStep(
         name="Classifier",
@@ -35,17 +72,19 @@ TICKET_PIPELINE = [
             "complexity (simple/moderate/complex), tags (array of relevant keyword tags)."
         ),
         output_model=ClassifierOutput,
+        depends_on=[],
     ),
     AgentStep(
         name="Researcher",
         system_prompt=(
-            "You are a research agent. Given a support ticket and its classification, "
-            "suggest a resolution strategy. Return JSON with: relevant_docs (array of "
+            "You are a research agent. Given a support ticket, suggest a "
+            "resolution strategy. Return JSON with: relevant_docs (array of "
             "objects with title and summary — leave empty if none), "
             "suggested_resolution (string with concrete steps), "
             "confidence (float 0-1 indicating how confident you are in the resolution)."
         ),
         output_model=ResearcherOutput,
+        depends_on=[],
     ),
     AgentStep(
         name="Drafter",
@@ -56,6 +95,7 @@ TICKET_PIPELINE = [
             "key_points (array of the main points addressed)."
         ),
         output_model=DrafterOutput,
+        depends_on=["Classifier", "Researcher"],
     ),
     AgentStep(
         name="Reviewer",
@@ -67,6 +107,9 @@ TICKET_PIPELINE = [
             "quality_score (float 0-1)."
         ),
         output_model=ReviewerOutput,
+        depends_on=["Classifier", "Researcher", "Drafter"],
+        skip_if=_skip_review,
+        route=_review_model,
     ),
 ]
 
@@ -87,30 +130,38 @@ def _build_ticket_input(ticket: dict, messages: list[dict]) -> str:
     return "\n".join(lines)
 
 
-def _get_rag_context(ticket: dict) -> str:
+async def _get_rag_context(db, ticket: dict) -> str:
     """Optionally search the knowledge base for relevant context."""
     try:
         query = f"{ticket.get('subject', '')} {ticket.get('context', '')}"
-        query_vec = embed_text(query)
-        rpc = supabase.rpc(
+        query_vec = await aembed_text(query)
+        rpc = await db.rpc(
             "match_chunks",
             {"query_embedding": query_vec, "match_count": 3, "match_threshold": 0.6},
         ).execute()
-        if rpc.data:
-            snippets = [r["content"] for r in rpc.data]
-            return "Relevant knowledge base excerpts:\n" + "\n---\n".join(snippets)
+        packed = context_packer.pack(rpc.data or [])
+        if packed.passages:
+            return "Relevant knowledge base excerpts:\n" + packed.render()
     except Exception as e:
         logger.warning(f"RAG context lookup failed (non-fatal): {e}")
     return ""
 
 
+def _async_db():
+    db = get_async_db()
+    if db is None:
+        raise HTTPException(503, "Supabase is not configured")
+    return db
+
+
 # ------------------------------------------------------------------
 # Run analysis on a ticket
 # ------------------------------------------------------------------
 @router.post("/analyze-ticket/{ticket_id}", response_model=WorkflowAnalysisResponse)
-def analyze_ticket(ticket_id: str, current_user: dict = Depends(get_current_admin)):
-    ticket_q = (
-        supabase.table("tickets")
+async def analyze_ticket(ticket_id: str, current_user: dict = Depends(get_current_admin)):
+    db = _async_db()
+    ticket_q = await (
+        db.table("tickets")
         .select("*")
         .eq("id", ticket_id)
         .limit(1)
@@ -120,8 +171,8 @@ def analyze_ticket(ticket_id: str, current_user: dict = Depends(get_current_admi
         raise HTTPException(404, "Ticket not found")
     ticket = ticket_q.data[0]
 
-    msgs_q = (
-        supabase.table("messages")
+    msgs_q = await (
+        db.table("messages")
         .select("sender, message, created_at")
         .eq("ticket_id", ticket_id)
         .order("created_at")
@@ -136,19 +187,26 @@ def analyze_ticket(ticket_id: str, current_user: dict = Depends(get_current_admi
         "steps": [],
         "started_by": current_user["id"],
     }
-    insert = supabase.table("workflow_analyses").insert(analysis_row).execute()
+    insert = await db.table("workflow_analyses").insert(analysis_row).execute()
     analysis_id = insert.data[0]["id"] if insert.data else None
 
     ticket_input = _build_ticket_input(ticket, messages)
-    rag_context = _get_rag_context(ticket)
+    rag_context = await _get_rag_context(db, ticket)
 
-    step_results = run_pipeline(TICKET_PIPELINE, ticket_input, extra_context=rag_context)
+    # Steps whose inputs are unchanged since an earlier run (including the
+    # successful part of a failed one) come from the step cache
+    step_results = await arun_pipeline(
+        TICKET_PIPELINE, ticket_input, extra_context=rag_context, cache=workflow_step_cache
+    )
 
-    final_output = step_results[-1]["output"] if step_results else None
+    final_output = _final_output(step_results)
+    failed = any(s["status"] == "failed" for s in step_results)
+    status = "failed" if failed else "completed"
+    cache_hits = [s["agent_name"] for s in step_results if s["cached"]]
 
     if analysis_id:
-        supabase.table("workflow_analyses").update({
-            "status": "completed",
+        await db.table("workflow_analyses").update({
+            "status": status,
             "steps": step_results,
             "final_output": final_output,
             "completed_at": datetime.utcnow().isoformat(),
@@ -158,16 +216,21 @@ def analyze_ticket(ticket_id: str, current_user: dict = Depends(get_current_admi
         id=analysis_id or "unknown",
         ticket_id=ticket_id,
         pipeline_name="ticket_analysis",
-        status="completed",
+        status=status,
         steps=[
             WorkflowStepResult(
                 agent_name=s["agent_name"],
                 output=s["output"],
                 duration_ms=s["duration_ms"],
+                status=s["status"],
+                model=s["model"],
+                routed=s["routed"],
+                cached=s["cached"],
             )
             for s in step_results
         ],
         final_output=final_output,
+        cache_hits=cache_hits,
     )
 
 
@@ -2,6 +2,8 @@
 from typing import Optional, Dict, Any, List
 from app.logger import setup_logger
 from app.supabase_config import supabase
+from app.reference_cache import reference_cache
+from app.write_buffer import buffered_writer
 from datetime import datetime, timezone
 
 logger = setup_logger(__name__)
@@ -13,71 +15,75 @@ class RoutingService:
     def __init__(self):
         self.supabase = supabase
     
-    def apply_routing_rules(self, ticket_id: str, organization_id: Optional[str] = None) -> Dict[str, Any]:
+    def apply_routing_rules(
+        self,
+        ticket_id: str,
+        organization_id: Optional[str] = None,
+        *,
+        ticket: Optional[Dict[str, Any]] = None,
+        ticket_text: Optional[str] = None,
+        ticket_tag_ids: Optional[set] = None,
+    ) -> Dict[str, Any]:
         """
         Apply routing rules to a ticket.
-        Returns dict with actions taken.
+        Returns dict with actions taken and the merged ticket ``updates``.
+
+        Callers that already hold the ticket row, its message text and its tag
+        ids (e.g. right after creating it) can pass them to skip those reads.
         """
         try:
             if not self.supabase:
                 return {"success": False, "error": "Database not configured"}
             
             # Get ticket details
-            ticket_res = (
-                self.supabase.table("tickets")
-                .select("*")
-                .eq("id", ticket_id)
-                .limit(1)
-                .execute()
-            )
-            
-            if not ticket_res.data:
-                return {"success": False, "error": "Ticket not found"}
-            
-            ticket = ticket_res.data[0]
-            
-            # Get all active routing rules for the organization (or global if no org)
-            query = (
-                self.supabase.table("routing_rules")
-                .select("*")
-                .eq("is_active", True)
-            )
+            if ticket is None:
+                ticket_res = (
+                    self.supabase.table("tickets")
+                    .select("*")
+                    .eq("id", ticket_id)
+                    .limit(1)
+                    .execute()
+                )
+                
+                if not ticket_res.data:
+                    return {"success": False, "error": "Ticket not found"}
+                
+                ticket = ticket_res.data[0]
             
+            # Active routing rules for the organization (or all if no org), highest priority first
+            organization_id = organization_id or ticket.get("organization_id")
+            rules = reference_cache.rows("routing_rules", self.supabase)
             if organization_id:
-                query = query.eq("organization_id", organization_id)
-            else:
-                # Get organization from ticket if available
-                if ticket.get("organization_id"):
-                    query = query.eq("organization_id", ticket["organization_id"])
-            
-            rules_res = query.order("priority", desc=True).execute()
-            rules = rules_res.data if rules_res.data else []
+                rules = [r for r in rules if r.get("organization_id") == organization_id]
             
             if not rules:
-                return {"success": True, "actions": [], "message": "No routing rules found"}
+                return {"success": True, "actions": [], "updates": {}, "message": "No routing rules found"}
             
             # Get ticket messages for keyword matching
-            messages_res = (
-                self.supabase.table("messages")
-                .select("message")
-                .eq("ticket_id", ticket_id)
-                .execute()
-            )
-            ticket_text = " ".join([msg.get("message", "") for msg in (messages_res.data or [])])
+            if ticket_text is None:
+                messages_res = (
+                    self.supabase.table("messages")
+                    .select("message")
+                    .eq("ticket_id", ticket_id)
+                    .execute()
+                )
+                ticket_text = " ".join([msg.get("message", "") for msg in (messages_res.data or [])])
             ticket_text_lower = ticket_text.lower()
-            subject_lower = ticket.get("subject", "").lower()
-            context_lower = ticket.get("context", "").lower()
+            subject_lower = (ticket.get("subject") or "").lower()
+            context_lower = (ticket.get("context") or "").lower()
             
             # Get ticket tags
-            tags_res = (
-                self.supabase.table("ticket_tags")
-                .select("tag_id")
-                .eq("ticket_id", ticket_id)
-                .execute()
-            )
-            ticket_tag_ids = {tag["tag_id"] for tag in (tags_res.data or [])}
+            if ticket_tag_ids is None:
+                tags_res = (
+                    self.supabase.table("ticket_tags")
+                    .select("tag_id")
+                    .eq("ticket_id", ticket_id)
+                    .execute()
+                )
+                ticket_tag_ids = {tag["tag_id"] for tag in (tags_res.data or [])}
             
             actions_taken = []
+            updates: Dict[str, Any] = {}
             
             # Evaluate each rule
             for rule in rules:
@@ -87,6 +93,7 @@ class RoutingService:
                 # Rule matches - apply action
                 action_result = self._apply_rule_action(rule, ticket_id, ticket)
                 if action_result.get("success"):
+                    updates.update(action_result.get("updates", {}))
                     actions_taken.append({
                         "rule_id": rule["id"],
                         "rule_name": rule["name"],
@@ -95,24 +102,22 @@ class RoutingService:
                         "result": action_result
                     })
                     
-                    # Log the routing action
-                    try:
-                        self.supabase.table("routing_logs").insert({
-                            "ticket_id": ticket_id,
-                            "routing_rule_id": rule["id"],
-                            "rule_name": rule["name"],
-                            "action_taken": f"{rule['action_type']}: {rule['action_value']}",
-                            "matched_conditions": rule.get("conditions", {}),
-                            "created_at": datetime.now(timezone.utc).isoformat()
-                        }).execute()
-                    except Exception as e:
-                        logger.warning(f"Failed to log routing action: {e}")
+                    # Log the routing action (written behind the request)
+                    buffered_writer.enqueue("routing_logs", {
+                        "ticket_id": ticket_id,
+                        "routing_rule_id": rule["id"],
+                        "rule_name": rule["name"],
+                        "action_taken": f"{rule['action_type']}: {rule['action_value']}",
+                        "matched_conditions": rule.get("conditions", {}),
+                        "created_at": datetime.now(timezone.utc).isoformat()
+                    })
             
             return {
                 "success": True,
                 "actions": actions_taken,
                 "rules_evaluated": len(rules),
-                "rules_matched": len(actions_taken)
+                "rules_matched": len(actions_taken),
+                "updates": updates,
             }
             
         except Exception as e:
@@ -146,7 +151,7 @@ class RoutingService:
         # Check issue types (can match against context or category)
         issue_types = conditions.get("issue_types", [])
         if issue_types:
-            ticket_category = ticket.get("category", "").lower()
+            ticket_category = (ticket.get("category") or "").lower()
             ticket_context = context_lower
             issue_match = False
             for issue_type in issue_types:
@@ -160,13 +165,9 @@ class RoutingService:
         tag_names = conditions.get("tags", [])
         if tag_names:
             # Get tag IDs for the tag names
-            tags_res = (
-                self.supabase.table("tags")
-                .select("id, name")
-                .in_("name", tag_names)
-                .execute()
-            )
-            rule_tag_ids = {tag["id"] for tag in (tags_res.data or [])}
+            rule_tag_ids = {
+                tag["id"] for tag in reference_cache.rows("tags", self.supabase) if tag.get("name") in tag_names
+            }
             if not rule_tag_ids.intersection(ticket_tag_ids):
                 return False
         
@@ -179,7 +180,7 @@ class RoutingService:
         # Check priority
         priorities = conditions.get("priority", [])
         if priorities:
-            if ticket.get("priority", "").lower() not in [p.lower() for p in priorities]:
+            if (ticket.get("priority") or "").lower() not in [p.lower() for p in priorities]:
                 return False
         
         return True
@@ -215,15 +216,12 @@ class RoutingService:
             
             elif action_type == "add_tag":
                 # Find or create tag
-                tag_res = (
-                    self.supabase.table("tags")
-                    .select("id")
-                    .eq("name", action_value)
-                    .limit(1)
-                    .execute()
+                tag = next(
+                    (t for t in reference_cache.rows("tags", self.supabase) if t.get("name") == action_value),
+                    None,
                 )
-                if tag_res.data:
-                    tag_id = tag_res.data[0]["id"]
+                if tag:
+                    tag_id = tag["id"]
                     # Add tag to ticket if not already present
                     existing_tag_res = (
                         self.supabase.table("ticket_tags")
@@ -249,7 +247,7 @@ class RoutingService:
             if update_data:
                 self.supabase.table("tickets").update(update_data).eq("id", ticket_id).execute()
             
-            return {"success": True, "action": action_type, "value": action_value}
+            return {"success": True, "action": action_type, "value": action_value, "updates": update_data}
             
         except Exception as e:
             logger.error(f"Error applying rule action: {e}", exc_info=True)
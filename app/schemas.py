@@ -175,6 +175,10 @@ class SearchRequest(BaseModel):
     query: str
     top_k: int = Field(default=5, ge=1, le=20)
     threshold: float = Field(default=0.7, ge=0.0, le=1.0)
+    document_ids: Optional[list[str]] = None
+    source: Optional[str] = None
+    tenant_id: Optional[str] = None
+    metadata: Optional[dict] = None
 
 
 class ChatRequest(BaseModel):
@@ -217,6 +221,11 @@ class EvaluateRequest(BaseModel):
     template_id: str
 
 
+class BatchEvaluateRequest(BaseModel):
+    document_ids: list[str] = Field(min_length=1)
+    template_ids: list[str] = Field(min_length=1)
+
+
 class RequirementResult(BaseModel):
     requirement_id: str
     status: Literal["pass", "fail", "partial", "not_applicable"]
@@ -232,6 +241,8 @@ class EvaluationResponse(BaseModel):
     results: list[RequirementResult]
     overall_score: float
     summary: str
+    reused: list[str] = []
+    recomputed: list[str] = []
 
 
 # ============================================================
@@ -268,6 +279,10 @@ class WorkflowStepResult(BaseModel):
     agent_name: str
     output: dict
     duration_ms: int
+    status: Literal["completed", "failed", "skipped"] = "completed"
+    model: Optional[str] = None
+    routed: bool = False
+    cached: bool = False
 
 
 class WorkflowAnalysisResponse(BaseModel):
@@ -277,3 +292,4 @@ class WorkflowAnalysisResponse(BaseModel):
     status: str
     steps: list[WorkflowStepResult]
     final_output: Optional[dict] = None
+    cache_hits: list[str] = []
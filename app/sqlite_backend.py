@@ -0,0 +1,979 @@
+"""Embedded SQLite backend speaking the PostgREST query-builder dialect.
+
+Lets the whole app run against a local database file (or ``:memory:``) for
+offline load tests and profiling: set ``DB_BACKEND=sqlite``. The builders
+cover the query shapes the routers use — ``select`` (with ``count``),
+``eq/neq/gt/gte/lt/lte/like/ilike/in_/is_/or_``, ``order``, ``limit``,
+``offset``, ``range``, ``insert``, ``update``, ``upsert``, ``delete`` and
+``rpc`` — and return the same ``APIResponse`` objects as postgrest-py.
+
+Hot tables are created with their real columns and the indexes the
+Postgres migrations define; any other table is created (and widened) on
+first insert. RPCs are plain Python functions registered by name.
+Embedded resources (``select("*, tags(*)")``) are not supported.
+"""
+
+import asyncio
+import json
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from postgrest.base_request_builder import APIResponse
+from postgrest.exceptions import APIError
+
+from app.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Declared types drive value conversion in both directions
+_BOOL, _JSON = "BOOLEAN", "JSON"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY, email TEXT NOT NULL UNIQUE, password_hash TEXT, role TEXT DEFAULT 'customer',
+    name TEXT, created_at TEXT, updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS tickets (
+    id TEXT PRIMARY KEY, user_id TEXT, context TEXT, subject TEXT, status TEXT DEFAULT 'open',
+    priority TEXT DEFAULT 'medium', sla_id TEXT, source TEXT DEFAULT 'web', category TEXT,
+    assigned_to TEXT, is_deleted BOOLEAN DEFAULT 0, deleted_at TEXT,
+    first_response_at TEXT, last_response_at TEXT, resolved_at TEXT,
+    conversation_summary TEXT, summary_message_count INTEGER DEFAULT 0, summary_updated_at TEXT,
+    created_at TEXT, updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_tickets_updated_at_id ON tickets(updated_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_tickets_user_updated_at_id ON tickets(user_id, updated_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_tickets_assigned_updated_at_id ON tickets(assigned_to, updated_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_tickets_open_lookup ON tickets(user_id, context, subject, status);
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY, ticket_id TEXT, sender TEXT NOT NULL, message TEXT NOT NULL,
+    confidence REAL, success BOOLEAN, cached_response_id TEXT, created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_messages_ticket_created ON messages(ticket_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_messages_ticket_sender_created ON messages(ticket_id, sender, created_at);
+CREATE TABLE IF NOT EXISTS ratings (
+    id TEXT PRIMARY KEY, ticket_id TEXT NOT NULL, message_id TEXT NOT NULL, user_id TEXT NOT NULL,
+    rating INTEGER NOT NULL, created_at TEXT, UNIQUE(ticket_id, message_id, user_id)
+);
+CREATE TABLE IF NOT EXISTS sla_definitions (
+    id TEXT PRIMARY KEY, name TEXT, description TEXT, priority TEXT NOT NULL,
+    response_time_minutes INTEGER DEFAULT 480, resolution_time_minutes INTEGER DEFAULT 2880,
+    business_hours_only BOOLEAN DEFAULT 0, business_hours_start TEXT, business_hours_end TEXT,
+    business_days JSON, is_active BOOLEAN DEFAULT 1, created_by TEXT, created_at TEXT, updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_sla_priority_active ON sla_definitions(priority, is_active, created_at);
+CREATE TABLE IF NOT EXISTS knowledge_documents (
+    id TEXT PRIMARY KEY, title TEXT NOT NULL, source TEXT DEFAULT 'manual', file_name TEXT, file_url TEXT,
+    content_hash TEXT, total_chunks INTEGER DEFAULT 0, metadata JSON, tenant_id TEXT, created_by TEXT,
+    created_at TEXT, updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_knowledge_documents_created_at_id ON knowledge_documents(created_at DESC, id DESC);
+CREATE TABLE IF NOT EXISTS document_chunks (
+    id TEXT PRIMARY KEY, document_id TEXT, chunk_index INTEGER NOT NULL, content TEXT NOT NULL,
+    token_count INTEGER, embedding JSON, metadata JSON, created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_chunks_document ON document_chunks(document_id);
+CREATE TABLE IF NOT EXISTS ticket_embeddings (
+    id TEXT PRIMARY KEY, ticket_id TEXT NOT NULL UNIQUE, embedding JSON, summary_text TEXT, created_at TEXT
+);
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    id TEXT PRIMARY KEY, model TEXT NOT NULL, text_hash TEXT NOT NULL, embedding JSON, created_at TEXT,
+    UNIQUE(model, text_hash)
+);
+CREATE TABLE IF NOT EXISTS workflow_step_cache (
+    id TEXT PRIMARY KEY, cache_key TEXT NOT NULL UNIQUE, agent_name TEXT NOT NULL, model TEXT NOT NULL,
+    output JSON NOT NULL, created_at TEXT
+);
+CREATE TABLE IF NOT EXISTS compliance_result_cache (
+    id TEXT PRIMARY KEY, cache_key TEXT NOT NULL UNIQUE, requirement_id TEXT, content_hash TEXT NOT NULL,
+    model TEXT NOT NULL, prompt_version TEXT NOT NULL, result JSON NOT NULL, created_at TEXT
+);
+CREATE TABLE IF NOT EXISTS knowledge_base_state (
+    id INTEGER PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0, updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS response_cache (
+    id TEXT PRIMARY KEY, context TEXT NOT NULL, user_id TEXT NOT NULL, kb_version INTEGER NOT NULL,
+    question TEXT NOT NULL,
+    embedding JSON, answer TEXT NOT NULL, source_message_id TEXT UNIQUE, created_at TEXT, expires_at TEXT
+);
+CREATE TABLE IF NOT EXISTS ai_reply_jobs (
+    id TEXT PRIMARY KEY, ticket_id TEXT NOT NULL, user_id TEXT, priority TEXT DEFAULT 'medium',
+    status TEXT DEFAULT 'queued', prompt TEXT NOT NULL, context TEXT, question TEXT, result JSON,
+    error TEXT, created_at TEXT, started_at TEXT, finished_at TEXT
+);
+CREATE TABLE IF NOT EXISTS compliance_evaluations (
+    id TEXT PRIMARY KEY, template_id TEXT, document_id TEXT, results JSON, overall_score REAL,
+    summary TEXT, evaluated_by TEXT, evaluated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_compliance_evaluations_evaluated_at_id ON compliance_evaluations(evaluated_at DESC, id DESC);
+CREATE TABLE IF NOT EXISTS email_templates (
+    id TEXT PRIMARY KEY, name TEXT NOT NULL, template_type TEXT, subject TEXT, body_text TEXT,
+    body_html TEXT, variables JSON, is_active BOOLEAN DEFAULT 1, brand_id TEXT, created_by TEXT,
+    created_at TEXT, updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_email_templates_created_at_id ON email_templates(created_at DESC, id DESC);
+"""
+
+_IDENT_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_COMPARISONS = {"eq": "=", "neq": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="microseconds")
+
+
+def _normalize_timestamp(value: str) -> str:
+    """Store ``*_at`` values in one UTC format so text comparison orders like timestamptz."""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return value
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).isoformat(timespec="microseconds")
+
+
+def _ident(name: str) -> str:
+    if not _IDENT_RE.match(name):
+        raise APIError({"message": f"Invalid identifier: {name!r}", "code": "PGRST100"})
+    return f'"{name}"'
+
+
+def _declared_type(value: Any) -> str:
+    if isinstance(value, bool):
+        return _BOOL
+    if isinstance(value, int):
+        return "INTEGER"
+    if isinstance(value, float):
+        return "REAL"
+    if isinstance(value, (dict, list)):
+        return _JSON
+    return "TEXT"
+
+
+def _like_to_glob(pattern: str) -> str:
+    escaped = re.sub(r"([\[\]*?])", r"[\1]", pattern)
+    return escaped.replace("%", "*").replace("_", "?")
+
+
+# ---------------------------------------------------
+# Database
+# ---------------------------------------------------
+class SQLiteDatabase:
+    """A single SQLite connection shared by every builder, guarded by a lock."""
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        self._columns: Dict[str, Dict[str, str]] = {}
+        # Parsed embedding matrices for the vector RPCs, dropped on any write
+        self._vectors: Dict[str, Tuple[List[sqlite3.Row], np.ndarray]] = {}
+        self._rpcs: Dict[str, Callable[["SQLiteDatabase", Dict[str, Any]], List[Dict[str, Any]]]] = {}
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+        register_builtin_rpcs(self)
+
+    # -- schema --------------------------------------------------------
+    def columns(self, table: str) -> Dict[str, str]:
+        """Column name → declared type ('' when the table does not exist)."""
+        if table not in self._columns:
+            info = self._conn.execute(f"PRAGMA table_info({_ident(table)})").fetchall()
+            if not info:
+                return {}
+            self._columns[table] = {row["name"]: (row["type"] or "").upper() for row in info}
+        return self._columns[table]
+
+    def _ensure_columns(self, table: str, rows: List[Dict[str, Any]]) -> None:
+        existing = self.columns(table)
+        wanted: Dict[str, str] = {}
+        for row in rows:
+            for key, value in row.items():
+                if key not in existing and key not in wanted and value is not None:
+                    wanted[key] = _declared_type(value)
+                elif key not in existing and key not in wanted:
+                    wanted.setdefault(key, "TEXT")
+        if not existing:
+            cols = ", ".join(
+                ["id TEXT PRIMARY KEY", "created_at TEXT"]
+                + [f"{_ident(c)} {t}" for c, t in wanted.items() if c not in ("id", "created_at")]
+            )
+            self._conn.execute(f"CREATE TABLE {_ident(table)} ({cols})")
+        else:
+            for column, decl in wanted.items():
+                self._conn.execute(f"ALTER TABLE {_ident(table)} ADD COLUMN {_ident(column)} {decl}")
+        self._columns.pop(table, None)
+
+    # -- value conversion ----------------------------------------------
+    def to_sql(self, table: str, column: str, value: Any) -> Any:
+        decl = self.columns(table).get(column, "")
+        if value is None:
+            return None
+        if decl == _JSON or isinstance(value, (dict, list)):
+            return value if isinstance(value, str) else json.dumps(value)
+        if decl == _BOOL or isinstance(value, bool):
+            if isinstance(value, str):
+                return 1 if value.lower() == "true" else 0
+            return int(bool(value))
+        if isinstance(value, str) and column.endswith("_at"):
+            return _normalize_timestamp(value)
+        return value
+
+    def from_row(self, table: str, row: sqlite3.Row) -> Dict[str, Any]:
+        types = self.columns(table)
+        out = {}
+        for key in row.keys():
+            value = row[key]
+            decl = types.get(key, "")
+            if value is not None and decl == _BOOL:
+                value = bool(value)
+            elif value is not None and decl == _JSON:
+                value = json.loads(value)
+            out[key] = value
+        return out
+
+    # -- execution -----------------------------------------------------
+    def query(self, sql: str, params: Tuple = ()) -> List[sqlite3.Row]:
+        try:
+            with self._lock:
+                return self._conn.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            raise APIError({"message": str(e), "code": "SQLITE", "hint": sql})
+
+    def prepare_rows(self, table: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Fill ``id``/timestamps like the Postgres column defaults would."""
+        now = _now()
+        prepared = []
+        for row in rows:
+            row = dict(row)
+            row.setdefault("id", str(uuid.uuid4()))
+            for column in ("created_at", "updated_at", "evaluated_at"):
+                if column in self.columns(table) or (column == "created_at" and not self.columns(table)):
+                    row.setdefault(column, now)
+            prepared.append(row)
+        return prepared
+
+    def insert_rows(
+        self,
+        table: str,
+        rows: List[Dict[str, Any]],
+        *,
+        on_conflict: Optional[List[str]] = None,
+        ignore_duplicates: bool = False,
+    ) -> List[Dict[str, Any]]:
+        if not rows:
+            return []
+        with self._lock:
+            self.invalidate(table)
+            rows = self.prepare_rows(table, rows)
+            self._ensure_columns(table, rows)
+            columns = list(dict.fromkeys(c for row in rows for c in row))
+            placeholders = ", ".join("?" for _ in columns)
+            sql = (
+                f"INSERT INTO {_ident(table)} ({', '.join(_ident(c) for c in columns)}) "
+                f"VALUES ({placeholders})"
+            )
+            if on_conflict is not None:
+                target = ", ".join(_ident(c) for c in on_conflict)
+                if ignore_duplicates:
+                    sql += f" ON CONFLICT({target}) DO NOTHING"
+                else:
+                    updates = ", ".join(
+                        f"{_ident(c)} = excluded.{_ident(c)}" for c in columns if c not in on_conflict
+                    )
+                    sql += f" ON CONFLICT({target}) DO UPDATE SET {updates}" if updates else f" ON CONFLICT({target}) DO NOTHING"
+            values = [
+                tuple(self.to_sql(table, c, row.get(c)) for c in columns) for row in rows
+            ]
+            try:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(sql, values)
+                self._conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                self._conn.execute("ROLLBACK")
+                raise APIError({"message": str(e), "code": "SQLITE", "hint": sql})
+            key = on_conflict or ["id"]
+            if key == ["id"]:
+                ids = [row["id"] for row in rows]
+                found = self.query(
+                    f"SELECT * FROM {_ident(table)} WHERE id IN ({', '.join('?' for _ in ids)})",
+                    tuple(ids),
+                )
+                by_id = {r["id"]: self.from_row(table, r) for r in found}
+                return [by_id[i] for i in ids if i in by_id]
+            return rows
+
+    def bulk_insert(self, table: str, rows: List[Dict[str, Any]], batch_size: int = 10000) -> int:
+        """Fast seeding path for load tests: batched inserts without returning rows."""
+        total = 0
+        for start in range(0, len(rows), batch_size):
+            batch = self.prepare_rows(table, rows[start:start + batch_size])
+            with self._lock:
+                self.invalidate(table)
+                self._ensure_columns(table, batch)
+                columns = list(dict.fromkeys(c for row in batch for c in row))
+                sql = (
+                    f"INSERT INTO {_ident(table)} ({', '.join(_ident(c) for c in columns)}) "
+                    f"VALUES ({', '.join('?' for _ in columns)})"
+                )
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    sql, [tuple(self.to_sql(table, c, r.get(c)) for c in columns) for r in batch]
+                )
+                self._conn.execute("COMMIT")
+            total += len(batch)
+        return total
+
+    def invalidate(self, table: str) -> None:
+        self._vectors.pop(table, None)
+
+    def embedding_rows(self, table: str, columns: str) -> Tuple[List[sqlite3.Row], np.ndarray]:
+        """Rows of *table* with an embedding, plus their stacked vectors.
+
+        Parsing the JSON-encoded vectors dominates the vector RPCs, so the
+        result is kept until the next write to *table*.
+        """
+        with self._lock:
+            cached = self._vectors.get(table)
+            if cached is None:
+                rows = self.query(f"SELECT {columns}, embedding FROM {_ident(table)} WHERE embedding IS NOT NULL")
+                matrix = np.array([json.loads(r["embedding"]) for r in rows], dtype=np.float32)
+                cached = self._vectors[table] = (rows, matrix)
+            return cached
+
+    # -- rpc -----------------------------------------------------------
+    def register_rpc(
+        self, name: str, fn: Callable[["SQLiteDatabase", Dict[str, Any]], List[Dict[str, Any]]]
+    ) -> None:
+        self._rpcs[name] = fn
+
+    def call_rpc(self, name: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if name not in self._rpcs:
+            raise APIError({"message": f"Function {name} not registered", "code": "PGRST202"})
+        return self._rpcs[name](self, params or {})
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# ---------------------------------------------------
+# Filter grammar
+# ---------------------------------------------------
+def _split_top_level(expression: str) -> List[str]:
+    parts, depth, quoted, current = [], 0, False, []
+    i = 0
+    while i < len(expression):
+        ch = expression[i]
+        if quoted:
+            current.append(ch)
+            if ch == "\\" and i + 1 < len(expression):
+                current.append(expression[i + 1])
+                i += 1
+            elif ch == '"':
+                quoted = False
+        elif ch == '"':
+            quoted = True
+            current.append(ch)
+        elif ch == "(":
+            depth += 1
+            current.append(ch)
+        elif ch == ")":
+            depth -= 1
+            current.append(ch)
+        elif ch == "," and depth == 0:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(ch)
+        i += 1
+    if current:
+        parts.append("".join(current))
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return re.sub(r"\\(.)", r"\1", value[1:-1])
+    return value
+
+
+class _Filters:
+    """Accumulates WHERE fragments and their parameters for one table."""
+
+    def __init__(self, db: SQLiteDatabase, table: str):
+        self.db = db
+        self.table = table
+        self.clauses: List[str] = []
+        self.params: List[Any] = []
+
+    def condition(self, column: str, operator: str, value: Any) -> Tuple[str, List[Any]]:
+        col = _ident(column)
+        negate = operator.startswith("not.")
+        if negate:
+            operator = operator[4:]
+        if operator in _COMPARISONS:
+            sql, params = f"{col} {_COMPARISONS[operator]} ?", [self.db.to_sql(self.table, column, value)]
+        elif operator == "like":
+            sql, params = f"{col} GLOB ?", [_like_to_glob(value)]
+        elif operator == "ilike":
+            sql, params = f"{col} LIKE ? ESCAPE '\\'", [value]
+        elif operator == "is":
+            literal = {"null": "NULL", "true": "1", "false": "0"}[str(value).lower()]
+            sql, params = f"{col} IS {literal}", []
+        elif operator == "in":
+            values = list(value)
+            if not values:
+                sql, params = "0", []
+            else:
+                sql = f"{col} IN ({', '.join('?' for _ in values)})"
+                params = [self.db.to_sql(self.table, column, v) for v in values]
+        else:
+            raise APIError({"message": f"Unsupported operator {operator!r}", "code": "PGRST100"})
+        if negate:
+            sql = f"NOT ({sql})"
+        return sql, params
+
+    def add(self, column: str, operator: str, value: Any) -> None:
+        sql, params = self.condition(column, operator, value)
+        self.clauses.append(sql)
+        self.params.extend(params)
+
+    def parse_group(self, expression: str, joiner: str) -> Tuple[str, List[Any]]:
+        fragments, params = [], []
+        for item in _split_top_level(expression):
+            for prefix, nested in (("and(", "AND"), ("or(", "OR")):
+                if item.startswith(prefix) and item.endswith(")"):
+                    sql, p = self.parse_group(item[len(prefix):-1], nested)
+                    break
+            else:
+                column, rest = item.split(".", 1)
+                negate = rest.startswith("not.")
+                operator, raw = rest[4:].split(".", 1) if negate else rest.split(".", 1)
+                if operator == "in":
+                    value: Any = [_unquote(v) for v in _split_top_level(raw.strip("()"))]
+                else:
+                    value = _unquote(raw)
+                sql, p = self.condition(column, f"not.{operator}" if negate else operator, value)
+            fragments.append(f"({sql})")
+            params.extend(p)
+        return f" {joiner} ".join(fragments) or "1", params
+
+    def add_or(self, expression: str) -> None:
+        expression = expression.strip()
+        if expression.startswith("(") and expression.endswith(")"):
+            expression = expression[1:-1]
+        sql, params = self.parse_group(expression, "OR")
+        self.clauses.append(f"({sql})")
+        self.params.extend(params)
+
+    def where(self) -> str:
+        return f" WHERE {' AND '.join(self.clauses)}" if self.clauses else ""
+
+
+# ---------------------------------------------------
+# Query builders
+# ---------------------------------------------------
+class SQLiteQueryBuilder:
+    """Chainable builder mirroring postgrest-py's request builders."""
+
+    def __init__(self, db: SQLiteDatabase, table: str, latency_ms: float = 0.0):
+        self._db = db
+        self._table = table
+        self._latency_ms = latency_ms
+        self._method = "select"
+        self._columns = "*"
+        self._count: Optional[str] = None
+        self._payload: Any = None
+        self._on_conflict: Optional[List[str]] = None
+        self._ignore_duplicates = False
+        self._filters = _Filters(db, table)
+        self._order: List[str] = []
+        self._limit: Optional[int] = None
+        self._offset: Optional[int] = None
+
+    # -- statements ----------------------------------------------------
+    def select(self, *columns: str, count: Optional[str] = None):
+        self._method = "select"
+        self._columns = ",".join(columns) if columns else "*"
+        self._count = count
+        return self
+
+    def insert(self, json: Union[Dict, List[Dict]], *, count: Optional[str] = None, **_):
+        self._method = "insert"
+        self._payload = json if isinstance(json, list) else [json]
+        return self
+
+    def upsert(
+        self,
+        json: Union[Dict, List[Dict]],
+        *,
+        on_conflict: str = "",
+        ignore_duplicates: bool = False,
+        **_,
+    ):
+        self._method = "insert"
+        self._payload = json if isinstance(json, list) else [json]
+        self._on_conflict = [c.strip() for c in on_conflict.split(",") if c.strip()] or ["id"]
+        self._ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, json: Dict[str, Any], **_):
+        self._method = "update"
+        self._payload = json
+        return self
+
+    def delete(self, **_):
+        self._method = "delete"
+        return self
+
+    # -- filters -------------------------------------------------------
+    def eq(self, column: str, value: Any):
+        self._filters.add(column, "eq", value)
+        return self
+
+    def neq(self, column: str, value: Any):
+        self._filters.add(column, "neq", value)
+        return self
+
+    def gt(self, column: str, value: Any):
+        self._filters.add(column, "gt", value)
+        return self
+
+    def gte(self, column: str, value: Any):
+        self._filters.add(column, "gte", value)
+        return self
+
+    def lt(self, column: str, value: Any):
+        self._filters.add(column, "lt", value)
+        return self
+
+    def lte(self, column: str, value: Any):
+        self._filters.add(column, "lte", value)
+        return self
+
+    def like(self, column: str, pattern: str):
+        self._filters.add(column, "like", pattern)
+        return self
+
+    def ilike(self, column: str, pattern: str):
+        self._filters.add(column, "ilike", pattern)
+        return self
+
+    def is_(self, column: str, value: Any):
+        self._filters.add(column, "is", "null" if value is None else value)
+        return self
+
+    def in_(self, column: str, values):
+        self._filters.add(column, "in", values)
+        return self
+
+    def or_(self, filters: str, **_):
+        self._filters.add_or(filters)
+        return self
+
+    # -- modifiers -----------------------------------------------------
+    def order(self, column: str, *, desc: bool = False, nullsfirst: bool = False, **_):
+        # Same serialisation as postgrest-py, so "a.desc,b" + desc=True → "a.desc,b.desc"
+        spec = f"{column}{'.desc' if desc else ''}{'.nullsfirst' if nullsfirst else ''}"
+        for item in spec.split(","):
+            name, *flags = item.strip().split(".")
+            direction = "DESC" if "desc" in flags else "ASC"
+            nulls = "FIRST" if "nullsfirst" in flags or (direction == "DESC" and "nullslast" not in flags) else "LAST"
+            self._order.append(f"{_ident(name)} {direction} NULLS {nulls}")
+        return self
+
+    def limit(self, size: int, **_):
+        self._limit = size
+        return self
+
+    def offset(self, size: int):
+        self._offset = size
+        return self
+
+    def range(self, start: int, end: int):
+        # postgrest-py 0.13 sends `Range: start-(end-1)`
+        self._offset = start
+        self._limit = max(end - start, 0)
+        return self
+
+    # -- execution -----------------------------------------------------
+    def _select_columns(self) -> str:
+        if self._columns.strip() == "*":
+            return "*"
+        names = [c.strip() for c in self._columns.split(",") if c.strip()]
+        if any("(" in n for n in names):
+            raise APIError({"message": "Embedded resources are not supported by the SQLite backend", "code": "PGRST100"})
+        return ", ".join(_ident(n) for n in names)
+
+    def _run(self) -> APIResponse:
+        db, table = self._db, self._table
+        if self._method == "insert":
+            rows = db.insert_rows(
+                table, self._payload, on_conflict=self._on_conflict,
+                ignore_duplicates=self._ignore_duplicates,
+            )
+            return APIResponse(data=rows, count=None)
+
+        if not db.columns(table):
+            # Unknown table: nothing to read or change yet
+            return APIResponse(data=[], count=0 if self._count else None)
+
+        where, params = self._filters.where(), tuple(self._filters.params)
+        if self._method == "update":
+            with db._lock:
+                ids = [r["id"] for r in db.query(f"SELECT id FROM {_ident(table)}{where}", params)]
+                if ids:
+                    db.invalidate(table)
+                    db._ensure_columns(table, [self._payload])
+                    assignments = ", ".join(f"{_ident(c)} = ?" for c in self._payload)
+                    values = tuple(db.to_sql(table, c, v) for c, v in self._payload.items())
+                    marks = ", ".join("?" for _ in ids)
+                    db.query(f"UPDATE {_ident(table)} SET {assignments} WHERE id IN ({marks})", values + tuple(ids))
+                    rows = db.query(f"SELECT * FROM {_ident(table)} WHERE id IN ({marks})", tuple(ids))
+                else:
+                    rows = []
+            return APIResponse(data=[db.from_row(table, r) for r in rows], count=None)
+
+        if self._method == "delete":
+            with db._lock:
+                rows = db.query(f"SELECT * FROM {_ident(table)}{where}", params)
+                db.invalidate(table)
+                db.query(f"DELETE FROM {_ident(table)}{where}", params)
+            return APIResponse(data=[db.from_row(table, r) for r in rows], count=None)
+
+        sql = f"SELECT {self._select_columns()} FROM {_ident(table)}{where}"
+        if self._order:
+            sql += f" ORDER BY {', '.join(self._order)}"
+        if self._limit is not None or self._offset is not None:
+            sql += f" LIMIT {int(self._limit) if self._limit is not None else -1}"
+            sql += f" OFFSET {int(self._offset or 0)}"
+        rows = [db.from_row(table, r) for r in db.query(sql, params)]
+        count = None
+        if self._count:
+            count = db.query(f"SELECT count(*) FROM {_ident(table)}{where}", params)[0][0]
+        return APIResponse(data=rows, count=count)
+
+    def execute(self) -> APIResponse:
+        if self._latency_ms:
+            time.sleep(self._latency_ms / 1000)
+        return self._run()
+
+
+class SQLiteRpcBuilder:
+    def __init__(self, db: SQLiteDatabase, fn: str, params: Dict[str, Any], latency_ms: float = 0.0):
+        self._db, self._fn, self._params, self._latency_ms = db, fn, params, latency_ms
+
+    def _run(self) -> APIResponse:
+        return APIResponse(data=self._db.call_rpc(self._fn, self._params), count=None)
+
+    def execute(self) -> APIResponse:
+        if self._latency_ms:
+            time.sleep(self._latency_ms / 1000)
+        return self._run()
+
+
+class AsyncSQLiteQueryBuilder(SQLiteQueryBuilder):
+    async def execute(self) -> APIResponse:
+        # SQLite itself is in-process and fast; only the simulated network hop yields
+        if self._latency_ms:
+            await asyncio.sleep(self._latency_ms / 1000)
+        return self._run()
+
+
+class AsyncSQLiteRpcBuilder(SQLiteRpcBuilder):
+    async def execute(self) -> APIResponse:
+        if self._latency_ms:
+            await asyncio.sleep(self._latency_ms / 1000)
+        return self._run()
+
+
+class SQLiteClient:
+    """Drop-in for the sync Supabase client's ``table()``/``rpc()`` surface.
+
+    *latency_ms* adds a fixed delay per round trip to approximate a remote
+    database during load tests.
+    """
+
+    _query_builder = SQLiteQueryBuilder
+    _rpc_builder = SQLiteRpcBuilder
+
+    def __init__(self, db: SQLiteDatabase, latency_ms: float = 0.0):
+        self.db = db
+        self.latency_ms = latency_ms
+
+    def table(self, name: str):
+        return self._query_builder(self.db, name, self.latency_ms)
+
+    def from_(self, name: str):
+        return self.table(name)
+
+    def rpc(self, fn: str, params: Optional[Dict[str, Any]] = None, **_):
+        return self._rpc_builder(self.db, fn, params or {}, self.latency_ms)
+
+
+class AsyncSQLiteClient(SQLiteClient):
+    """Async counterpart used by the ticket repository (``await ....execute()``)."""
+
+    _query_builder = AsyncSQLiteQueryBuilder
+    _rpc_builder = AsyncSQLiteRpcBuilder
+
+    async def aclose(self) -> None:
+        return None
+
+
+# ---------------------------------------------------
+# Built-in RPCs (Python ports of the Postgres functions)
+# ---------------------------------------------------
+def _cosine_top_k(
+    db: SQLiteDatabase, table: str, columns: str, query_embedding, threshold: float, count: int,
+    exclude: Optional[Callable[[sqlite3.Row], bool]] = None,
+) -> List[Tuple[float, sqlite3.Row]]:
+    rows, matrix = db.embedding_rows(table, columns)
+    if not rows:
+        return []
+    query = np.asarray(query_embedding, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+    sims = matrix @ query / np.where(norms == 0, 1.0, norms)
+    hits = []
+    for i in np.argsort(-sims):
+        if sims[i] <= threshold or len(hits) == count:
+            break
+        if exclude is None or not exclude(rows[i]):
+            hits.append((float(sims[i]), rows[i]))
+    return hits
+
+
+def _chunk_rows(hits: List[Tuple[float, sqlite3.Row]]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": r["id"],
+            "document_id": r["document_id"],
+            "content": r["content"],
+            "chunk_index": r["chunk_index"],
+            "similarity": sim,
+        }
+        for sim, r in hits
+    ]
+
+
+def _rpc_match_chunks(db: SQLiteDatabase, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    hits = _cosine_top_k(
+        db, "document_chunks", "id, document_id, content, chunk_index", params["query_embedding"],
+        params.get("match_threshold", 0.7), params.get("match_count", 5),
+    )
+    return _chunk_rows(hits)
+
+
+def _json_contains(value: Any, pattern: Any) -> bool:
+    """JSONB ``@>`` for objects, arrays and scalars."""
+    if isinstance(pattern, dict):
+        return isinstance(value, dict) and all(
+            k in value and _json_contains(value[k], v) for k, v in pattern.items()
+        )
+    if isinstance(pattern, list):
+        return isinstance(value, list) and all(any(_json_contains(x, p) for x in value) for p in pattern)
+    return value == pattern
+
+
+def _rpc_match_chunks_filtered(db: SQLiteDatabase, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Port of migration 027: match_chunks within documents passing the filters."""
+    ids = params.get("p_document_ids")
+    allowed = set(ids) if ids is not None else None
+    source, tenant_id, metadata = params.get("p_source"), params.get("p_tenant_id"), params.get("p_metadata")
+    if source is not None or tenant_id is not None or metadata is not None:
+        matching = {
+            r["id"]
+            for r in db.query("SELECT id, source, tenant_id, metadata FROM knowledge_documents")
+            if (source is None or r["source"] == source)
+            and (tenant_id is None or r["tenant_id"] == tenant_id)
+            and (metadata is None or _json_contains(json.loads(r["metadata"] or "{}"), metadata))
+        }
+        allowed = matching if allowed is None else allowed & matching
+    hits = _cosine_top_k(
+        db, "document_chunks", "id, document_id, content, chunk_index", params["query_embedding"],
+        params.get("match_threshold", 0.7), params.get("match_count", 5),
+        exclude=None if allowed is None else lambda r: r["document_id"] not in allowed,
+    )
+    return _chunk_rows(hits)
+
+
+def _rpc_match_tickets(db: SQLiteDatabase, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    excluded = params.get("exclude_ticket_id")
+    hits = _cosine_top_k(
+        db, "ticket_embeddings", "ticket_id, summary_text", params["query_embedding"],
+        params.get("match_threshold", 0.6), params.get("match_count", 5),
+        exclude=lambda r: r["ticket_id"] == excluded,
+    )
+    return [
+        {"ticket_id": r["ticket_id"], "summary_text": r["summary_text"], "similarity": sim}
+        for sim, r in hits
+    ]
+
+
+def _rpc_search_tickets(db: SQLiteDatabase, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Substring port of migration 019 (subject hits rank above message hits)."""
+    pattern = "%" + re.sub(r"([\\%_])", r"\\\1", params["p_query"]) + "%"
+    clauses, args = ["t.is_deleted = 0"], [pattern, pattern, pattern]
+    for column, key in (
+        ("user_id", "p_user_id"), ("assigned_to", "p_assigned_to"),
+        ("status", "p_status"), ("context", "p_context"),
+    ):
+        if params.get(key) is not None:
+            clauses.append(f"t.{column} = ?")
+            args.append(params[key])
+    if params.get("p_date_from"):
+        clauses.append("t.created_at >= ?")
+        args.append(_normalize_timestamp(params["p_date_from"]))
+    if params.get("p_date_to"):
+        clauses.append("t.created_at <= ?")
+        args.append(_normalize_timestamp(params["p_date_to"]))
+    args += [params.get("p_limit", 10), params.get("p_offset", 0)]
+    rows = db.query(
+        f"""
+        SELECT t.*, count(*) OVER () AS total_count FROM (
+            SELECT t.*,
+                   CASE WHEN t.subject LIKE ? ESCAPE '\\' THEN 2.0 ELSE 1.0 END AS rank
+            FROM tickets t
+            WHERE (t.subject LIKE ? ESCAPE '\\'
+                   OR EXISTS (
+                       SELECT 1 FROM messages m WHERE m.ticket_id = t.id AND m.message LIKE ? ESCAPE '\\'
+                   ))
+              AND {' AND '.join(clauses)}
+        ) t
+        ORDER BY rank DESC, updated_at DESC, id DESC
+        LIMIT ? OFFSET ?
+        """,
+        tuple(args),
+    )
+    results = []
+    for row in rows:
+        ticket = db.from_row("tickets", row)
+        rank, total = ticket.pop("rank"), ticket.pop("total_count")
+        results.append({"ticket": ticket, "rank": rank, "total_count": total})
+    return results
+
+
+def _rpc_create_or_continue_ticket(db: SQLiteDatabase, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Port of migration 021; the connection lock stands in for the advisory lock."""
+    with db._lock:
+        ticket = None
+        if params.get("p_ticket_id"):
+            rows = db.query("SELECT * FROM tickets WHERE id = ?", (params["p_ticket_id"],))
+            ticket = db.from_row("tickets", rows[0]) if rows else None
+        elif params.get("p_continue_open", True) and params.get("p_user_id"):
+            rows = db.query(
+                "SELECT * FROM tickets WHERE user_id = ? AND context = ? AND subject = ? AND status = 'open' "
+                "ORDER BY created_at DESC LIMIT 1",
+                (params["p_user_id"], params["p_context"], params["p_subject"]),
+            )
+            ticket = db.from_row("tickets", rows[0]) if rows else None
+
+        created = ticket is None
+        if created:
+            priority = params.get("p_priority", "medium")
+            sla = db.query(
+                "SELECT id FROM sla_definitions WHERE priority = ? AND is_active = 1 ORDER BY created_at DESC LIMIT 1",
+                (priority,),
+            )
+            ticket = db.insert_rows("tickets", [{
+                "context": params["p_context"],
+                "subject": params["p_subject"],
+                "status": "open",
+                "priority": priority,
+                "sla_id": sla[0]["id"] if sla else None,
+                "user_id": params.get("p_user_id"),
+                "source": params.get("p_source", "web"),
+            }])[0]
+
+        message = db.insert_rows(
+            "messages", [{"ticket_id": ticket["id"], "sender": "customer", "message": params["p_message"]}]
+        )[0]
+        history = db.query(
+            "SELECT sender, message, created_at FROM messages WHERE ticket_id = ? ORDER BY created_at, id",
+            (ticket["id"],),
+        )
+        window_start = datetime.now(timezone.utc).timestamp() - params.get("p_rate_window_seconds", 60)
+        ai_replies = db.query(
+            "SELECT count(*) AS n FROM messages WHERE ticket_id = ? AND sender = 'ai' AND created_at >= ?",
+            (ticket["id"], datetime.fromtimestamp(window_start, timezone.utc).isoformat(timespec="microseconds")),
+        )[0]["n"]
+    return [{
+        "ticket": ticket,
+        "created": created,
+        "message": message,
+        "history": [dict(r) for r in history],
+        "ai_replies_in_window": ai_replies,
+    }]
+
+
+def _kb_version(db: SQLiteDatabase) -> int:
+    rows = db.query("SELECT version FROM knowledge_base_state LIMIT 1")
+    return rows[0]["version"] if rows else 0
+
+
+def _rpc_match_cached_response(db: SQLiteDatabase, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Port of migration 023: closest live answer for the context, customer and current KB version."""
+    version, now = _kb_version(db), _now()
+    hits = _cosine_top_k(
+        db, "response_cache", "id, context, user_id, kb_version, question, answer, expires_at",
+        params["query_embedding"], params.get("match_threshold", 0.92), 1,
+        exclude=lambda r: (
+            r["context"] != params["p_context"] or r["user_id"] != params["p_user_id"]
+            or r["kb_version"] != version or r["expires_at"] <= now
+        ),
+    )
+    return [
+        {"id": r["id"], "question": r["question"], "answer": r["answer"], "similarity": sim}
+        for sim, r in hits
+    ]
+
+
+def _rpc_bump_kb_version(db: SQLiteDatabase, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    now = _now()
+    db.query(
+        "INSERT INTO knowledge_base_state (id, version, updated_at) VALUES (1, 1, ?) "
+        "ON CONFLICT(id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at",
+        (now,),
+    )
+    version = _kb_version(db)
+    db.query("DELETE FROM response_cache WHERE kb_version < ? OR expires_at <= ?", (version, now))
+    db.invalidate("response_cache")
+    return [{"version": version}]
+
+
+def register_builtin_rpcs(db: SQLiteDatabase) -> None:
+    db.register_rpc("match_chunks", _rpc_match_chunks)
+    db.register_rpc("match_chunks_filtered", _rpc_match_chunks_filtered)
+    db.register_rpc("match_tickets", _rpc_match_tickets)
+    db.register_rpc("search_tickets", _rpc_search_tickets)
+    db.register_rpc("create_or_continue_ticket", _rpc_create_or_continue_ticket)
+    db.register_rpc("match_cached_response", _rpc_match_cached_response)
+    db.register_rpc("bump_kb_version", _rpc_bump_kb_version)
+
+
+# ---------------------------------------------------
+# Shared instance (DB_BACKEND=sqlite)
+# ---------------------------------------------------
+_database: Optional[SQLiteDatabase] = None
+
+
+def get_sqlite_database() -> SQLiteDatabase:
+    """Return the process-wide SQLite database at ``settings.sqlite_path``."""
+    global _database
+    if _database is None:
+        from app.config import settings
+
+        _database = SQLiteDatabase(settings.sqlite_path)
+        logger.info(f"SQLite backend initialized at {settings.sqlite_path}")
+    return _database
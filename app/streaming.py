@@ -0,0 +1,191 @@
+"""Server-Sent Events streaming of AI replies.
+
+The streaming ticket endpoints send the reply as it is generated instead of
+waiting for the whole completion. Every delta goes through
+:class:`app.helpers.StreamSanitizer` before it leaves the server, and the
+complete (redacted) reply is stored in ``messages`` once generation finishes.
+
+Events, each a JSON ``data:`` payload:
+
+``ticket``        ``{ticket_id}``, sent first
+``token``         ``{text}``, a redacted piece of the reply
+``reply``         ``{ticket_id, reply}``, a complete reply that was not generated (human assigned)
+``rate_limited``  ``{ticket_id, wait_seconds}``
+``done``          ``{ticket_id, message_id, ttft_ms, duration_ms, flags, cached}``
+``error``         ``{detail}``
+
+When the semantic response cache has an approved answer to the question, it
+is sent as a single ``token`` event and ``done`` reports ``cached: true``.
+
+Time to first token (request start to the first ``token`` event) is recorded
+in :data:`stream_stats` and reported by ``GET /admin/stream-stats``.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import numpy as np
+from fastapi.responses import StreamingResponse
+
+from app.helpers import ReplyPrompt, StreamSanitizer, stream_ai_reply
+from app.logger import setup_logger
+from app.response_cache import response_cache
+from app.ticket_repository import ticket_repository
+
+logger = setup_logger(__name__)
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # keep nginx from buffering the stream
+}
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+# ---------------------------------------------------
+# Time-to-first-token metrics
+# ---------------------------------------------------
+class StreamStats:
+    """TTFT and duration of recent streamed replies (bounded sample window)."""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._lock = threading.Lock()
+        self._ttft_ms: List[float] = []
+        self._duration_ms: List[float] = []
+        self._completed = 0
+        self._failed = 0
+        self._disconnected = 0
+
+    def record(self, ttft_ms: Optional[float], duration_ms: float, outcome: str = "completed") -> None:
+        with self._lock:
+            if outcome == "completed":
+                self._completed += 1
+            elif outcome == "disconnected":
+                self._disconnected += 1
+            else:
+                self._failed += 1
+            if ttft_ms is not None:
+                self._ttft_ms = (self._ttft_ms + [ttft_ms])[-self.window:]
+            self._duration_ms = (self._duration_ms + [duration_ms])[-self.window:]
+
+    @staticmethod
+    def _percentiles(samples: List[float]) -> Dict[str, Optional[float]]:
+        if not samples:
+            return {"p50": None, "p95": None, "p99": None}
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+        return {"p50": round(float(p50), 1), "p95": round(float(p95), 1), "p99": round(float(p99), 1)}
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            ttft, duration = list(self._ttft_ms), list(self._duration_ms)
+            counts = {
+                "completed": self._completed,
+                "failed": self._failed,
+                "disconnected": self._disconnected,
+            }
+        return {
+            **counts,
+            "samples": len(duration),
+            "ttft_ms": self._percentiles(ttft),
+            "duration_ms": self._percentiles(duration),
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._ttft_ms.clear()
+            self._duration_ms.clear()
+            self._completed = self._failed = self._disconnected = 0
+
+
+# Global instance
+stream_stats = StreamStats()
+
+
+# ---------------------------------------------------
+# Reply stream
+# ---------------------------------------------------
+async def _replay(text: str) -> AsyncIterator[str]:
+    yield text
+
+
+async def stream_ai_message(ticket_id: str, prompt: ReplyPrompt, started: float) -> AsyncIterator[str]:
+    """Stream the AI reply for *prompt* as ``token`` events, then store it.
+
+    *started* is the ``time.perf_counter()`` value at which the request was
+    received. The OpenAI stream is consumed through the LLM gateway, so no
+    worker thread is held while waiting on it. If the client disconnects,
+    generation stops and nothing is stored.
+    """
+    sanitizer = StreamSanitizer()
+    parts: List[str] = []
+    ttft_ms: Optional[float] = None
+    outcome = "failed"
+    confidence = 0.95
+    try:
+        cached = await response_cache.alookup(prompt.context, prompt.question, prompt.user_id)
+        if cached:
+            confidence = round(float(cached["similarity"]), 3)
+        deltas = _replay(cached["answer"]) if cached else stream_ai_reply(prompt.text)
+        async for delta in deltas:
+            text = sanitizer.feed(delta)
+            if not text:
+                continue
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - started) * 1000
+            parts.append(text)
+            yield sse_event("token", {"text": text})
+
+        tail = sanitizer.flush()
+        if tail:
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - started) * 1000
+            parts.append(tail)
+            yield sse_event("token", {"text": tail})
+
+        message = await ticket_repository.add_message(
+            {
+                "ticket_id": ticket_id,
+                "sender": "ai",
+                "message": "".join(parts),
+                "confidence": confidence,
+                "success": True,
+                "cached_response_id": cached["id"] if cached else None,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            }
+        )
+        outcome = "completed"
+        duration_ms = (time.perf_counter() - started) * 1000
+        logger.info(
+            f"Streamed AI reply for ticket {ticket_id}: ttft {ttft_ms or 0:.0f}ms, total {duration_ms:.0f}ms"
+        )
+        yield sse_event(
+            "done",
+            {
+                "ticket_id": ticket_id,
+                "message_id": (message or {}).get("id"),
+                "ttft_ms": round(ttft_ms, 1) if ttft_ms is not None else None,
+                "duration_ms": round(duration_ms, 1),
+                "flags": sanitizer.flags,
+                "cached": cached is not None,
+            },
+        )
+    except (GeneratorExit, asyncio.CancelledError):
+        outcome = "disconnected"
+        logger.info(f"Client disconnected from AI reply stream for ticket {ticket_id}")
+        raise
+    except Exception as e:
+        logger.error(f"Error streaming AI reply for ticket {ticket_id}: {e}", exc_info=True)
+        yield sse_event("error", {"detail": "Failed to generate AI reply"})
+    finally:
+        stream_stats.record(ttft_ms, (time.perf_counter() - started) * 1000, outcome)
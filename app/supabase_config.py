@@ -1,6 +1,7 @@
 from supabase import create_client, Client
 from app.config import settings
 from app.logger import setup_logger
+from app.db_instrumentation import instrument_client
 
 logger = setup_logger(__name__)
 
@@ -62,8 +63,18 @@ def get_supabase_storage_client() -> Client:
         return None
 
 
+def get_database_client() -> Client:
+    """Return the client for the configured data backend (``DB_BACKEND``)."""
+    if settings.db_backend == "sqlite":
+        from app.sqlite_backend import SQLiteClient, get_sqlite_database
+
+        logger.info("Using embedded SQLite backend")
+        return SQLiteClient(get_sqlite_database())
+    return get_supabase_client()
+
+
 # Initialize Supabase client
-supabase: Client = get_supabase_client()
+supabase: Client = instrument_client(get_database_client())
 
 # Initialize Supabase storage client (with service role key if available)
-supabase_storage: Client = get_supabase_storage_client()
+supabase_storage: Client = instrument_client(get_supabase_storage_client())
@@ -0,0 +1,98 @@
+"""Base class for caches kept in a per-process LRU and a persistent table.
+
+:class:`TableBackedCache` holds what the compliance result and workflow step
+caches share: the bounded in-memory tier, writes to the table through
+:data:`app.write_buffer.buffered_writer` (upserted on ``cache_key``), and the
+hit/miss counters. Subclasses name the table and the column holding the cached
+value, build the rest of the row in ``put`` and implement their own table
+lookup.
+"""
+
+import asyncio
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.write_buffer import buffered_writer
+
+
+class TableBackedCache:
+    """LRU of JSON values keyed by ``cache_key`` and backed by ``TABLE``."""
+
+    TABLE: str
+    VALUE_COLUMN: str
+
+    def __init__(self, *, enabled: bool = True, persist: bool = True, max_entries: int = 1000, writer=None):
+        self.enabled = enabled
+        self.persist = persist
+        self.max_entries = max_entries
+        self.writer = writer if writer is not None else buffered_writer
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.reset_stats()
+
+    async def aput(self, *args, **kwargs) -> None:
+        """:meth:`put` from the event loop.
+
+        ``put`` may wait on a full write buffer (or write directly), so it runs
+        in a worker thread.
+        """
+        if self.enabled:
+            await asyncio.to_thread(self.put, *args, **kwargs)
+
+    def _store(self, key: str, value: Dict[str, Any], row: Dict[str, Any]) -> None:
+        """Remember *value* and write it to the table along with the extra *row* columns."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._put(key, value)
+            self._stats["stored"] += 1
+        if self.persist:
+            self.writer.enqueue(
+                self.TABLE,
+                [{"cache_key": key, **row, self.VALUE_COLUMN: value}],
+                on_conflict="cache_key",
+            )
+
+    @staticmethod
+    def _decode(value: Any) -> Optional[Dict[str, Any]]:
+        # JSON columns come back as text from some backends
+        return json.loads(value) if isinstance(value, str) else value
+
+    def _get_memory(self, key: str) -> Optional[Dict[str, Any]]:
+        # Caller holds self._lock
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def _put(self, key: str, value: Dict[str, Any]) -> None:
+        # Caller holds self._lock
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop the in-memory tier (the table is kept)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            s = dict(self._stats)
+            entries = len(self._entries)
+        lookups = s["memory_hits"] + s["table_hits"] + s["misses"]
+        return {
+            "enabled": self.enabled,
+            "persist": self.persist,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            **s,
+            "hit_ratio": round((lookups - s["misses"]) / lookups, 3) if lookups else None,
+        }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._stats = {"memory_hits": 0, "table_hits": 0, "misses": 0, "stored": 0}
@@ -0,0 +1,310 @@
+"""Async repository for the ticket hot paths.
+
+Wraps the shared async PostgREST client so endpoints can ``await`` their
+database calls instead of holding a threadpool slot per round trip.
+"""
+
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from app.async_db import get_async_db
+from app.config import settings
+from app.logger import setup_logger
+from app.pagination import (
+    apply_keyset,
+    build_pagination,
+    cursor_offset,
+    keyset_cursor,
+    offset_cursor,
+    order_keyset,
+    split_page,
+)
+from app.reference_cache import active_sla_for_priority, reference_cache
+
+logger = setup_logger(__name__)
+
+
+def ticket_intake_params(
+    *,
+    context: str,
+    subject: str,
+    message: str,
+    user_id: Optional[str],
+    priority: str = "medium",
+    source: str = "web",
+    ticket_id: Optional[str] = None,
+    continue_open: bool = True,
+) -> Dict[str, Any]:
+    """Parameters for the ``create_or_continue_ticket`` RPC (shared with sync callers)."""
+    return {
+        "p_context": context,
+        "p_subject": subject,
+        "p_message": message,
+        "p_user_id": user_id,
+        "p_priority": priority,
+        "p_source": source,
+        "p_ticket_id": ticket_id,
+        "p_continue_open": continue_open,
+        "p_rate_window_seconds": settings.ai_reply_window_seconds,
+    }
+
+
+class TicketRepository:
+    """Async data access for tickets, messages and ratings."""
+
+    def __init__(self, client=None):
+        self._client = client
+
+    @property
+    def db(self):
+        return self._client if self._client is not None else get_async_db()
+
+    @property
+    def is_configured(self) -> bool:
+        return self.db is not None
+
+    # ---------------------------------------------------
+    # Tickets
+    # ---------------------------------------------------
+    async def get_ticket(self, ticket_id: str) -> Optional[Dict[str, Any]]:
+        res = await self.db.table("tickets").select("*").eq("id", ticket_id).limit(1).execute()
+        return res.data[0] if res.data else None
+
+    async def create_or_continue_ticket(
+        self,
+        *,
+        context: str,
+        subject: str,
+        message: str,
+        user_id: Optional[str],
+        priority: str = "medium",
+        source: str = "web",
+        ticket_id: Optional[str] = None,
+        continue_open: bool = True,
+    ) -> Dict[str, Any]:
+        """Find or create the ticket and add the customer message in one round trip.
+
+        Runs the ``create_or_continue_ticket`` RPC (migration 021). Returns
+        ``{"ticket", "created", "message", "history", "ai_replies_in_window"}``.
+        """
+        params = ticket_intake_params(
+            context=context, subject=subject, message=message, user_id=user_id,
+            priority=priority, source=source, ticket_id=ticket_id, continue_open=continue_open,
+        )
+        res = await self.db.rpc("create_or_continue_ticket", params).execute()
+        return res.data[0]
+
+    async def update_conversation_summary(
+        self, ticket_id: str, summary: str, message_count: int, expected_count: int
+    ) -> bool:
+        """Store a new rolling summary unless another update got there first.
+
+        The write only applies while ``summary_message_count`` is still
+        *expected_count*; returns whether it did.
+        """
+        res = await (
+            self.db.table("tickets")
+            .update({
+                "conversation_summary": summary,
+                "summary_message_count": message_count,
+                "summary_updated_at": datetime.now(timezone.utc).isoformat(),
+            })
+            .eq("id", ticket_id)
+            .eq("summary_message_count", expected_count)
+            .execute()
+        )
+        return bool(res.data)
+
+    def _filtered_tickets(self, filters, date_from, date_to, count=None):
+        query = self.db.table("tickets").select("*", count=count).eq("is_deleted", False)
+        for column, value in filters.items():
+            if value is not None:
+                query = query.eq(column, value)
+        if date_from:
+            query = query.gte("created_at", f"{date_from}T00:00:00Z")
+        if date_to:
+            query = query.lte("created_at", f"{date_to}T23:59:59Z")
+        return query
+
+    async def list_tickets(
+        self,
+        filters: Dict[str, Any],
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        *,
+        limit: int,
+        cursor: Optional[str] = None,
+    ) -> tuple[List[Dict[str, Any]], Optional[str]]:
+        """One keyset page of non-deleted tickets, newest activity first.
+
+        Returns ``(tickets, next_cursor)``; ``next_cursor`` is None on the last page.
+        """
+        query = apply_keyset(
+            self._filtered_tickets(filters, date_from, date_to), limit=limit, cursor=cursor
+        )
+        res = await query.execute()
+        return split_page(res.data or [], limit)
+
+    async def list_tickets_at_offset(
+        self,
+        filters: Dict[str, Any],
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        *,
+        limit: int,
+        offset: int,
+    ) -> tuple[List[Dict[str, Any]], int]:
+        """Page-number listing kept for existing clients: ``(tickets, total_count)``.
+
+        The slice is taken by the database (``Range`` header), not in Python.
+        """
+        query = order_keyset(self._filtered_tickets(filters, date_from, date_to, count="exact"))
+        res = await query.range(offset, offset + limit).execute()
+        return res.data or [], res.count or 0
+
+    async def page_tickets(
+        self,
+        filters: Dict[str, Any],
+        *,
+        search: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        page: int = 1,
+        page_size: int = 10,
+        cursor: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Build the ``{"tickets", "pagination"}`` body shared by the ticket list endpoints.
+
+        With *cursor* the request is served by keyset pagination; without it the
+        legacy *page* counters are returned as well. Ranked search results carry
+        an offset cursor since they are not ordered by ``(updated_at, id)``.
+        """
+        if search:
+            offset = cursor_offset(cursor) if cursor else (page - 1) * page_size
+            tickets, total_count = await self.search_tickets(
+                search, filters, date_from=date_from, date_to=date_to,
+                limit=page_size, offset=offset,
+            )
+            more = offset + len(tickets) < total_count
+            next_cursor = offset_cursor(offset + page_size) if more else None
+            if cursor:
+                total_count = None
+        elif cursor:
+            tickets, next_cursor = await self.list_tickets(
+                filters, date_from, date_to, limit=page_size, cursor=cursor
+            )
+            total_count = None
+        else:
+            offset = (page - 1) * page_size
+            tickets, total_count = await self.list_tickets_at_offset(
+                filters, date_from, date_to, limit=page_size, offset=offset
+            )
+            more = offset + len(tickets) < total_count
+            next_cursor = keyset_cursor(tickets[-1]) if more and tickets else None
+
+        return {
+            "tickets": tickets,
+            "pagination": build_pagination(
+                page_size=page_size,
+                next_cursor=next_cursor,
+                page=page,
+                total_count=total_count,
+            ),
+        }
+
+    async def search_tickets(
+        self,
+        search: str,
+        filters: Dict[str, Any],
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        limit: int = 10,
+        offset: int = 0,
+    ) -> tuple[List[Dict[str, Any]], int]:
+        """Ranked full-text search over ticket subjects and message bodies.
+
+        Runs the ``search_tickets`` RPC (migration 019), which returns only the
+        requested page together with the total match count. Each returned
+        ticket carries its ``search_rank``.
+        """
+        params = {
+            "p_query": search,
+            "p_user_id": filters.get("user_id"),
+            "p_assigned_to": filters.get("assigned_to"),
+            "p_status": filters.get("status"),
+            "p_context": filters.get("context"),
+            "p_date_from": f"{date_from}T00:00:00Z" if date_from else None,
+            "p_date_to": f"{date_to}T23:59:59Z" if date_to else None,
+            "p_limit": limit,
+            "p_offset": offset,
+        }
+        res = await self.db.rpc("search_tickets", params).execute()
+        rows = res.data or []
+        tickets = [{**row["ticket"], "search_rank": row["rank"]} for row in rows]
+        total_count = rows[0]["total_count"] if rows else 0
+        return tickets, total_count
+
+    # ---------------------------------------------------
+    # SLA
+    # ---------------------------------------------------
+    async def get_active_sla_id(self, priority: str) -> Optional[str]:
+        """Return the newest active SLA definition id for *priority*."""
+        slas = await reference_cache.arows("sla_definitions", self.db)
+        sla = active_sla_for_priority(slas, priority)
+        return sla["id"] if sla else None
+
+    # ---------------------------------------------------
+    # Messages & ratings
+    # ---------------------------------------------------
+    async def add_message(self, row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        res = await self.db.table("messages").insert(row).execute()
+        return res.data[0] if res.data else None
+
+    async def get_messages(self, ticket_id: str, columns: str = "*") -> List[Dict[str, Any]]:
+        res = await (
+            self.db.table("messages")
+            .select(columns)
+            .eq("ticket_id", ticket_id)
+            .order("created_at", desc=False)
+            .execute()
+        )
+        return res.data or []
+
+    async def count_ai_replies_since(self, ticket_id: str, since_iso: str) -> int:
+        res = await (
+            self.db.table("messages")
+            .select("id", count="exact")
+            .eq("ticket_id", ticket_id)
+            .eq("sender", "ai")
+            .gte("created_at", since_iso)
+            .execute()
+        )
+        return res.count or 0
+
+    async def get_user_ratings(self, ticket_id: str, user_id: str) -> Dict[str, int]:
+        """Map message id → rating given by *user_id* on this ticket."""
+        res = await (
+            self.db.table("ratings")
+            .select("*")
+            .eq("ticket_id", ticket_id)
+            .eq("user_id", user_id)
+            .execute()
+        )
+        return {r["message_id"]: r["rating"] for r in (res.data or [])}
+
+    async def get_thread(self, ticket_id: str, user_id: str) -> tuple:
+        """Fetch ticket, messages and the user's ratings concurrently.
+
+        Returns ``(ticket | None, messages, ratings_map)``. Callers must still
+        check access on the ticket before exposing the messages.
+        """
+        return await asyncio.gather(
+            self.get_ticket(ticket_id),
+            self.get_messages(ticket_id),
+            self.get_user_ratings(ticket_id, user_id),
+        )
+
+
+# Global instance
+ticket_repository = TicketRepository()
@@ -0,0 +1,94 @@
+"""Content-addressed cache of workflow agent step outputs.
+
+An agent step is a pure function of its system prompt, model, input and the
+upstream outputs it declared, so its output can be keyed by a hash of exactly
+those. Re-analysing an unchanged ticket then reuses every step, and a run that
+failed part-way resumes at the first failed step: everything upstream of it
+hashes to a key that is already cached. Only successful outputs are stored.
+
+Outputs are kept in a per-process LRU and in the ``workflow_step_cache`` table
+(:class:`app.table_cache.TableBackedCache`).
+"""
+
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.logger import setup_logger
+from app.supabase_config import supabase
+from app.table_cache import TableBackedCache
+
+logger = setup_logger(__name__)
+
+TABLE = "workflow_step_cache"
+
+
+def step_key(name: str, system_prompt: str, model: str, context: str, upstream: List[Dict[str, Any]]) -> str:
+    """Hex sha256 of everything a step's output depends on."""
+    payload = json.dumps(
+        [name, system_prompt, model, context, [[r["agent_name"], r["output"]] for r in upstream]],
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class WorkflowStepCache(TableBackedCache):
+    """LRU of step outputs backed by a persistent table."""
+
+    TABLE = TABLE
+    VALUE_COLUMN = "output"
+
+    def __init__(
+        self,
+        client=None,
+        *,
+        enabled: bool = True,
+        persist: bool = True,
+        max_entries: int = 1000,
+        writer=None,
+    ):
+        super().__init__(enabled=enabled, persist=persist, max_entries=max_entries, writer=writer)
+        self.client = client if client is not None else supabase
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """The cached output for *key*, or None."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            output = self._get_memory(key)
+            if output is not None:
+                self._stats["memory_hits"] += 1
+                return output
+        output = self._table_lookup(key) if self.persist else None
+        with self._lock:
+            if output is None:
+                self._stats["misses"] += 1
+            else:
+                self._put(key, output)
+                self._stats["table_hits"] += 1
+        return output
+
+    def put(self, key: str, agent_name: str, model: str, output: Dict[str, Any]) -> None:
+        self._store(key, output, {"agent_name": agent_name, "model": model})
+
+    def _table_lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        if self.client is None:
+            return None
+        try:
+            result = self.client.table(TABLE).select("output").eq("cache_key", key).limit(1).execute()
+        except Exception as e:
+            logger.warning(f"Workflow step cache lookup failed, running the step: {e}")
+            return None
+        if not result.data:
+            return None
+        return self._decode(result.data[0].get("output"))
+
+
+# Global instance
+workflow_step_cache = WorkflowStepCache(
+    enabled=settings.workflow_step_cache_enabled,
+    persist=settings.workflow_step_cache_persist,
+    max_entries=settings.workflow_step_cache_max_entries,
+)
@@ -0,0 +1,203 @@
+"""Write-behind buffer for non-critical audit and log inserts.
+
+KB usage logs, routing logs, ticket activity entries and filtered-email
+records are useful for reporting but nothing in the request depends on them
+having been written. Callers :meth:`BufferedWriter.enqueue` the rows instead
+of inserting them; a background thread groups them per table and writes each
+group with one bulk insert once ``WRITE_BUFFER_MAX_BATCH`` rows are waiting or
+``WRITE_BUFFER_FLUSH_INTERVAL_SECONDS`` has passed. Whatever is still queued
+is flushed when the app shuts down.
+
+Rows enqueued with ``on_conflict`` are written as upserts that skip rows
+already present, for caches filled from several workers at once.
+
+The queue is bounded. When it is full, ``enqueue`` waits briefly for the
+flusher to make room and then drops the rows, counting them in
+:meth:`BufferedWriter.stats` rather than slowing the request further.
+"""
+
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple, Union
+
+from app.config import settings
+from app.logger import setup_logger
+from app.supabase_config import supabase
+
+logger = setup_logger(__name__)
+
+Rows = Union[Dict[str, Any], List[Dict[str, Any]]]
+
+
+class BufferedWriter:
+    """Batches inserts per table and flushes them from a daemon thread."""
+
+    def __init__(
+        self,
+        client=None,
+        *,
+        enabled: bool = True,
+        max_batch: int = 500,
+        flush_interval: float = 1.0,
+        max_pending: int = 10000,
+        enqueue_timeout: float = 0.05,
+    ):
+        self.client = client if client is not None else supabase
+        self.enabled = enabled
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.enqueue_timeout = enqueue_timeout
+        self._queue: Deque[Tuple[str, Optional[str], Dict[str, Any]]] = deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"enqueued": 0, "written": 0, "dropped": 0, "failed": 0, "batches": 0}
+        )
+
+    # ---------------------------------------------------
+    # Producer side
+    # ---------------------------------------------------
+    def enqueue(self, table: str, rows: Rows, *, on_conflict: Optional[str] = None) -> bool:
+        """Queue *rows* for *table*. Returns ``False`` if they were dropped.
+
+        *on_conflict* names the unique columns of an upsert that ignores
+        duplicates. With the buffer disabled the rows are written immediately.
+        """
+        rows = [rows] if isinstance(rows, dict) else list(rows)
+        if not rows:
+            return True
+        if self.client is None:
+            return False
+        if not self.enabled:
+            self._write(table, rows, on_conflict)
+            return True
+
+        self._ensure_started()
+        deadline = time.monotonic() + self.enqueue_timeout
+        with self._cond:
+            while len(self._queue) + len(rows) > self.max_pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stopping:
+                    self._stats[table]["dropped"] += len(rows)
+                    logger.warning(f"Write buffer full; dropped {len(rows)} {table} row(s)")
+                    return False
+                self._cond.notify_all()  # wake the flusher early
+                self._cond.wait(remaining)
+            self._queue.extend((table, on_conflict, row) for row in rows)
+            self._stats[table]["enqueued"] += len(rows)
+            if len(self._queue) >= self.max_batch:
+                self._cond.notify_all()
+        return True
+
+    # ---------------------------------------------------
+    # Flushing
+    # ---------------------------------------------------
+    def flush(self) -> int:
+        """Write everything queued so far; returns the number of rows written."""
+        with self._flush_lock:
+            with self._cond:
+                pending = list(self._queue)
+                self._queue.clear()
+                self._cond.notify_all()
+            by_target: Dict[Tuple[str, Optional[str]], List[Dict[str, Any]]] = defaultdict(list)
+            for table, on_conflict, row in pending:
+                by_target[(table, on_conflict)].append(row)
+            return sum(
+                self._write(table, rows, on_conflict) for (table, on_conflict), rows in by_target.items()
+            )
+
+    def _write(self, table: str, rows: List[Dict[str, Any]], on_conflict: Optional[str] = None) -> int:
+        # PostgREST bulk inserts need every object in a request to share its keys
+        groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = defaultdict(list)
+        for row in rows:
+            groups[tuple(sorted(row))].append(row)
+        written = 0
+        for group in groups.values():
+            for start in range(0, len(group), self.max_batch):
+                written += self._insert_batch(table, group[start:start + self.max_batch], on_conflict)
+        return written
+
+    def _insert_batch(self, table: str, batch: List[Dict[str, Any]], on_conflict: Optional[str] = None) -> int:
+        try:
+            query = self.client.table(table)
+            if on_conflict:
+                query.upsert(batch, on_conflict=on_conflict, ignore_duplicates=True).execute()
+            else:
+                query.insert(batch).execute()
+            self._count(table, batches=1, written=len(batch))
+            return len(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                self._count(table, failed=1)
+                logger.warning(f"Buffered {table} insert failed: {e}")
+                return 0
+            # Retry row by row so one bad row does not lose the whole batch
+            logger.warning(f"Buffered {table} batch of {len(batch)} failed, retrying rows: {e}")
+            return sum(self._insert_batch(table, [row], on_conflict) for row in batch)
+
+    def _count(self, table: str, **deltas: int) -> None:
+        with self._cond:
+            for name, delta in deltas.items():
+                self._stats[table][name] += delta
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if not self._stopping and len(self._queue) < self.max_batch:
+                    self._cond.wait(self.flush_interval)
+                stopping = self._stopping
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Write buffer flush failed: {e}", exc_info=True)
+            if stopping:
+                return
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name="write-buffer", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop the flusher after writing everything still queued."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    # ---------------------------------------------------
+    # Metrics
+    # ---------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            pending = len(self._queue)
+            tables = {table: dict(counts) for table, counts in self._stats.items()}
+        return {
+            "enabled": self.enabled,
+            "pending": pending,
+            "max_pending": self.max_pending,
+            "dropped": sum(t["dropped"] for t in tables.values()),
+            "failed": sum(t["failed"] for t in tables.values()),
+            "tables": tables,
+        }
+
+
+# Global instance
+buffered_writer = BufferedWriter(
+    enabled=settings.write_buffer_enabled,
+    max_batch=settings.write_buffer_max_batch,
+    flush_interval=settings.write_buffer_flush_interval_seconds,
+    max_pending=settings.write_buffer_max_pending,
+    enqueue_timeout=settings.write_buffer_enqueue_timeout_seconds,
+)
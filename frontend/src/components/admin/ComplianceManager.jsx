@@ -2,7 +2,7 @@ import { useState, useEffect } from 'react';
 import { useAuth } from '../../contexts/AuthContext';
 import Loading from '../Loading';
 import { getToken } from '../../services/auth';
-import { getBaseUrl } from '../../services/api';
+import { fetchAllPages, getBaseUrl } from '../../services/api';
 
 function apiRequest(url, options = {}) {
   const baseUrl = getBaseUrl().replace(/\/+$/, '');
@@ -58,12 +58,12 @@ export default function ComplianceManager() {
     try {
       const [tmpl, evals, docs] = await Promise.all([
         apiRequest('/compliance/templates'),
-        apiRequest('/compliance/evaluations'),
-        apiRequest('/knowledge/documents'),
+        fetchAllPages(apiRequest, '/compliance/evaluations', 'evaluations'),
+        fetchAllPages(apiRequest, '/knowledge/documents', 'documents'),
       ]);
       setTemplates(tmpl.templates || []);
-      setEvaluations(evals.evaluations || []);
-      setDocuments(docs.documents || []);
+      setEvaluations(evals);
+      setDocuments(docs);
     } catch (e) {
       alert(`Failed to load: ${e.message}`);
     }
@@ -2,7 +2,7 @@ import { useState, useEffect, useRef } from 'react';
 import { useAuth } from '../../contexts/AuthContext';
 import Loading from '../Loading';
 import { getToken } from '../../services/auth';
-import { getBaseUrl } from '../../services/api';
+import { fetchAllPages, getBaseUrl } from '../../services/api';
 
 function apiRequest(url, options = {}) {
   const baseUrl = getBaseUrl().replace(/\/+$/, '');
@@ -57,8 +57,7 @@ export default function KnowledgeBase() {
   const loadDocuments = async () => {
     setLoading(true);
     try {
-      const data = await apiRequest('/knowledge/documents');
-      setDocuments(data.documents || []);
+      setDocuments(await fetchAllPages(apiRequest, '/knowledge/documents', 'documents'));
     } catch (e) {
       alert(`Failed to load documents: ${e.message}`);
     }
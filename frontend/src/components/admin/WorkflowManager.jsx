@@ -97,7 +97,11 @@ export default function WorkflowManager() {
                 <span className="text-xl">{icon}</span>
                 <div>
                   <span className="text-sm font-medium text-text">{step.agent_name}</span>
-                  <span className="text-xs text-muted ml-2">{step.duration_ms}ms</span>
+                  <span className="text-xs text-muted ml-2">
+                    {step.status === 'skipped' ? 'skipped' : `${step.duration_ms}ms`}
+                  </span>
+                  {step.routed && <span className="text-xs text-muted ml-2">on {step.model}</span>}
+                  {step.cached && <span className="text-xs text-muted ml-2">(cached)</span>}
                 </div>
               </div>
               <svg
@@ -181,11 +185,13 @@ export default function WorkflowManager() {
           {/* Final output summary */}
           {result.final_output && (
             <div className="bg-panel rounded-lg p-4 border border-accent/30">
-              <h4 className="text-sm font-medium text-accent mb-2">Final Output (Reviewer)</h4>
+              <h4 className="text-sm font-medium text-accent mb-2">
+                {result.final_output.review_skipped ? 'Final Output (Drafter, review skipped)' : 'Final Output (Reviewer)'}
+              </h4>
               {result.final_output.revised_response && (
                 <p className="text-sm text-text whitespace-pre-wrap">{result.final_output.revised_response}</p>
               )}
-              {result.final_output.quality_score !== undefined && (
+              {result.final_output.quality_score != null && (
                 <div className="mt-3 flex items-center gap-2">
                   <span className="text-xs text-muted">Quality:</span>
                   <div className="flex-1 bg-bg rounded-full h-2 max-w-xs">
@@ -68,6 +68,41 @@ async function apiRequest(url, options = {}) {
   }
 }
 
+/**
+ * Load every page of a cursor-paginated list endpoint.
+ * `fetchPage(url)` resolves to the parsed response body (and throws on errors);
+ * the `key` items of all pages are returned in order.
+ */
+export async function fetchAllPages(fetchPage, path, key, pageSize = 200) {
+  const items = [];
+  const separator = path.includes('?') ? '&' : '?';
+  let cursor = null;
+  do {
+    const params = new URLSearchParams({ limit: pageSize });
+    if (cursor) params.append('cursor', cursor);
+    const page = await fetchPage(`${path}${separator}${params.toString()}`);
+    items.push(...(page[key] || []));
+    cursor = page.next_cursor;
+  } while (cursor);
+  return items;
+}
+
+/**
+ * apiRequest for list endpoints: follows `next_cursor` and returns every row under `key`
+ */
+async function apiRequestAllPages(path, key) {
+  try {
+    const items = await fetchAllPages(async (url) => {
+      const { data, error } = await apiRequest(url);
+      if (error) throw new Error(error);
+      return data;
+    }, path, key);
+    return { data: { [key]: items, next_cursor: null }, error: null };
+  } catch (error) {
+    return { data: null, error: error.message || 'Request failed' };
+  }
+}
+
 // Auth
 export const login = async (email, password) => {
   const { data, error } = await apiRequest('/auth/login', {
@@ -481,7 +516,7 @@ export async function listEmailTemplates(templateType = null, isActive = null) {
 
   const queryString = params.toString();
   const url = `/admin/email-templates${queryString ? `?${queryString}` : ''}`;
-  return apiRequest(url);
+  return apiRequestAllPages(url, 'templates');
 }
 
 /**
@@ -724,7 +759,7 @@ export async function deleteCategory(categoryId) {
 // ---------------------------
 
 export async function listKnowledgeDocuments() {
-  return apiRequest('/knowledge/documents');
+  return apiRequestAllPages('/knowledge/documents', 'documents');
 }
 
 export async function deleteKnowledgeDocument(documentId) {
@@ -768,7 +803,7 @@ export async function evaluateCompliance(documentId, templateId) {
 }
 
 export async function listComplianceEvaluations() {
-  return apiRequest('/compliance/evaluations');
+  return apiRequestAllPages('/compliance/evaluations', 'evaluations');
 }
 
 // ---------------------------
@@ -0,0 +1,110 @@
+-- Migration: Server-side ticket search
+-- Created: 2026
+-- Description: Full-text + trigram indexes over ticket subjects and message bodies,
+--              and a `search_tickets` RPC that returns one ranked page plus the total count.
+-- Dependencies: 000, 001, 008_ticket_soft_delete, 016
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- ============================================================
+-- Indexes (expression indexes, so `select *` payloads are unchanged)
+-- ============================================================
+
+-- Word matches ("refund status")
+CREATE INDEX IF NOT EXISTS idx_tickets_subject_fts ON public.tickets
+    USING GIN (to_tsvector('simple', coalesce(subject, '')));
+CREATE INDEX IF NOT EXISTS idx_messages_message_fts ON public.messages
+    USING GIN (to_tsvector('simple', coalesce(message, '')));
+
+-- Substring matches ("refu"), matching the old ILIKE behaviour
+CREATE INDEX IF NOT EXISTS idx_tickets_subject_trgm ON public.tickets
+    USING GIN (subject gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_messages_message_trgm ON public.messages
+    USING GIN (message gin_trgm_ops);
+
+-- Message hits are looked up per filtered ticket (also serves the intake RPC, 021)
+CREATE INDEX IF NOT EXISTS idx_messages_ticket_created_at
+    ON public.messages(ticket_id, created_at);
+
+-- List ordering used by every ticket list endpoint
+CREATE INDEX IF NOT EXISTS idx_tickets_updated_at_id ON public.tickets(updated_at DESC, id DESC);
+
+-- ============================================================
+-- search_tickets: one round trip per search page
+-- ============================================================
+-- Returns each matching ticket as JSONB (same shape as `select *`), its rank,
+-- and the total number of matches (window count) so callers can paginate.
+CREATE OR REPLACE FUNCTION search_tickets(
+    p_query TEXT,
+    p_user_id UUID DEFAULT NULL,
+    p_assigned_to TEXT DEFAULT NULL,
+    p_status TEXT DEFAULT NULL,
+    p_context TEXT DEFAULT NULL,
+    p_date_from TIMESTAMPTZ DEFAULT NULL,
+    p_date_to TIMESTAMPTZ DEFAULT NULL,
+    p_limit INT DEFAULT 10,
+    p_offset INT DEFAULT 0
+)
+RETURNS TABLE (
+    ticket JSONB,
+    rank REAL,
+    total_count BIGINT
+)
+LANGUAGE sql STABLE AS $$
+    WITH q AS (
+        SELECT
+            websearch_to_tsquery('simple', p_query) AS tsq,
+            -- Wildcards in the query match literally ("50%", "a_b")
+            '%' || replace(replace(replace(p_query, '\', '\\'), '%', '\%'), '_', '\_') || '%' AS pattern
+    ),
+    -- Tickets the caller may see; message hits are only ranked for these, so a
+    -- customer's search reads their own tickets' messages, not every tenant's
+    filtered AS (
+        SELECT t.*
+        FROM public.tickets t
+        WHERE t.is_deleted = false
+          AND (p_user_id IS NULL OR t.user_id = p_user_id)
+          AND (p_assigned_to IS NULL OR t.assigned_to = p_assigned_to)
+          AND (p_status IS NULL OR t.status = p_status)
+          AND (p_context IS NULL OR t.context = p_context)
+          AND (p_date_from IS NULL OR t.created_at >= p_date_from)
+          AND (p_date_to IS NULL OR t.created_at <= p_date_to)
+    ),
+    message_hits AS (
+        SELECT
+            m.ticket_id,
+            max(ts_rank(to_tsvector('simple', coalesce(m.message, '')), q.tsq)) AS rank
+        FROM public.messages m
+        JOIN filtered f ON f.id = m.ticket_id
+        CROSS JOIN q
+        WHERE to_tsvector('simple', coalesce(m.message, '')) @@ q.tsq
+           OR m.message ILIKE q.pattern
+        GROUP BY m.ticket_id
+    ),
+    matches AS (
+        SELECT
+            t.*,
+            greatest(
+                -- Subject hits outrank message hits
+                ts_rank(to_tsvector('simple', coalesce(t.subject, '')), q.tsq) * 2,
+                CASE WHEN t.subject ILIKE q.pattern THEN 0.1 ELSE 0 END,
+                coalesce(mh.rank, 0)
+            )::REAL AS search_rank
+        FROM filtered t
+        CROSS JOIN q
+        LEFT JOIN message_hits mh ON mh.ticket_id = t.id
+        WHERE (
+                to_tsvector('simple', coalesce(t.subject, '')) @@ q.tsq
+             OR t.subject ILIKE q.pattern
+             OR mh.ticket_id IS NOT NULL
+          )
+    )
+    SELECT
+        to_jsonb(m) - 'search_rank' AS ticket,
+        m.search_rank AS rank,
+        count(*) OVER () AS total_count
+    FROM matches m
+    ORDER BY m.search_rank DESC, m.updated_at DESC, m.id DESC
+    LIMIT p_limit
+    OFFSET p_offset;
+$$;
@@ -0,0 +1,21 @@
+-- Migration: Keyset pagination indexes
+-- Created: 2026
+-- Description: Composite (sort column, id) indexes backing cursor pagination
+--              (`app/pagination.py`), so each list page is an index range scan.
+-- Dependencies: 008_email_templates, 016, 017, 019
+
+-- ============================================================
+-- Tickets: per-customer and per-agent lists (global list uses
+-- idx_tickets_updated_at_id from 019)
+-- ============================================================
+CREATE INDEX IF NOT EXISTS idx_tickets_user_updated_at_id ON public.tickets(user_id, updated_at DESC, id DESC)
+    WHERE is_deleted = false;
+CREATE INDEX IF NOT EXISTS idx_tickets_assigned_updated_at_id ON public.tickets(assigned_to, updated_at DESC, id DESC)
+    WHERE is_deleted = false;
+
+-- ============================================================
+-- Knowledge base, compliance and email template lists
+-- ============================================================
+CREATE INDEX IF NOT EXISTS idx_knowledge_documents_created_at_id ON knowledge_documents(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_compliance_evaluations_evaluated_at_id ON compliance_evaluations(evaluated_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_email_templates_created_at_id ON public.email_templates(created_at DESC, id DESC);
@@ -0,0 +1,110 @@
+-- Migration: Single-round-trip ticket intake
+-- Created: 2026
+-- Description: `create_or_continue_ticket` RPC that finds or creates a ticket, assigns the
+--              SLA, inserts the customer message and returns the ticket with its history
+--              and AI-reply count for rate limiting, all in one transaction.
+-- Dependencies: 000, 001, 002, 004, 019
+
+-- Lookup used to continue a user's open ticket for the same context/subject
+CREATE INDEX IF NOT EXISTS idx_tickets_user_context_subject_open
+    ON public.tickets(user_id, context, subject)
+    WHERE status = 'open';
+
+-- History and AI-reply window reads use idx_messages_ticket_created_at (migration 019)
+
+-- ============================================================
+-- create_or_continue_ticket
+-- ============================================================
+-- p_ticket_id      continue this ticket (e.g. an email reply); a missing id creates a new one
+-- p_continue_open  otherwise reuse the user's open ticket with the same context and subject
+--
+-- Returns one row:
+--   ticket               the ticket as JSONB (same shape as `select *`)
+--   created              true when the ticket was inserted by this call
+--   message              the inserted customer message
+--   history              [{sender, message, created_at}, ...] oldest first, including `message`
+--   ai_replies_in_window AI messages on the ticket within p_rate_window_seconds
+CREATE OR REPLACE FUNCTION create_or_continue_ticket(
+    p_context TEXT,
+    p_subject TEXT,
+    p_message TEXT,
+    p_user_id UUID DEFAULT NULL,
+    p_priority TEXT DEFAULT 'medium',
+    p_source TEXT DEFAULT 'web',
+    p_ticket_id UUID DEFAULT NULL,
+    p_continue_open BOOLEAN DEFAULT true,
+    p_rate_window_seconds INT DEFAULT 60
+)
+RETURNS TABLE (
+    ticket JSONB,
+    created BOOLEAN,
+    message JSONB,
+    history JSONB,
+    ai_replies_in_window INT
+)
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_ticket public.tickets;
+    v_message public.messages;
+    v_created BOOLEAN := false;
+BEGIN
+    IF p_ticket_id IS NOT NULL THEN
+        SELECT * INTO v_ticket FROM public.tickets WHERE id = p_ticket_id;
+    ELSIF p_continue_open AND p_user_id IS NOT NULL THEN
+        -- Serialise find-or-create per (user, context, subject) so two concurrent
+        -- first messages land on the same ticket
+        PERFORM pg_advisory_xact_lock(
+            hashtextextended(p_user_id::text || '|' || p_context || '|' || p_subject, 0)
+        );
+        SELECT * INTO v_ticket
+        FROM public.tickets t
+        WHERE t.user_id = p_user_id
+          AND t.context = p_context
+          AND t.subject = p_subject
+          AND t.status = 'open'
+        ORDER BY t.created_at DESC
+        LIMIT 1;
+    END IF;
+
+    IF v_ticket.id IS NULL THEN
+        INSERT INTO public.tickets (context, subject, status, priority, sla_id, user_id, source, created_at)
+        VALUES (
+            p_context,
+            p_subject,
+            'open',
+            p_priority,
+            (SELECT s.id FROM public.sla_definitions s
+             WHERE s.priority = p_priority AND s.is_active
+             ORDER BY s.created_at DESC
+             LIMIT 1),
+            p_user_id,
+            p_source,
+            now()
+        )
+        RETURNING * INTO v_ticket;
+        v_created := true;
+    END IF;
+
+    INSERT INTO public.messages (ticket_id, sender, message, created_at)
+    VALUES (v_ticket.id, 'customer', p_message, now())
+    RETURNING * INTO v_message;
+
+    RETURN QUERY SELECT
+        to_jsonb(v_ticket),
+        v_created,
+        to_jsonb(v_message),
+        coalesce(
+            (SELECT jsonb_agg(
+                        jsonb_build_object('sender', m.sender, 'message', m.message, 'created_at', m.created_at)
+                        ORDER BY m.created_at, m.id)
+             FROM public.messages m
+             WHERE m.ticket_id = v_ticket.id),
+            '[]'::jsonb
+        ),
+        (SELECT count(*)::INT
+         FROM public.messages m
+         WHERE m.ticket_id = v_ticket.id
+           AND m.sender = 'ai'
+           AND m.created_at >= now() - make_interval(secs => p_rate_window_seconds));
+END;
+$$;
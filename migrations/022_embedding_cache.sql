@@ -0,0 +1,17 @@
+-- Migration: Persistent embedding cache
+-- Created: 2026
+-- Description: Embedding vectors keyed by model and SHA-256 of the input text, so identical
+--              texts (ticket subjects, repeated searches, compliance requirements) are only
+--              sent to the embeddings API once. The text itself is not stored.
+-- Dependencies: 017 (pgvector extension)
+
+CREATE TABLE IF NOT EXISTS public.embedding_cache (
+    model TEXT NOT NULL,
+    text_hash TEXT NOT NULL,          -- hex sha256 of the embedded text
+    embedding vector NOT NULL,        -- unsized so a model change does not need a migration
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (model, text_hash)
+);
+
+COMMENT ON TABLE public.embedding_cache IS
+    'Embeddings by (model, sha256(text)); rows are immutable and may be deleted at any time to reclaim space.';
@@ -0,0 +1,90 @@
+-- Migration: Semantic response cache
+-- Created: 2026
+-- Description: Approved AI answers (customer rating >= SEMANTIC_CACHE_MIN_RATING) keyed by the
+--              embedding of the customer question, scoped by ticket context, customer and
+--              knowledge base version. Replies are written with the customer's conversation in
+--              the prompt, so an answer is only served back to the customer it was written for. `match_cached_response` finds a close enough answer for the current KB
+--              version; `bump_kb_version` is called whenever KB documents change and drops the
+--              answers that were grounded in the old content. AI replies sent from a cached
+--              answer record it in `messages.cached_response_id`.
+-- Dependencies: 000, 017 (pgvector)
+
+-- ============================================================
+-- Knowledge base version (single row)
+-- ============================================================
+CREATE TABLE IF NOT EXISTS public.knowledge_base_state (
+    id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+INSERT INTO public.knowledge_base_state (id) VALUES (true) ON CONFLICT (id) DO NOTHING;
+
+-- ============================================================
+-- Cached answers
+-- ============================================================
+CREATE TABLE IF NOT EXISTS public.response_cache (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    context TEXT NOT NULL,
+    user_id UUID NOT NULL,  -- owner of the ticket the answer was written for
+    kb_version BIGINT NOT NULL,
+    question TEXT NOT NULL,
+    embedding vector(1536) NOT NULL,  -- embedding of `question`
+    answer TEXT NOT NULL,
+    source_message_id UUID UNIQUE REFERENCES public.messages(id) ON DELETE CASCADE,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+-- AI replies sent from a cached answer point at it; rating them does not cache the answer again
+ALTER TABLE public.messages
+    ADD COLUMN IF NOT EXISTS cached_response_id UUID REFERENCES public.response_cache(id) ON DELETE SET NULL;
+
+CREATE INDEX IF NOT EXISTS idx_response_cache_scope ON public.response_cache(context, user_id, kb_version);
+CREATE INDEX IF NOT EXISTS idx_response_cache_expires ON public.response_cache(expires_at);
+CREATE INDEX IF NOT EXISTS idx_response_cache_vector ON public.response_cache
+    USING ivfflat (embedding vector_cosine_ops) WITH (lists = 50);
+
+-- Closest live answer for the question in this context, for this customer and the current KB version
+CREATE OR REPLACE FUNCTION match_cached_response(
+    query_embedding vector(1536),
+    p_context TEXT,
+    p_user_id UUID,
+    match_threshold FLOAT DEFAULT 0.92
+)
+RETURNS TABLE (
+    id UUID,
+    question TEXT,
+    answer TEXT,
+    similarity FLOAT
+)
+LANGUAGE sql STABLE AS $$
+    SELECT r.id, r.question, r.answer, 1 - (r.embedding <=> query_embedding) AS similarity
+    FROM public.response_cache r
+    WHERE r.context = p_context
+      AND r.user_id = p_user_id
+      AND r.kb_version = (SELECT s.version FROM public.knowledge_base_state s)
+      AND r.expires_at > now()
+      AND 1 - (r.embedding <=> query_embedding) > match_threshold
+    ORDER BY r.embedding <=> query_embedding
+    LIMIT 1;
+$$;
+
+-- Start a new KB version; answers cached under older versions (and expired ones) are removed
+CREATE OR REPLACE FUNCTION bump_kb_version()
+RETURNS TABLE (version BIGINT)
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_version BIGINT;
+BEGIN
+    UPDATE public.knowledge_base_state s
+    SET version = s.version + 1, updated_at = now()
+    WHERE s.id  -- the single row; pg_safeupdate rejects an UPDATE without WHERE
+    RETURNING s.version INTO v_version;
+
+    DELETE FROM public.response_cache
+    WHERE kb_version < v_version OR expires_at <= now();
+
+    RETURN QUERY SELECT v_version;
+END;
+$$;
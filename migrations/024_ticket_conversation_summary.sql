@@ -0,0 +1,12 @@
+-- Migration: Rolling conversation summary per ticket
+-- Created: 2026
+-- Description: AI prompts send a running summary of the older part of a ticket thread plus the
+--              most recent messages within a token budget. `conversation_summary` covers the
+--              first `summary_message_count` messages (oldest first) and is extended as the
+--              thread grows, so prompt size stays bounded however long the thread gets.
+-- Dependencies: 000
+
+ALTER TABLE public.tickets
+    ADD COLUMN IF NOT EXISTS conversation_summary TEXT,
+    ADD COLUMN IF NOT EXISTS summary_message_count INT NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS summary_updated_at TIMESTAMPTZ;
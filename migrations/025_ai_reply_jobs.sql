@@ -0,0 +1,32 @@
+-- Migration: Durable AI reply jobs
+-- Created: 2026
+-- Description: Clients that send `Prefer: respond-async` get 202 with a job id while the AI reply
+--              is generated in the background. With AI_REPLY_JOBS_DURABLE=true each job is
+--              recorded here: workers claim it (`status` queued -> running) before running it,
+--              any worker process can answer a poll, and unfinished jobs are re-queued on startup.
+-- Dependencies: 000
+
+CREATE TABLE IF NOT EXISTS public.ai_reply_jobs (
+    id UUID PRIMARY KEY,
+    ticket_id UUID NOT NULL REFERENCES public.tickets(id) ON DELETE CASCADE,
+    user_id UUID,
+    priority TEXT NOT NULL DEFAULT 'medium',
+    status TEXT NOT NULL DEFAULT 'queued'
+        CHECK (status IN ('queued', 'running', 'completed', 'failed')),
+    prompt TEXT NOT NULL,
+    context TEXT,
+    question TEXT,
+    result JSONB,                     -- response body of the reply endpoint
+    error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    started_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ
+);
+
+-- Startup recovery scans only unfinished jobs
+CREATE INDEX IF NOT EXISTS idx_ai_reply_jobs_unfinished
+    ON public.ai_reply_jobs(status, created_at)
+    WHERE status IN ('queued', 'running');
+
+COMMENT ON TABLE public.ai_reply_jobs IS
+    'Background AI reply jobs; finished rows are only needed for polling and may be deleted after a day.';
@@ -0,0 +1,18 @@
+-- Migration: Workflow agent step cache
+-- Created: 2026
+-- Description: Outputs of workflow agent steps keyed by a SHA-256 of the step name, system prompt,
+--              model, input and the upstream outputs the step received. Re-analysing an unchanged
+--              ticket reuses every step, and a failed run resumes at the first failed step.
+--              Only successful outputs are stored.
+-- Dependencies: 017 (workflow_analyses)
+
+CREATE TABLE IF NOT EXISTS public.workflow_step_cache (
+    cache_key TEXT PRIMARY KEY,       -- hex sha256 of the step's inputs
+    agent_name TEXT NOT NULL,
+    model TEXT NOT NULL,
+    output JSONB NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+COMMENT ON TABLE public.workflow_step_cache IS
+    'Agent step outputs by content hash of their inputs; rows are immutable and may be deleted at any time.';
@@ -0,0 +1,123 @@
+-- Migration: Filtered knowledge base vector search
+-- Created: 2026
+-- Description: `match_chunks_filtered` is `match_chunks` restricted to a list of documents, a
+--              document `source`, a `tenant_id` and/or a `metadata` containment predicate. The
+--              filters are first resolved to the matching document ids (indexed lookups on
+--              knowledge_documents). Up to 500 documents, their chunks are read through
+--              idx_chunks_document and ranked exactly, so a selective filter still returns up to
+--              match_count rows instead of whatever survives an ANN scan of the whole knowledge
+--              base. Broader filters use the ivfflat index with more probes and a candidate list
+--              oversampled by how much of the knowledge base the filter drops. Adds
+--              `knowledge_documents.tenant_id`.
+-- Dependencies: 017 (knowledge_documents, document_chunks)
+
+ALTER TABLE public.knowledge_documents
+    ADD COLUMN IF NOT EXISTS tenant_id TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_knowledge_documents_tenant
+    ON public.knowledge_documents(tenant_id) WHERE tenant_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_knowledge_documents_source
+    ON public.knowledge_documents(source);
+CREATE INDEX IF NOT EXISTS idx_knowledge_documents_metadata
+    ON public.knowledge_documents USING gin (metadata jsonb_path_ops);
+
+CREATE OR REPLACE FUNCTION public.match_chunks_filtered(
+    query_embedding vector(1536),
+    match_count INT DEFAULT 5,
+    match_threshold FLOAT DEFAULT 0.7,
+    p_document_ids UUID[] DEFAULT NULL,
+    p_source TEXT DEFAULT NULL,
+    p_tenant_id TEXT DEFAULT NULL,
+    p_metadata JSONB DEFAULT NULL
+)
+RETURNS TABLE (
+    id UUID,
+    document_id UUID,
+    content TEXT,
+    chunk_index INT,
+    similarity FLOAT
+)
+LANGUAGE plpgsql STABLE AS $$
+DECLARE
+    doc_ids UUID[] := p_document_ids;
+    -- Above this many documents exact ranking would read most of the knowledge base
+    exact_max_documents CONSTANT INT := 500;
+    total_documents BIGINT;
+    candidates INT;
+BEGIN
+    IF p_source IS NOT NULL OR p_tenant_id IS NOT NULL OR p_metadata IS NOT NULL THEN
+        -- Resolve the document filters first (tenant/source/metadata indexes), so the chunk
+        -- ranking below only ever sees chunks of matching documents
+        SELECT array_agg(kd.id) INTO doc_ids
+        FROM knowledge_documents kd
+        WHERE (p_document_ids IS NULL OR kd.id = ANY(p_document_ids))
+          AND (p_source IS NULL OR kd.source = p_source)
+          AND (p_tenant_id IS NULL OR kd.tenant_id = p_tenant_id)
+          AND (p_metadata IS NULL OR kd.metadata @> p_metadata);
+        IF doc_ids IS NULL THEN
+            RETURN;
+        END IF;
+    END IF;
+
+    IF doc_ids IS NULL THEN
+        -- No filters: same as match_chunks
+        RETURN QUERY
+        SELECT
+            dc.id,
+            dc.document_id,
+            dc.content,
+            dc.chunk_index,
+            1 - (dc.embedding <=> query_embedding) AS similarity
+        FROM document_chunks dc
+        WHERE 1 - (dc.embedding <=> query_embedding) > match_threshold
+        ORDER BY dc.embedding <=> query_embedding
+        LIMIT match_count;
+        RETURN;
+    END IF;
+
+    IF array_length(doc_ids, 1) > exact_max_documents THEN
+        -- Broad filter: take the nearest chunks from the ivfflat index and filter those.
+        -- Oversample by the share of documents the filter keeps (x4 for uneven chunk
+        -- counts), so about match_count candidates survive it, and probe more lists than
+        -- the default single one so the candidates are not all from one cluster.
+        SELECT count(*) INTO total_documents FROM knowledge_documents;
+        candidates := least(match_count * 4 * total_documents / array_length(doc_ids, 1), 10000);
+        PERFORM set_config('ivfflat.probes', '10', true);
+        RETURN QUERY
+        SELECT c.id, c.document_id, c.content, c.chunk_index, c.similarity
+        FROM (
+            SELECT
+                dc.id,
+                dc.document_id,
+                dc.content,
+                dc.chunk_index,
+                1 - (dc.embedding <=> query_embedding) AS similarity
+            FROM document_chunks dc
+            ORDER BY dc.embedding <=> query_embedding
+            LIMIT candidates
+        ) c
+        WHERE c.document_id = ANY(doc_ids)
+          AND c.similarity > match_threshold
+        ORDER BY c.similarity DESC
+        LIMIT match_count;
+        RETURN;
+    END IF;
+
+    -- Exact ranking over the matching documents' chunks, read through idx_chunks_document.
+    -- Ordering by similarity instead of distance keeps the planner off the ivfflat index,
+    -- which would scan only the nearest list(s) of the whole knowledge base and filter
+    -- afterwards, returning fewer than match_count rows (often none) for selective filters.
+    RETURN QUERY
+    SELECT
+        dc.id,
+        dc.document_id,
+        dc.content,
+        dc.chunk_index,
+        1 - (dc.embedding <=> query_embedding) AS similarity
+    FROM document_chunks dc
+    WHERE dc.document_id = ANY(doc_ids)
+      AND 1 - (dc.embedding <=> query_embedding) > match_threshold
+    ORDER BY 1 - (dc.embedding <=> query_embedding) DESC
+    LIMIT match_count;
+END;
+$$;
@@ -0,0 +1,20 @@
+-- Migration: Compliance result cache
+-- Created: 2026
+-- Description: Per-requirement compliance verdicts keyed by a SHA-256 of the requirement, the
+--              document's `content_hash`, the model and the evaluation prompt version.
+--              Re-evaluating a template against a document only calls the LLM for requirements
+--              that were edited or documents whose content changed. Error verdicts are not stored.
+-- Dependencies: 017 (compliance tables)
+
+CREATE TABLE IF NOT EXISTS public.compliance_result_cache (
+    cache_key TEXT PRIMARY KEY,       -- hex sha256 of the inputs below
+    requirement_id TEXT,
+    content_hash TEXT NOT NULL,       -- knowledge_documents.content_hash
+    model TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    result JSONB NOT NULL,            -- RequirementResult
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+COMMENT ON TABLE public.compliance_result_cache IS
+    'Compliance verdicts by hash of requirement, document content, model and prompt version; rows are immutable and may be deleted at any time.';
@@ -0,0 +1,366 @@
+"""In-process benchmark harness for the hot API paths.
+
+Boots the real FastAPI app on the embedded SQLite backend (``DB_BACKEND=sqlite``)
+with a simulated per-round-trip database latency, replaces the LLM gateway's
+OpenAI client with a stand-in that sleeps for a configurable time, seeds a
+realistic data set, and drives scenarios concurrently through
+``httpx.ASGITransport``.
+
+Database round trips per request are read from the ``Server-Timing`` header
+emitted by ``app.db_instrumentation``; LLM calls are counted by the stand-in.
+"""
+
+import asyncio
+import gc
+import hashlib
+import itertools
+import os
+import random
+import tempfile
+import time
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+EMBEDDING_DIM = 256
+
+
+def configure_environment(sqlite_path: str) -> None:
+    """Point settings at the SQLite backend; must run before ``app`` is imported."""
+    os.environ["DB_BACKEND"] = "sqlite"
+    os.environ["SQLITE_PATH"] = sqlite_path
+    os.environ["EMAIL_POLLING_ENABLED"] = "false"
+    # Benchmarks hammer a small pool of tickets; do not measure the rate limiter
+    os.environ["AI_REPLY_MAX_PER_WINDOW"] = "1000000"
+    # ...nor the provider limits in the LLM gateway (its concurrency cap still applies)
+    os.environ.setdefault("LLM_REQUESTS_PER_MINUTE", "0")
+    os.environ.setdefault("LLM_TOKENS_PER_MINUTE", "0")
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    os.environ.setdefault("SUPABASE_URL", "https://benchmark.supabase.co")
+    os.environ.setdefault("SUPABASE_KEY", "benchmark.anon.key")
+    os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret")
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+
+# ---------------------------------------------------
+# OpenAI stand-in
+# ---------------------------------------------------
+class FakeOpenAI:
+    """Quacks like the parts of ``openai.AsyncOpenAI`` the LLM gateway uses, with fixed latency."""
+
+    def __init__(self, chat_latency_ms: float, embedding_latency_ms: float):
+        self.chat_latency_ms = chat_latency_ms
+        self.embedding_latency_ms = embedding_latency_ms
+        self.chat_calls = 0
+        self.embedding_calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+        self.embeddings = SimpleNamespace(create=self._embed)
+
+    async def _chat(self, **kwargs):
+        self.chat_calls += 1
+        content = '{"status": "pass", "reasoning": "ok", "confidence": 0.9, "evidence": ""}'
+        if not kwargs.get("response_format"):
+            content = "Thanks for reaching out. Please try resetting your password from the login page."
+        usage = SimpleNamespace(prompt_tokens=200, completion_tokens=40, total_tokens=240)
+        if kwargs.get("stream"):
+            return self._stream(content, usage)
+        await asyncio.sleep(self.chat_latency_ms / 1000)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+    async def _stream(self, content: str, usage):
+        words = content.split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(self.chat_latency_ms / 1000 / len(words))
+            delta = SimpleNamespace(content=word if i == 0 else " " + word)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+        yield SimpleNamespace(choices=[], usage=usage)
+
+    async def _embed(self, model: str, input, **_):
+        self.embedding_calls += 1
+        await asyncio.sleep(self.embedding_latency_ms / 1000)
+        texts = input if isinstance(input, list) else [input]
+        return SimpleNamespace(
+            data=[SimpleNamespace(embedding=fake_embedding(t), index=i) for i, t in enumerate(texts)],
+            usage=SimpleNamespace(prompt_tokens=10 * len(texts), total_tokens=10 * len(texts)),
+        )
+
+
+def fake_embedding(text: str) -> List[float]:
+    seed = int(hashlib.sha256(text.encode()).hexdigest()[:8], 16)
+    vec = np.random.default_rng(seed).standard_normal(EMBEDDING_DIM)
+    return (vec / np.linalg.norm(vec)).round(5).tolist()
+
+
+def install_fake_openai(fake: FakeOpenAI) -> None:
+    """Route every OpenAI call (they all go through the LLM gateway) to *fake*."""
+    from app.llm_gateway import llm_gateway
+
+    llm_gateway.client = fake
+
+
+# ---------------------------------------------------
+# Data set
+# ---------------------------------------------------
+SUBJECTS = ["Password reset", "Refund request", "Billing question", "Login issue", "Shipping delay"]
+WORDS = "account order refund invoice password delivery login error charge update".split()
+
+
+@dataclass
+class Fixture:
+    customer_token: str
+    admin_token: str
+    ticket_ids: List[str]
+    customer_ticket_ids: List[str]
+
+
+def seed(db, tickets: int, messages_per_ticket: int, kb_chunks: int, rng: random.Random) -> Fixture:
+    from app.auth import create_access_token
+
+    customer_id, admin_id = "00000000-0000-0000-0000-000000000001", "00000000-0000-0000-0000-000000000002"
+    db.bulk_insert(
+        "users",
+        [
+            {"id": customer_id, "email": "customer@example.com", "role": "customer", "name": "Customer"},
+            {"id": admin_id, "email": "admin@example.com", "role": "admin", "name": "Admin"},
+        ],
+    )
+    db.bulk_insert(
+        "email_accounts",
+        [{"email": "support@example.com", "is_default": True, "is_active": True, "provider": "smtp"}],
+    )
+    db.bulk_insert(
+        "sla_definitions",
+        [{"name": f"{p} SLA", "priority": p, "is_active": True} for p in ("low", "medium", "high", "urgent")],
+    )
+
+    ticket_rows, message_rows = [], []
+    for i in range(tickets):
+        day = 1 + i % 28
+        ts = f"2026-0{1 + i % 9}-{day:02d}T{i % 24:02d}:{i % 60:02d}:00+00:00"
+        ticket_rows.append(
+            {
+                "id": f"ticket-{i:08d}",
+                "user_id": customer_id if i % 10 == 0 else f"user-{i % 997}",
+                "context": "acme",
+                "subject": f"{rng.choice(SUBJECTS)} #{i}",
+                "status": rng.choice(["open", "open", "human_assigned", "closed"]),
+                "assigned_to": "admin@example.com" if i % 7 == 0 else None,
+                "created_at": ts,
+                "updated_at": ts,
+            }
+        )
+        for m in range(messages_per_ticket):
+            message_rows.append(
+                {
+                    "ticket_id": f"ticket-{i:08d}",
+                    "sender": "customer" if m % 2 == 0 else "ai",
+                    "message": " ".join(rng.choice(WORDS) for _ in range(12)),
+                    "created_at": ts,
+                }
+            )
+    db.bulk_insert("tickets", ticket_rows)
+    db.bulk_insert("messages", message_rows)
+
+    doc_id = "kb-doc-1"
+    db.bulk_insert("knowledge_documents", [{"id": doc_id, "title": "Help Center", "total_chunks": kb_chunks}])
+    db.bulk_insert(
+        "document_chunks",
+        [
+            {
+                "document_id": doc_id,
+                "chunk_index": c,
+                "content": f"Article {c}: " + " ".join(rng.choice(WORDS) for _ in range(40)),
+                "embedding": fake_embedding(f"chunk-{c}"),
+            }
+            for c in range(kb_chunks)
+        ],
+    )
+
+    return Fixture(
+        customer_token=create_access_token({"sub": customer_id, "email": "customer@example.com", "role": "customer"}),
+        admin_token=create_access_token({"sub": admin_id, "email": "admin@example.com", "role": "admin"}),
+        ticket_ids=[r["id"] for r in ticket_rows],
+        customer_ticket_ids=[r["id"] for r in ticket_rows if r["user_id"] == customer_id],
+    )
+
+
+# ---------------------------------------------------
+# Scenarios
+# ---------------------------------------------------
+@dataclass
+class Scenario:
+    name: str
+    request: Callable[[Any, Fixture, int], Awaitable[Any]]
+
+
+def _auth(token: str) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def _create_ticket(client, fx: Fixture, i: int):
+    return await client.post(
+        "/ticket",
+        json={"context": "acme", "subject": f"Benchmark ticket {i}", "message": "I cannot log in to my account"},
+        headers=_auth(fx.customer_token),
+    )
+
+
+async def _customer_reply(client, fx: Fixture, i: int):
+    ticket_id = fx.customer_ticket_ids[i % len(fx.customer_ticket_ids)]
+    return await client.post(
+        f"/ticket/{ticket_id}/reply", json={"message": "Any update on this?"}, headers=_auth(fx.customer_token)
+    )
+
+
+async def _thread_fetch(client, fx: Fixture, i: int):
+    ticket_id = fx.customer_ticket_ids[i % len(fx.customer_ticket_ids)]
+    return await client.get(f"/ticket/{ticket_id}", headers=_auth(fx.customer_token))
+
+
+async def _admin_list(client, fx: Fixture, i: int):
+    return await client.get("/admin/tickets", params={"page_size": 20}, headers=_auth(fx.admin_token))
+
+
+async def _admin_search(client, fx: Fixture, i: int):
+    return await client.get(
+        "/admin/tickets", params={"search": WORDS[i % len(WORDS)], "page_size": 20}, headers=_auth(fx.admin_token)
+    )
+
+
+async def _kb_search(client, fx: Fixture, i: int):
+    return await client.post(
+        "/knowledge/search",
+        json={"query": f"how do I reset my password {i % 50}", "top_k": 5, "threshold": 0.0},
+        headers=_auth(fx.admin_token),
+    )
+
+
+async def _email_ingest(client, fx: Fixture, i: int):
+    raw = (
+        "From: Customer <customer@example.com>\r\n"
+        "To: support@example.com\r\n"
+        f"Subject: Order {i} has not arrived\r\n"
+        f"Message-ID: <bench-{i}-{time.time_ns()}@example.com>\r\n"
+        "Content-Type: text/plain; charset=utf-8\r\n\r\n"
+        "Hello, my order has not arrived yet. Could you check the delivery status?\r\n"
+    )
+    return await client.post("/webhooks/email", content=raw.encode())
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    s.name: s
+    for s in (
+        Scenario("create_ticket", _create_ticket),
+        Scenario("customer_reply", _customer_reply),
+        Scenario("thread_fetch", _thread_fetch),
+        Scenario("admin_list", _admin_list),
+        Scenario("admin_search", _admin_search),
+        Scenario("kb_search", _kb_search),
+        Scenario("email_ingest", _email_ingest),
+    )
+}
+
+
+# ---------------------------------------------------
+# Runner
+# ---------------------------------------------------
+@dataclass
+class ScenarioResult:
+    name: str
+    requests: int
+    errors: int
+    wall_seconds: float
+    latencies_ms: List[float] = field(default_factory=list)
+    db_round_trips: List[int] = field(default_factory=list)
+    chat_calls: int = 0
+    embedding_calls: int = 0
+
+    def summary(self) -> Dict[str, Any]:
+        lat = np.array(self.latencies_ms) if self.latencies_ms else np.zeros(1)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "throughput_rps": round(self.requests / self.wall_seconds, 2) if self.wall_seconds else 0.0,
+            "p50_ms": round(float(np.percentile(lat, 50)), 2),
+            "p95_ms": round(float(np.percentile(lat, 95)), 2),
+            "p99_ms": round(float(np.percentile(lat, 99)), 2),
+            "db_calls_per_request": round(float(np.mean(self.db_round_trips)), 2) if self.db_round_trips else 0.0,
+            "llm_calls_per_request": self._per_request(self.chat_calls + self.embedding_calls),
+            "chat_calls_per_request": self._per_request(self.chat_calls),
+            "embedding_calls_per_request": self._per_request(self.embedding_calls),
+        }
+
+    def _per_request(self, calls: int) -> float:
+        return round(calls / self.requests, 2) if self.requests else 0.0
+
+
+def _round_trips(server_timing: Optional[str]) -> Optional[int]:
+    # `db;dur=1.2;desc="4 round trips", ...`
+    if not server_timing or 'desc="' not in server_timing:
+        return None
+    return int(server_timing.split('desc="', 1)[1].split(" ", 1)[0])
+
+
+async def run_scenario(app, scenario: Scenario, fx: Fixture, fake: FakeOpenAI, requests: int, concurrency: int) -> ScenarioResult:
+    import httpx
+
+    # Start from a collected heap so a GC pause owed to the previous scenario is not timed here
+    gc.collect()
+    counter = itertools.count()
+    result = ScenarioResult(scenario.name, requests, 0, 0.0)
+    chat_before, embedding_before = fake.chat_calls, fake.embedding_calls
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def worker():
+            while (i := next(counter)) < requests:
+                started = time.perf_counter()
+                response = await scenario.request(client, fx, i)
+                result.latencies_ms.append((time.perf_counter() - started) * 1000)
+                if response.status_code >= 400:
+                    result.errors += 1
+                trips = _round_trips(response.headers.get("server-timing"))
+                if trips is not None:
+                    result.db_round_trips.append(trips)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        result.wall_seconds = time.perf_counter() - started
+
+    # Background work (conversation summaries) belongs to this scenario, not the next one
+    from app.conversation_memory import conversation_memory
+
+    await conversation_memory.drain()
+    result.chat_calls = fake.chat_calls - chat_before
+    result.embedding_calls = fake.embedding_calls - embedding_before
+    return result
+
+
+def build_app(
+    *,
+    tickets: int,
+    messages_per_ticket: int,
+    kb_chunks: int,
+    db_latency_ms: float,
+    chat_latency_ms: float,
+    embedding_latency_ms: float,
+    seed_value: int = 7,
+    sqlite_path: Optional[str] = None,
+):
+    """Import the app against a freshly seeded SQLite file; returns ``(app, fixture, fake)``."""
+    sqlite_path = sqlite_path or os.path.join(tempfile.mkdtemp(prefix="nexus-bench-"), "bench.db")
+    configure_environment(sqlite_path)
+
+    from app.sqlite_backend import get_sqlite_database
+    from app.main import app
+    from app import async_db, supabase_config
+
+    fake = FakeOpenAI(chat_latency_ms, embedding_latency_ms)
+    install_fake_openai(fake)
+
+    fx = seed(get_sqlite_database(), tickets, messages_per_ticket, kb_chunks, random.Random(seed_value))
+    # Apply the simulated network hop to both the sync and the async client
+    for client in (supabase_config.supabase, async_db.get_async_db()):
+        getattr(client, "_client", client).latency_ms = db_latency_ms
+    return app, fx, fake
@@ -0,0 +1,143 @@
+"""Run the hot-path benchmark suite and compare against the stored baseline.
+
+Usage::
+
+    python -m tests.benchmarks.run                       # all scenarios, compare to baseline
+    python -m tests.benchmarks.run -s admin_search -n 500 -c 32
+    python -m tests.benchmarks.run --update-baseline     # record a new baseline
+
+Exits non-zero when a scenario regresses: p95 latency above the baseline by
+more than ``--tolerance``, more DB round trips, chat completions or (beyond
+batching jitter) embedding calls per request, or any errors. Latency baselines are machine-specific; re-record them on the
+machine that runs the comparison.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+from tests.benchmarks.harness import SCENARIOS, build_app, run_scenario
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+
+# Coalesced embedding calls depend on how concurrent requests fall into
+# batching windows, so they get some relative slack
+EMBEDDING_CALL_SLACK = 0.2
+
+
+def compare(name: str, current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    problems = []
+    if current["errors"]:
+        problems.append(f"{current['errors']} errors")
+    if baseline:
+        if current["p95_ms"] > baseline["p95_ms"] * (1 + tolerance):
+            problems.append(f"p95 {baseline['p95_ms']}ms → {current['p95_ms']}ms")
+        if current["db_calls_per_request"] > baseline["db_calls_per_request"] + 0.05:
+            problems.append(
+                f"db_calls_per_request {baseline['db_calls_per_request']} → {current['db_calls_per_request']}"
+            )
+        if "chat_calls_per_request" not in baseline:
+            # Recorded before chat and embedding calls were counted separately: only
+            # the total is known, and it includes the jittery embedding calls
+            llm_limit = baseline["llm_calls_per_request"] * (1 + EMBEDDING_CALL_SLACK) + 0.05
+            if current["llm_calls_per_request"] > llm_limit:
+                problems.append(
+                    f"llm_calls_per_request {baseline['llm_calls_per_request']} → {current['llm_calls_per_request']}"
+                )
+            return problems
+        if current["chat_calls_per_request"] > baseline["chat_calls_per_request"] + 0.05:
+            problems.append(
+                f"chat_calls_per_request {baseline['chat_calls_per_request']} → {current['chat_calls_per_request']}"
+            )
+        embedding_limit = baseline["embedding_calls_per_request"] * (1 + EMBEDDING_CALL_SLACK) + 0.05
+        if current["embedding_calls_per_request"] > embedding_limit:
+            problems.append(
+                f"embedding_calls_per_request {baseline['embedding_calls_per_request']} → "
+                f"{current['embedding_calls_per_request']}"
+            )
+    return problems
+
+
+def print_table(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]]) -> None:
+    header = (
+        f"{'scenario':<16}{'err':>5}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}"
+        f"{'db/req':>8}{'chat/req':>9}{'emb/req':>8}{'Δp95':>8}"
+    )
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        base = baseline.get(name)
+        delta = f"{(r['p95_ms'] / base['p95_ms'] - 1) * 100:+.0f}%" if base and base["p95_ms"] else "n/a"
+        print(
+            f"{name:<16}{r['errors']:>5}{r['throughput_rps']:>9.1f}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}"
+            f"{r['p99_ms']:>9.1f}{r['db_calls_per_request']:>8.1f}"
+            f"{r['chat_calls_per_request']:>9.2f}{r['embedding_calls_per_request']:>8.2f}{delta:>8}"
+        )
+
+
+async def main_async(args) -> int:
+    app, fx, fake = build_app(
+        tickets=args.tickets,
+        messages_per_ticket=args.messages_per_ticket,
+        kb_chunks=args.kb_chunks,
+        db_latency_ms=args.db_latency_ms,
+        chat_latency_ms=args.llm_latency_ms,
+        embedding_latency_ms=args.embedding_latency_ms,
+    )
+    names = args.scenario or list(SCENARIOS)
+    results = {}
+    for name in names:
+        result = await run_scenario(app, SCENARIOS[name], fx, fake, args.requests, args.concurrency)
+        results[name] = result.summary()
+
+    stored = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    baseline = stored.get("scenarios", {})
+    print_table(results, baseline)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({"config": vars(args), "scenarios": results}, indent=2))
+
+    if args.update_baseline:
+        config = {k: v for k, v in vars(args).items() if k not in ("update_baseline", "output", "scenario")}
+        merged = {**baseline, **results}
+        BASELINE_PATH.write_text(json.dumps({"config": config, "scenarios": merged}, indent=2) + "\n")
+        print(f"\nBaseline written to {BASELINE_PATH}")
+        return 0
+
+    regressions = {n: compare(n, r, baseline.get(n, {}), args.tolerance) for n, r in results.items()}
+    regressions = {n: p for n, p in regressions.items() if p}
+    if regressions:
+        print("\nRegressions:")
+        for name, problems in regressions.items():
+            print(f"  {name}: {'; '.join(problems)}")
+        return 1
+    print("\nNo regressions against baseline.")
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS), help="Scenario to run (repeatable)")
+    parser.add_argument("-n", "--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("-c", "--concurrency", type=int, default=16, help="Concurrent in-flight requests")
+    parser.add_argument("--tickets", type=int, default=20000, help="Seeded tickets")
+    parser.add_argument("--messages-per-ticket", type=int, default=4)
+    parser.add_argument("--kb-chunks", type=int, default=2000)
+    parser.add_argument("--db-latency-ms", type=float, default=2.0, help="Simulated latency per DB round trip")
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0, help="Simulated chat completion latency")
+    parser.add_argument("--embedding-latency-ms", type=float, default=50.0, help="Simulated embedding latency")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed p95 regression (fraction)")
+    parser.add_argument("--output", help="Write full results JSON here")
+    parser.add_argument("--update-baseline", action="store_true", help="Store these results as the new baseline")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    return asyncio.run(main_async(parse_args(argv)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,17 @@
 """Pytest fixtures for testing."""
 import pytest
-from unittest.mock import MagicMock, Mock
+from unittest.mock import AsyncMock, MagicMock, Mock
 from fastapi.testclient import TestClient
-from openai import OpenAI
+from openai import AsyncOpenAI
 from supabase import Client
 
 
 @pytest.fixture
 def mock_openai_client():
-    """Mock OpenAI client for testing."""
-    client = MagicMock(spec=OpenAI)
-    client.chat.completions.create.return_value = MagicMock(
-        choices=[MagicMock(message=MagicMock(content="Test AI response"))]
+    """Mock async OpenAI client (as used by the LLM gateway) for testing."""
+    client = MagicMock(spec=AsyncOpenAI)
+    client.chat.completions.create = AsyncMock(
+        return_value=MagicMock(choices=[MagicMock(message=MagicMock(content="Test AI response"))])
     )
     return client
 
@@ -71,8 +71,8 @@ def app_client(mock_supabase_client, mock_openai_client, monkeypatch):
     """Create FastAPI test client with mocked dependencies."""
     from app.main import app
     
-    # Patch the OpenAI client (now lives in helpers module)
-    monkeypatch.setattr("app.helpers.client", mock_openai_client)
+    # Patch the OpenAI client (every call goes through the LLM gateway)
+    monkeypatch.setattr("app.llm_gateway.llm_gateway.client", mock_openai_client)
     
     # Patch the Supabase client
     monkeypatch.setattr("app.supabase_config.supabase", mock_supabase_client)
@@ -94,3 +94,13 @@ def sample_ticket_request():
 def sample_message_request():
     """Sample message request data."""
     return {"message": "Test follow-up message"}
+
+
+@pytest.fixture
+def db():
+    """Empty in-memory SQLite database (app.sqlite_backend)."""
+    from app.sqlite_backend import SQLiteDatabase
+
+    database = SQLiteDatabase(":memory:")
+    yield database
+    database.close()
@@ -0,0 +1,217 @@
+"""Unit tests for the DAG agent pipeline orchestrator."""
+import asyncio
+import json
+import time
+
+import pytest
+from pydantic import BaseModel
+
+import app.agent_orchestrator as orchestrator
+from app.agent_orchestrator import AgentStep, arun_pipeline, resolve_dependencies
+from app.sqlite_backend import SQLiteClient, SQLiteDatabase
+from app.workflow_cache import WorkflowStepCache
+from app.write_buffer import BufferedWriter
+
+
+class EchoOutput(BaseModel):
+    agent: str
+
+
+class FakeGateway:
+    """Answers after a delay per agent and records each agent's user prompt."""
+
+    def __init__(self, delay=0.0, fail=()):
+        self.delay = delay
+        self.fail = set(fail)
+        self.prompts = {}
+        self.calls = []
+        self.models = {}
+
+    async def complete(self, messages, **kwargs):
+        agent = messages[0]["content"]
+        self.prompts[agent] = messages[1]["content"]
+        self.calls.append(agent)
+        self.models[agent] = kwargs["model"]
+        await asyncio.sleep(self.delay)
+        if agent in self.fail:
+            raise RuntimeError("LLM down")
+        return json.dumps({"agent": agent})
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    fake = FakeGateway(delay=0.1)
+    monkeypatch.setattr(orchestrator, "llm_gateway", fake)
+    return fake
+
+
+def step(name, depends_on=None, **kwargs):
+    # The system prompt doubles as the agent name for FakeGateway
+    return AgentStep(name, name, EchoOutput, depends_on=depends_on, **kwargs)
+
+
+class TestResolveDependencies:
+    """Tests for resolve_dependencies."""
+
+    def test_default_is_every_earlier_step(self):
+        deps = resolve_dependencies([step("A"), step("B"), step("C", []), step("D")])
+        assert deps == {"A": [], "B": ["A"], "C": [], "D": ["A", "B", "C"]}
+
+    def test_unknown_or_later_dependency_rejected(self):
+        with pytest.raises(ValueError, match="depends on 'B'"):
+            resolve_dependencies([step("A", ["B"]), step("B")])
+        with pytest.raises(ValueError, match="depends on 'X'"):
+            resolve_dependencies([step("A"), step("B", ["X"])])
+
+    def test_duplicate_name_rejected(self):
+        with pytest.raises(ValueError, match="Duplicate"):
+            resolve_dependencies([step("A"), step("A")])
+
+
+class TestRunPipeline:
+    """Tests for arun_pipeline."""
+
+    def test_independent_steps_run_concurrently(self, gateway):
+        steps = [step("A", []), step("B", []), step("C", ["A", "B"]), step("D", ["C"])]
+        t0 = time.monotonic()
+        results = asyncio.run(arun_pipeline(steps, "ticket"))
+        elapsed = time.monotonic() - t0
+        # Critical path is A|B -> C -> D: three delays, not four
+        assert elapsed < 0.38
+        assert [r["agent_name"] for r in results] == ["A", "B", "C", "D"]
+        assert [r["output"] for r in results] == [{"agent": name} for name in "ABCD"]
+
+    def test_step_sees_only_declared_outputs(self, gateway):
+        steps = [step("A", []), step("B", []), step("C", ["B"])]
+        asyncio.run(arun_pipeline(steps, "ticket", extra_context="kb excerpt"))
+        assert gateway.prompts["A"] == "Input:\nticket\n\nkb excerpt"
+        assert "Previous agent outputs" not in gateway.prompts["B"]
+        assert "--- B output ---" in gateway.prompts["C"]
+        assert "--- A output ---" not in gateway.prompts["C"]
+
+    def test_failed_step_recorded_and_downstream_still_runs(self, monkeypatch):
+        fake = FakeGateway(fail={"A"})
+        monkeypatch.setattr(orchestrator, "llm_gateway", fake)
+        results = asyncio.run(arun_pipeline([step("A"), step("B")], "ticket"))
+        assert results[0]["output"] == {"error": "LLM down"}
+        assert results[1]["output"] == {"agent": "B"}
+        assert '"error": "LLM down"' in fake.prompts["B"]
+
+
+class TestConditionalSteps:
+    """Tests for skip_if / route."""
+
+    def test_skipped_step_recorded_and_left_out_downstream(self, monkeypatch):
+        fake = FakeGateway()
+        monkeypatch.setattr(orchestrator, "llm_gateway", fake)
+        seen = {}
+
+        def skip(outputs):
+            seen.update(outputs)
+            return outputs["A"]["agent"] == "A"
+
+        results = asyncio.run(arun_pipeline([step("A", []), step("B", ["A"], skip_if=skip), step("C")], "ticket"))
+        assert seen == {"A": {"agent": "A"}}
+        assert fake.calls == ["A", "C"]
+        assert results[1] == {
+            "agent_name": "B", "output": {}, "duration_ms": 0, "status": "skipped",
+            "model": None, "routed": False, "cached": False, "cache_key": None,
+        }
+        assert "--- B output ---" not in fake.prompts["C"]
+        assert "--- A output ---" in fake.prompts["C"]
+
+    def test_route_picks_model(self, monkeypatch):
+        fake = FakeGateway()
+        monkeypatch.setattr(orchestrator, "llm_gateway", fake)
+        results = asyncio.run(arun_pipeline(
+            [step("A", []), step("B", ["A"], route=lambda outputs: "cheap-model"), step("C", route=lambda outputs: None)],
+            "ticket",
+        ))
+        assert fake.models == {"A": "gpt-4o-mini", "B": "cheap-model", "C": "gpt-4o-mini"}
+        assert [(r["model"], r["routed"]) for r in results] == [
+            ("gpt-4o-mini", False), ("cheap-model", True), ("gpt-4o-mini", False),
+        ]
+
+    def test_hooks_ignored_when_upstream_failed_or_raising(self, monkeypatch):
+        fake = FakeGateway(fail={"A"})
+        monkeypatch.setattr(orchestrator, "llm_gateway", fake)
+        results = asyncio.run(arun_pipeline(
+            [
+                step("A", []),
+                step("B", ["A"], skip_if=lambda outputs: True),
+                step("C", [], skip_if=lambda outputs: outputs["missing"], route=lambda outputs: 1 / 0),
+            ],
+            "ticket",
+        ))
+        assert [r["status"] for r in results] == ["failed", "completed", "completed"]
+        assert results[2]["model"] == "gpt-4o-mini"
+
+
+@pytest.fixture
+def db():
+    db = SQLiteDatabase(":memory:")
+    yield db
+    db.close()
+
+
+def make_cache(db, **kwargs):
+    client = SQLiteClient(db)
+    return WorkflowStepCache(client, writer=BufferedWriter(client, enabled=False), **kwargs)
+
+
+class TestStepCache:
+    """Tests for arun_pipeline with a WorkflowStepCache."""
+
+    steps = [step("A", []), step("B", []), step("C", ["A", "B"])]
+
+    def test_unchanged_rerun_reuses_every_step(self, monkeypatch, db):
+        fake = FakeGateway()
+        monkeypatch.setattr(orchestrator, "llm_gateway", fake)
+        cache = make_cache(db)
+        first = asyncio.run(arun_pipeline(self.steps, "ticket", cache=cache))
+        second = asyncio.run(arun_pipeline(self.steps, "ticket", cache=cache))
+        assert fake.calls.count("C") == 1 and len(fake.calls) == 3
+        assert [r["cached"] for r in first] == [False, False, False]
+        assert [r["cached"] for r in second] == [True, True, True]
+        assert [r["output"] for r in second] == [r["output"] for r in first]
+
+        # Another worker finds the outputs in the table
+        fresh = make_cache(db)
+        assert all(r["cached"] for r in asyncio.run(arun_pipeline(self.steps, "ticket", cache=fresh)))
+        assert fresh.stats()["table_hits"] == 3
+
+    def test_changed_input_misses(self, monkeypatch, db):
+        fake = FakeGateway()
+        monkeypatch.setattr(orchestrator, "llm_gateway", fake)
+        cache = make_cache(db)
+        asyncio.run(arun_pipeline(self.steps, "ticket", cache=cache))
+        results = asyncio.run(arun_pipeline(self.steps, "ticket, edited", cache=cache))
+        assert not any(r["cached"] for r in results)
+        assert len(fake.calls) == 6
+
+    def test_failed_run_resumes_at_failed_step(self, monkeypatch, db):
+        cache = make_cache(db)
+        monkeypatch.setattr(orchestrator, "llm_gateway", FakeGateway(fail={"C"}))
+        failed = asyncio.run(arun_pipeline(self.steps, "ticket", cache=cache))
+        assert "error" in failed[2]["output"]
+
+        retry = FakeGateway()
+        monkeypatch.setattr(orchestrator, "llm_gateway", retry)
+        results = asyncio.run(arun_pipeline(self.steps, "ticket", cache=cache))
+        assert retry.calls == ["C"]
+        assert [r["cached"] for r in results] == [True, True, False]
+        assert results[2]["output"] == {"agent": "C"}
+
+    def test_slow_cache_write_does_not_block_other_steps(self, gateway, db):
+        cache = make_cache(db)
+        enqueue = cache.writer.enqueue
+
+        def slow_enqueue(*args, **kwargs):
+            time.sleep(0.2)  # a full write buffer waiting for room
+            return enqueue(*args, **kwargs)
+
+        cache.writer.enqueue = slow_enqueue
+        t0 = time.monotonic()
+        asyncio.run(arun_pipeline([step("A", []), step("B", [])], "ticket", cache=cache))
+        # The two writes overlap instead of stalling the event loop one after the other
+        assert time.monotonic() - t0 < 0.38
@@ -0,0 +1,117 @@
+"""Unit tests for the shared cache backends."""
+import time
+import pytest
+
+from app.cache_backend import MemoryCacheBackend, RedisCacheBackend
+from app.reference_cache import ReferenceCache
+
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+@pytest.fixture
+def redis_server():
+    fakeredis = pytest.importorskip("fakeredis")
+    return fakeredis.FakeServer()
+
+
+def redis_backend(server, prefix="test:"):
+    import fakeredis
+
+    return RedisCacheBackend(client=fakeredis.FakeRedis(server=server), prefix=prefix)
+
+
+@pytest.fixture(params=["memory", "redis"])
+def backend(request):
+    if request.param == "memory":
+        yield MemoryCacheBackend(prefix="test:")
+    else:
+        b = redis_backend(request.getfixturevalue("redis_server"))
+        yield b
+        b.close()
+
+
+class TestCacheBackend:
+    """Behaviour shared by every backend."""
+
+    def test_get_set_delete(self, backend):
+        assert backend.get("k") is None
+        assert backend.set("k", "v")
+        assert backend.get("k") == b"v"
+        assert backend.delete("k") == 1
+        assert backend.get("k") is None
+
+    def test_ttl_expires(self, backend):
+        backend.set("k", b"v", ttl_seconds=0.1)
+        assert backend.get("k") == b"v"
+        assert wait_for(lambda: backend.get("k") is None)
+
+    def test_only_if_absent(self, backend):
+        assert backend.set("lock", "a", only_if_absent=True)
+        assert not backend.set("lock", "b", only_if_absent=True)
+        assert backend.get("lock") == b"a"
+
+    def test_json_round_trip(self, backend):
+        backend.set_json("doc", {"ids": [1, 2]})
+        assert backend.get_json("doc") == {"ids": [1, 2]}
+        assert backend.get_json("missing") is None
+
+    def test_incr_keeps_first_ttl(self, backend):
+        assert backend.incr("n", ttl_seconds=0.2) == 1
+        assert backend.incr("n", 5, ttl_seconds=60) == 6
+        assert backend.get("n") == b"6"
+        assert wait_for(lambda: backend.get("n") is None)
+
+    def test_sliding_window(self, backend):
+        assert [backend.hit_window("w", 0.3) for _ in range(3)] == [1, 2, 3]
+        assert backend.window_count("w", 0.3) == 3
+        assert wait_for(lambda: backend.window_count("w", 0.3) == 0)
+        assert backend.hit_window("w", 0.3) == 1
+
+    def test_prefix_isolates_keys(self, backend):
+        backend.set("k", "v")
+        assert backend.key("k") == "test:k"
+
+    def test_publish_reaches_subscribers_until_closed(self, backend):
+        received = []
+        sub = backend.subscribe("events", received.append)
+        time.sleep(0.05)
+        backend.publish("events", "hello")
+        assert wait_for(lambda: received == ["hello"])
+        sub.close()
+        backend.publish("events", "ignored")
+        time.sleep(0.1)
+        assert received == ["hello"]
+
+
+class TestSharedInvalidation:
+    """Reference cache invalidations fan out to other workers."""
+
+    def test_invalidation_reaches_other_worker(self, redis_server):
+        worker_a, worker_b = ReferenceCache(), ReferenceCache()
+        backend_a, backend_b = redis_backend(redis_server), redis_backend(redis_server)
+        worker_a.connect(backend_a)
+        worker_b.connect(backend_b)
+        try:
+            worker_b._store("tags", 0, [{"id": "t1", "name": "billing"}])
+            time.sleep(0.05)
+            worker_a.invalidate("tags")
+            assert wait_for(lambda: "tags" not in worker_b._entries)
+            assert worker_a.stats()["tables"]["tags"]["invalidations"] == 1
+        finally:
+            worker_a.disconnect()
+            worker_b.disconnect()
+
+    def test_own_messages_ignored(self):
+        backend = MemoryCacheBackend()
+        cache = ReferenceCache()
+        cache.connect(backend)
+        cache.invalidate("tags")
+        assert cache.stats()["tables"]["tags"]["invalidations"] == 1
+        cache.disconnect()
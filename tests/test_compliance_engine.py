@@ -0,0 +1,197 @@
+"""Unit tests for the concurrent compliance evaluation engine."""
+import asyncio
+import json
+import time
+
+import pytest
+
+from app.compliance_cache import ComplianceResultCache
+from app.compliance_engine import ComplianceEngine, summarize
+from app.schemas import RequirementResult
+from app.sqlite_backend import AsyncSQLiteClient, SQLiteClient, SQLiteDatabase
+from app.write_buffer import BufferedWriter
+
+TOPICS = ["encryption", "retention", "access"]
+
+
+def vector(text):
+    return [1.0 if topic in text else 0.0 for topic in TOPICS]
+
+
+class FakeEmbed:
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, texts):
+        self.calls.append(list(texts))
+        return [vector(t) for t in texts]
+
+
+class FakeGateway:
+    """Passes a requirement when excerpts were found; tracks concurrency."""
+
+    def __init__(self, delays=None, fail=()):
+        self.delays = delays or {}
+        self.fail = set(fail)
+        self.active = self.max_active = 0
+        self.calls = []
+
+    async def complete(self, messages, **kwargs):
+        prompt = messages[1]["content"]
+        title = prompt.splitlines()[0].removeprefix("Requirement: ")
+        self.calls.append(title)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delays.get(title, 0.01))
+        finally:
+            self.active -= 1
+        if title in self.fail:
+            raise RuntimeError("LLM down")
+        found = "(No relevant sections found.)" not in prompt
+        return json.dumps({"status": "pass" if found else "fail", "reasoning": title, "confidence": 0.9})
+
+
+@pytest.fixture
+def db():
+    db = SQLiteDatabase(":memory:")
+    SQLiteClient(db).table("document_chunks").insert([
+        {"id": "c1", "document_id": "doc-1", "chunk_index": 0, "content": "Data is encrypted at rest.", "embedding": vector("encryption")},
+        {"id": "c2", "document_id": "doc-2", "chunk_index": 0, "content": "Logs are kept 90 days.", "embedding": vector("retention")},
+    ]).execute()
+    yield db
+    db.close()
+
+
+def requirement(i, topic):
+    return {"id": f"r{i}", "title": f"{topic} {i}", "description": f"Policy covers {topic}"}
+
+
+def make_engine(db, gateway, embed=None, **kwargs):
+    return ComplianceEngine(
+        embed=embed or FakeEmbed(),
+        gateway=gateway,
+        async_client_factory=lambda: AsyncSQLiteClient(db),
+        **kwargs,
+    )
+
+
+class TestComplianceEngine:
+    """Tests for ComplianceEngine."""
+
+    def test_one_embedding_call_and_bounded_concurrency(self, db):
+        embed = FakeEmbed()
+        gateway = FakeGateway()
+        engine = make_engine(db, gateway, embed, concurrency=3)
+        requirements = [requirement(i, TOPICS[i % 3]) for i in range(10)]
+        results, reused = asyncio.run(engine.evaluate_all("doc-1", requirements))
+        assert reused == []
+        assert len(embed.calls) == 1 and len(embed.calls[0]) == 10
+        assert gateway.max_active == 3
+        assert [r.requirement_id for r in results] == [f"r{i}" for i in range(10)]
+        # Only chunks of the evaluated document count as evidence
+        assert [r.status for r in results[:3]] == ["pass", "fail", "fail"]
+
+    def test_results_yielded_as_they_finish(self, db):
+        gateway = FakeGateway(delays={"encryption 0": 0.1, "retention 1": 0.0, "access 2": 0.05})
+        engine = make_engine(db, gateway)
+        requirements = [requirement(0, "encryption"), requirement(1, "retention"), requirement(2, "access")]
+
+        async def run():
+            return [index async for index, _, _ in engine.evaluate("doc-1", requirements)]
+
+        assert asyncio.run(run()) == [1, 2, 0]
+
+    def test_failed_requirement_does_not_fail_the_rest(self, db):
+        engine = make_engine(db, FakeGateway(fail={"retention 1"}))
+        results, _ = asyncio.run(engine.evaluate_all("doc-1", [requirement(0, "encryption"), requirement(1, "retention")]))
+        assert results[0].status == "pass"
+        assert results[1].status == "fail"
+        assert results[1].reasoning == "Evaluation error: LLM down"
+
+    def test_no_requirements(self, db):
+        embed = FakeEmbed()
+        assert asyncio.run(make_engine(db, FakeGateway(), embed).evaluate_all("doc-1", [])) == ([], [])
+        assert embed.calls == []
+
+
+def make_cache(db, **kwargs):
+    return ComplianceResultCache(
+        writer=BufferedWriter(SQLiteClient(db), enabled=False),
+        async_client_factory=lambda: AsyncSQLiteClient(db),
+        **kwargs,
+    )
+
+
+class TestCachedEvaluation:
+    """Tests for ComplianceEngine with a ComplianceResultCache."""
+
+    requirements = [requirement(0, "encryption"), requirement(1, "retention"), requirement(2, "access")]
+
+    def test_unchanged_inputs_reuse_every_verdict(self, db):
+        gateway = FakeGateway()
+        embed = FakeEmbed()
+        engine = make_engine(db, gateway, embed, cache=make_cache(db))
+        first, reused = asyncio.run(engine.evaluate_all("doc-1", self.requirements, "hash-1"))
+        assert reused == [] and len(gateway.calls) == 3
+
+        # A second worker: nothing in memory, everything in the table
+        other = make_engine(db, gateway, embed, cache=make_cache(db))
+        again, reused = asyncio.run(other.evaluate_all("doc-1", self.requirements, "hash-1"))
+        assert reused == ["r0", "r1", "r2"]
+        assert again == first
+        assert len(gateway.calls) == 3 and len(embed.calls) == 1
+
+    def test_only_changed_requirements_and_documents_recomputed(self, db):
+        gateway = FakeGateway()
+        embed = FakeEmbed()
+        engine = make_engine(db, gateway, embed, cache=make_cache(db))
+        asyncio.run(engine.evaluate_all("doc-1", self.requirements, "hash-1"))
+
+        edited = [self.requirements[0], {**self.requirements[1], "description": "Keep logs a year"}, self.requirements[2]]
+        _, reused = asyncio.run(engine.evaluate_all("doc-1", edited, "hash-1"))
+        assert reused == ["r0", "r2"]
+        assert gateway.calls[3:] == ["retention 1"]
+        assert embed.calls[-1] == ["retention 1 Keep logs a year"]
+
+        # New document content: nothing reused
+        _, reused = asyncio.run(engine.evaluate_all("doc-1", self.requirements, "hash-2"))
+        assert reused == []
+
+    def test_errors_and_unhashed_documents_not_cached(self, db):
+        gateway = FakeGateway(fail={"retention 1"})
+        cache = make_cache(db)
+        engine = make_engine(db, gateway, cache=cache)
+        asyncio.run(engine.evaluate_all("doc-1", self.requirements, "hash-1"))
+        assert cache.stats()["stored"] == 2
+
+        _, reused = asyncio.run(engine.evaluate_all("doc-1", self.requirements, None))
+        assert reused == []
+        assert cache.stats()["stored"] == 2
+
+    def test_slow_cache_write_does_not_block_other_requirements(self, db):
+        cache = make_cache(db)
+        enqueue = cache.writer.enqueue
+
+        def slow_enqueue(*args, **kwargs):
+            time.sleep(0.2)  # a full write buffer waiting for room
+            return enqueue(*args, **kwargs)
+
+        cache.writer.enqueue = slow_enqueue
+        engine = make_engine(db, FakeGateway(), cache=cache)
+        t0 = time.monotonic()
+        asyncio.run(engine.evaluate_all("doc-1", self.requirements, "hash-1"))
+        # The three writes overlap instead of stalling the event loop one after the other
+        assert time.monotonic() - t0 < 0.45
+        assert cache.stats()["stored"] == 3
+
+
+class TestSummarize:
+    """Tests for summarize."""
+
+    def test_score_counts_pass_and_partial(self):
+        results = [
+            RequirementResult(requirement_id=str(i), status=status, reasoning="", confidence=1.0)
+            for i, status in enumerate(["pass", "partial", "fail", "not_applicable"])
+        ]
+        assert summarize(results) == (0.5, "Overall compliance: 50% 1 requirement(s) failed.")
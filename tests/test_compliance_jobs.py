@@ -0,0 +1,142 @@
+"""Unit tests for compliance batch evaluation jobs."""
+import asyncio
+
+import pytest
+
+from app.compliance_jobs import BatchTooLarge, ComplianceBatchJobs
+from app.schemas import RequirementResult
+from app.sqlite_backend import AsyncSQLiteClient, SQLiteClient
+
+# Each document covers one topic; a requirement passes when it names that topic
+DOCUMENT_TOPICS = {"doc-1": "encryption", "doc-2": "retention"}
+
+
+class FakeEngine:
+    """Stands in for ComplianceEngine: judges requirements under the shared limit.
+
+    With *cache*, verdicts for a (document, content hash, requirement) judged
+    before are reused, as the result cache would.
+    """
+
+    def __init__(self, cache=False, fail=()):
+        self.cache = cache
+        self.fail = set(fail)
+        self.embedded = []
+        self.judged = []
+        self.seen = set()
+        self.active = self.max_active = 0
+
+    async def query_vectors(self, requirements):
+        queries = list(dict.fromkeys(r["title"] for r in requirements))
+        self.embedded.append(queries)
+        return {q: [1.0] for q in queries}
+
+    async def evaluate(self, document_id, requirements, content_hash=None, *, vectors=None, limit=None):
+        if document_id in self.fail:
+            raise RuntimeError("search down")
+        keys = [(document_id, content_hash, req["id"]) for req in requirements]
+        cached = {key for key in keys if self.cache and content_hash is not None and key in self.seen}
+        for index, (req, key) in enumerate(zip(requirements, keys)):
+            reused = key in cached
+            if not reused:
+                async with limit:
+                    self.judged.append(req["title"])
+                    self.active += 1
+                    self.max_active = max(self.max_active, self.active)
+                    try:
+                        await asyncio.sleep(0.01)
+                    finally:
+                        self.active -= 1
+                self.seen.add(key)
+            passed = DOCUMENT_TOPICS.get(document_id, "") in req["title"].split()
+            yield index, RequirementResult(
+                requirement_id=req["id"], status="pass" if passed else "fail", reasoning="", confidence=0.9
+            ), reused
+
+
+def requirement(i, topic):
+    return {"id": f"r{i}", "title": f"{topic} {i}", "description": f"Policy covers {topic}"}
+
+
+TEMPLATES = [
+    {"id": "t-security", "requirements": [requirement(0, "encryption"), requirement(1, "access")]},
+    {"id": "t-records", "requirements": [requirement(2, "retention"), requirement(0, "encryption")]},
+]
+DOCUMENTS = [{"id": "doc-1", "content_hash": "h1"}, {"id": "doc-2", "content_hash": "h2"}, {"id": "doc-3", "content_hash": None}]
+
+
+def make_jobs(db, engine, **kwargs):
+    return ComplianceBatchJobs(engine=engine, async_client_factory=lambda: AsyncSQLiteClient(db), **kwargs)
+
+
+def run_batch(jobs, templates=TEMPLATES, documents=DOCUMENTS):
+    async def run():
+        job = jobs.submit(templates, documents, "admin-1")
+        return await jobs.wait(job.id, 5)
+
+    return asyncio.run(run())
+
+
+class TestComplianceBatchJobs:
+    """Tests for ComplianceBatchJobs."""
+
+    def test_every_pair_evaluated_and_written_in_bulk(self, db):
+        engine = FakeEngine()
+        jobs = make_jobs(db, engine, write_size=4)
+        view = run_batch(jobs)
+        assert view["status"] == "completed"
+        assert view["progress"] == {
+            "pairs_total": 6, "pairs_completed": 6, "pairs_failed": 0,
+            "requirements_total": 12, "requirements_completed": 12, "requirements_reused": 0,
+        }
+        # Requirement queries embedded once for all templates and documents
+        assert len(engine.embedded) == 1 and len(engine.embedded[0]) == 3
+        assert jobs.stats()["inserts"] == 2
+
+        rows = {r["id"]: r for r in SQLiteClient(db).table("compliance_evaluations").select("*").execute().data}
+        assert len(rows) == 6
+        by_pair = {(e["template_id"], e["document_id"]): e for e in view["evaluations"]}
+        stored = rows[by_pair[("t-security", "doc-1")]["evaluation_id"]]
+        assert stored["evaluated_by"] == "admin-1"
+        assert stored["overall_score"] == by_pair[("t-security", "doc-1")]["overall_score"] == 0.5
+
+    def test_concurrency_cap_shared_by_all_jobs(self, db):
+        engine = FakeEngine()
+        jobs = make_jobs(db, engine, concurrency=2)
+
+        async def run():
+            first = jobs.submit(TEMPLATES, DOCUMENTS, "admin-1")
+            second = jobs.submit(TEMPLATES[:1], DOCUMENTS, "admin-2")
+            return [await jobs.wait(job.id, 5) for job in (first, second)]
+
+        views = asyncio.run(run())
+        assert [v["status"] for v in views] == ["completed", "completed"]
+        assert engine.max_active == 2
+        assert len(engine.judged) == 18
+
+    def test_cached_verdicts_reused(self, db):
+        engine = FakeEngine(cache=True)
+        jobs = make_jobs(db, engine)
+        run_batch(jobs)
+        view = run_batch(jobs)
+        # doc-3 has no content hash, so only its 4 verdicts are recomputed
+        assert view["progress"]["requirements_reused"] == 8
+        assert len(engine.judged) == 12 + 4
+
+    def test_failed_pair_does_not_fail_the_job(self, db):
+        view = run_batch(make_jobs(db, FakeEngine(fail={"doc-2"})))
+        assert view["status"] == "completed"
+        assert view["progress"]["pairs_failed"] == 2
+        failed = [e for e in view["evaluations"] if e["status"] == "failed"]
+        assert {e["document_id"] for e in failed} == {"doc-2"}
+        assert all(e["evaluation_id"] is None for e in failed)
+
+    def test_too_many_pairs_rejected(self, db):
+        jobs = make_jobs(db, FakeEngine(), max_pairs=5)
+
+        async def run():
+            jobs.submit(TEMPLATES, DOCUMENTS, "admin-1")
+
+        with pytest.raises(BatchTooLarge):
+            asyncio.run(run())
+        assert jobs.stats()["rejected"] == 1
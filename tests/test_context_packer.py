@@ -0,0 +1,86 @@
+"""Unit tests for the RAG context packer."""
+from app.context_packer import ContextPacker, merge_overlap
+
+
+def words(text):
+    return len(text.split())
+
+
+def make_packer(**kwargs):
+    kwargs.setdefault("budget_tokens", 1000)
+    return ContextPacker(count_tokens=words, **kwargs)
+
+
+def sentence(n, topic="refund"):
+    return " ".join(f"{topic}{n}w{i}" for i in range(10)) + "."
+
+
+def chunk(chunk_id, document_id, index, content, similarity):
+    return {"id": chunk_id, "document_id": document_id, "chunk_index": index, "content": content, "similarity": similarity}
+
+
+class TestMergeOverlap:
+    """Tests for merge_overlap."""
+
+    def test_shared_text_kept_once(self):
+        first = sentence(1) + " " + sentence(2)
+        second = sentence(2) + " " + sentence(3)
+        assert merge_overlap(first, second) == " ".join([sentence(1), sentence(2), sentence(3)])
+
+    def test_no_overlap_joins_with_newline(self):
+        assert merge_overlap(sentence(1), sentence(2)) == sentence(1) + "\n" + sentence(2)
+
+
+class TestContextPacker:
+    """Tests for ContextPacker.pack."""
+
+    def test_adjacent_chunks_merged_into_one_passage(self):
+        rows = [
+            chunk("c2", "doc", 2, sentence(2) + " " + sentence(3), 0.8),
+            chunk("c1", "doc", 1, sentence(1) + " " + sentence(2), 0.9),
+        ]
+        packed = make_packer().pack(rows)
+        assert len(packed.passages) == 1
+        passage = packed.passages[0]
+        assert passage.chunk_ids == ["c1", "c2"]
+        assert passage.similarity == 0.9
+        assert passage.content == " ".join([sentence(1), sentence(2), sentence(3)])
+        assert packed.tokens == 30
+
+    def test_near_duplicate_paragraphs_dropped(self):
+        faq = sentence(1, "reset") + " " + sentence(2, "reset")
+        rows = [
+            chunk("a", "doc-a", 0, faq + "\n\n" + sentence(3), 0.9),
+            # Same FAQ paragraph copied into another document, plus new text
+            chunk("b", "doc-b", 5, faq.replace(".", "!") + "\n\n" + sentence(4), 0.8),
+            chunk("c", "doc-c", 0, faq, 0.7),
+        ]
+        packer = make_packer()
+        packed = packer.pack(rows)
+        assert [p.document_id for p in packed.passages] == ["doc-a", "doc-b"]
+        assert packed.passages[1].content == sentence(4)
+        assert packed.chunk_ids == {"a", "b"}
+        assert packer.stats()["duplicate_spans_dropped"] == 2
+
+    def test_budget_filled_in_similarity_order(self):
+        rows = [chunk(f"c{i}", f"doc{i}", 0, " ".join(sentence(i * 10 + j) for j in range(6)), 0.9 - i / 10) for i in range(4)]
+        packer = make_packer(budget_tokens=170)
+        packed = packer.pack(list(reversed(rows)))
+        assert [p.document_id for p in packed.passages] == ["doc0", "doc1", "doc2"]
+        assert packed.passages[-1].content.endswith("…")
+        assert packed.tokens <= 170
+        assert packer.stats()["truncated"] == 1
+
+        # Too little room left to be worth a cut: the passage is skipped instead
+        packed = packer.pack(rows, budget_tokens=130)
+        assert [p.document_id for p in packed.passages] == ["doc0", "doc1"]
+
+    def test_empty_rows(self):
+        packed = make_packer().pack([])
+        assert packed.passages == [] and packed.tokens == 0
+        assert packed.render() == ""
+
+    def test_render_with_labels(self):
+        rows = [chunk("a", "doc-a", 0, sentence(1), 0.9), chunk("b", "doc-b", 0, sentence(2), 0.8)]
+        text = make_packer().pack(rows).render("\n\n---\n\n", label=lambda p: f"[{p.document_id}]\n")
+        assert text == f"[doc-a]\n{sentence(1)}\n\n---\n\n[doc-b]\n{sentence(2)}"
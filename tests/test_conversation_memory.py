@@ -0,0 +1,141 @@
+"""Unit tests for token-budgeted conversation history and rolling summaries."""
+import asyncio
+
+import pytest
+
+from app.conversation_memory import ConversationMemory
+from app.sqlite_backend import AsyncSQLiteClient, SQLiteClient, SQLiteDatabase
+from app.ticket_repository import TicketRepository
+
+
+def words(text):
+    return len(text.split())
+
+
+class FakeGateway:
+    def __init__(self):
+        self.prompts = []
+
+    async def complete(self, messages, max_tokens=None):
+        self.prompts.append(messages[-1]["content"])
+        return f"summary #{len(self.prompts)}"
+
+
+@pytest.fixture
+def db():
+    db = SQLiteDatabase(":memory:")
+    yield db
+    db.close()
+
+
+def make_memory(db, **kwargs):
+    kwargs.setdefault("budget_tokens", 20)
+    kwargs.setdefault("recent_messages", 4)
+    return ConversationMemory(
+        count_tokens=words,
+        repository=TicketRepository(AsyncSQLiteClient(db)),
+        gateway=FakeGateway(),
+        **kwargs,
+    )
+
+
+def make_ticket(db, **fields):
+    return SQLiteClient(db).table("tickets").insert({"subject": "Order", **fields}).execute().data[0]
+
+
+def thread(n):
+    return [{"sender": "customer" if i % 2 == 0 else "ai", "message": f"message {i} words"} for i in range(n)]
+
+
+class TestPromptWindow:
+    """Tests for ConversationMemory.build."""
+
+    def test_short_thread_sent_in_full(self, db):
+        memory = make_memory(db)
+        window = memory.build({"id": "t"}, thread(3))
+        assert window.text.splitlines() == ["Customer: message 0 words", "Ai: message 1 words", "Customer: message 2 words"]
+        assert window.overflow == []
+        assert window.tokens == 12
+
+    def test_long_thread_bounded_by_budget_and_turns(self, db):
+        memory = make_memory(db)
+        window = memory.build({"id": "t"}, thread(50))
+        lines = window.text.splitlines()
+        assert lines[0] == "(46 earlier message(s) not shown)"
+        assert lines[-1] == "Ai: message 49 words"
+        assert len(lines) == 5
+        assert window.tokens <= memory.budget_tokens
+        assert len(window.overflow) == 46
+
+    def test_summary_replaces_covered_messages(self, db):
+        memory = make_memory(db)
+        ticket = {"id": "t", "conversation_summary": "Wants refund.", "summary_message_count": 47}
+        window = memory.build(ticket, thread(50))
+        assert window.text.splitlines() == [
+            "Summary of the earlier conversation:", "Wants refund.",
+            "Ai: message 47 words", "Customer: message 48 words", "Ai: message 49 words",
+        ]
+        assert "not shown" not in window.text
+        assert window.overflow == []
+
+    def test_newest_message_truncated_to_budget(self, db):
+        memory = make_memory(db, budget_tokens=10)
+        window = memory.build({"id": "t"}, [{"sender": "customer", "message": "word " * 100}])
+        assert window.text.startswith("Customer: word")
+        assert window.text.endswith("…")
+        assert window.tokens <= 10
+
+
+class TestRollingSummary:
+    """Tests for ConversationMemory.refresh / schedule_refresh."""
+
+    def test_overflow_folded_into_stored_summary(self, db):
+        memory = make_memory(db)
+        ticket = make_ticket(db)
+        window = memory.build(ticket, thread(50))
+
+        async def run():
+            memory.schedule_refresh(ticket["id"], ticket, window)
+            await memory.drain()
+
+        asyncio.run(run())
+        stored = SQLiteClient(db).table("tickets").select("*").eq("id", ticket["id"]).execute().data[0]
+        assert stored["summary_message_count"] == 46
+        assert stored["conversation_summary"] == f"summary #{len(memory.gateway.prompts)}"
+        # 46 four-word lines in 20-token slices, each call extending the previous summary
+        assert len(memory.gateway.prompts) == 10
+        assert "summary #1" in memory.gateway.prompts[1]
+        assert memory.stats()["summaries_written"] == 1
+
+        # The next prompt uses the summary instead of the overflow
+        window = memory.build(stored, thread(52))
+        assert window.text.startswith("Summary of the earlier conversation:\nsummary #10")
+        assert len(window.overflow) == 3
+        assert window.tokens <= memory.budget_tokens
+
+    def test_concurrent_update_does_not_overwrite(self, db):
+        memory = make_memory(db)
+        ticket = make_ticket(db)
+        window = memory.build(ticket, thread(50))
+        SQLiteClient(db).table("tickets").update(
+            {"conversation_summary": "newer", "summary_message_count": 48}
+        ).eq("id", ticket["id"]).execute()
+
+        assert asyncio.run(memory.refresh(ticket["id"], ticket, window)) is None
+        stored = SQLiteClient(db).table("tickets").select("*").eq("id", ticket["id"]).execute().data[0]
+        assert stored["conversation_summary"] == "newer"
+        assert memory.stats()["summary_conflicts"] == 1
+
+    def test_disabled_summaries_only_bound_the_prompt(self, db):
+        memory = make_memory(db, summaries_enabled=False)
+        ticket = {"id": "t", "conversation_summary": "stale", "summary_message_count": 40}
+        window = memory.build(ticket, thread(50))
+        assert "stale" not in window.text
+        assert window.tokens <= memory.budget_tokens
+
+        async def run():
+            memory.schedule_refresh("t", ticket, window)
+            await memory.drain()
+
+        asyncio.run(run())
+        assert memory.gateway.prompts == []
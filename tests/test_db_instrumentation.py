@@ -0,0 +1,154 @@
+"""Unit tests for database round-trip instrumentation."""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.db_instrumentation import (
+    InstrumentedClient,
+    RequestDbStats,
+    _current_stats,
+    DbTimingMiddleware,
+    route_db_summary,
+)
+
+
+def make_client(async_execute=False):
+    client = MagicMock()
+    chain = MagicMock()
+    for method in ("select", "insert", "update", "delete", "eq", "order", "limit"):
+        getattr(chain, method).return_value = chain
+    if async_execute:
+        chain.execute = AsyncMock(return_value=MagicMock(data=[]))
+    else:
+        chain.execute.return_value = MagicMock(data=[])
+    client.table.return_value = chain
+    client.rpc.return_value = chain
+    return client, chain
+
+
+class TestInstrumentedClient:
+    """Tests for the client proxy."""
+
+    def test_sync_execute_tagged_by_table_and_operation(self):
+        raw, _ = make_client()
+        db = InstrumentedClient(raw)
+        stats = RequestDbStats()
+        token = _current_stats.set(stats)
+        try:
+            db.table("tickets").select("*").eq("id", "t1").execute()
+            db.table("messages").insert({"message": "hi"}).execute()
+            db.rpc("match_chunks", {"match_count": 3}).execute()
+        finally:
+            _current_stats.reset(token)
+
+        assert stats.round_trips == 3
+        assert [(c.target, c.operation) for c in stats.calls] == [
+            ("tickets", "select"),
+            ("messages", "insert"),
+            ("match_chunks", "rpc"),
+        ]
+
+    def test_async_execute_is_timed(self):
+        raw, chain = make_client(async_execute=True)
+        db = InstrumentedClient(raw)
+        stats = RequestDbStats()
+
+        async def run():
+            token = _current_stats.set(stats)
+            try:
+                await db.table("tickets").update({"status": "closed"}).eq("id", "t1").execute()
+            finally:
+                _current_stats.reset(token)
+
+        asyncio.run(run())
+        assert stats.by_tag() == {"tickets.update": {"count": 1, "ms": stats.total_ms}}
+        chain.execute.assert_awaited_once()
+
+    def test_outside_request_nothing_recorded(self):
+        raw, chain = make_client()
+        InstrumentedClient(raw).table("tickets").select("*").execute()
+        chain.execute.assert_called_once()
+
+    def test_attribute_writes_reach_builder(self):
+        raw, chain = make_client()
+        query = InstrumentedClient(raw).table("tickets").select("*")
+        query.params = "patched"
+        assert chain.params == "patched"
+
+
+class TestDbTimingMiddleware:
+    """Tests for the Server-Timing middleware and route summary."""
+
+    def test_sync_endpoint_calls_reported(self):
+        raw, _ = make_client()
+        db = InstrumentedClient(raw)
+        app = FastAPI()
+        app.add_middleware(DbTimingMiddleware)
+
+        @app.get("/items/{item_id}")
+        def get_item(item_id: str):
+            db.table("tickets").select("*").eq("id", item_id).execute()
+            db.table("messages").select("*").execute()
+            return {"ok": True}
+
+        route_db_summary.reset()
+        response = TestClient(app).get("/items/abc")
+
+        timing = response.headers["Server-Timing"]
+        assert 'desc="2 round trips"' in timing
+        assert "db.tickets.select" in timing
+        summary = route_db_summary.snapshot()["GET /items/{item_id}"]
+        assert summary["requests"] == 1
+        assert summary["max_round_trips"] == 2
+        assert set(summary["calls"]) == {"tickets.select", "messages.select"}
+        route_db_summary.reset()
+
+    def test_over_budget_logged(self, monkeypatch):
+        from app import db_instrumentation
+
+        monkeypatch.setattr(db_instrumentation.settings, "db_round_trip_budget", 1)
+        warning = MagicMock()
+        monkeypatch.setattr(db_instrumentation.logger, "warning", warning)
+        raw, _ = make_client()
+        db = InstrumentedClient(raw)
+        app = FastAPI()
+        app.add_middleware(DbTimingMiddleware)
+
+        @app.get("/chatty")
+        async def chatty():
+            for _ in range(3):
+                db.table("tickets").select("*").execute()
+            return {}
+
+        TestClient(app).get("/chatty")
+        warning.assert_called_once()
+        assert "3 round trips" in warning.call_args.args[0]
+        route_db_summary.reset()
+
+    def test_streaming_body_calls_attributed_to_route(self):
+        raw, _ = make_client(async_execute=True)
+        db = InstrumentedClient(raw)
+        app = FastAPI()
+        app.add_middleware(DbTimingMiddleware)
+
+        @app.get("/stream")
+        async def stream():
+            async def events():
+                yield "event: start\n\n"
+                await db.table("messages").insert({"message": "hi"}).execute()
+                yield "event: done\n\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        route_db_summary.reset()
+        response = TestClient(app).get("/stream")
+        assert response.text.endswith("event: done\n\n")
+        # Headers went out before the body ran, so the calls are only in the summary
+        assert "server-timing" not in response.headers
+        summary = route_db_summary.snapshot()["GET /stream"]
+        assert summary["max_round_trips"] == 1
+        assert set(summary["calls"]) == {"messages.insert"}
+        route_db_summary.reset()
@@ -0,0 +1,119 @@
+"""Unit tests for the two-tier embedding cache."""
+import asyncio
+import time
+
+from app.embedding_cache import EmbeddingCache, text_hash
+from app.sqlite_backend import AsyncSQLiteClient, SQLiteClient
+from app.write_buffer import BufferedWriter
+
+
+class FakeAPI:
+    """Records the texts sent to the embeddings API."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+
+def make_cache(db, **kwargs):
+    writer = BufferedWriter(SQLiteClient(db), enabled=False)
+    return EmbeddingCache(
+        SQLiteClient(db),
+        writer=writer,
+        async_client_factory=lambda: AsyncSQLiteClient(db),
+        **kwargs,
+    )
+
+
+class TestEmbeddingCache:
+    """Tests for EmbeddingCache."""
+
+    def test_only_misses_sent_to_api(self, db):
+        cache, api = make_cache(db), FakeAPI()
+        assert cache.embed(["aa", "b"], "m", api) == [[2.0, 1.0], [1.0, 1.0]]
+        assert cache.embed(["b", "cccc", "aa"], "m", api) == [[1.0, 1.0], [4.0, 1.0], [2.0, 1.0]]
+        assert api.calls == [["aa", "b"], ["cccc"]]
+        stats = cache.stats()
+        assert (stats["memory_hits"], stats["misses"], stats["api_calls"]) == (2, 3, 2)
+
+    def test_duplicates_in_one_batch_embedded_once(self, db):
+        cache, api = make_cache(db), FakeAPI()
+        assert cache.embed(["x", "x", "yy"], "m", api) == [[1.0, 1.0], [1.0, 1.0], [2.0, 1.0]]
+        assert api.calls == [["x", "yy"]]
+
+    def test_table_tier_shared_between_processes(self, db):
+        api = FakeAPI()
+        make_cache(db).embed(["hello"], "m", api)
+        stored = db.query("SELECT model, text_hash FROM embedding_cache")
+        assert [(r["model"], r["text_hash"]) for r in stored] == [("m", text_hash("hello"))]
+
+        other = make_cache(db)  # fresh memory tier, e.g. another worker
+        assert other.embed(["hello"], "m", api) == [[5.0, 1.0]]
+        assert len(api.calls) == 1
+        stats = other.stats()
+        assert (stats["table_hits"], stats["api_calls_saved"], stats["hit_ratio"]) == (1, 1, 1.0)
+
+    def test_model_is_part_of_the_key(self, db):
+        cache, api = make_cache(db), FakeAPI()
+        cache.embed(["hello"], "small", api)
+        cache.embed(["hello"], "large", api)
+        assert len(api.calls) == 2
+
+    def test_lru_evicts_least_recently_used(self, db):
+        cache, api = make_cache(db, persist=False, max_entries=2), FakeAPI()
+        cache.embed(["a", "b"], "m", api)
+        cache.embed(["a"], "m", api)  # "a" is now most recent
+        cache.embed(["c"], "m", api)  # evicts "b"
+        cache.embed(["a", "b"], "m", api)
+        assert api.calls[-1] == ["b"]
+        assert cache.stats()["entries"] == 2
+
+    def test_table_failure_falls_back_to_api(self, db):
+        cache, api = make_cache(db), FakeAPI()
+        cache.client = None
+        cache.writer.client = None
+        assert cache.embed(["a"], "m", api) == [[1.0, 1.0]]
+
+    def test_disabled_passes_through(self, db):
+        cache, api = make_cache(db, enabled=False), FakeAPI()
+        cache.embed(["a"], "m", api)
+        cache.embed(["a"], "m", api)
+        assert len(api.calls) == 2
+
+    def test_async_lookup_uses_table(self, db):
+        api = FakeAPI()
+        make_cache(db).embed(["a", "bb"], "m", api)
+
+        async def fetch(texts):
+            return api(texts)
+
+        cache = make_cache(db)
+        result = asyncio.run(cache.aembed(["bb", "ccc"], "m", fetch))
+        assert result == [[2.0, 1.0], [3.0, 1.0]]
+        assert api.calls[-1] == ["ccc"]
+        assert cache.stats()["table_hits"] == 1
+
+    def test_async_store_does_not_block_the_event_loop(self, db):
+        cache = make_cache(db)
+        enqueue = cache.writer.enqueue
+
+        def slow_enqueue(*args, **kwargs):
+            time.sleep(0.2)  # a full write buffer waiting for room
+            return enqueue(*args, **kwargs)
+
+        cache.writer.enqueue = slow_enqueue
+
+        async def fetch(texts):
+            return FakeAPI()(texts)
+
+        async def run():
+            t0 = time.monotonic()
+            await asyncio.gather(cache.aembed(["a"], "m", fetch), cache.aembed(["bb"], "m", fetch))
+            return time.monotonic() - t0
+
+        # The two writes overlap instead of stalling the event loop one after the other
+        assert asyncio.run(run()) < 0.38
+        assert db.query("SELECT count(*) FROM embedding_cache")[0][0] == 2
@@ -0,0 +1,80 @@
+"""Unit tests for knowledge base vector search in embedding_service."""
+import asyncio
+
+import pytest
+
+from app.embedding_service import asearch_chunks, chunk_search_params, search_chunks
+from app.sqlite_backend import AsyncSQLiteClient, SQLiteClient
+
+
+@pytest.fixture
+def client(db):
+    client = SQLiteClient(db)
+    client.table("knowledge_documents").insert([
+        {"id": "doc-1", "title": "Security", "source": "upload", "tenant_id": "acme", "metadata": {"lang": "en"}},
+        {"id": "doc-2", "title": "Retention", "source": "manual", "tenant_id": "acme", "metadata": {"lang": "de"}},
+        {"id": "doc-3", "title": "Other tenant", "source": "upload", "tenant_id": "globex", "metadata": {"lang": "en"}},
+    ]).execute()
+    client.table("document_chunks").insert([
+        {"id": "c1", "document_id": "doc-1", "chunk_index": 0, "content": "Encrypted at rest.", "embedding": [1.0, 0.0]},
+        {"id": "c2", "document_id": "doc-2", "chunk_index": 0, "content": "Logs kept 90 days.", "embedding": [0.9, 0.1]},
+        {"id": "c3", "document_id": "doc-3", "chunk_index": 0, "content": "Globex encryption.", "embedding": [1.0, 0.0]},
+    ]).execute()
+    return client
+
+
+class TestChunkSearchParams:
+    """Tests for chunk_search_params."""
+
+    def test_no_filters_uses_match_chunks(self):
+        assert chunk_search_params([1.0], match_count=3) == (
+            "match_chunks",
+            {"query_embedding": [1.0], "match_count": 3, "match_threshold": 0.7},
+        )
+
+    def test_filters_use_match_chunks_filtered(self):
+        fn, params = chunk_search_params([1.0], document_ids=["doc-1"], metadata={"lang": "en"})
+        assert fn == "match_chunks_filtered"
+        assert params == {
+            "query_embedding": [1.0],
+            "match_count": 5,
+            "match_threshold": 0.7,
+            "p_document_ids": ["doc-1"],
+            "p_metadata": {"lang": "en"},
+        }
+
+    def test_empty_document_list_is_a_filter(self):
+        # No documents selected means no results, not the whole knowledge base
+        assert chunk_search_params([1.0], document_ids=[])[0] == "match_chunks_filtered"
+
+
+def contents(rows):
+    return [r["content"] for r in rows]
+
+
+class TestSearchChunks:
+    """Tests for search_chunks and asearch_chunks on the SQLite backend."""
+
+    def test_unfiltered_search_ranks_whole_knowledge_base(self, client):
+        rows = search_chunks([1.0, 0.0], client=client, match_threshold=0.5)
+        assert contents(rows) == ["Encrypted at rest.", "Globex encryption.", "Logs kept 90 days."]
+        assert rows[0]["similarity"] > rows[2]["similarity"]
+
+    def test_filters_restrict_to_matching_documents(self, client):
+        assert contents(search_chunks([1.0, 0.0], client=client, match_threshold=0.5, tenant_id="acme")) == [
+            "Encrypted at rest.", "Logs kept 90 days.",
+        ]
+        assert contents(search_chunks([1.0, 0.0], client=client, source="upload", metadata={"lang": "en"})) == [
+            "Encrypted at rest.", "Globex encryption.",
+        ]
+        assert contents(search_chunks([1.0, 0.0], client=client, document_ids=["doc-3"])) == ["Globex encryption."]
+        assert search_chunks([1.0, 0.0], client=client, document_ids=["doc-2"], tenant_id="globex") == []
+
+    def test_match_count_and_threshold(self, client):
+        assert len(search_chunks([1.0, 0.0], client=client, match_count=1)) == 1
+        assert search_chunks([0.0, 1.0], client=client, match_threshold=0.5) == []
+
+    def test_async_variant_matches_sync(self, db, client):
+        filters = {"match_threshold": 0.5, "tenant_id": "acme"}
+        rows = asyncio.run(asearch_chunks([1.0, 0.0], client=AsyncSQLiteClient(db), **filters))
+        assert rows == search_chunks([1.0, 0.0], client=client, **filters)
@@ -1,8 +1,9 @@
 """Unit tests for helper functions."""
+import asyncio
 import pytest
 from datetime import datetime, timedelta
 from unittest.mock import Mock, MagicMock, patch
-from app.helpers import sanitize_output, is_rate_limited, generate_ai_reply
+from app.helpers import sanitize_output, is_rate_limited, generate_ai_reply, stream_ai_reply
 
 
 class TestSanitizeOutput:
@@ -109,46 +110,50 @@ class TestIsRateLimited:
 
 
 class TestGenerateAIReply:
-    """Tests for generate_ai_reply function."""
+    """Tests for generate_ai_reply function (retries live in the LLM gateway)."""
 
-    @patch("app.helpers.client")
-    def test_successful_reply(self, mock_client):
+    @patch("app.helpers._get_rag_context", return_value="")
+    @patch("app.helpers.llm_gateway")
+    def test_successful_reply(self, mock_gateway, _rag):
         """Test successful AI reply generation."""
-        mock_response = MagicMock()
-        mock_response.choices[0].message.content = "Test response"
-        mock_client.chat.completions.create.return_value = mock_response
+        mock_gateway.complete_sync.return_value = "Test response"
         
         result = generate_ai_reply("Test prompt")
         assert result == "Test response"
-        mock_client.chat.completions.create.assert_called_once()
-
-    @patch("app.helpers.client")
-    @patch("time.sleep")
-    def test_retry_on_failure(self, mock_sleep, mock_client):
-        """Test retry logic on API failure."""
-        from config import settings
-        
-        # First call fails, second succeeds
-        mock_client.chat.completions.create.side_effect = [
-            Exception("API Error"),
-            MagicMock(choices=[MagicMock(message=MagicMock(content="Retry success"))]),
-        ]
-        
-        result = generate_ai_reply("Test prompt")
-        assert result == "Retry success"
-        assert mock_client.chat.completions.create.call_count == 2
-        mock_sleep.assert_called_once()
-
-    @patch("app.helpers.client")
-    @patch("time.sleep")
-    def test_all_retries_fail(self, mock_sleep, mock_client):
-        """Test when all retry attempts fail."""
-        mock_client.chat.completions.create.side_effect = Exception("API Error")
+        mock_gateway.complete_sync.assert_called_once_with([{"role": "user", "content": "Test prompt"}])
+
+    @patch("app.helpers._get_rag_context", return_value="\n\nKB excerpt")
+    @patch("app.helpers.llm_gateway")
+    def test_rag_context_appended(self, mock_gateway, _rag):
+        """Knowledge base excerpts are appended to the prompt."""
+        mock_gateway.complete_sync.return_value = "ok"
+        generate_ai_reply("Test prompt")
+        assert mock_gateway.complete_sync.call_args.args[0][0]["content"] == "Test prompt\n\nKB excerpt"
+
+    @patch("app.helpers._get_rag_context", return_value="")
+    @patch("app.helpers.llm_gateway")
+    def test_gateway_failure_propagates(self, mock_gateway, _rag):
+        """Test when the gateway gives up after its retries."""
+        mock_gateway.complete_sync.side_effect = Exception("API Error")
         
         with pytest.raises(Exception, match="API Error"):
             generate_ai_reply("Test prompt")
-        
-        # Should retry based on max_retries setting (default 3)
-        # Total attempts = max_retries + 1 = 4
-        assert mock_client.chat.completions.create.call_count >= 3
 
+
+class TestStreamAIReply:
+    """Tests for stream_ai_reply function."""
+
+    @patch("app.helpers.llm_gateway")
+    def test_yields_gateway_deltas(self, mock_gateway):
+        """Deltas from the gateway stream are passed through unchanged."""
+        async def fake_stream(messages):
+            assert messages == [{"role": "user", "content": "Test prompt"}]
+            for delta in ("Hel", "lo"):
+                yield delta
+
+        mock_gateway.stream = fake_stream
+
+        async def collect():
+            return [d async for d in stream_ai_reply("Test prompt", use_rag=False)]
+
+        assert asyncio.run(collect()) == ["Hel", "lo"]
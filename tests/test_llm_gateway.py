@@ -0,0 +1,296 @@
+"""Unit tests for the LLM gateway."""
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from app.cache_backend import MemoryCacheBackend
+from app.llm_gateway import LLMGateway, SharedRateLimit, TokenBucket
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+
+def completion(content="ok", total_tokens=10):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=SimpleNamespace(total_tokens=total_tokens),
+    )
+
+
+def rate_limit_error(retry_after=None):
+    headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+    response = httpx.Response(429, request=REQUEST, headers=headers)
+    return openai.RateLimitError("slow down", response=response, body=None)
+
+
+class FakeClient:
+    """Async client whose chat calls follow a script of results/exceptions."""
+
+    def __init__(self, script=None, latency=0.0):
+        self.script = list(script or [])
+        self.latency = latency
+        self.calls = 0
+        self.inputs = []
+        self.active = 0
+        self.max_active = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+        self.embeddings = SimpleNamespace(create=self._embed)
+
+    async def _chat(self, **kwargs):
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.latency)
+            outcome = self.script.pop(0) if self.script else completion()
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+        finally:
+            self.active -= 1
+
+    async def _embed(self, model, input):
+        self.calls += 1
+        self.inputs.append(list(input))
+        if self.script:
+            raise self.script.pop(0)
+        return SimpleNamespace(
+            data=[SimpleNamespace(embedding=[float(len(t))]) for t in input],
+            usage=SimpleNamespace(total_tokens=len(input)),
+        )
+
+
+@pytest.fixture
+def make_gateway():
+    gateways = []
+
+    def make(client, **kwargs):
+        kwargs.setdefault("initial_delay", 0.001)
+        kwargs.setdefault("max_delay", 0.01)
+        gateway = LLMGateway(client, **kwargs)
+        gateways.append(gateway)
+        return gateway
+
+    yield make
+    for gateway in gateways:
+        gateway.close()
+
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+class TestRetries:
+    """Backoff and retry policy."""
+
+    def test_retryable_error_is_retried(self, make_gateway):
+        client = FakeClient([openai.APIConnectionError(request=REQUEST), completion("second")])
+        gateway = make_gateway(client)
+        assert gateway.complete_sync(MESSAGES) == "second"
+        assert client.calls == 2
+        assert gateway.stats()["retries"] == 1
+
+    def test_non_retryable_error_raised_immediately(self, make_gateway):
+        bad_request = openai.BadRequestError(
+            "bad", response=httpx.Response(400, request=REQUEST), body=None
+        )
+        client = FakeClient([bad_request])
+        gateway = make_gateway(client)
+        with pytest.raises(openai.BadRequestError):
+            gateway.complete_sync(MESSAGES)
+        assert client.calls == 1
+
+    def test_gives_up_after_max_retries(self, make_gateway):
+        client = FakeClient([rate_limit_error() for _ in range(5)])
+        gateway = make_gateway(client, max_retries=2)
+        with pytest.raises(openai.RateLimitError):
+            gateway.complete_sync(MESSAGES)
+        assert client.calls == 3
+        assert gateway.stats()["failures"] == 1
+
+    def test_timeout_per_attempt(self, make_gateway):
+        client = FakeClient(latency=0.2)
+        gateway = make_gateway(client, timeout=0.02, max_retries=1)
+        with pytest.raises(asyncio.TimeoutError):
+            gateway.complete_sync(MESSAGES)
+        assert gateway.stats()["timeouts"] == 2
+
+    def test_backoff_honours_retry_after(self):
+        gateway = LLMGateway(FakeClient(), initial_delay=0.01, max_delay=5)
+        assert gateway._backoff(0, rate_limit_error(retry_after=2)) == 2.0
+        assert gateway._backoff(0, rate_limit_error(retry_after=60)) == 5.0
+        assert 0.005 <= gateway._backoff(0, RuntimeError()) <= 0.01
+
+
+class TestLimits:
+    """Concurrency cap and token buckets."""
+
+    def test_concurrency_cap_applies_across_callers(self, make_gateway):
+        client = FakeClient(latency=0.05)
+        gateway = make_gateway(client, max_concurrency=3)
+
+        async def burst():
+            return await asyncio.gather(*(gateway.complete(MESSAGES) for _ in range(6)))
+
+        # Async callers on another loop and a sync caller share one limit
+        thread = threading.Thread(target=lambda: [gateway.complete_sync(MESSAGES) for _ in range(2)])
+        thread.start()
+        assert asyncio.run(burst()) == ["ok"] * 6
+        thread.join()
+        assert client.max_active == 3
+        assert gateway.stats()["in_flight"] == 0
+
+    def test_token_bucket_reservations(self):
+        now = [0.0]
+        bucket = TokenBucket(60, clock=lambda: now[0])  # one unit per second
+        assert bucket.reserve(60) == 0.0
+        assert bucket.reserve(2) == pytest.approx(2.0)
+        now[0] = 5.0
+        assert bucket.reserve(1) == 0.0
+        bucket.adjust(-100)  # give back; never above capacity
+        assert bucket.reserve(60) == 0.0
+        assert TokenBucket(0).reserve(10 ** 9) == 0.0
+
+    def test_shared_rate_limit_counts_across_workers(self):
+        backend = MemoryCacheBackend()
+        now = [130.0]  # 10 s into minute window 2
+        workers = [SharedRateLimit(backend, "requests", 3, clock=lambda: now[0]) for _ in range(2)]
+        assert [workers[i % 2].reserve(1) for i in range(3)] == [0.0, 0.0, 0.0]
+        # The fourth request, from either worker, waits for the next minute
+        assert workers[1].reserve(1) == pytest.approx(50.0)
+        workers[0].adjust(-1)  # usage came in lower than reserved
+        assert workers[0].reserve(1) == 0.0
+        assert SharedRateLimit(backend, "off", 0).reserve(10 ** 9) == 0.0
+
+    def test_shared_rate_limit_falls_back_when_backend_fails(self):
+        class Down:
+            def incr(self, *args, **kwargs):
+                raise ConnectionError("redis down")
+
+        limit = SharedRateLimit(Down(), "requests", 60)
+        assert limit.reserve(60) == 0.0
+        assert limit.reserve(1) > 0
+
+    def test_requests_per_minute_throttles(self, make_gateway):
+        gateway = make_gateway(FakeClient(), requests_per_minute=600)  # 10 per second
+        gateway._requests._level = 0
+        started = time.perf_counter()
+        gateway.complete_sync(MESSAGES)
+        assert time.perf_counter() - started >= 0.09
+        assert gateway.stats()["throttled"] == 1
+
+
+class TestStreamingAndEmbeddings:
+    """Streams and embedding calls."""
+
+    def test_stream_yields_deltas_and_releases_slot(self, make_gateway):
+        async def chunks():
+            for text in ("Hel", None, "lo"):
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))], usage=None)
+            yield SimpleNamespace(choices=[], usage=SimpleNamespace(total_tokens=7))
+
+        client = FakeClient([chunks()])
+        gateway = make_gateway(client, max_concurrency=1)
+
+        async def collect():
+            return [d async for d in gateway.stream(MESSAGES)]
+
+        assert asyncio.run(collect()) == ["Hel", "lo"]
+        assert gateway.stats()["in_flight"] == 0
+        assert gateway.complete_sync(MESSAGES) == "ok"  # the single slot was released
+
+    def test_stream_error_raised_to_consumer(self, make_gateway):
+        async def broken():
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="Hi"))], usage=None)
+            raise openai.APIConnectionError(request=REQUEST)
+
+        gateway = make_gateway(FakeClient([broken()]))
+
+        async def collect():
+            received = []
+            with pytest.raises(openai.APIConnectionError):
+                async for delta in gateway.stream(MESSAGES):
+                    received.append(delta)
+            return received
+
+        assert asyncio.run(collect()) == ["Hi"]
+
+    def test_embed_keeps_order(self, make_gateway):
+        gateway = make_gateway(FakeClient())
+        assert gateway.embed_sync(["a", "bbb"]) == [[1.0], [3.0]]
+        assert asyncio.run(gateway.embed([])) == []
+
+
+class TestEmbeddingBatcher:
+    """Cross-caller micro-batching of embedding requests."""
+
+    def test_concurrent_callers_share_one_request(self, make_gateway):
+        client = FakeClient()
+        gateway = make_gateway(client, embed_batch_window=0.05)
+
+        async def burst():
+            return await asyncio.gather(
+                *(gateway.embed(["x" * n], coalesce=True) for n in range(1, 6)),
+                gateway.embed(["yy", "x"], coalesce=True),
+            )
+
+        results = asyncio.run(burst())
+        assert results == [[[float(n)]] for n in range(1, 6)] + [[[2.0], [1.0]]]
+        assert client.calls == 1
+        assert sorted(client.inputs[0]) == sorted(["x", "xx", "xxx", "xxxx", "xxxxx", "yy"])  # "x" sent once
+        stats = gateway.stats()["embedding_batches"]
+        assert (stats["batches"], stats["texts"], stats["sent"], stats["window_flushes"]) == (1, 7, 6, 1)
+
+    def test_sync_and_async_callers_batch_together(self, make_gateway):
+        client = FakeClient()
+        gateway = make_gateway(client, embed_batch_window=0.2)
+        results = {}
+        threads = [
+            threading.Thread(target=lambda i=i: results.update({i: gateway.embed_sync(["a" * i], coalesce=True)}))
+            for i in (1, 2, 3)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert results == {1: [[1.0]], 2: [[2.0]], 3: [[3.0]]}
+        assert client.calls == 1
+
+    def test_full_batch_sent_without_waiting(self, make_gateway):
+        client = FakeClient()
+        gateway = make_gateway(client, embed_batch_window=10, embed_batch_max=3)
+        started = time.perf_counter()
+
+        async def burst():
+            return await asyncio.gather(gateway.embed(["a", "b"], coalesce=True), gateway.embed(["c"], coalesce=True))
+
+        assert asyncio.run(burst()) == [[[1.0], [1.0]], [[1.0]]]
+        assert time.perf_counter() - started < 5
+        stats = gateway.stats()["embedding_batches"]
+        assert stats["full_flushes"] == 1
+        assert stats["fill_ratio"] == 1.0
+        assert stats["batch_sizes"] == {"2-3": 1}
+
+    def test_large_and_uncoalesced_requests_bypass_batcher(self, make_gateway):
+        client = FakeClient()
+        gateway = make_gateway(client, embed_batch_max=2)
+        gateway.embed_sync(["a", "b", "c"], coalesce=True)
+        gateway.embed_sync(["a"])
+        assert client.calls == 2
+        assert gateway.stats()["embedding_batches"]["batches"] == 0
+
+    def test_failure_reaches_every_caller(self, make_gateway):
+        bad_request = openai.BadRequestError(
+            "bad", response=httpx.Response(400, request=REQUEST), body=None
+        )
+        gateway = make_gateway(FakeClient([bad_request]), embed_batch_window=0.05)
+
+        async def burst():
+            return await asyncio.gather(
+                gateway.embed(["a"], coalesce=True), gateway.embed(["b"], coalesce=True), return_exceptions=True
+            )
+
+        assert all(isinstance(r, openai.BadRequestError) for r in asyncio.run(burst()))
@@ -0,0 +1,95 @@
+"""Unit tests for keyset (cursor) pagination helpers."""
+import pytest
+from fastapi import HTTPException
+from postgrest import SyncPostgrestClient
+
+from app.pagination import (
+    apply_keyset,
+    build_pagination,
+    cursor_offset,
+    decode_cursor,
+    encode_cursor,
+    keyset_cursor,
+    offset_cursor,
+    split_page,
+)
+
+
+def tickets_query():
+    return SyncPostgrestClient("http://localhost/rest/v1").table("tickets").select("*")
+
+
+class TestCursorEncoding:
+    """Tests for cursor tokens."""
+
+    def test_round_trip(self):
+        row = {"id": "t1", "updated_at": "2026-03-01T10:00:00+00:00"}
+        assert decode_cursor(keyset_cursor(row)) == {"v": row["updated_at"], "id": "t1"}
+
+    def test_cursor_is_url_safe(self):
+        token = encode_cursor({"v": "a+b/c?", "id": "x" * 40})
+        assert all(c.isalnum() or c in "-_" for c in token)
+
+    def test_garbage_cursor_rejected(self):
+        with pytest.raises(HTTPException) as exc:
+            decode_cursor("not-a-cursor!!")
+        assert exc.value.status_code == 400
+
+    def test_offset_cursor(self):
+        assert cursor_offset(offset_cursor(30)) == 30
+        with pytest.raises(HTTPException):
+            cursor_offset(keyset_cursor({"id": "t1", "updated_at": "x"}))
+
+
+class TestApplyKeyset:
+    """Tests for query construction."""
+
+    def test_first_page_orders_and_looks_ahead(self):
+        query = apply_keyset(tickets_query(), limit=10)
+        assert query.params.get_list("order") == ["updated_at.desc.nullsfirst,id.desc"]
+        assert query.params["limit"] == "11"
+        assert "or" not in query.params
+
+    def test_cursor_adds_keyset_filter(self):
+        cursor = keyset_cursor({"id": "t9", "created_at": "2026-03-01T10:00:00+00:00"}, "created_at")
+        query = apply_keyset(tickets_query(), limit=5, cursor=cursor, sort_column="created_at")
+        assert query.params["or"] == (
+            '(created_at.lt."2026-03-01T10:00:00+00:00",'
+            'and(created_at.eq."2026-03-01T10:00:00+00:00",id.lt."t9"))'
+        )
+
+    def test_null_sort_key_cursor(self):
+        cursor = keyset_cursor({"id": "e1", "evaluated_at": None}, "evaluated_at")
+        assert decode_cursor(cursor) == {"v": None, "id": "e1"}
+        query = apply_keyset(tickets_query(), limit=5, cursor=cursor, sort_column="evaluated_at")
+        assert query.params["or"] == '(and(evaluated_at.is.null,id.lt."e1"),evaluated_at.not.is.null)'
+
+    def test_cursor_missing_keys_rejected(self):
+        with pytest.raises(HTTPException):
+            apply_keyset(tickets_query(), limit=5, cursor=offset_cursor(10))
+
+
+class TestSplitPage:
+    """Tests for page trimming and response metadata."""
+
+    def test_last_page_has_no_cursor(self):
+        rows = [{"id": "a", "updated_at": "2"}, {"id": "b", "updated_at": "1"}]
+        assert split_page(rows, 2) == (rows, None)
+
+    def test_extra_row_yields_cursor_for_last_kept_row(self):
+        rows = [{"id": str(i), "updated_at": str(10 - i)} for i in range(4)]
+        page, next_cursor = split_page(rows, 3)
+        assert [r["id"] for r in page] == ["0", "1", "2"]
+        assert decode_cursor(next_cursor) == {"v": "8", "id": "2"}
+
+    def test_build_pagination_legacy_counters(self):
+        pagination = build_pagination(page_size=10, next_cursor="c", page=2, total_count=25)
+        assert pagination["total_pages"] == 3
+        assert pagination["has_next"] and pagination["has_prev"]
+
+    def test_build_pagination_cursor_only(self):
+        assert build_pagination(page_size=10, next_cursor=None) == {
+            "page_size": 10,
+            "has_next": False,
+            "next_cursor": None,
+        }
@@ -0,0 +1,125 @@
+"""Unit tests for the reference table cache."""
+import asyncio
+import pytest
+
+from app.reference_cache import ReferenceCache, active_sla_for_priority, find_by_id
+from app.sqlite_backend import AsyncSQLiteClient, SQLiteClient, SQLiteDatabase
+from app.ticket_repository import TicketRepository
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def db():
+    database = SQLiteDatabase(":memory:")
+    database.bulk_insert(
+        "sla_definitions",
+        [
+            {"id": "s-old", "priority": "high", "is_active": True, "created_at": "2026-01-01T00:00:00+00:00"},
+            {"id": "s-new", "priority": "high", "is_active": True, "created_at": "2026-02-01T00:00:00+00:00"},
+            {"id": "s-off", "priority": "low", "is_active": False, "created_at": "2026-03-01T00:00:00+00:00"},
+        ],
+    )
+    yield database
+    database.close()
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def cache(clock):
+    return ReferenceCache(ttl_seconds=60, clock=clock)
+
+
+class TestReferenceCache:
+    """Tests for ReferenceCache."""
+
+    def test_second_read_is_a_hit(self, cache, db):
+        client = SQLiteClient(db)
+        first = cache.rows("sla_definitions", client)
+        assert [s["id"] for s in first] == ["s-new", "s-old"]
+        assert cache.rows("sla_definitions", client) is first
+
+        stats = cache.stats()["tables"]["sla_definitions"]
+        assert (stats["hits"], stats["misses"], stats["cached_rows"]) == (1, 1, 2)
+
+    def test_expires_after_ttl(self, cache, clock, db):
+        client = SQLiteClient(db)
+        cache.rows("sla_definitions", client)
+        clock.now += 61
+        cache.rows("sla_definitions", client)
+        assert cache.stats()["tables"]["sla_definitions"]["misses"] == 2
+
+    def test_invalidate_reloads_changed_rows(self, cache, db):
+        client = SQLiteClient(db)
+        cache.rows("sla_definitions", client)
+        client.table("sla_definitions").update({"is_active": False}).eq("id", "s-new").execute()
+        assert [s["id"] for s in cache.rows("sla_definitions", client)] == ["s-new", "s-old"]
+
+        cache.invalidate("sla_definitions")
+        assert [s["id"] for s in cache.rows("sla_definitions", client)] == ["s-old"]
+        assert cache.stats()["tables"]["sla_definitions"]["invalidations"] == 1
+
+    def test_load_racing_an_invalidate_is_not_stored(self, cache, db):
+        client = SQLiteClient(db)
+        _, generation = cache._lookup("sla_definitions")
+        cache.invalidate("sla_definitions")
+        cache._store("sla_definitions", generation, [{"id": "stale"}])
+        assert [s["id"] for s in cache.rows("sla_definitions", client)] == ["s-new", "s-old"]
+
+    def test_disabled_cache_always_loads(self, clock, db):
+        cache = ReferenceCache(ttl_seconds=60, enabled=False, clock=clock)
+        client = SQLiteClient(db)
+        cache.rows("sla_definitions", client)
+        cache.rows("sla_definitions", client)
+        assert cache.stats()["misses"] == 2
+
+    def test_unknown_table_rejected(self, cache, db):
+        with pytest.raises(KeyError):
+            cache.rows("tickets", SQLiteClient(db))
+
+    def test_async_reads_share_the_cached_copy(self, cache, db):
+        client = AsyncSQLiteClient(db)
+
+        async def run():
+            first = await cache.arows("sla_definitions", client)
+            second = await cache.arows("sla_definitions", client)
+            return first, second
+
+        first, second = asyncio.run(run())
+        assert first is second
+        assert cache.stats()["hit_ratio"] == 0.5
+
+
+class TestLookups:
+    """Tests for the helpers over cached rows."""
+
+    def test_active_sla_for_priority_prefers_newest(self, db):
+        slas = ReferenceCache().rows("sla_definitions", SQLiteClient(db))
+        assert active_sla_for_priority(slas, "high")["id"] == "s-new"
+        assert active_sla_for_priority(slas, "low") is None
+
+    def test_find_by_id(self):
+        rows = [{"id": "a"}, {"id": "b"}]
+        assert find_by_id(rows, "b") == {"id": "b"}
+        assert find_by_id(rows, None) is None
+
+    def test_repository_sla_lookup_uses_cache(self, db, monkeypatch):
+        cache = ReferenceCache()
+        monkeypatch.setattr("app.ticket_repository.reference_cache", cache)
+        repo = TicketRepository(AsyncSQLiteClient(db))
+
+        async def run():
+            return [await repo.get_active_sla_id(p) for p in ("high", "high", "urgent")]
+
+        assert asyncio.run(run()) == ["s-new", "s-new", None]
+        assert cache.stats()["tables"]["sla_definitions"]["misses"] == 1
@@ -0,0 +1,199 @@
+"""Unit tests for the background AI reply job queue."""
+import asyncio
+
+import pytest
+
+from app.helpers import ReplyPrompt
+from app.reply_jobs import ReplyJobLookupFailed, ReplyJobQueue, ReplyQueueFull
+from app.sqlite_backend import AsyncSQLiteClient, SQLiteClient, SQLiteDatabase
+
+
+@pytest.fixture
+def db():
+    db = SQLiteDatabase(":memory:")
+    yield db
+    db.close()
+
+
+class RecordingHandler:
+    """Generates "reply to <ticket>" and records order and concurrency."""
+
+    def __init__(self, gate=None):
+        self.gate = gate
+        self.order = []
+        self.active = self.max_active = 0
+
+    async def __call__(self, ticket_id, prompt):
+        self.order.append(ticket_id)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            if self.gate is not None:
+                await self.gate.wait()
+            await asyncio.sleep(0.01)
+            if ticket_id == "boom":
+                raise RuntimeError("LLM down")
+            return {"ticket_id": ticket_id, "reply": f"reply to {ticket_id}"}
+        finally:
+            self.active -= 1
+
+
+def prompt(priority="medium"):
+    return ReplyPrompt("prompt", "Acme", "question", priority)
+
+
+class TestReplyJobQueue:
+    """Tests for ReplyJobQueue."""
+
+    def test_job_completes_and_can_be_polled(self):
+        async def run():
+            queue = ReplyJobQueue(workers=2, handler=RecordingHandler())
+            job = await queue.submit("t1", "u1", prompt())
+            assert (await queue.get(job.id))["status"] in ("queued", "running")
+            view = await queue.wait(job.id, timeout=1)
+            await queue.stop()
+            return view, queue.stats()
+
+        view, stats = asyncio.run(run())
+        assert view["status"] == "completed"
+        assert view["result"] == {"ticket_id": "t1", "reply": "reply to t1"}
+        assert view["user_id"] == "u1"
+        assert stats["completed"] == 1 and stats["queued"] == 0
+        assert stats["wait_ms"]["p50"] is not None
+
+    def test_urgent_jumps_the_queue(self):
+        async def run():
+            gate = asyncio.Event()
+            handler = RecordingHandler(gate)
+            queue = ReplyJobQueue(workers=1, handler=handler)
+            first = await queue.submit("first", "u", prompt("low"))
+            await asyncio.sleep(0)  # the only worker picks up "first" and blocks
+            jobs = [
+                await queue.submit(name, "u", prompt(priority))
+                for name, priority in [("low", "low"), ("medium", "medium"), ("urgent", "urgent"), ("high", "high")]
+            ]
+            assert queue.stats()["queued_by_priority"] == {"urgent": 1, "high": 1, "medium": 1, "low": 1}
+            gate.set()
+            for job in [first, *jobs]:
+                await queue.wait(job.id, timeout=2)
+            await queue.stop()
+            return handler.order
+
+        assert asyncio.run(run()) == ["first", "urgent", "high", "medium", "low"]
+
+    def test_workers_are_bounded(self):
+        async def run():
+            handler = RecordingHandler()
+            queue = ReplyJobQueue(workers=3, handler=handler)
+            jobs = [await queue.submit(f"t{i}", "u", prompt()) for i in range(10)]
+            for job in jobs:
+                await queue.wait(job.id, timeout=2)
+            await queue.stop()
+            return handler.max_active
+
+        assert asyncio.run(run()) == 3
+
+    def test_failure_recorded(self):
+        async def run():
+            queue = ReplyJobQueue(workers=1, handler=RecordingHandler())
+            job = await queue.submit("boom", "u", prompt())
+            view = await queue.wait(job.id, timeout=1)
+            await queue.stop()
+            return view, queue.stats()
+
+        view, stats = asyncio.run(run())
+        assert view["status"] == "failed"
+        assert view["error"] == "Failed to generate AI reply"
+        assert stats["failed"] == 1
+
+    def test_full_queue_rejects(self):
+        async def run():
+            gate = asyncio.Event()
+            queue = ReplyJobQueue(workers=1, max_queued=2, handler=RecordingHandler(gate))
+            await queue.submit("running", "u", prompt())
+            await asyncio.sleep(0)
+            await queue.submit("a", "u", prompt())
+            await queue.submit("b", "u", prompt())
+            with pytest.raises(ReplyQueueFull):
+                await queue.submit("c", "u", prompt())
+            gate.set()
+            await queue.stop()
+            return queue.stats()
+
+        assert asyncio.run(run())["rejected"] == 1
+
+
+class TestDurableReplyJobs:
+    """Tests for the ai_reply_jobs table mode."""
+
+    def make_queue(self, db, handler, **kwargs):
+        return ReplyJobQueue(durable=True, handler=handler, async_client_factory=lambda: AsyncSQLiteClient(db), **kwargs)
+
+    def test_job_recorded_and_polled_from_another_process(self, db):
+        async def run():
+            queue = self.make_queue(db, RecordingHandler())
+            job = await queue.submit("t1", "u1", prompt("high"))
+            await queue.wait(job.id, timeout=1)
+            await queue.stop()
+            # A second process only has the table
+            other = self.make_queue(db, RecordingHandler())
+            return job.id, await other.get(job.id)
+
+        job_id, view = asyncio.run(run())
+        assert view["status"] == "completed"
+        assert view["result"]["reply"] == "reply to t1"
+        assert view["user_id"] == "u1"
+        row = SQLiteClient(db).table("ai_reply_jobs").select("*").eq("id", job_id).execute().data[0]
+        assert row["priority"] == "high" and row["finished_at"]
+
+    def test_unfinished_jobs_recovered_on_start(self, db):
+        client = SQLiteClient(db)
+        client.table("ai_reply_jobs").insert([
+            {"id": "queued-job", "ticket_id": "t1", "user_id": "u", "status": "queued", "prompt": "p", "created_at": "2026-01-01T00:00:00+00:00"},
+            {"id": "stuck-job", "ticket_id": "t2", "user_id": "u", "status": "running", "prompt": "p",
+             "started_at": "2026-01-01T00:00:00+00:00", "created_at": "2026-01-01T00:00:01+00:00"},
+            {"id": "done-job", "ticket_id": "t3", "user_id": "u", "status": "completed", "prompt": "p", "created_at": "2026-01-01T00:00:02+00:00"},
+        ]).execute()
+
+        async def run():
+            handler = RecordingHandler()
+            queue = self.make_queue(db, handler)
+            recovered = await queue.start()
+            for job_id in ("queued-job", "stuck-job"):
+                await queue.wait(job_id, timeout=1)
+            await queue.stop()
+            return recovered, handler.order
+
+        recovered, order = asyncio.run(run())
+        assert recovered == 2
+        assert order == ["t1", "t2"]
+        statuses = {r["id"]: r["status"] for r in client.table("ai_reply_jobs").select("id, status").execute().data}
+        assert statuses == {"queued-job": "completed", "stuck-job": "completed", "done-job": "completed"}
+
+    def test_job_claimed_elsewhere_is_not_rerun(self, db):
+        async def run():
+            gate = asyncio.Event()
+            handler = RecordingHandler()
+            queue = self.make_queue(db, handler, workers=1)
+            blocker = self.make_queue(db, RecordingHandler(gate), workers=1)
+            # Another process claims the job between submit and pick-up
+            job = await blocker.submit("t1", "u", prompt())
+            await asyncio.sleep(0.01)
+            await queue.start()
+            await asyncio.sleep(0.05)
+            gate.set()
+            await blocker.wait(job.id, timeout=1)
+            await queue.stop()
+            await blocker.stop()
+            return handler.order
+
+        assert asyncio.run(run()) == []
+
+    def test_failed_table_lookup_is_not_reported_as_unknown(self):
+        class DownClient:
+            def table(self, name):
+                raise ConnectionError("database unavailable")
+
+        queue = ReplyJobQueue(durable=True, handler=RecordingHandler(), async_client_factory=DownClient)
+        with pytest.raises(ReplyJobLookupFailed):
+            asyncio.run(queue.get("job-from-another-process"))
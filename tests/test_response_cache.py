@@ -0,0 +1,129 @@
+"""Unit tests for the semantic response cache."""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from app.response_cache import SemanticResponseCache
+from app.sqlite_backend import AsyncSQLiteClient, SQLiteClient
+
+# Questions map to fixed unit vectors; "reset my password" variants are near-identical
+VECTORS = {
+    "How do I reset my password?": [1.0, 0.0, 0.0],
+    "how can I reset my password": [0.99, 0.1, 0.0],
+    "Where is my refund?": [0.0, 1.0, 0.0],
+}
+
+
+async def aembed(text):
+    return VECTORS[text]
+
+
+def make_cache(db, **kwargs):
+    kwargs.setdefault("enabled", True)
+    return SemanticResponseCache(
+        SQLiteClient(db),
+        async_client_factory=lambda: AsyncSQLiteClient(db),
+        embed=VECTORS.__getitem__,
+        aembed=aembed,
+        **kwargs,
+    )
+
+
+def add_exchange(db, question, answer, context="Acme", ticket_id="t1", user_id="u1"):
+    client = SQLiteClient(db)
+    ticket = {"id": ticket_id, "context": context, "user_id": user_id}
+    client.table("messages").insert({"ticket_id": ticket_id, "sender": "customer", "message": question}).execute()
+    message = client.table("messages").insert({"ticket_id": ticket_id, "sender": "ai", "message": answer}).execute().data[0]
+    return ticket, message
+
+
+def lookup(cache, context, question, user_id="u1"):
+    return asyncio.run(cache.alookup(context, question, user_id))
+
+
+class TestSemanticResponseCache:
+    """Tests for SemanticResponseCache."""
+
+    def test_approved_answer_served_for_similar_question(self, db):
+        cache = make_cache(db)
+        cache.record_rating(*add_exchange(db, "How do I reset my password?", "Use the reset link."), rating=5)
+
+        hit = lookup(cache, "Acme", "how can I reset my password")
+        assert hit["answer"] == "Use the reset link."
+        assert hit["similarity"] > 0.99
+        assert lookup(cache, "Acme", "Where is my refund?") is None
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["hit_rate"], stats["llm_calls_saved"]) == (1, 1, 0.5, 1)
+
+    def test_low_rating_not_cached_and_removes_existing(self, db):
+        cache = make_cache(db)
+        ticket, message = add_exchange(db, "How do I reset my password?", "Use the reset link.")
+        cache.record_rating(ticket, message, rating=2)
+        assert lookup(cache, "Acme", "How do I reset my password?") is None
+
+        cache.record_rating(ticket, message, rating=5)
+        cache.record_rating(ticket, message, rating=1)
+        assert lookup(cache, "Acme", "How do I reset my password?") is None
+
+    def test_reply_sent_from_cache_not_stored_again(self, db):
+        cache = make_cache(db)
+        cache.record_rating(*add_exchange(db, "How do I reset my password?", "Use the reset link."), rating=5)
+        hit = lookup(cache, "Acme", "how can I reset my password")
+
+        client = SQLiteClient(db)
+        question = {"ticket_id": "t2", "sender": "customer", "message": "how can I reset my password"}
+        client.table("messages").insert(question).execute()
+        reused = client.table("messages").insert(
+            {"ticket_id": "t2", "sender": "ai", "message": hit["answer"], "cached_response_id": hit["id"]}
+        ).execute().data[0]
+        cache.record_rating({"id": "t2", "context": "Acme", "user_id": "u1"}, reused, rating=5)
+        assert db.query("SELECT count(*) FROM response_cache")[0][0] == 1
+        assert cache.stats()["skipped_reused"] == 1
+
+        # A bad rating of the reused reply drops the entry it came from
+        cache.record_rating({"id": "t2", "context": "Acme", "user_id": "u1"}, reused, rating=1)
+        assert lookup(cache, "Acme", "How do I reset my password?") is None
+
+    def test_scoped_by_context(self, db):
+        cache = make_cache(db)
+        cache.record_rating(*add_exchange(db, "How do I reset my password?", "Acme answer."), rating=5)
+        assert lookup(cache, "Globex", "How do I reset my password?") is None
+
+    def test_not_served_to_other_customers(self, db):
+        cache = make_cache(db)
+        cache.record_rating(*add_exchange(db, "How do I reset my password?", "Sent to jane@acme.com."), rating=5)
+        assert lookup(cache, "Acme", "How do I reset my password?", user_id="u2") is None
+        assert lookup(cache, "Acme", "How do I reset my password?", user_id=None) is None
+
+        # A ticket without a customer is never cached
+        ticket, message = add_exchange(db, "Where is my refund?", "Refund sent.", ticket_id="t2", user_id=None)
+        assert cache.approve(ticket, message) is False
+
+    def test_kb_change_invalidates(self, db):
+        cache = make_cache(db)
+        ticket, message = add_exchange(db, "How do I reset my password?", "Old answer.")
+        cache.record_rating(ticket, message, rating=5)
+
+        assert cache.invalidate() == 1
+        assert lookup(cache, "Acme", "How do I reset my password?") is None
+        assert db.query("SELECT count(*) FROM response_cache")[0][0] == 0
+
+        # An answer written before the KB changed is not cached afterwards either
+        assert cache.approve(ticket, message) is False
+        assert cache.stats()["skipped_stale"] == 1
+
+        cache.record_rating(*add_exchange(db, "How do I reset my password?", "New answer.", ticket_id="t2"), rating=5)
+        assert lookup(cache, "Acme", "How do I reset my password?")["answer"] == "New answer."
+
+    def test_expired_entries_ignored(self, db):
+        cache = make_cache(db)
+        cache.record_rating(*add_exchange(db, "How do I reset my password?", "Use the reset link."), rating=5)
+        past = (datetime.now(timezone.utc) - timedelta(seconds=1)).isoformat()
+        SQLiteClient(db).table("response_cache").update({"expires_at": past}).eq("context", "Acme").execute()
+        assert lookup(cache, "Acme", "How do I reset my password?") is None
+
+    def test_disabled_cache_does_nothing(self, db):
+        cache = make_cache(db, enabled=False)
+        cache.record_rating(*add_exchange(db, "How do I reset my password?", "Use the reset link."), rating=5)
+        assert db.query("SELECT count(*) FROM response_cache")[0][0] == 0
+        assert lookup(cache, "Acme", "How do I reset my password?") is None
+        assert cache.stats()["lookups"] == 0
@@ -0,0 +1,288 @@
+"""Unit tests for the embedded SQLite backend."""
+import asyncio
+import pytest
+from postgrest.exceptions import APIError
+
+from app.pagination import apply_keyset, keyset_cursor, split_page
+from app.sqlite_backend import AsyncSQLiteClient, SQLiteClient, SQLiteDatabase
+from app.ticket_repository import TicketRepository
+
+
+@pytest.fixture
+def db():
+    database = SQLiteDatabase(":memory:")
+    yield database
+    database.close()
+
+
+@pytest.fixture
+def client(db):
+    return SQLiteClient(db)
+
+
+def seed_tickets(db, n=5):
+    db.bulk_insert(
+        "tickets",
+        [
+            {
+                "id": f"t{i}",
+                "user_id": "u1" if i % 2 == 0 else "u2",
+                "subject": f"Subject {i}",
+                "status": "open",
+                "updated_at": f"2026-01-{10 + i:02d}T00:00:00+00:00",
+                "created_at": f"2026-01-{10 + i:02d}T00:00:00+00:00",
+            }
+            for i in range(n)
+        ],
+    )
+
+
+class TestSQLiteQueryBuilder:
+    """Tests for the PostgREST-compatible builder."""
+
+    def test_insert_fills_defaults_and_returns_rows(self, client):
+        res = client.table("tickets").insert({"subject": "Refund", "user_id": "u1"}).execute()
+        row = res.data[0]
+        assert row["id"] and row["created_at"]
+        assert row["status"] == "open"
+        assert row["is_deleted"] is False
+
+    def test_filters_order_limit_and_count(self, client, db):
+        seed_tickets(db)
+        res = (
+            client.table("tickets")
+            .select("id, subject", count="exact")
+            .eq("user_id", "u1")
+            .eq("is_deleted", False)
+            .order("updated_at", desc=True)
+            .limit(2)
+            .execute()
+        )
+        assert [r["id"] for r in res.data] == ["t4", "t2"]
+        assert res.count == 3
+        assert set(res.data[0]) == {"id", "subject"}
+
+    def test_in_gte_lte_and_range(self, client, db):
+        seed_tickets(db)
+        res = (
+            client.table("tickets")
+            .select("id")
+            .in_("id", ["t0", "t1", "t2", "t3"])
+            .gte("created_at", "2026-01-11T00:00:00Z")
+            .lte("created_at", "2026-01-13T23:59:59Z")
+            .order("id")
+            .range(0, 2)
+            .execute()
+        )
+        assert [r["id"] for r in res.data] == ["t1", "t2"]
+
+    def test_update_and_delete_return_affected_rows(self, client, db):
+        seed_tickets(db, 2)
+        updated = client.table("tickets").update({"status": "closed"}).eq("id", "t0").execute()
+        assert updated.data[0]["status"] == "closed"
+        deleted = client.table("tickets").delete().eq("id", "t1").execute()
+        assert [r["id"] for r in deleted.data] == ["t1"]
+        assert client.table("tickets").select("id").execute().data == [{"id": "t0"}]
+
+    def test_upsert_on_conflict(self, client):
+        client.table("ticket_embeddings").upsert(
+            {"ticket_id": "t1", "embedding": [1.0, 0.0], "summary_text": "a"}, on_conflict="ticket_id"
+        ).execute()
+        client.table("ticket_embeddings").upsert(
+            {"ticket_id": "t1", "embedding": [0.0, 1.0], "summary_text": "b"}, on_conflict="ticket_id"
+        ).execute()
+        rows = client.table("ticket_embeddings").select("*").execute().data
+        assert len(rows) == 1
+        assert rows[0]["embedding"] == [0.0, 1.0]
+
+    def test_unknown_table_created_on_insert(self, client):
+        assert client.table("routing_logs").select("*").execute().data == []
+        client.table("routing_logs").insert({"ticket_id": "t1", "actions": {"assign": "x"}}).execute()
+        row = client.table("routing_logs").select("*").eq("ticket_id", "t1").execute().data[0]
+        assert row["actions"] == {"assign": "x"}
+
+    def test_ilike_and_is_null(self, client, db):
+        seed_tickets(db, 3)
+        assert len(client.table("tickets").select("id").ilike("subject", "%SUBJECT 1%").execute().data) == 1
+        assert len(client.table("tickets").select("id").is_("assigned_to", "null").execute().data) == 3
+
+    def test_embedded_select_rejected(self, client):
+        with pytest.raises(APIError):
+            client.table("tickets").select("*, tags(*)").execute()
+
+
+class TestKeysetOnSQLite:
+    """Cursor pagination runs unchanged against the SQLite builder."""
+
+    def test_pages_walk_every_row_once(self, client, db):
+        seed_tickets(db, 7)
+        seen, cursor = [], None
+        while True:
+            res = apply_keyset(client.table("tickets").select("*"), limit=3, cursor=cursor).execute()
+            page, cursor = split_page(res.data, 3)
+            seen += [r["id"] for r in page]
+            if cursor is None:
+                break
+        assert seen == [f"t{i}" for i in reversed(range(7))]
+
+    def test_ties_broken_by_id(self, client, db):
+        db.bulk_insert("tickets", [{"id": f"t{i}", "updated_at": "2026-01-01"} for i in range(4)])
+        cursor = keyset_cursor({"id": "t2", "updated_at": "2026-01-01"})
+        res = apply_keyset(client.table("tickets").select("id"), limit=5, cursor=cursor).execute()
+        assert [r["id"] for r in res.data] == ["t1", "t0"]
+
+    def test_null_sort_keys_paged_first(self, client, db):
+        db.bulk_insert("compliance_evaluations", [
+            {"id": f"e{i}", "evaluated_at": None if i < 3 else f"2026-01-0{i}"} for i in range(6)
+        ])
+        seen, cursor = [], None
+        while True:
+            query = client.table("compliance_evaluations").select("id, evaluated_at")
+            res = apply_keyset(query, limit=2, cursor=cursor, sort_column="evaluated_at").execute()
+            page, cursor = split_page(res.data, 2, "evaluated_at")
+            seen += [r["id"] for r in page]
+            if cursor is None:
+                break
+        assert seen == ["e2", "e1", "e0", "e5", "e4", "e3"]
+
+
+class TestSQLiteRpcs:
+    """Tests for the Python ports of the Postgres functions."""
+
+    def test_search_tickets_ranks_subject_hits_first(self, client, db):
+        seed_tickets(db, 3)
+        db.bulk_insert("messages", [{"ticket_id": "t0", "sender": "customer", "message": "need a refund"}])
+        client.table("tickets").update({"subject": "Refund please"}).eq("id", "t2").execute()
+
+        rows = client.rpc("search_tickets", {"p_query": "refund", "p_limit": 10, "p_offset": 0}).execute().data
+
+        assert [r["ticket"]["id"] for r in rows] == ["t2", "t0"]
+        assert rows[0]["rank"] > rows[1]["rank"]
+        assert rows[0]["total_count"] == 2
+
+    def test_search_tickets_wildcards_match_literally(self, client, db):
+        seed_tickets(db, 3)
+        client.table("tickets").update({"subject": "50% off"}).eq("id", "t1").execute()
+        client.table("tickets").update({"subject": "a_b test"}).eq("id", "t2").execute()
+
+        for query, expected in (("50%", ["t1"]), ("a_b", ["t2"]), ("%", ["t1"]), ("\\", [])):
+            rows = client.rpc("search_tickets", {"p_query": query, "p_limit": 10, "p_offset": 0}).execute().data
+            assert [r["ticket"]["id"] for r in rows] == expected
+
+    def test_match_chunks_cosine(self, client, db):
+        db.bulk_insert(
+            "document_chunks",
+            [
+                {"document_id": "d1", "chunk_index": 0, "content": "a", "embedding": [1.0, 0.0]},
+                {"document_id": "d1", "chunk_index": 1, "content": "b", "embedding": [0.0, 1.0]},
+            ],
+        )
+        rows = client.rpc(
+            "match_chunks", {"query_embedding": [0.9, 0.1], "match_count": 5, "match_threshold": 0.5}
+        ).execute().data
+        assert [r["content"] for r in rows] == ["a"]
+
+    def test_match_chunks_filtered_scans_only_matching_documents(self, client, db):
+        db.bulk_insert(
+            "knowledge_documents",
+            [
+                {"id": "d1", "title": "Policy", "source": "manual", "tenant_id": "acme", "metadata": {"tags": ["hr", "legal"]}},
+                {"id": "d2", "title": "FAQ", "source": "auto_generated", "tenant_id": "acme", "metadata": {}},
+                {"id": "d3", "title": "Other", "source": "manual", "tenant_id": "globex", "metadata": {"tags": ["hr"]}},
+            ],
+        )
+        db.bulk_insert(
+            "document_chunks",
+            [
+                {"document_id": "d2", "chunk_index": 0, "content": "best", "embedding": [1.0, 0.0]},
+                {"document_id": "d3", "chunk_index": 0, "content": "close", "embedding": [0.95, 0.05]},
+                {"document_id": "d1", "chunk_index": 0, "content": "policy", "embedding": [0.8, 0.2]},
+                {"document_id": "d1", "chunk_index": 1, "content": "far", "embedding": [0.0, 1.0]},
+            ],
+        )
+
+        def search(**filters):
+            params = {"query_embedding": [1.0, 0.0], "match_count": 1, "match_threshold": 0.5, **filters}
+            return [r["content"] for r in client.rpc("match_chunks_filtered", params).execute().data]
+
+        assert search() == ["best"]
+        # The global top match is elsewhere; the document's own best chunk is still found
+        assert search(p_document_ids=["d1"]) == ["policy"]
+        assert search(p_source="manual") == ["close"]
+        assert search(p_source="manual", p_tenant_id="acme") == ["policy"]
+        assert search(p_metadata={"tags": ["hr"]}) == ["close"]
+        assert search(p_metadata={"tags": ["legal"]}, p_document_ids=["d1", "d3"]) == ["policy"]
+        assert search(p_document_ids=["d2"], p_tenant_id="globex") == []
+
+    def test_match_tickets_sees_writes_after_cached_query(self, client):
+        params = {"query_embedding": [1.0, 0.0], "match_count": 5, "match_threshold": 0.5, "exclude_ticket_id": "t0"}
+        table = client.table("ticket_embeddings")
+        table.upsert({"ticket_id": "t0", "embedding": [1.0, 0.0], "summary_text": "self"}, on_conflict="ticket_id").execute()
+        assert client.rpc("match_tickets", params).execute().data == []
+
+        table.upsert({"ticket_id": "t1", "embedding": [1.0, 0.1], "summary_text": "near"}, on_conflict="ticket_id").execute()
+        rows = client.rpc("match_tickets", params).execute().data
+        assert [r["ticket_id"] for r in rows] == ["t1"]
+
+    def test_create_or_continue_ticket_reuses_open_ticket(self, client, db):
+        db.bulk_insert("sla_definitions", [{"id": "sla-high", "name": "High", "priority": "high", "is_active": True}])
+        params = {"p_context": "Acme", "p_subject": "Login", "p_user_id": "u1", "p_priority": "high"}
+
+        first = client.rpc("create_or_continue_ticket", {**params, "p_message": "can't log in"}).execute().data[0]
+        db.bulk_insert("messages", [{"ticket_id": first["ticket"]["id"], "sender": "ai", "message": "try a reset"}])
+        second = client.rpc("create_or_continue_ticket", {**params, "p_message": "still broken"}).execute().data[0]
+
+        assert first["created"] and not second["created"]
+        assert first["ticket"]["sla_id"] == "sla-high"
+        assert second["ticket"]["id"] == first["ticket"]["id"]
+        assert [m["message"] for m in second["history"]] == ["can't log in", "try a reset", "still broken"]
+        assert second["ai_replies_in_window"] == 1
+
+    def test_create_or_continue_ticket_by_id_only(self, client, db):
+        seed_tickets(db, 1)
+        base = {"p_context": "email", "p_subject": "Subject 0", "p_user_id": "u1", "p_continue_open": False}
+        reply = client.rpc("create_or_continue_ticket", {**base, "p_ticket_id": "t0", "p_message": "re"}).execute().data[0]
+        fresh = client.rpc("create_or_continue_ticket", {**base, "p_message": "new"}).execute().data[0]
+        assert (reply["ticket"]["id"], reply["created"]) == ("t0", False)
+        assert fresh["created"] and fresh["ticket"]["id"] != "t0"
+        assert fresh["ticket"]["sla_id"] is None
+
+    def test_unknown_rpc(self, client):
+        with pytest.raises(APIError):
+            client.rpc("nope", {}).execute()
+
+
+class TestAsyncRepositoryOnSQLite:
+    """The async ticket repository works against the SQLite backend."""
+
+    def test_thread_and_pages(self, db):
+        seed_tickets(db, 4)
+        db.bulk_insert("messages", [{"ticket_id": "t1", "sender": "customer", "message": "hi"}])
+        repo = TicketRepository(AsyncSQLiteClient(db))
+
+        async def run():
+            ticket, messages, ratings = await repo.get_thread("t1", "u2")
+            body = await repo.page_tickets({"user_id": "u1"}, page=1, page_size=1)
+            return ticket, messages, ratings, body
+
+        ticket, messages, ratings, body = asyncio.run(run())
+        assert ticket["id"] == "t1"
+        assert messages[0]["message"] == "hi"
+        assert ratings == {}
+        assert [t["id"] for t in body["tickets"]] == ["t2"]
+        assert body["pagination"]["total_count"] == 2
+        assert body["pagination"]["next_cursor"]
+
+    def test_create_or_continue_ticket(self, db):
+        repo = TicketRepository(AsyncSQLiteClient(db))
+
+        async def run():
+            return await repo.create_or_continue_ticket(
+                context="Acme", subject="Billing", message="charged twice", user_id="u1", source="web"
+            )
+
+        intake = asyncio.run(run())
+        assert intake["created"]
+        assert intake["ticket"]["source"] == "web"
+        assert intake["message"]["sender"] == "customer"
+        assert intake["history"][0]["message"] == "charged twice"
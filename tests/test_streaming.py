@@ -0,0 +1,108 @@
+"""Unit tests for streamed AI replies."""
+import asyncio
+import json
+import time
+import pytest
+
+from app import streaming
+from app.helpers import ReplyPrompt, StreamSanitizer, sanitize_output
+from app.sqlite_backend import AsyncSQLiteClient, SQLiteDatabase
+from app.streaming import StreamStats, stream_ai_message
+from app.ticket_repository import TicketRepository
+
+
+def parse_events(chunks):
+    events = []
+    for chunk in chunks:
+        name, data = chunk.strip().split("\n")
+        events.append((name[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+async def collect(agen):
+    return [chunk async for chunk in agen]
+
+
+class TestStreamSanitizer:
+    """Redaction of text that arrives token by token."""
+
+    @pytest.mark.parametrize(
+        "pieces",
+        [
+            ["Mail jo", "hn@exa", "mple.com today"],
+            ["Call 555", " 123", "-4567 now"],
+            ["Card 4111 1111 ", "1111 1111 ok ", "thanks"],
+            ["what the fu", "cking mess"],
+        ],
+    )
+    def test_matches_whole_message_redaction(self, pieces):
+        sanitizer = StreamSanitizer()
+        streamed = "".join(sanitizer.feed(p) for p in pieces) + sanitizer.flush()
+        expected, flags = sanitize_output("".join(pieces))
+        assert streamed == expected
+        assert sanitizer.flags == flags
+
+    def test_releases_text_at_safe_boundaries(self):
+        sanitizer = StreamSanitizer()
+        assert sanitizer.feed("Hello the") == "Hello "
+        assert sanitizer.feed("re, call 555 ") == "there, call "
+        assert sanitizer.flush() == "555 "
+
+
+class TestStreamAiMessage:
+    """The SSE generator sends redacted tokens and stores the reply."""
+
+    @pytest.fixture
+    def repo(self, monkeypatch):
+        db = SQLiteDatabase(":memory:")
+        repo = TicketRepository(AsyncSQLiteClient(db))
+        monkeypatch.setattr(streaming, "ticket_repository", repo)
+        monkeypatch.setattr(streaming, "stream_stats", StreamStats())
+        yield repo
+        db.close()
+
+    def test_tokens_then_done_and_message_stored(self, repo, monkeypatch):
+        async def deltas(prompt):
+            for delta in ["Write to ", "ann@ex", "ample.com ", "please."]:
+                yield delta
+
+        monkeypatch.setattr(streaming, "stream_ai_reply", deltas)
+        events = parse_events(asyncio.run(collect(stream_ai_message("t1", ReplyPrompt("prompt"), time.perf_counter()))))
+
+        names = [name for name, _ in events]
+        assert names[-1] == "done" and set(names[:-1]) == {"token"}
+        text = "".join(data["text"] for name, data in events if name == "token")
+        assert text == "Write to ***@***.*** please."
+        done = events[-1][1]
+        assert done["flags"]["email"] is True
+        assert done["ttft_ms"] is not None and done["message_id"]
+
+        stored = asyncio.run(repo.get_messages("t1"))
+        assert [(m["sender"], m["message"]) for m in stored] == [("ai", text)]
+        assert streaming.stream_stats.snapshot()["completed"] == 1
+
+    def test_generation_error_sends_error_event(self, repo, monkeypatch):
+        async def failing(prompt):
+            yield "Partial "
+            raise RuntimeError("upstream closed")
+
+        monkeypatch.setattr(streaming, "stream_ai_reply", failing)
+        events = parse_events(asyncio.run(collect(stream_ai_message("t1", ReplyPrompt("prompt"), time.perf_counter()))))
+
+        assert events[-1][0] == "error"
+        assert asyncio.run(repo.get_messages("t1")) == []
+        assert streaming.stream_stats.snapshot()["failed"] == 1
+
+
+class TestStreamStats:
+    """TTFT percentile reporting."""
+
+    def test_snapshot_and_window(self):
+        stats = StreamStats(window=3)
+        for ttft in (100, 200, 300, 400):
+            stats.record(ttft, ttft * 2)
+        stats.record(None, 50, "failed")
+        snap = stats.snapshot()
+        assert (snap["completed"], snap["failed"]) == (4, 1)
+        assert snap["ttft_ms"]["p50"] == 300.0
+        assert snap["samples"] == 3
@@ -0,0 +1,134 @@
+"""Unit tests for the async ticket repository."""
+import asyncio
+import time
+import pytest
+from unittest.mock import AsyncMock, MagicMock, Mock
+from app.pagination import keyset_cursor
+from app.ticket_repository import TicketRepository
+
+
+def make_async_client(data_by_table=None, delay=0.0):
+    """Build a fake async PostgREST client whose builders chain and await execute()."""
+    data_by_table = data_by_table or {}
+    client = MagicMock()
+    chains = {}
+
+    def table(name):
+        if name not in chains:
+            chain = MagicMock()
+            for method in ("select", "insert", "update", "eq", "gte", "lte", "in_", "ilike", "order", "limit", "range", "or_"):
+                getattr(chain, method).return_value = chain
+
+            async def execute():
+                if delay:
+                    await asyncio.sleep(delay)
+                result = Mock()
+                result.data = data_by_table.get(name, [])
+                result.count = len(result.data)
+                return result
+
+            chain.execute = AsyncMock(side_effect=execute)
+            chains[name] = chain
+        return chains[name]
+
+    client.table = MagicMock(side_effect=table)
+    # RPC results are looked up under "rpc:<function name>"
+    client.rpc = MagicMock(side_effect=lambda fn, params=None: table(f"rpc:{fn}"))
+    client._chains = chains
+    return client
+
+
+class TestTicketRepository:
+    """Tests for TicketRepository."""
+
+    @pytest.mark.asyncio
+    async def test_get_ticket_not_found(self):
+        repo = TicketRepository(make_async_client())
+        assert await repo.get_ticket("missing") is None
+
+    @pytest.mark.asyncio
+    async def test_get_thread_runs_lookups_concurrently(self):
+        client = make_async_client(
+            {
+                "tickets": [{"id": "t1", "user_id": "u1"}],
+                "messages": [{"id": "m1", "sender": "ai", "message": "hi"}],
+                "ratings": [{"message_id": "m1", "rating": 5}],
+            },
+            delay=0.1,
+        )
+        repo = TicketRepository(client)
+
+        start = time.perf_counter()
+        ticket, messages, ratings = await repo.get_thread("t1", "u1")
+        elapsed = time.perf_counter() - start
+
+        assert ticket["id"] == "t1"
+        assert messages[0]["id"] == "m1"
+        assert ratings == {"m1": 5}
+        # Three 100ms lookups in parallel should take ~100ms, not ~300ms
+        assert elapsed < 0.25
+
+    @pytest.mark.asyncio
+    async def test_search_tickets_single_rpc(self):
+        rows = [
+            {"ticket": {"id": "t2", "subject": "Refund"}, "rank": 0.6, "total_count": 7},
+            {"ticket": {"id": "t5", "subject": "Other"}, "rank": 0.1, "total_count": 7},
+        ]
+        client = make_async_client({"rpc:search_tickets": rows})
+        repo = TicketRepository(client)
+
+        tickets, total = await repo.search_tickets(
+            "refund", {"user_id": "u1", "status": None}, date_from="2026-01-01", limit=2, offset=4
+        )
+
+        assert [t["id"] for t in tickets] == ["t2", "t5"]
+        assert tickets[0]["search_rank"] == 0.6
+        assert total == 7
+        client.table.assert_not_called()
+        client.rpc.assert_called_once()
+        fn, params = client.rpc.call_args.args
+        assert fn == "search_tickets"
+        assert params["p_query"] == "refund"
+        assert params["p_user_id"] == "u1"
+        assert params["p_status"] is None
+        assert params["p_date_from"] == "2026-01-01T00:00:00Z"
+        assert params["p_date_to"] is None
+        assert (params["p_limit"], params["p_offset"]) == (2, 4)
+
+    @pytest.mark.asyncio
+    async def test_search_tickets_no_matches(self):
+        repo = TicketRepository(make_async_client())
+        assert await repo.search_tickets("nothing", {}) == ([], 0)
+
+    @pytest.mark.asyncio
+    async def test_page_tickets_legacy_page_uses_range(self):
+        rows = [{"id": f"t{i}", "updated_at": f"2026-01-0{9 - i}"} for i in range(3)]
+        client = make_async_client({"tickets": rows})
+        repo = TicketRepository(client)
+
+        # make_async_client reports count == len(data); pretend there are more rows
+        chain = client.table("tickets")
+        chain.execute.side_effect = None
+        chain.execute.return_value = Mock(data=rows, count=9)
+
+        body = await repo.page_tickets({"user_id": "u1"}, page=2, page_size=3)
+
+        chain.range.assert_called_once_with(3, 6)
+        assert body["pagination"]["total_count"] == 9
+        assert body["pagination"]["total_pages"] == 3
+        assert body["pagination"]["has_next"] is True
+        assert body["pagination"]["next_cursor"]
+
+    @pytest.mark.asyncio
+    async def test_page_tickets_cursor_fetches_look_ahead_row(self):
+        rows = [{"id": f"t{i}", "updated_at": f"2026-01-0{9 - i}"} for i in range(3)]
+        client = make_async_client({"tickets": rows})
+        repo = TicketRepository(client)
+
+        cursor = keyset_cursor({"id": "t", "updated_at": "2026-01-10"})
+        body = await repo.page_tickets({}, page_size=2, cursor=cursor)
+
+        client._chains["tickets"].limit.assert_called_with(3)
+        assert [t["id"] for t in body["tickets"]] == ["t0", "t1"]
+        assert "total_count" not in body["pagination"]
+        assert body["pagination"]["has_next"] is True
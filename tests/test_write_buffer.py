@@ -0,0 +1,110 @@
+"""Unit tests for the write-behind buffer."""
+import time
+import pytest
+from unittest.mock import MagicMock
+
+from app.sqlite_backend import SQLiteClient, SQLiteDatabase
+from app.write_buffer import BufferedWriter
+
+
+@pytest.fixture
+def client():
+    db = SQLiteDatabase(":memory:")
+    yield SQLiteClient(db)
+    db.close()
+
+
+def count(client, table):
+    return len(client.table(table).select("id").execute().data)
+
+
+class TestBufferedWriter:
+    """Tests for BufferedWriter."""
+
+    def test_rows_written_in_one_batch_per_table_on_flush(self, client):
+        writer = BufferedWriter(client, flush_interval=60)
+        for i in range(5):
+            writer.enqueue("routing_logs", {"ticket_id": f"t{i}", "rule_name": "r"})
+        writer.enqueue("kb_usage_logs", [{"chunk_id": "c1"}, {"chunk_id": "c2"}])
+        assert count(client, "routing_logs") == 0
+
+        assert writer.flush() == 7
+        assert count(client, "routing_logs") == 5
+        stats = writer.stats()["tables"]
+        assert stats["routing_logs"]["batches"] == 1
+        assert stats["kb_usage_logs"]["written"] == 2
+        writer.stop()
+
+    def test_background_flush_on_interval(self, client):
+        writer = BufferedWriter(client, flush_interval=0.05)
+        writer.enqueue("ticket_activities", {"ticket_id": "t1", "action_type": "priority_changed"})
+        deadline = time.monotonic() + 2
+        while count(client, "ticket_activities") == 0 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert count(client, "ticket_activities") == 1
+        writer.stop()
+
+    def test_batch_size_triggers_early_flush(self, client):
+        writer = BufferedWriter(client, max_batch=3, flush_interval=60)
+        writer.enqueue("routing_logs", [{"ticket_id": f"t{i}"} for i in range(3)])
+        deadline = time.monotonic() + 2
+        while count(client, "routing_logs") < 3 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert count(client, "routing_logs") == 3
+        writer.stop()
+
+    def test_stop_flushes_remaining_rows(self, client):
+        writer = BufferedWriter(client, flush_interval=60)
+        writer.enqueue("routing_logs", {"ticket_id": "t1"})
+        writer.stop()
+        assert count(client, "routing_logs") == 1
+        assert writer.stats()["pending"] == 0
+
+    def test_full_buffer_drops_and_counts(self):
+        writer = BufferedWriter(MagicMock(), max_pending=2, flush_interval=60, enqueue_timeout=0)
+        writer._ensure_started = lambda: None  # no flusher, so the queue cannot drain
+        assert writer.enqueue("routing_logs", [{"a": 1}, {"a": 2}])
+        assert not writer.enqueue("routing_logs", {"a": 3})
+        stats = writer.stats()
+        assert stats["dropped"] == 1
+        assert stats["pending"] == 2
+
+    def test_failed_batch_retried_row_by_row(self):
+        client = MagicMock()
+
+        def insert(rows):
+            chain = MagicMock()
+            if len(rows) > 1 or rows[0].get("bad"):
+                chain.execute.side_effect = RuntimeError("rejected")
+            return chain
+
+        client.table.return_value.insert.side_effect = insert
+        writer = BufferedWriter(client, flush_interval=60)
+        writer.enqueue("routing_logs", [{"bad": False}, {"bad": True}, {"bad": False}])
+        assert writer.flush() == 2
+        stats = writer.stats()["tables"]["routing_logs"]
+        assert (stats["written"], stats["failed"]) == (2, 1)
+        writer.stop()
+
+    def test_rows_with_different_keys_use_separate_inserts(self, client):
+        writer = BufferedWriter(client, flush_interval=60)
+        writer.enqueue("routing_logs", [{"ticket_id": "t1"}, {"ticket_id": "t2", "rule_name": "r"}])
+        writer.flush()
+        assert writer.stats()["tables"]["routing_logs"]["batches"] == 2
+        writer.stop()
+
+    def test_on_conflict_skips_existing_rows(self, client):
+        writer = BufferedWriter(client, flush_interval=60)
+        row = {"model": "m", "text_hash": "h1", "embedding": [0.1]}
+        writer.enqueue("embedding_cache", [row, {**row, "text_hash": "h2"}], on_conflict="model,text_hash")
+        writer.enqueue("embedding_cache", row, on_conflict="model,text_hash")
+        assert writer.flush() == 3
+        assert count(client, "embedding_cache") == 2
+        assert writer.stats()["tables"]["embedding_cache"]["failed"] == 0
+        writer.stop()
+
+    def test_disabled_writes_inline(self, client):
+        writer = BufferedWriter(client, enabled=False)
+        writer.enqueue("routing_logs", {"ticket_id": "t1"})
+        assert count(client, "routing_logs") == 1
+        assert writer._thread is None